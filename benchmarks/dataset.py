@@ -0,0 +1,205 @@
+"""
+    benchmarks/dataset.py
+
+    This module seeds the database with a deterministic dataset for load tests: products of every type,
+    discounts of every type and orders referring to them. The same seed always produces the same names,
+    prices and order lines, so that load test runs against freshly seeded databases can be compared.
+
+    Rows are written in bulk. Seasonal and bulk products, and percentage and fixed amount discounts, get
+    their parent rows from one `bulk_create` per batch (Django cannot bulk create multi-table children) and
+    their child rows from raw saves, which skip the signal receivers; the search index is rebuilt once at
+    the end instead.
+"""
+
+import random
+from decimal import Decimal
+
+from django.db import transaction
+
+from discounts.models import ProductDiscount, PercentageDiscount, FixedAmountDiscount
+from orders.models import Order, OrderItem
+from orders.services import place_orders
+from products.models import Product, SeasonalProduct, BulkProduct
+from products.search import rebuild_index
+
+ADJECTIVES = (
+    'Classic', 'Compact', 'Deluxe', 'Eco', 'Essential', 'Premium', 'Portable', 'Pro', 'Rugged', 'Smart',
+    'Solid', 'Ultra', 'Vintage', 'Wireless', 'Organic', 'Modern',
+)
+NOUNS = (
+    'Backpack', 'Blender', 'Camera', 'Chair', 'Desk', 'Headphones', 'Kettle', 'Keyboard', 'Lamp', 'Monitor',
+    'Mouse', 'Notebook', 'Speaker', 'Tent', 'Toaster', 'Watch', 'Bottle', 'Jacket', 'Sneakers', 'Umbrella',
+)
+MATERIALS = ('Aluminium', 'Bamboo', 'Carbon', 'Ceramic', 'Cotton', 'Leather', 'Oak', 'Steel', 'Wool', 'Glass')
+
+BATCH_SIZE = 1000
+
+
+def product_name(rng):
+    """
+    Builds a product name such as "Rugged Oak Desk".
+
+    Args:
+        rng (Random): The random generator of the dataset.
+
+    Returns:
+        str: The product name.
+    """
+    return f"{rng.choice(ADJECTIVES)} {rng.choice(MATERIALS)} {rng.choice(NOUNS)}"
+
+
+def money(rng, low, high):
+    """
+    Draws an amount with two decimal places.
+
+    Args:
+        rng (Random): The random generator of the dataset.
+        low (int): The lowest amount, in whole units.
+        high (int): The highest amount, in whole units.
+
+    Returns:
+        Decimal: The amount.
+    """
+    return Decimal(rng.randint(low * 100, high * 100)) / 100
+
+
+def create_subtyped(base_model, instances):
+    """
+    Inserts instances of a multi-table hierarchy: the parent rows in bulk, then the child rows.
+
+    Args:
+        base_model (Model): The base model of the hierarchy.
+        instances (list): Unsaved instances of the base model or of its subtypes.
+
+    Returns:
+        list: The saved instances.
+    """
+    fields = base_model._meta.concrete_fields
+    parents = [base_model(**{field.attname: getattr(instance, field.attname)
+                             for field in fields if not field.primary_key})
+               for instance in instances]
+    base_model.objects.bulk_create(parents, batch_size=BATCH_SIZE)
+    for instance, parent in zip(instances, parents):
+        for field in fields:
+            setattr(instance, field.attname, getattr(parent, field.attname))
+        if type(instance) is base_model:
+            instance._state.adding = False
+            instance._state.db = parent._state.db
+        else:
+            setattr(instance, instance._meta.pk.attname, parent.pk)
+            instance.save_base(raw=True, force_insert=True)
+    return instances
+
+
+def seed_products(count, rng, stock=None):
+    """
+    Creates products, a fifth of them seasonal and a fifth of them bulk products.
+
+    Args:
+        count (int): The number of products.
+        rng (Random): The random generator of the dataset.
+        stock (int, optional): The units in stock of every product. The stock is not tracked when None.
+
+    Returns:
+        list: The created products.
+    """
+    products = []
+    for index in range(count):
+        attrs = {'name': product_name(rng), 'price': money(rng, 1, 500), 'stock': stock}
+        if index % 5 == 3:
+            products.append(SeasonalProduct(seasonal_discount=Decimal(rng.randint(5, 40)), **attrs))
+        elif index % 5 == 4:
+            products.append(BulkProduct(bulk_threshold=rng.randint(5, 50),
+                                        bulk_discount=Decimal(rng.randint(5, 30)), **attrs))
+        else:
+            products.append(Product(**attrs))
+    return create_subtyped(Product, products)
+
+
+def seed_discounts(count, rng):
+    """
+    Creates discounts, alternating percentage and fixed amount discounts.
+
+    Args:
+        count (int): The number of discounts.
+        rng (Random): The random generator of the dataset.
+
+    Returns:
+        list: The created discounts.
+    """
+    discounts = []
+    for index in range(count):
+        if index % 2:
+            discounts.append(FixedAmountDiscount(name=f"{rng.choice(NOUNS)} {index} Off",
+                                                 amount=money(rng, 1, 50)))
+        else:
+            percentage = rng.choice((5, 10, 15, 20, 25, 30))
+            discounts.append(PercentageDiscount(name=f"{percentage}% {rng.choice(ADJECTIVES)} Deal {index}",
+                                                percentage=Decimal(percentage)))
+    return create_subtyped(ProductDiscount, discounts)
+
+
+def seed_orders(count, products, discounts, rng):
+    """
+    Places orders of one to five lines, each with one of the discounts.
+
+    Args:
+        count (int): The number of orders.
+        products (list): The products ordered.
+        discounts (list): The discounts applied.
+        rng (Random): The random generator of the dataset.
+
+    Returns:
+        int: The number of placed orders.
+    """
+    placed = 0
+    while placed < count:
+        batch = min(BATCH_SIZE, count - placed)
+        place_orders([{
+            'discount': rng.choice(discounts),
+            'products': [{'product': product, 'quantity': rng.randint(1, 20)}
+                         for product in rng.sample(products, rng.randint(1, min(5, len(products))))],
+        } for _ in range(batch)])
+        placed += batch
+    return placed
+
+
+def clear_dataset():
+    """
+    Deletes all orders, discounts and products.
+    """
+    OrderItem.objects.all().delete()
+    Order.objects.all().delete()
+    ProductDiscount.objects.all().delete()
+    Product.objects.all().delete()
+
+
+def seed_dataset(products=2000, discounts=50, orders=1000, seed=0, clear=False, stock=None):
+    """
+    Seeds the database with a deterministic dataset.
+
+    Args:
+        products (int): The number of products.
+        discounts (int): The number of discounts.
+        orders (int): The number of orders. Orders need at least one product and one discount.
+        seed (int): The seed of the random generator.
+        clear (bool): Deletes the existing orders, discounts and products first.
+        stock (int, optional): The units in stock of every product. The stock is not tracked when None.
+
+    Returns:
+        dict: The number of created products, discounts and orders, and of indexed products.
+    """
+    rng = random.Random(seed)
+    with transaction.atomic():
+        if clear:
+            clear_dataset()
+        created_products = seed_products(products, rng, stock)
+        created_discounts = seed_discounts(discounts, rng)
+        placed = seed_orders(orders, created_products, created_discounts, rng) \
+            if created_products and created_discounts else 0
+    return {
+        'products': len(created_products),
+        'discounts': len(created_discounts),
+        'orders': placed,
+        'indexed': rebuild_index(),
+    }
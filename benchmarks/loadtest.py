@@ -0,0 +1,529 @@
+"""
+    benchmarks/loadtest.py
+
+    This module drives mixed workloads against the `/api/` endpoints and reports throughput and latency
+    percentiles per endpoint. Unlike micro-benchmarks of single functions, every request goes through the
+    full request path: middleware, load shedding, views, serializers and the ORM.
+
+    A pool of client threads picks endpoints at random according to the weights of a workload mix and
+    builds their requests from the seeded dataset (see `benchmarks/dataset.py`). Requests are sent either
+    to a running server over HTTP, or in-process to the WSGI application of the project, which needs no
+    server and measures the application alone.
+"""
+
+import http.client
+import io
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+from decimal import Decimal
+from urllib.parse import urlencode, urlsplit
+
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+
+from discounts.models import ProductDiscount, PercentageDiscount, FixedAmountDiscount
+from products.models import Product
+
+Endpoint = namedtuple('Endpoint', ['method', 'path', 'build'])
+Dataset = namedtuple('Dataset', ['product_ids', 'discount_ids', 'percentage_ids', 'fixed_ids', 'words'])
+Sample = namedtuple('Sample', ['endpoint', 'status', 'elapsed'])
+
+
+def load_dataset(word_count=200):
+    """
+    Loads the ids and search words requests are built from.
+
+    Args:
+        word_count (int): The largest number of distinct search words.
+
+    Returns:
+        Dataset: The dataset.
+    """
+    words = set()
+    for name in Product.objects.values_list('name', flat=True)[:word_count * 10]:
+        words.update(word.lower() for word in name.split() if len(word) > 2)
+    return Dataset(
+        product_ids=list(Product.objects.values_list('pk', flat=True)),
+        discount_ids=list(ProductDiscount.objects.values_list('pk', flat=True)),
+        percentage_ids=list(PercentageDiscount.objects.values_list('pk', flat=True)),
+        fixed_ids=list(FixedAmountDiscount.objects.values_list('pk', flat=True)),
+        words=sorted(words)[:word_count],
+    )
+
+
+def money(rng, low, high):
+    """
+    Draws an amount with two decimal places, as sent in request bodies.
+
+    Args:
+        rng (Random): The random generator of the client.
+        low (int): The lowest amount, in whole units.
+        high (int): The highest amount, in whole units.
+
+    Returns:
+        str: The amount.
+    """
+    return str(Decimal(rng.randint(low * 100, high * 100)) / 100)
+
+
+# Request builders take the dataset and the random generator of the client and return the query
+# parameters and the JSON body of a request, each None if not needed.
+
+def no_request(dataset, rng):
+    """Builds the request of an endpoint taking no parameters."""
+    return None, None
+
+
+def product_body(dataset, rng):
+    """Builds the body of a new product."""
+    return None, {'name': f"Load Test {rng.choice(dataset.words or ['product'])}", 'price': money(rng, 1, 500)}
+
+
+def seasonal_product_body(dataset, rng):
+    """Builds the body of a new seasonal product."""
+    _, body = product_body(dataset, rng)
+    return None, dict(body, seasonal_discount=str(rng.randint(5, 40)))
+
+
+def bulk_product_body(dataset, rng):
+    """Builds the body of a new bulk product."""
+    _, body = product_body(dataset, rng)
+    return None, dict(body, bulk_threshold=rng.randint(5, 50), bulk_discount=str(rng.randint(5, 30)))
+
+
+def search_query(dataset, rng):
+    """Builds the query of a search for one of the seeded words."""
+    return {'q': rng.choice(dataset.words or ['product']), 'limit': 20}, None
+
+
+def batch_query(dataset, rng):
+    """Builds the query of a batch lookup of 20 products."""
+    ids = rng.sample(dataset.product_ids, min(20, len(dataset.product_ids)))
+    return {'ids': ','.join(map(str, ids))}, None
+
+
+def product_bulk_update_body(dataset, rng):
+    """Builds the body of a price update of 10 products."""
+    ids = rng.sample(dataset.product_ids, min(10, len(dataset.product_ids)))
+    return None, {'items': [{'id': product_id, 'price': money(rng, 1, 500)} for product_id in ids]}
+
+
+def discount_body(dataset, rng):
+    """Builds the body of a new discount."""
+    return None, {'name': f"Load Test Discount {rng.randint(1, 10 ** 6)}"}
+
+
+def percentage_discount_body(dataset, rng):
+    """Builds the body of a new percentage discount."""
+    _, body = discount_body(dataset, rng)
+    return None, dict(body, percentage=str(rng.choice((5, 10, 15, 20))))
+
+
+def fixed_discount_body(dataset, rng):
+    """Builds the body of a new fixed amount discount."""
+    _, body = discount_body(dataset, rng)
+    return None, dict(body, amount=money(rng, 1, 50))
+
+
+def discount_bulk_update_body(dataset, rng):
+    """Builds the body of an update of 5 percentage discounts."""
+    ids = rng.sample(dataset.percentage_ids, min(5, len(dataset.percentage_ids)))
+    return None, {'items': [{'id': discount_id, 'percentage': str(rng.choice((5, 10, 15, 20)))}
+                            for discount_id in ids]}
+
+
+def order_body(dataset, rng):
+    """Builds the body of an order of one to five products."""
+    lines = rng.sample(dataset.product_ids, min(rng.randint(1, 5), len(dataset.product_ids)))
+    return None, {
+        'discount': rng.choice(dataset.discount_ids) if dataset.discount_ids else None,
+        'products': [{'product': product_id, 'quantity': rng.randint(1, 20)} for product_id in lines],
+    }
+
+
+def hot_order_body(dataset, rng):
+    """Builds the body of an order of one unit of the first product, which every such order competes for."""
+    return None, {'products': [{'product': dataset.product_ids[0], 'quantity': 1}]}
+
+
+def spread_order_body(dataset, rng):
+    """Builds the body of an order of one unit of a random product."""
+    return None, {'products': [{'product': rng.choice(dataset.product_ids), 'quantity': 1}]}
+
+
+ENDPOINTS = {
+    'products.list': Endpoint('GET', '/api/products/', no_request),
+    'products.create': Endpoint('POST', '/api/products/', product_body),
+    'seasonal.list': Endpoint('GET', '/api/products/seasonal/', no_request),
+    'seasonal.create': Endpoint('POST', '/api/products/seasonal/', seasonal_product_body),
+    'bulk.list': Endpoint('GET', '/api/products/bulk/', no_request),
+    'bulk.create': Endpoint('POST', '/api/products/bulk/', bulk_product_body),
+    'products.search': Endpoint('GET', '/api/products/search/', search_query),
+    'products.batch': Endpoint('GET', '/api/products/batch/', batch_query),
+    'products.bulk_update': Endpoint('PATCH', '/api/products/bulk-update/', product_bulk_update_body),
+    'discounts.list': Endpoint('GET', '/api/discounts/', no_request),
+    'discounts.create': Endpoint('POST', '/api/discounts/', discount_body),
+    'percentage.list': Endpoint('GET', '/api/discounts/percentage/', no_request),
+    'percentage.create': Endpoint('POST', '/api/discounts/percentage/', percentage_discount_body),
+    'fixed.list': Endpoint('GET', '/api/discounts/fixed/', no_request),
+    'fixed.create': Endpoint('POST', '/api/discounts/fixed/', fixed_discount_body),
+    'discounts.bulk_update': Endpoint('PATCH', '/api/discounts/bulk-update/', discount_bulk_update_body),
+    'orders.list': Endpoint('GET', '/api/orders/', no_request),
+    'orders.create': Endpoint('POST', '/api/orders/', order_body),
+    'orders.hot': Endpoint('POST', '/api/orders/', hot_order_body),
+    'orders.spread': Endpoint('POST', '/api/orders/', spread_order_body),
+}
+
+# The list endpoints return every row, so they are weighted low against a large dataset.
+MIXES = {
+    'read': {
+        'products.search': 35, 'products.batch': 35, 'products.list': 5, 'seasonal.list': 5, 'bulk.list': 5,
+        'discounts.list': 5, 'percentage.list': 4, 'fixed.list': 4, 'orders.list': 2,
+    },
+    'checkout': {
+        'products.search': 25, 'products.batch': 35, 'orders.create': 35, 'discounts.list': 5,
+    },
+    # Orders of a single best-seller against orders spread over all products. With stock tracked (see
+    # `seed_dataset --stock`) every hot order decrements the same row.
+    'contention': {'orders.hot': 50, 'orders.spread': 50},
+    'mixed': {
+        'products.search': 20, 'products.batch': 20, 'orders.create': 15, 'products.list': 3,
+        'seasonal.list': 3, 'bulk.list': 3, 'discounts.list': 3, 'percentage.list': 3, 'fixed.list': 3,
+        'orders.list': 1, 'products.create': 3, 'seasonal.create': 3, 'bulk.create': 3, 'discounts.create': 3,
+        'percentage.create': 3, 'fixed.create': 3, 'products.bulk_update': 5, 'discounts.bulk_update': 5,
+    },
+}
+
+
+class WSGIClient:
+    """
+    Sends requests in-process to the WSGI application of the project.
+
+    Every client uses its own REMOTE_ADDR, so that the per-client token buckets of the load shedding
+    middleware see every client thread as a separate client.
+
+    Attributes:
+        application (callable): The WSGI application.
+        remote_addr (str): The client address of the requests.
+    """
+
+    def __init__(self, application, remote_addr):
+        self.application = application
+        self.remote_addr = remote_addr
+
+    def request(self, method, path, query=None, body=None):
+        """
+        Sends a request and reads the whole response.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The path of the endpoint.
+            query (dict): The query parameters, if any.
+            body (dict): The JSON body, if any.
+
+        Returns:
+            int: The status code of the response.
+        """
+        payload = json.dumps(body).encode() if body is not None else b''
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': urlencode(query or {}),
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost',
+            'REMOTE_ADDR': self.remote_addr,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(payload)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(payload),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        status = []
+        response = self.application(environ, lambda status_line, headers, exc_info=None: status.append(status_line))
+        try:
+            for _ in response:
+                pass
+        finally:
+            if hasattr(response, 'close'):
+                response.close()
+        return int(status[0].split(' ', 1)[0])
+
+    def close(self):
+        """
+        Closes the database connections of the client thread.
+        """
+        connections.close_all()
+
+
+class HTTPClient:
+    """
+    Sends requests to a running server over one keep-alive HTTP connection.
+
+    Attributes:
+        host (str): The host of the server.
+        port (int): The port of the server.
+        prefix (str): The path the server is mounted at.
+        timeout (float): The number of seconds to wait for a response.
+    """
+
+    def __init__(self, url, timeout=30.0):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"Unsupported URL: {url}")
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' \
+            else http.client.HTTPConnection
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.connection = None
+
+    def request(self, method, path, query=None, body=None):
+        """
+        Sends a request and reads the whole response, reconnecting once if the connection was dropped.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The path of the endpoint.
+            query (dict): The query parameters, if any.
+            body (dict): The JSON body, if any.
+
+        Returns:
+            int: The status code of the response.
+        """
+        url = self.prefix + path + ('?' + urlencode(query) if query else '')
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = self.connection_class(self.host, self.port, timeout=self.timeout)
+            try:
+                self.connection.request(method, url, body=payload, headers=headers)
+                response = self.connection.getresponse()
+                response.read()
+                if response.will_close:
+                    self.close()
+                return response.status
+            except (http.client.HTTPException, ConnectionError):
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        """
+        Closes the connection to the server.
+        """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def in_process_clients():
+    """
+    Returns a factory of in-process clients sharing the WSGI application of the project.
+
+    Returns:
+        callable: Builds the client of a worker from its index.
+    """
+    application = get_wsgi_application()
+    return lambda index: WSGIClient(application, f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}")
+
+
+def http_clients(url, timeout=30.0):
+    """
+    Returns a factory of HTTP clients of a running server.
+
+    Args:
+        url (str): The base URL of the server, such as http://127.0.0.1:8000.
+        timeout (float): The number of seconds to wait for a response.
+
+    Returns:
+        callable: Builds the client of a worker from its index.
+    """
+    HTTPClient(url, timeout)  # Validates the URL before the workers start.
+    return lambda index: HTTPClient(url, timeout)
+
+
+def run_load_test(client_factory, mix, dataset, concurrency=8, duration=10.0, requests=None, seed=0):
+    """
+    Sends requests from a pool of client threads until the duration has elapsed or the number of requests
+    has been sent.
+
+    Args:
+        client_factory (callable): Builds the client of a worker from its index.
+        mix (dict): The weight of every endpoint name.
+        dataset (Dataset): The dataset requests are built from.
+        concurrency (int): The number of client threads.
+        duration (float): The number of seconds to run for, ignored when `requests` is given.
+        requests (int): The total number of requests to send, if given.
+        seed (int): The seed of the random generators of the clients.
+
+    Returns:
+        tuple: The samples of all requests and the elapsed wall time in seconds.
+    """
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    lock = threading.Lock()
+    remaining = [requests]
+    samples = []
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def take():
+        if requests is None:
+            return time.perf_counter() < deadline
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def work(index):
+        rng = random.Random(seed * 1000003 + index)
+        client = client_factory(index)
+        local = []
+        try:
+            while take():
+                name = rng.choices(names, weights)[0]
+                endpoint = ENDPOINTS[name]
+                query, body = endpoint.build(dataset, rng)
+                began = time.perf_counter()
+                try:
+                    status = client.request(endpoint.method, endpoint.path, query, body)
+                except Exception:
+                    status = 0
+                local.append(Sample(name, status, time.perf_counter() - began))
+        finally:
+            client.close()
+            with lock:
+                samples.extend(local)
+
+    workers = [threading.Thread(target=work, args=(index,), daemon=True) for index in range(concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return samples, time.perf_counter() - start
+
+
+def percentile(ordered, fraction):
+    """
+    Returns the nearest-rank percentile of sorted values.
+
+    Args:
+        ordered (list): The sorted values.
+        fraction (float): The percentile as a fraction, such as 0.95.
+
+    Returns:
+        float: The percentile, or 0.0 without values.
+    """
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def endpoint_stats(samples, elapsed):
+    """
+    Summarizes the samples of one endpoint.
+
+    Args:
+        samples (list): The samples.
+        elapsed (float): The wall time of the run in seconds.
+
+    Returns:
+        dict: The request and error counts, the status counts, the throughput and the latency statistics
+        in milliseconds.
+    """
+    latencies = sorted(sample.elapsed * 1000 for sample in samples)
+    statuses = Counter(sample.status for sample in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(count for status, count in statuses.items() if status == 0 or status >= 400),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+    }
+
+
+def build_report(samples, elapsed, settings):
+    """
+    Builds the report of a run.
+
+    Args:
+        samples (list): The samples of all requests.
+        elapsed (float): The wall time of the run in seconds.
+        settings (dict): The parameters of the run, copied into the report.
+
+    Returns:
+        dict: The run parameters, the elapsed time, the statistics of every endpoint and their total.
+    """
+    by_endpoint = defaultdict(list)
+    for sample in samples:
+        by_endpoint[sample.endpoint].append(sample)
+    return {
+        'settings': settings,
+        'elapsed_seconds': round(elapsed, 3),
+        'endpoints': {name: endpoint_stats(by_endpoint[name], elapsed) for name in sorted(by_endpoint)},
+        'total': endpoint_stats(samples, elapsed),
+    }
+
+
+def format_report(report):
+    """
+    Formats a report as a text table.
+
+    Args:
+        report (dict): The report built by `build_report`.
+
+    Returns:
+        str: The table, one line per endpoint and a total line.
+    """
+    columns = ('requests', 'errors', 'throughput', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')
+    headers = ('endpoint', 'requests', 'errors', 'req/s', 'mean ms', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms')
+    rows = [(name, *(stats[column] for column in columns)) for name, stats in report['endpoints'].items()]
+    rows.append(('total', *(report['total'][column] for column in columns)))
+    widths = [max(len(str(row[index])) for row in [headers] + rows) for index in range(len(headers))]
+    lines = [' '.join(str(value).ljust(width) if index == 0 else str(value).rjust(width)
+                      for index, (value, width) in enumerate(zip(row, widths)))
+             for row in [headers] + rows]
+    lines.insert(1, '-' * len(lines[0]))
+    lines.insert(len(lines) - 1, '-' * len(lines[0]))
+    return '\n'.join(lines)
+
+
+def find_regressions(report, baseline, max_regression, metric='p95_ms'):
+    """
+    Compares the latency of every endpoint with a baseline report.
+
+    Args:
+        report (dict): The report of this run.
+        baseline (dict): The report of the baseline run.
+        max_regression (float): The largest accepted latency increase, in percent.
+        metric (str): The compared latency statistic.
+
+    Returns:
+        list: The (endpoint, baseline latency, latency) triples of the endpoints that got slower than
+        accepted. A latency exactly `max_regression` percent over the baseline is accepted. Endpoints missing
+        from the baseline, or with a zero baseline latency, have nothing to compare with and are skipped.
+    """
+    regressions = []
+    for name, stats in report['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(name, {}).get(metric)
+        if before and stats[metric] > before * (1 + max_regression / 100):
+            regressions.append((name, before, stats[metric]))
+    return regressions
@@ -0,0 +1,120 @@
+"""
+    benchmarks/management/commands/loadtest.py
+
+    Drives a mixed workload against the /api/ endpoints and reports throughput and latency percentiles per
+    endpoint.
+"""
+
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from benchmarks.loadtest import (ENDPOINTS, MIXES, build_report, find_regressions, format_report, http_clients,
+                                 in_process_clients, load_dataset, run_load_test)
+
+
+class Command(BaseCommand):
+    help = "Runs a load test against the API and reports latency percentiles per endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=None,
+                            help="Base URL of a running server, such as http://127.0.0.1:8000. Requests are "
+                                 "sent in-process to the WSGI application when omitted")
+        parser.add_argument('--mix', choices=sorted(MIXES), default='mixed', help="Workload mix")
+        parser.add_argument('--weight', action='append', default=[], metavar='ENDPOINT=WEIGHT',
+                            help="Overrides the weight of an endpoint in the mix, 0 removes it. Repeatable")
+        parser.add_argument('--concurrency', type=int, default=8, help="Number of client threads")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds to run for")
+        parser.add_argument('--requests', type=int, default=None,
+                            help="Total number of requests to send, instead of running for --duration")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the random generators of the clients")
+        parser.add_argument('--timeout', type=float, default=30.0, help="Seconds to wait for an HTTP response")
+        parser.add_argument('--no-load-shedding', action='store_true',
+                            help="Disable load shedding for in-process runs")
+        parser.add_argument('--group-commit', action='store_true',
+                            help="Place orders with group commit for in-process runs, see ORDER_GROUP_COMMIT")
+        parser.add_argument('--json', default=None, metavar='PATH',
+                            help="Write the report as JSON to PATH, or to standard output with -")
+        parser.add_argument('--baseline', default=None, metavar='PATH',
+                            help="JSON report of an earlier run to compare p95 latencies with")
+        parser.add_argument('--max-regression', type=float, default=20.0,
+                            help="Largest accepted p95 latency increase over the baseline, in percent")
+
+    def handle(self, *args, **options):
+        mix = self.build_mix(options)
+        if options['concurrency'] < 1:
+            raise CommandError("--concurrency must be at least 1")
+        if options['url'] and options['no_load_shedding']:
+            raise CommandError("--no-load-shedding only applies to in-process runs")
+        if options['url'] and options['group_commit']:
+            raise CommandError("--group-commit only applies to in-process runs")
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        dataset = load_dataset()
+        if not dataset.product_ids or not dataset.discount_ids:
+            raise CommandError("The database holds no products or discounts, run `manage.py seed_dataset` first")
+        overrides = {}
+        if options['no_load_shedding']:
+            overrides['LOAD_SHEDDING'] = {'ENABLED': False}
+        if options['group_commit']:
+            overrides['ORDER_GROUP_COMMIT'] = {**getattr(settings, 'ORDER_GROUP_COMMIT', {}), 'ENABLED': True}
+        # The WSGI application reads the settings of its middleware when it is built, so it is built under
+        # the overrides.
+        with override_settings(**overrides):
+            if options['url']:
+                try:
+                    client_factory = http_clients(options['url'], options['timeout'])
+                except ValueError as error:
+                    raise CommandError(str(error))
+            else:
+                client_factory = in_process_clients()
+            samples, elapsed = run_load_test(client_factory, mix, dataset, concurrency=options['concurrency'],
+                                             duration=options['duration'], requests=options['requests'],
+                                             seed=options['seed'])
+
+        report = build_report(samples, elapsed, {
+            'target': options['url'] or 'in-process',
+            'mix': mix,
+            'concurrency': options['concurrency'],
+            'duration': options['duration'] if options['requests'] is None else None,
+            'requests': options['requests'],
+            'seed': options['seed'],
+            'group_commit': options['group_commit'],
+        })
+        if options['json'] == '-':
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(format_report(report))
+            if options['json']:
+                with open(options['json'], 'w') as report_file:
+                    json.dump(report, report_file, indent=2)
+
+        if baseline is not None:
+            regressions = find_regressions(report, baseline, options['max_regression'])
+            if regressions:
+                raise CommandError("p95 latency regressed: " + ", ".join(
+                    f"{name} {before:.1f} ms -> {after:.1f} ms" for name, before, after in regressions))
+
+    def build_mix(self, options):
+        """
+        Builds the endpoint weights from the selected mix and the --weight overrides.
+        """
+        mix = dict(MIXES[options['mix']])
+        for override in options['weight']:
+            name, _, weight = override.partition('=')
+            if name not in ENDPOINTS:
+                raise CommandError(f"Unknown endpoint {name}, choose from {', '.join(ENDPOINTS)}")
+            try:
+                mix[name] = float(weight)
+            except ValueError:
+                raise CommandError(f"Invalid weight in {override}")
+            if mix[name] <= 0:
+                del mix[name]
+        if not mix:
+            raise CommandError("The workload mix is empty")
+        return mix
@@ -0,0 +1,34 @@
+"""
+    benchmarks/management/commands/seed_dataset.py
+
+    Seeds the database with the deterministic dataset used by the load tests.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.dataset import seed_dataset
+
+
+class Command(BaseCommand):
+    help = "Seeds the database with products, discounts and orders for load tests"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000, help="Number of products")
+        parser.add_argument('--discounts', type=int, default=50, help="Number of discounts")
+        parser.add_argument('--orders', type=int, default=1000, help="Number of orders")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the random generator")
+        parser.add_argument('--clear', action='store_true',
+                            help="Delete all orders, discounts and products first")
+        parser.add_argument('--stock', type=int, default=None,
+                            help="Units in stock of every product, which are then reserved by orders. The stock "
+                                 "is not tracked when omitted")
+
+    def handle(self, *args, **options):
+        if min(options['products'], options['discounts'], options['orders'], options['stock'] or 0) < 0:
+            raise CommandError("Counts cannot be negative")
+        counts = seed_dataset(products=options['products'], discounts=options['discounts'],
+                              orders=options['orders'], seed=options['seed'], clear=options['clear'],
+                              stock=options['stock'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {counts['products']} products, {counts['discounts']} discounts and {counts['orders']} "
+            f"orders, indexed {counts['indexed']} products"))
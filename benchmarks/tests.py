@@ -0,0 +1,120 @@
+from django.test import SimpleTestCase
+
+from .loadtest import Sample, build_report, find_regressions, format_report, percentile
+
+
+class PercentileTests(SimpleTestCase):
+    """
+    Checks the nearest-rank percentiles reported by load tests.
+    """
+
+    def test_no_values(self):
+        self.assertEqual(percentile([], 0.5), 0.0)
+        self.assertEqual(percentile([], 0.99), 0.0)
+
+    def test_single_value_is_every_percentile(self):
+        for fraction in (0.0, 0.01, 0.5, 0.95, 0.99, 1.0):
+            with self.subTest(fraction=fraction):
+                self.assertEqual(percentile([7.5], fraction), 7.5)
+
+    def test_ranks_are_rounded_up(self):
+        values = [1.0, 2.0, 3.0, 4.0]
+        self.assertEqual(percentile(values, 0.0), 1.0)
+        self.assertEqual(percentile(values, 0.25), 1.0)
+        self.assertEqual(percentile(values, 0.26), 2.0)
+        self.assertEqual(percentile(values, 0.50), 2.0)
+        self.assertEqual(percentile(values, 0.75), 3.0)
+        self.assertEqual(percentile(values, 1.0), 4.0)
+
+    def test_high_percentiles_of_small_sets_are_their_maximum(self):
+        values = [float(value) for value in range(1, 21)]
+        self.assertEqual(percentile(values, 0.95), 19.0)
+        self.assertEqual(percentile(values, 0.99), 20.0)
+        self.assertEqual(percentile(values[:2], 0.99), 2.0)
+        self.assertEqual(percentile(values[:2], 0.50), 1.0)
+
+
+class BuildReportTests(SimpleTestCase):
+    """
+    Checks the per-endpoint and total statistics of a load test report.
+    """
+
+    def setUp(self):
+        self.samples = [
+            Sample('products.list', 200, 0.010),
+            Sample('orders.create', 201, 0.030),
+            Sample('products.list', 200, 0.020),
+            Sample('orders.create', 409, 0.040),
+            Sample('products.list', 304, 0.030),
+            Sample('orders.create', 0, 5.000),
+            Sample('orders.create', 503, 0.001),
+        ]
+        self.report = build_report(self.samples, 2.0, {'mix': 'test'})
+
+    def test_endpoints_are_summarized_separately(self):
+        self.assertEqual(self.report['settings'], {'mix': 'test'})
+        self.assertEqual(self.report['elapsed_seconds'], 2.0)
+        self.assertEqual(list(self.report['endpoints']), ['orders.create', 'products.list'])
+        products = self.report['endpoints']['products.list']
+        self.assertEqual((products['requests'], products['errors']), (3, 0))
+        self.assertEqual(products['statuses'], {'200': 2, '304': 1})
+        self.assertEqual(products['throughput'], 1.5)
+        self.assertEqual((products['mean_ms'], products['p50_ms'], products['max_ms']), (20.0, 20.0, 30.0))
+
+    def test_failed_requests_and_error_statuses_are_errors(self):
+        orders = self.report['endpoints']['orders.create']
+        # 409 and 503 responses, and the request that got no response (status 0).
+        self.assertEqual((orders['requests'], orders['errors']), (4, 3))
+        self.assertEqual(orders['statuses'], {'0': 1, '201': 1, '409': 1, '503': 1})
+        self.assertEqual((orders['p50_ms'], orders['p99_ms'], orders['max_ms']), (30.0, 5000.0, 5000.0))
+
+    def test_total_covers_every_sample(self):
+        total = self.report['total']
+        self.assertEqual((total['requests'], total['errors'], total['throughput']), (7, 3, 3.5))
+        self.assertEqual(total['max_ms'], 5000.0)
+        lines = format_report(self.report).splitlines()
+        self.assertEqual([line.split()[0] for line in lines if not line.startswith('-')],
+                         ['endpoint', 'orders.create', 'products.list', 'total'])
+
+    def test_empty_run(self):
+        report = build_report([], 0.0, {})
+        self.assertEqual(report['endpoints'], {})
+        self.assertEqual(report['total']['requests'], 0)
+        self.assertEqual((report['total']['throughput'], report['total']['p95_ms']), (0.0, 0.0))
+
+
+class FindRegressionsTests(SimpleTestCase):
+    """
+    Checks the latency comparison failing `loadtest --baseline`.
+    """
+
+    @staticmethod
+    def report(**p95):
+        return {'endpoints': {name: {'p95_ms': value, 'p99_ms': value * 2} for name, value in p95.items()}}
+
+    def test_slower_endpoints_are_reported(self):
+        baseline = self.report(search=10.0, detail=5.0)
+        self.assertEqual(find_regressions(self.report(search=13.0, detail=5.5), baseline, 20.0),
+                         [('search', 10.0, 13.0)])
+        self.assertEqual(find_regressions(self.report(search=9.0, detail=4.0), baseline, 20.0), [])
+
+    def test_threshold_is_inclusive(self):
+        baseline = self.report(search=50.0)
+        self.assertEqual(find_regressions(self.report(search=60.0), baseline, 20.0), [])
+        self.assertEqual(find_regressions(self.report(search=60.001), baseline, 20.0), [('search', 50.0, 60.001)])
+        self.assertEqual(find_regressions(self.report(search=50.001), baseline, 0.0), [('search', 50.0, 50.001)])
+
+    def test_endpoints_missing_from_the_baseline_are_skipped(self):
+        self.assertEqual(find_regressions(self.report(search=10.0, added=500.0), self.report(search=10.0), 20.0), [])
+        self.assertEqual(find_regressions(self.report(search=10.0), {}, 20.0), [])
+        # Endpoints of the baseline that this run did not exercise cannot regress either.
+        self.assertEqual(find_regressions(self.report(), self.report(search=10.0), 20.0), [])
+
+    def test_zero_baseline_latency_is_skipped(self):
+        self.assertEqual(find_regressions(self.report(search=3.0), self.report(search=0.0), 20.0), [])
+
+    def test_other_metrics_can_be_compared(self):
+        baseline = self.report(search=10.0)
+        self.assertEqual(find_regressions(self.report(search=11.0), baseline, 20.0, metric='p99_ms'), [])
+        self.assertEqual(find_regressions({'endpoints': {'search': {'p95_ms': 10.0, 'p99_ms': 30.0}}}, baseline,
+                                          20.0, metric='p99_ms'), [('search', 20.0, 30.0)])
@@ -0,0 +1,4 @@
+CART = "Cart"
+CART_EMPTY = "The cart has no lines"
+CART_CHANGED = "The cart was changed while it was being updated, please retry"
+CART_TOTAL_TOO_LARGE = "The cart total cannot exceed {limit}"
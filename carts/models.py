@@ -0,0 +1,66 @@
+"""
+    carts/models.py
+
+    This module defines server-side carts. Every line stores its priced total, and the cart the sum of its
+    line totals, so that editing a line only reprices that line and a cart converts to an order without
+    pricing it again. Amounts are stored as integers in units of 10^-10 of the base currency, see
+    `carts/pricing.py`, which holds the unrounded totals exactly and keeps the increments of the subtotal exact.
+"""
+
+from django.db import models
+
+from discounts.models import ProductDiscount
+from pricing.expressions import round_money
+from products.models import BaseModel, Product
+from .pricing import from_units
+
+
+class Cart(BaseModel):
+    """
+    Represents the cart of a customer.
+
+    Attributes:
+        customer (CharField): The reference of the customer, used to enforce the per-customer redemption caps
+            of the discount.
+        discount (ForeignKey): The discount requested for the cart, if any.
+        subtotal (BigIntegerField): The sum of the line totals, in units of 10^-10.
+    """
+    customer = models.CharField(max_length=255, blank=True)
+    discount = models.ForeignKey(ProductDiscount, null=True, blank=True, on_delete=models.SET_NULL)
+    subtotal = models.BigIntegerField(default=0)
+
+    @property
+    def total_price(self):
+        """
+        Returns the total price of the cart.
+
+        Returns:
+            Decimal: The subtotal rounded to cents, half to even.
+        """
+        return round_money(from_units(self.subtotal))
+
+
+class CartLine(models.Model):
+    """
+    Represents a product in a cart, with its price when it was last changed.
+
+    Attributes:
+        cart (ForeignKey): The cart of the line.
+        product (ForeignKey): The product of the line, at most one line per product and cart.
+        quantity (PositiveIntegerField): The number of units.
+        discount (ForeignKey): The discount applied to the units, if any.
+        line_total (BigIntegerField): The discounted total of the units, in units of 10^-10.
+        priced_at (DateTimeField): The time the line was last priced.
+    """
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    discount = models.ForeignKey(ProductDiscount, null=True, blank=True, on_delete=models.SET_NULL,
+                                 related_name='+')
+    line_total = models.BigIntegerField()
+    priced_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
@@ -0,0 +1,83 @@
+"""
+    carts/pricing.py
+
+    This module prices cart lines. A line is priced on its own, with the pricing rules of its product for its
+    quantity (so that crossing a bulk threshold only reprices the line crossing it) and the best of the
+    requested and automatic discounts for its unit price, as orders are, see `pricing/optimizer.py`.
+
+    Line totals are stored as integers in units of 10^-10. Prices and amounts have two decimal places and
+    percentages four once divided by 100, so a unit price discounted by both its product and a discount has
+    at most ten decimal places: the stored totals are exact, and so is their sum.
+"""
+
+from decimal import Decimal
+
+from discounts.models import ProductDiscount
+from orders.models import Order
+from pricing.calculator import load_discount_appliers, load_unit_prices
+from pricing.optimizer import best_discounts
+
+PRICE_SCALE = 10
+
+
+def to_units(value):
+    """
+    Converts an amount into an integer number of units of 10^-10.
+
+    Args:
+        value (Decimal): The amount.
+
+    Returns:
+        int: The amount in units.
+    """
+    return int(Decimal(value).scaleb(PRICE_SCALE).to_integral_value())
+
+
+def from_units(value):
+    """
+    Converts an integer number of units of 10^-10 back into an amount.
+
+    Args:
+        value (int): The amount in units.
+
+    Returns:
+        Decimal: The amount.
+    """
+    return Decimal(value).scaleb(-PRICE_SCALE)
+
+
+def get_max_subtotal():
+    """
+    Returns the largest subtotal of a cart, the largest total price of an order.
+
+    Returns:
+        int: The subtotal in units.
+    """
+    field = Order._meta.get_field('total_price')
+    return to_units(Decimal(10) ** (field.max_digits - field.decimal_places)) - 1
+
+
+def price_lines(lines, discount_id=None):
+    """
+    Prices cart lines, with a constant number of queries.
+
+    Args:
+        lines (Iterable[tuple]): The (product_id, quantity) pairs of the lines.
+        discount_id (int, optional): The id of the discount requested for the cart.
+
+    Returns:
+        list: The (discount_id, line_total) pair of every line, where the discount id is None when no discount
+        lowers the price and the line total is in units.
+
+    Raises:
+        Product.DoesNotExist: If a product does not exist.
+    """
+    lines = list(lines)
+    if not lines:
+        return []
+    discount_ids = set(ProductDiscount.objects.filter(auto_apply=True).values_list('pk', flat=True))
+    if discount_id is not None:
+        discount_ids.add(discount_id)
+    unit_prices = load_unit_prices(lines)
+    chosen = best_discounts([unit_prices[line] for line in lines], load_discount_appliers(discount_ids))
+    return [(chosen_id, to_units(price * quantity)) for (_, quantity), (chosen_id, price) in zip(lines, chosen)]
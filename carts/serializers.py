@@ -0,0 +1,95 @@
+"""
+    carts/serializers.py
+
+    This module defines serializers for carts and their lines. Amounts are rendered rounded to cents from the
+    exact totals stored with the lines, see `carts/pricing.py`.
+"""
+
+from rest_framework import serializers
+
+from currencies.conversion import MONEY_FIELD
+from discounts.serializers import normalize_coupon_code
+from orders.serializers import resolve_discount
+from pricing.expressions import round_money
+from .models import Cart, CartLine
+from .pricing import from_units
+from .services import update_cart
+
+
+class CartLineSerializer(serializers.ModelSerializer):
+    """
+    Serializes the CartLine model.
+
+    Attributes:
+        product (PrimaryKeyRelatedField): The id of the product.
+        quantity (IntegerField): The number of units.
+        discount (PrimaryKeyRelatedField): The id of the discount applied to the units, if any.
+        unit_price (SerializerMethodField): The average discounted unit price.
+        line_total (SerializerMethodField): The discounted total of the units.
+        query_budget (int): The largest number of queries rendering its instances may run.
+    """
+    unit_price = serializers.SerializerMethodField()
+    line_total = serializers.SerializerMethodField()
+    query_budget = 0
+
+    class Meta:
+        model = CartLine
+        fields = ['product', 'quantity', 'discount', 'unit_price', 'line_total']
+
+    def get_unit_price(self, line):
+        return MONEY_FIELD.to_representation(round_money(from_units(line.line_total) / line.quantity))
+
+    def get_line_total(self, line):
+        return MONEY_FIELD.to_representation(round_money(from_units(line.line_total)))
+
+
+class CartSerializer(serializers.ModelSerializer):
+    """
+    Serializes the Cart model, with its lines.
+
+    Attributes:
+        id (IntegerField): The unique identifier for the cart.
+        customer (CharField): The reference of the customer.
+        discount (PrimaryKeyRelatedField): The id of the requested discount, if any.
+        coupon_code (CharField): The coupon code of the discount to apply, write-only.
+        lines (CartLineSerializer): The lines of the cart, read-only; lines are changed one at a time.
+        total_price (SerializerMethodField): The total price of the cart.
+        updated_at (DateTimeField): The time of the last change.
+        query_budget (int): The largest number of queries rendering its instances may run.
+
+    Methods:
+        validate(attrs): Resolves the coupon code to its discount, see `orders.serializers.resolve_discount`.
+        update(instance, validated_data): Changes the cart, repricing its lines for a new discount.
+    """
+    coupon_code = serializers.CharField(max_length=50, write_only=True, required=False)
+    lines = CartLineSerializer(many=True, read_only=True)
+    total_price = serializers.SerializerMethodField()
+    query_budget = 1
+
+    class Meta:
+        model = Cart
+        fields = ['id', 'customer', 'discount', 'coupon_code', 'lines', 'total_price', 'updated_at']
+
+    def validate_coupon_code(self, value):
+        return normalize_coupon_code(value)
+
+    def validate(self, attrs):
+        if self.instance is not None:
+            attrs.setdefault('customer', self.instance.customer)
+        return resolve_discount(attrs)
+
+    def update(self, instance, validated_data):
+        return update_cart(instance, validated_data)
+
+    def get_total_price(self, cart):
+        return MONEY_FIELD.to_representation(cart.total_price)
+
+
+class CartLineUpdateSerializer(serializers.Serializer):
+    """
+    Validates the new quantity of a cart line.
+
+    Attributes:
+        quantity (IntegerField): The number of units, 0 to remove the line.
+    """
+    quantity = serializers.IntegerField(min_value=0)
@@ -0,0 +1,195 @@
+"""
+    carts/services.py
+
+    This module edits carts and converts them to orders. Changing a line reprices that line only and adds
+    the difference of its total to the subtotal of the cart, with a constant number of queries whatever the
+    number of lines. Changing the discount of a cart reprices all its lines.
+
+    A cart converts to an order at the prices of its lines, unless one of them was priced more than
+    CARTS['PRICE_TTL_SECONDS'] ago or a bundle offer applies to its products: bundles span lines, so such
+    orders are priced again by `orders.services.place_orders`.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from orders.services import place_orders
+from pricing.expressions import round_money
+from pricing.offers import has_offers, load_offers
+from .models import Cart, CartLine
+from .pricing import from_units, get_max_subtotal, price_lines
+
+DEFAULT_PRICE_TTL_SECONDS = 900
+
+
+class CartError(Exception):
+    """
+    Raised when a cart cannot be changed or converted to an order.
+    """
+
+
+class CartChanged(CartError):
+    """
+    Raised when a cart is changed by another request while it is being updated or converted.
+    """
+
+
+class CartEmpty(CartError):
+    """
+    Raised when converting a cart without lines.
+    """
+
+
+class CartTotalExceeded(CartError):
+    """
+    Raised when a change would make the total of a cart larger than the total of an order can be.
+    """
+
+
+def touch_cart(cart, **conditions):
+    """
+    Marks a cart as changed, which also locks its row until the end of the transaction: concurrent changes of
+    the cart are applied one after the other.
+
+    Args:
+        cart (Cart): The cart, updated in place.
+        **conditions: Field values the cart must still have.
+
+    Raises:
+        Cart.DoesNotExist: If the cart was deleted.
+        CartChanged: If the cart no longer has the given field values.
+    """
+    now = timezone.now()
+    if not Cart.objects.filter(pk=cart.pk, **conditions).update(updated_at=now):
+        if not Cart.objects.filter(pk=cart.pk).exists():
+            raise Cart.DoesNotExist(f"Cart {cart.pk} does not exist")
+        raise CartChanged("The cart was changed concurrently")
+    cart.updated_at = now
+
+
+def set_line(cart, product_id, quantity):
+    """
+    Adds, changes or removes the line of a product, repricing that line only.
+
+    Args:
+        cart (Cart): The cart, whose subtotal is refreshed.
+        product_id (int): The id of the product of the line.
+        quantity (int): The new number of units, 0 to remove the line.
+
+    Returns:
+        CartLine: The line, or None once removed.
+
+    Raises:
+        Product.DoesNotExist: If the product does not exist.
+        Cart.DoesNotExist: If the cart was deleted.
+        CartChanged: If the discount of the cart was changed while pricing the line.
+        CartTotalExceeded: If the new subtotal would exceed the largest order total.
+    """
+    if quantity:
+        # Priced before the transaction, which then starts with a write.
+        [(discount_id, line_total)] = price_lines([(product_id, quantity)], cart.discount_id)
+    with transaction.atomic():
+        touch_cart(cart, discount_id=cart.discount_id)
+        line = CartLine.objects.filter(cart=cart, product_id=product_id).first()
+        delta = (line_total if quantity else 0) - (line.line_total if line is not None else 0)
+        if not Cart.objects.filter(pk=cart.pk, subtotal__lte=get_max_subtotal() - delta).update(
+                subtotal=F('subtotal') + delta):
+            raise CartTotalExceeded("The cart total would exceed the largest order total")
+        if not quantity:
+            if line is not None:
+                line.delete()
+                line = None
+        elif line is None:
+            line = CartLine.objects.create(cart=cart, product_id=product_id, quantity=quantity,
+                                           discount_id=discount_id, line_total=line_total, priced_at=cart.updated_at)
+        else:
+            line.quantity, line.discount_id, line.line_total, line.priced_at = (
+                quantity, discount_id, line_total, cart.updated_at)
+            line.save(update_fields=['quantity', 'discount', 'line_total', 'priced_at'])
+        cart.subtotal = Cart.objects.filter(pk=cart.pk).values_list('subtotal', flat=True).get()
+    return line
+
+
+def update_cart(cart, validated_data):
+    """
+    Changes the customer or the discount of a cart. A new discount reprices every line.
+
+    Args:
+        cart (Cart): The cart, updated in place.
+        validated_data (dict): The new `customer` and `discount`, if given.
+
+    Returns:
+        Cart: The updated cart.
+
+    Raises:
+        Cart.DoesNotExist: If the cart was deleted.
+        CartTotalExceeded: If the new subtotal would exceed the largest order total.
+    """
+    with transaction.atomic():
+        touch_cart(cart)
+        for name, value in validated_data.items():
+            setattr(cart, name, value)
+        if 'discount' in validated_data:
+            lines = list(cart.lines.order_by('pk'))
+            priced = price_lines(((line.product_id, line.quantity) for line in lines), cart.discount_id)
+            for line, (discount_id, line_total) in zip(lines, priced):
+                line.discount_id, line.line_total, line.priced_at = discount_id, line_total, cart.updated_at
+            CartLine.objects.bulk_update(lines, ['discount', 'line_total', 'priced_at'])
+            cart.subtotal = sum(line.line_total for line in lines)
+            if cart.subtotal > get_max_subtotal():
+                raise CartTotalExceeded("The cart total would exceed the largest order total")
+        cart.save(update_fields=['customer', 'discount', 'subtotal', 'updated_at'])
+    return cart
+
+
+def get_price_ttl():
+    """
+    Returns how long the price of a cart line holds.
+
+    Returns:
+        timedelta: The time from CARTS['PRICE_TTL_SECONDS'].
+    """
+    return timedelta(seconds=getattr(settings, 'CARTS', {}).get('PRICE_TTL_SECONDS', DEFAULT_PRICE_TTL_SECONDS))
+
+
+def checkout(cart):
+    """
+    Converts a cart to an order and deletes it, in one transaction.
+
+    Args:
+        cart (Cart): The cart.
+
+    Returns:
+        Order: The placed order.
+
+    Raises:
+        Cart.DoesNotExist: If the cart was deleted.
+        CartChanged: If the cart was changed while it was being converted.
+        CartEmpty: If the cart has no lines.
+        CouponError: If the discount has reached one of its redemption caps.
+        InsufficientStock: If a product does not have enough stock left.
+    """
+    lines = list(cart.lines.select_related('product').order_by('pk'))
+    if not lines:
+        raise CartEmpty("The cart has no lines")
+    data = {'discount': cart.discount, 'customer': cart.customer,
+            'products': [{'product': line.product, 'quantity': line.quantity} for line in lines]}
+    offers = load_offers(line.product_id for line in lines)
+    fresh = min(line.priced_at for line in lines) >= timezone.now() - get_price_ttl()
+    if fresh and not offers.bundles:
+        if has_offers(offers):
+            # Automatic discounts compete with the requested one, as they do for orders.
+            if cart.discount_id is not None and not any(line.discount_id == cart.discount_id for line in lines):
+                data['dropped_discount'], data['discount'] = cart.discount, None
+            data['applied_offers'] = [{'product': line.product_id, 'discount': line.discount_id,
+                                       'units': line.quantity} for line in lines if line.discount_id is not None]
+        data['total_price'] = round_money(from_units(sum(line.line_total for line in lines)))
+    with transaction.atomic():
+        touch_cart(cart, updated_at=cart.updated_at)
+        order = place_orders([data])[0]
+        cart.delete()
+    return order
@@ -0,0 +1,90 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from discounts.models import FixedAmountDiscount, PercentageDiscount
+from pricing.calculator import calculate_lines_total
+from pricing.expressions import round_money
+from products.models import BulkProduct, Product, SeasonalProduct
+from .models import Cart, CartLine
+from .services import checkout, set_line, update_cart
+
+
+class CartTests(TestCase):
+    """
+    Checks that incremental cart totals match full repricing, and that carts convert to orders at their prices.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(name="Plain", price=Decimal('7.25')),
+            SeasonalProduct.objects.create(name="Seasonal", price=Decimal('10.00'), seasonal_discount=Decimal('12.50')),
+            BulkProduct.objects.create(name="Bulk", price=Decimal('5.00'), bulk_threshold=3,
+                                       bulk_discount=Decimal('20.00')),
+            BulkProduct.objects.create(name="Bulk odd", price=Decimal('1.33'), bulk_threshold=10,
+                                       bulk_discount=Decimal('7.50')),
+        ]
+        cls.odd = PercentageDiscount.objects.create(name="Odd", percentage=Decimal('33.33'))
+        cls.floor = FixedAmountDiscount.objects.create(name="Floor", amount=Decimal('6.00'))
+
+    def full_total(self, cart):
+        lines = cart.lines.values_list('product_id', 'quantity')
+        return round_money(calculate_lines_total(lines, cart.discount_id))
+
+    def test_incremental_total_matches_full_repricing(self):
+        generator = random.Random(3)
+        cart = Cart.objects.create(discount=self.odd)
+        for step in range(60):
+            product = generator.choice(self.products)
+            set_line(cart, product.pk, generator.choice([0, 1, 2, 3, 9, 10, 11]))
+            if step == 30:
+                update_cart(cart, {'discount': self.floor})
+            with self.subTest(step=step):
+                self.assertEqual(cart.total_price, self.full_total(cart))
+        cart.refresh_from_db()
+        self.assertEqual(cart.subtotal, sum(cart.lines.values_list('line_total', flat=True)))
+
+    def test_line_edit_queries_do_not_grow_with_lines(self):
+        small, large = Cart.objects.create(), Cart.objects.create()
+        set_line(small, self.products[0].pk, 1)
+        for product in self.products:
+            set_line(large, product.pk, 5)
+        counts = []
+        for cart in (small, large):
+            with CaptureQueriesContext(connection) as queries:
+                set_line(cart, self.products[2].pk, 3)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_bulk_threshold_crossing_reprices_the_line(self):
+        cart = Cart.objects.create()
+        set_line(cart, self.products[2].pk, 2)
+        self.assertEqual(cart.total_price, Decimal('10.00'))
+        set_line(cart, self.products[2].pk, 3)
+        self.assertEqual(cart.total_price, Decimal('12.00'))
+
+    def test_checkout_places_the_order_at_cart_prices(self):
+        cart = Cart.objects.create(discount=self.odd)
+        for product in self.products:
+            set_line(cart, product.pk, 4)
+        total = cart.total_price
+        # The price change is not applied to the lines priced before it.
+        Product.objects.filter(pk=self.products[0].pk).update(price=Decimal('99.00'))
+        order = checkout(cart)
+        self.assertEqual(order.total_price, total)
+        self.assertEqual(order.discount, self.odd)
+        self.assertEqual(order.orderitem_set.count(), len(self.products))
+        self.assertFalse(Cart.objects.filter(pk=cart.pk).exists())
+
+    def test_checkout_reprices_expired_lines(self):
+        cart = Cart.objects.create()
+        set_line(cart, self.products[0].pk, 2)
+        Product.objects.filter(pk=self.products[0].pk).update(price=Decimal('8.00'))
+        CartLine.objects.update(priced_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(checkout(cart).total_price, Decimal('16.00'))
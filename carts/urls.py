@@ -0,0 +1,9 @@
+from django.urls import path
+from .views import CartCheckoutView, CartCreateView, CartDetailView, CartLineView
+
+urlpatterns = [
+    path('carts/', CartCreateView.as_view(), name='cart-create'),
+    path('carts/<int:pk>/', CartDetailView.as_view(), name='cart-detail'),
+    path('carts/<int:pk>/lines/<int:product_id>/', CartLineView.as_view(), name='cart-line'),
+    path('carts/<int:pk>/checkout/', CartCheckoutView.as_view(), name='cart-checkout'),
+]
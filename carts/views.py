@@ -0,0 +1,216 @@
+"""
+    carts/views.py
+
+    This module defines API views for server-side carts: creating, reading, changing and deleting a cart,
+    changing one line at a time, and converting the cart to an order.
+"""
+
+from rest_framework import generics, status
+from rest_framework.response import Response
+
+from constants import CREATED_SUCCESSFULLY, SOMETHING_WENT_WRONG, UPDATED_SUCCESSFULLY
+from currencies.conversion import MONEY_FIELD
+from orders.constants import ORDER
+from orders.idempotency import idempotent
+from orders.serializers import OrderSerializer
+from orders.services import REJECTION_ERRORS
+from products.inventory import InsufficientStock
+from products.models import Product
+from .constants import CART, CART_CHANGED, CART_EMPTY, CART_TOTAL_TOO_LARGE
+from .models import Cart
+from .pricing import from_units, get_max_subtotal
+from .serializers import CartLineSerializer, CartLineUpdateSerializer, CartSerializer
+from .services import CartChanged, CartEmpty, CartTotalExceeded, checkout, set_line
+
+
+def cart_error_response(error):
+    """
+    Builds the response of a cart change or conversion that failed.
+
+    Args:
+        error (Exception): The error raised by `carts.services`.
+
+    Returns:
+        Response: A 404 response for a deleted cart, 400 for an empty cart or a total too large, and 409 for
+        a concurrent change, a discount over its caps or products out of stock, listing the short lines.
+    """
+    if isinstance(error, Cart.DoesNotExist):
+        return Response({'error': str(error)}, status=status.HTTP_404_NOT_FOUND)
+    if isinstance(error, CartEmpty):
+        return Response({'error': CART_EMPTY}, status=status.HTTP_400_BAD_REQUEST)
+    if isinstance(error, CartTotalExceeded):
+        limit = round(from_units(get_max_subtotal()), 2)
+        return Response({'error': CART_TOTAL_TOO_LARGE.replace("{limit}", str(limit))},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if isinstance(error, CartChanged):
+        return Response({'error': CART_CHANGED}, status=status.HTTP_409_CONFLICT)
+    details = {'error': str(error)}
+    if isinstance(error, InsufficientStock):
+        details['lines'] = error.lines
+    return Response(details, status=status.HTTP_409_CONFLICT)
+
+
+CART_ERRORS = (Cart.DoesNotExist, CartChanged, CartEmpty, CartTotalExceeded) + REJECTION_ERRORS
+
+
+class CartCreateView(generics.CreateAPIView):
+    """
+    Handles creating carts.
+
+    Attributes:
+        serializer_class (Serializer): The serializer validating the cart data.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
+    """
+    serializer_class = CartSerializer
+    query_budget = {'POST': 3}
+
+    def create(self, request, *args, **kwargs):
+        """
+        Creates an empty cart, optionally with a customer and a discount.
+
+        Args:
+            request (Request): The HTTP request containing the cart data.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+
+        Returns:
+            Response: A response containing the created cart data or error details.
+        """
+        serializer = self.get_serializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response({'message': CREATED_SUCCESSFULLY.replace("{module}", CART), 'data': serializer.data},
+                            status=status.HTTP_201_CREATED)
+        return Response({'error': SOMETHING_WENT_WRONG, 'details': serializer.errors},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+
+class CartDetailView(generics.RetrieveUpdateDestroyAPIView):
+    """
+    Handles reading a cart with its lines, changing its customer or discount, and deleting it. Changing the
+    discount reprices every line.
+
+    Attributes:
+        queryset (QuerySet): A queryset of all Cart instances, with their lines.
+        serializer_class (Serializer): The serializer class for cart data.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
+    """
+    queryset = Cart.objects.prefetch_related('lines')
+    serializer_class = CartSerializer
+    query_budget = {'GET': 2, 'PUT': 9, 'PATCH': 11, 'DELETE': 5}
+
+    def update(self, request, *args, **kwargs):
+        try:
+            return super().update(request, *args, **kwargs)
+        except CART_ERRORS as error:
+            return cart_error_response(error)
+
+
+class CartLineView(generics.GenericAPIView):
+    """
+    Handles changing and removing the line of a product in a cart. Only that line is repriced, and the
+    response holds the line and the new total of the cart, whatever the number of lines.
+
+    Attributes:
+        queryset (QuerySet): A queryset of all Cart instances.
+        serializer_class (Serializer): The serializer validating the new quantity.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
+    """
+    queryset = Cart.objects.all()
+    serializer_class = CartLineUpdateSerializer
+    query_budget = {'PUT': 9, 'DELETE': 6}
+
+    def put(self, request, *args, **kwargs):
+        """
+        Sets the quantity of a product in the cart, adding the line if needed and removing it for 0.
+
+        Args:
+            request (Request): The HTTP request containing the quantity.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments, with the `product_id`.
+
+        Returns:
+            Response: A response containing the line and the total price of the cart, or error details.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self.set_quantity(kwargs['product_id'], serializer.validated_data['quantity'])
+
+    def delete(self, request, *args, **kwargs):
+        """
+        Removes the line of a product from the cart.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments, with the `product_id`.
+
+        Returns:
+            Response: A response containing the total price of the cart, or error details.
+        """
+        return self.set_quantity(kwargs['product_id'], 0)
+
+    def set_quantity(self, product_id, quantity):
+        """
+        Sets the quantity of a product in the cart.
+
+        Args:
+            product_id (int): The id of the product.
+            quantity (int): The new number of units, 0 to remove the line.
+
+        Returns:
+            Response: A response containing the line and the total price of the cart, or error details.
+        """
+        cart = self.get_object()
+        try:
+            line = set_line(cart, product_id, quantity)
+        except Product.DoesNotExist as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        except CART_ERRORS as error:
+            return cart_error_response(error)
+        return Response({'message': UPDATED_SUCCESSFULLY.replace("{module}", CART), 'data': {
+            'line': CartLineSerializer(line).data if line is not None else None,
+            'total_price': MONEY_FIELD.to_representation(cart.total_price),
+        }})
+
+
+class CartCheckoutView(generics.GenericAPIView):
+    """
+    Converts a cart to an order at the prices of its lines, and deletes the cart.
+
+    Attributes:
+        queryset (QuerySet): A queryset of all Cart instances.
+        serializer_class (Serializer): The serializer rendering the placed order.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
+    """
+    queryset = Cart.objects.all()
+    serializer_class = OrderSerializer
+    query_budget = {'POST': 16}
+
+    def post(self, request, *args, **kwargs):
+        """
+        Places the order of the cart. Requests carrying an `Idempotency-Key` header place it at most once.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+
+        Returns:
+            Response: A response containing the created order data or error details.
+        """
+        return idempotent(request, self.checkout)
+
+    def checkout(self):
+        """
+        Places the order of the cart.
+
+        Returns:
+            Response: A response containing the created order data or error details.
+        """
+        try:
+            order = checkout(self.get_object())
+        except CART_ERRORS as error:
+            return cart_error_response(error)
+        return Response({'message': CREATED_SUCCESSFULLY.replace("{module}", ORDER),
+                         'data': self.get_serializer(order).data}, status=status.HTTP_201_CREATED)
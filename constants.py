@@ -8,3 +8,14 @@ UPDATED_SUCCESSFULLY = "{module} updated successfully"
 DELETED_SUCCESSFULLY = "{module} deleted successfully"
 PLACED_SUCCESSFULLY = "{module} placed successfully"
 SOMETHING_WENT_WRONG  = "Something went wrong, please try again later!"
+TOO_MANY_REQUESTS = "Too many requests, please retry later"
+SERVICE_OVERLOADED = "The service is overloaded, please retry later"
+BULK_UPDATE_ITEMS_REQUIRED = "A list of items is required"
+TOO_MANY_BULK_UPDATE_ITEMS = "At most {limit} items can be updated at once"
+BULK_UPDATE_NO_FIELDS = "Every item must change at least one field"
+BULK_UPDATE_DUPLICATE_IDS = "Every id can be updated only once per request"
+BULK_UPDATE_ROWS_NOT_FOUND = "Some of the rows to update do not exist"
+BULK_UPDATE_FIELDS_NOT_APPLICABLE = "Some fields do not exist on the type of the row to update"
+BULK_UPDATE_CONFLICT = "Some rows were changed since they were read, nothing was updated"
+FIELDS_REQUIRED = "Query parameter 'fields' must list at least one field"
+UNKNOWN_FIELDS = "Unknown fields: {fields}. Available fields: {allowed}"
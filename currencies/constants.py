@@ -0,0 +1,6 @@
+EXCHANGE_RATE = "Exchange Rate"
+PRODUCT_PRICE = "Product Price"
+INVALID_CURRENCY = "Currency must be a three-letter ISO 4217 code"
+UNKNOWN_CURRENCY = "No exchange rate is effective for currency {currency}"
+BASE_CURRENCY_RATE = "The base currency {currency} always has a rate of 1"
+BASE_CURRENCY_PRICE = "Prices in the base currency {currency} are the product prices"
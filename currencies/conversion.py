@@ -0,0 +1,191 @@
+"""
+    currencies/conversion.py
+
+    This module converts the amounts of API responses to the currency requested with `?currency=`.
+
+    Views using `CurrencyConversionMixin` pass a `CurrencyConversion` to their serializers in the `currency`
+    context entry. Serializers of many objects use `ConvertedListSerializer`, which loads the price list
+    entries of all serialized products with one query before serializing them; the exchange rate comes from
+    the cached rate table. Each object is then converted with plain arithmetic, without further queries.
+
+    Amounts are converted unrounded and rounded once, half to even, to two decimal places: an effective price
+    is derived from the converted price before rounding, not from the rounded base amount.
+"""
+
+from django.db import models
+from rest_framework import serializers
+
+from pricing.expressions import round_money
+from .constants import INVALID_CURRENCY, UNKNOWN_CURRENCY
+from .models import ProductPrice
+from .rates import get_rate_table
+
+CURRENCY_PARAM = 'currency'
+
+# Converted amounts can exceed the digits of the base currency fields, so they are rendered with their own
+# field.
+MONEY_FIELD = serializers.DecimalField(max_digits=20, decimal_places=2)
+
+
+class UnknownCurrency(Exception):
+    """
+    Raised when no exchange rate of a currency is effective.
+    """
+
+
+class CurrencyConversion:
+    """
+    Converts base currency amounts of one response to a currency.
+
+    Attributes:
+        currency (str): The ISO 4217 code of the target currency.
+        rate (Decimal): The amount of the currency worth one unit of the base currency.
+        is_base (bool): True if the target currency is the base currency.
+    """
+
+    def __init__(self, currency, rate, is_base=False):
+        self.currency = currency
+        self.rate = rate
+        self.is_base = is_base
+        self._list_prices = {}
+        self._loaded_ids = set()
+
+    @classmethod
+    def for_currency(cls, currency, at=None):
+        """
+        Builds the conversion to a currency at the rate effective at a given time.
+
+        Args:
+            currency (str): The ISO 4217 code of the currency.
+            at (datetime): The time of the rate, now when omitted.
+
+        Returns:
+            CurrencyConversion: The conversion.
+
+        Raises:
+            UnknownCurrency: If no rate of the currency is effective at that time.
+        """
+        table = get_rate_table()
+        rate = table.rate(currency, at)
+        if rate is None:
+            raise UnknownCurrency(UNKNOWN_CURRENCY.replace("{currency}", currency))
+        return cls(currency, rate, is_base=currency == table.base_currency)
+
+    def load_list_prices(self, products):
+        """
+        Loads the price list entries of products in the target currency, with one query for all products
+        not loaded yet.
+
+        Args:
+            products (Iterable[Product]): The products.
+        """
+        ids = {product.pk for product in products} - self._loaded_ids
+        if not ids or self.is_base:
+            return
+        self._list_prices.update(ProductPrice.objects.filter(currency=self.currency, product_id__in=ids)
+                                 .values_list('product_id', 'price'))
+        self._loaded_ids |= ids
+
+    def product_factor(self, product):
+        """
+        Returns the factor converting the base currency amounts derived from the price of a product: the
+        ratio of its list price to its base price when it has a list price, the exchange rate otherwise.
+        Seasonal and bulk pricing rules scale prices, so they apply alike to converted prices.
+
+        Args:
+            product (Product): The product.
+
+        Returns:
+            Decimal: The conversion factor.
+        """
+        if product.pk not in self._loaded_ids:
+            self.load_list_prices([product])
+        list_price = self._list_prices.get(product.pk)
+        if list_price is None or not product.price:
+            return self.rate
+        return list_price / product.price
+
+    def convert_product_amount(self, product, amount):
+        """
+        Converts an amount derived from the price of a product, such as its effective price.
+
+        Args:
+            product (Product): The product.
+            amount (Decimal): The unrounded amount in the base currency.
+
+        Returns:
+            Decimal: The amount in the target currency, rounded to two decimal places.
+        """
+        return round_money(amount * self.product_factor(product))
+
+    def convert(self, amount):
+        """
+        Converts an amount at the exchange rate.
+
+        Args:
+            amount (Decimal): The unrounded amount in the base currency, or None.
+
+        Returns:
+            Decimal: The amount in the target currency rounded to two decimal places, or None.
+        """
+        return None if amount is None else round_money(amount * self.rate)
+
+    def represent(self, amount):
+        """
+        Renders a converted amount as in the API responses.
+
+        Args:
+            amount (Decimal): The converted amount.
+
+        Returns:
+            str: The amount with two decimal places.
+        """
+        return MONEY_FIELD.to_representation(amount)
+
+
+class ConvertedListSerializer(serializers.ListSerializer):
+    """
+    List serializer loading the price list entries of all serialized products at once before converting
+    them.
+    """
+
+    def to_representation(self, data):
+        iterable = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        conversion = self.context.get('currency')
+        if conversion is not None:
+            conversion.load_list_prices(iterable)
+        return super().to_representation(iterable)
+
+
+class CurrencyConversionMixin:
+    """
+    View mixin reading the target currency from `?currency=` and passing its conversion to the serializers.
+    """
+
+    def get_currency_conversion(self):
+        """
+        Returns the conversion to the currency requested with `?currency=`.
+
+        Returns:
+            CurrencyConversion: The conversion, or None when no currency is requested.
+
+        Raises:
+            ValidationError: If the currency code is invalid or has no effective rate.
+        """
+        if not hasattr(self, '_currency_conversion'):
+            currency = self.request.query_params.get(CURRENCY_PARAM, '').strip().upper()
+            conversion = None
+            if currency:
+                if len(currency) != 3 or not (currency.isascii() and currency.isalpha()):
+                    raise serializers.ValidationError({CURRENCY_PARAM: INVALID_CURRENCY})
+                try:
+                    conversion = CurrencyConversion.for_currency(currency)
+                except UnknownCurrency as error:
+                    raise serializers.ValidationError({CURRENCY_PARAM: str(error)})
+            self._currency_conversion = conversion
+        return self._currency_conversion
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['currency'] = self.get_currency_conversion()
+        return context
@@ -0,0 +1,60 @@
+"""
+    currencies/models.py
+
+    This module defines the currency models. Product and discount amounts are stored in the base currency
+    (the CURRENCIES['BASE'] setting); exchange rates convert them to other currencies from the date they take
+    effect, and per-currency price lists override the converted price of individual products.
+"""
+
+from decimal import Decimal
+
+from django.core.validators import MinValueValidator, RegexValidator
+from django.db import models
+from django.utils import timezone
+
+from products.models import BaseModel, Product
+from .constants import INVALID_CURRENCY
+
+currency_code_validator = RegexValidator(r'^[A-Z]{3}$', INVALID_CURRENCY)
+
+
+class ExchangeRate(BaseModel):
+    """
+    Represents the exchange rate of a currency against the base currency, effective from a given time until
+    the next rate of the same currency takes effect.
+
+    Attributes:
+        currency (CharField): The ISO 4217 code of the currency.
+        rate (DecimalField): The amount of the currency worth one unit of the base currency.
+        effective_from (DateTimeField): The time the rate takes effect.
+    """
+    currency = models.CharField(max_length=3, validators=[currency_code_validator])
+    rate = models.DecimalField(max_digits=20, decimal_places=10, validators=[MinValueValidator(Decimal(0))])
+    effective_from = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'effective_from'], name='unique_rate_per_effective_date'),
+            models.CheckConstraint(condition=models.Q(rate__gt=0), name='exchange_rate_positive'),
+        ]
+        ordering = ['currency', 'effective_from']
+
+
+class ProductPrice(BaseModel):
+    """
+    Represents an entry of the price list of a currency: the price of a product in that currency, used
+    instead of its converted base price. Seasonal and bulk pricing rules apply to it as to the base price.
+
+    Attributes:
+        product (ForeignKey): The priced product.
+        currency (CharField): The ISO 4217 code of the currency of the price list.
+        price (DecimalField): The price of the product in the currency.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='currency_prices')
+    currency = models.CharField(max_length=3, validators=[currency_code_validator])
+    price = models.DecimalField(max_digits=14, decimal_places=2, validators=[MinValueValidator(Decimal(0))])
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'product'], name='unique_price_per_currency'),
+        ]
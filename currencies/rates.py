@@ -0,0 +1,125 @@
+"""
+    currencies/rates.py
+
+    This module caches the exchange rate table in process memory. The whole table, including rates taking
+    effect in the future, is loaded with one query and kept sorted by effective date per currency, so looking
+    up the rate of a currency at any time costs a binary search and no query.
+
+    Saved and deleted exchange rates invalidate the table of the process that changed them once their
+    transaction commits. Other processes reload their table after CURRENCIES['RATE_TABLE_TTL_SECONDS'].
+"""
+
+import threading
+import time
+from bisect import bisect_right
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ExchangeRate
+
+DEFAULT_BASE_CURRENCY = 'USD'
+DEFAULT_RATE_TABLE_TTL = 60
+
+
+def get_base_currency():
+    """
+    Returns the currency product and discount amounts are stored in.
+
+    Returns:
+        str: The ISO 4217 code of the base currency.
+    """
+    return getattr(settings, 'CURRENCIES', {}).get('BASE', DEFAULT_BASE_CURRENCY)
+
+
+class RateTable:
+    """
+    The exchange rates of every currency, sorted by the time they take effect.
+
+    Attributes:
+        base_currency (str): The currency every rate is expressed against.
+        loaded_at (float): The monotonic time the table was loaded at.
+    """
+
+    def __init__(self, rates, base_currency):
+        self.base_currency = base_currency
+        self.loaded_at = time.monotonic()
+        self._dates = {}
+        self._rates = {}
+        for currency, rate, effective_from in rates:
+            self._dates.setdefault(currency, []).append(effective_from)
+            self._rates.setdefault(currency, []).append(rate)
+
+    @classmethod
+    def load(cls):
+        """
+        Loads all exchange rates with one query.
+
+        Returns:
+            RateTable: The table.
+        """
+        rates = ExchangeRate.objects.order_by('currency', 'effective_from').values_list(
+            'currency', 'rate', 'effective_from')
+        return cls(rates, get_base_currency())
+
+    def rate(self, currency, at=None):
+        """
+        Returns the rate of a currency effective at a given time.
+
+        Args:
+            currency (str): The ISO 4217 code of the currency.
+            at (datetime): The time, now when omitted.
+
+        Returns:
+            Decimal: The amount of the currency worth one unit of the base currency, or None if no rate of
+            the currency is effective at that time.
+        """
+        if currency == self.base_currency:
+            return Decimal(1)
+        dates = self._dates.get(currency)
+        if not dates:
+            return None
+        index = bisect_right(dates, at or timezone.now())
+        return self._rates[currency][index - 1] if index else None
+
+    def currencies(self):
+        """
+        Returns the currencies with at least one rate, and the base currency.
+
+        Returns:
+            list: The sorted ISO 4217 codes.
+        """
+        return sorted({self.base_currency, *self._dates})
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_rate_table():
+    """
+    Returns the cached exchange rate table of this process, reloading it when it was invalidated or is older
+    than the configured time to live.
+
+    Returns:
+        RateTable: The table.
+    """
+    global _table
+    ttl = getattr(settings, 'CURRENCIES', {}).get('RATE_TABLE_TTL_SECONDS', DEFAULT_RATE_TABLE_TTL)
+    table = _table
+    if table is None or time.monotonic() - table.loaded_at > ttl:
+        with _table_lock:
+            if _table is table:
+                _table = RateTable.load()
+            table = _table
+    return table
+
+
+def invalidate_rate_table():
+    """
+    Drops the cached exchange rate table of this process, so that the next lookup reloads it.
+    """
+    global _table
+    with _table_lock:
+        _table = None
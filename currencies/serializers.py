@@ -0,0 +1,74 @@
+"""
+    currencies/serializers.py
+
+    This module defines serializers for exchange rates and price list entries. Neither may be created for
+    the base currency, whose rate is always 1 and whose prices are the product prices.
+"""
+
+from rest_framework import serializers
+
+from .constants import BASE_CURRENCY_PRICE, BASE_CURRENCY_RATE
+from .models import ExchangeRate, ProductPrice
+from .rates import get_base_currency
+
+
+def validate_not_base_currency(value, message):
+    """
+    Rejects the base currency, which needs neither an exchange rate nor a price list.
+
+    Args:
+        value (str): The ISO 4217 code of the currency.
+        message (str): The error message, with a {currency} placeholder.
+
+    Returns:
+        str: The currency code.
+
+    Raises:
+        ValidationError: If the currency is the base currency.
+    """
+    base_currency = get_base_currency()
+    if value == base_currency:
+        raise serializers.ValidationError(message.replace("{currency}", base_currency))
+    return value
+
+
+class ExchangeRateSerializer(serializers.ModelSerializer):
+    """
+    Serializes the ExchangeRate model.
+
+    Attributes:
+        id (IntegerField): The unique identifier for the rate.
+        currency (CharField): The ISO 4217 code of the currency.
+        rate (DecimalField): The amount of the currency worth one unit of the base currency.
+        effective_from (DateTimeField): The time the rate takes effect, now when omitted.
+        query_budget (int): The largest number of queries rendering its instances may run.
+    """
+    query_budget = 1
+
+    class Meta:
+        model = ExchangeRate
+        fields = ['id', 'currency', 'rate', 'effective_from']
+
+    def validate_currency(self, value):
+        return validate_not_base_currency(value, BASE_CURRENCY_RATE)
+
+
+class ProductPriceSerializer(serializers.ModelSerializer):
+    """
+    Serializes the ProductPrice model.
+
+    Attributes:
+        id (IntegerField): The unique identifier for the price list entry.
+        product (PrimaryKeyRelatedField): The priced product.
+        currency (CharField): The ISO 4217 code of the currency of the price list.
+        price (DecimalField): The price of the product in the currency.
+        query_budget (int): The largest number of queries rendering its instances may run.
+    """
+    query_budget = 1
+
+    class Meta:
+        model = ProductPrice
+        fields = ['id', 'product', 'currency', 'price']
+
+    def validate_currency(self, value):
+        return validate_not_base_currency(value, BASE_CURRENCY_PRICE)
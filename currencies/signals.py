@@ -0,0 +1,28 @@
+"""
+    currencies/signals.py
+
+    This module defines signal receivers for currency models. They drop the cached exchange rate table of
+    this process once a transaction saving or deleting a rate commits.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ExchangeRate
+from .rates import invalidate_rate_table
+
+
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def exchange_rate_changed(sender, instance, using=None, **kwargs):
+    """
+    Invalidates the cached exchange rate table after a rate has been saved or deleted.
+
+    Args:
+        sender (Model): The model class that was changed.
+        instance (ExchangeRate): The changed rate.
+        using (str): The alias of the database the rate was written to.
+        **kwargs: Arbitrary keyword arguments.
+    """
+    transaction.on_commit(invalidate_rate_table, using=using)
@@ -0,0 +1,187 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from discounts.models import FixedAmountDiscount, PercentageDiscount
+from products.models import BulkProduct, Product, SeasonalProduct
+from .constants import INVALID_CURRENCY, UNKNOWN_CURRENCY
+from .conversion import CurrencyConversion
+from .models import ExchangeRate, ProductPrice
+from .rates import get_rate_table, invalidate_rate_table
+
+
+class CurrencyTestCase(TestCase):
+    """
+    Drops the cached exchange rate table around every test, as rates saved by a test are rolled back.
+    """
+
+    def setUp(self):
+        invalidate_rate_table()
+        self.addCleanup(invalidate_rate_table)
+
+
+class RateTableTests(CurrencyTestCase):
+    """
+    Checks the lookup of the rate effective at a given time and the invalidation of the cached table.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        for days, rate in ((-10, '0.90'), (-1, '0.95'), (1, '1.00')):
+            ExchangeRate.objects.create(currency='EUR', rate=Decimal(rate),
+                                        effective_from=self.now + timedelta(days=days))
+
+    def test_rates_are_looked_up_by_effective_date(self):
+        table = get_rate_table()
+        self.assertEqual(table.rate('EUR', self.now), Decimal('0.95'))
+        self.assertEqual(table.rate('EUR', self.now - timedelta(days=5)), Decimal('0.90'))
+        self.assertEqual(table.rate('EUR', self.now - timedelta(days=10)), Decimal('0.90'))
+        self.assertIsNone(table.rate('EUR', self.now - timedelta(days=11)))
+        self.assertEqual(table.rate('USD'), Decimal(1))
+        self.assertIsNone(table.rate('GBP'))
+        self.assertEqual(table.currencies(), ['EUR', 'USD'])
+
+    def test_future_rates_take_effect_on_their_date(self):
+        table = get_rate_table()
+        self.assertEqual(table.rate('EUR'), Decimal('0.95'))
+        self.assertEqual(table.rate('EUR', self.now + timedelta(days=1)), Decimal('1.00'))
+        self.assertEqual(table.rate('EUR', self.now + timedelta(days=30)), Decimal('1.00'))
+
+    def test_lookups_read_the_cached_table(self):
+        get_rate_table()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_rate_table().rate('EUR'), Decimal('0.95'))
+
+    def test_saved_rates_invalidate_the_table_once_committed(self):
+        table = get_rate_table()
+        with self.captureOnCommitCallbacks(execute=True):
+            ExchangeRate.objects.create(currency='GBP', rate=Decimal('0.80'), effective_from=self.now)
+            self.assertIs(get_rate_table(), table)
+        self.assertEqual(get_rate_table().rate('GBP'), Decimal('0.80'))
+
+    def test_deleted_rates_invalidate_the_table(self):
+        self.assertEqual(get_rate_table().rate('EUR'), Decimal('0.95'))
+        with self.captureOnCommitCallbacks(execute=True):
+            ExchangeRate.objects.filter(rate=Decimal('0.95')).get().delete()
+        self.assertEqual(get_rate_table().rate('EUR'), Decimal('0.90'))
+
+    @override_settings(CURRENCIES={'RATE_TABLE_TTL_SECONDS': -1})
+    def test_tables_older_than_their_ttl_are_reloaded(self):
+        table = get_rate_table()
+        ExchangeRate.objects.filter(currency='EUR').update(rate=Decimal('2.00'))
+        self.assertIsNot(get_rate_table(), table)
+        self.assertEqual(get_rate_table().rate('EUR'), Decimal('2.00'))
+
+
+@override_settings(LOAD_SHEDDING={'ENABLED': False})
+class ConversionTests(CurrencyTestCase):
+    """
+    Checks the prices of API responses converted with `?currency=`.
+    """
+
+    def setUp(self):
+        super().setUp()
+        ExchangeRate.objects.create(currency='EUR', rate=Decimal('0.90'), effective_from=timezone.now() - timedelta(days=1))
+        ExchangeRate.objects.create(currency='EUR', rate=Decimal('2.00'), effective_from=timezone.now() + timedelta(days=1))
+        self.converted = Product.objects.create(name="Kettle", price=Decimal('10.00'))
+        self.listed = Product.objects.create(name="Toaster", price=Decimal('10.00'))
+        self.seasonal = SeasonalProduct.objects.create(name="Lantern", price=Decimal('20.00'),
+                                                       seasonal_discount=Decimal('25.00'))
+        ProductPrice.objects.create(product=self.listed, currency='EUR', price=Decimal('8.50'))
+        ProductPrice.objects.create(product=self.seasonal, currency='EUR', price=Decimal('16.00'))
+
+    def batch(self, currency):
+        response = self.client.get(reverse('product-batch'), {
+            'ids': f'{self.converted.pk},{self.listed.pk},{self.seasonal.pk}', 'currency': currency})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [(product['price'], product['effective_price'], product['currency'])
+                for product in response.json()['results']]
+
+    def test_list_prices_win_over_the_exchange_rate(self):
+        self.assertEqual(self.batch('eur'), [
+            ('9.00', '9.00', 'EUR'),
+            ('8.50', '8.50', 'EUR'),
+            # Seasonal pricing applies to the list price: 16.00 less 25%.
+            ('16.00', '12.00', 'EUR'),
+        ])
+
+    def test_list_of_products_is_converted(self):
+        response = self.client.get(reverse('product-list-create'), {'currency': 'EUR', 'fields': 'id,price'})
+        self.assertEqual([product['price'] for product in response.json()], ['9.00', '8.50', '16.00'])
+
+    def test_amounts_are_rounded_once_half_to_even(self):
+        conversion = CurrencyConversion('EUR', Decimal('0.9'))
+        self.assertEqual(conversion.convert(Decimal('0.05')), Decimal('0.04'))
+        self.assertEqual(conversion.convert(Decimal('0.15')), Decimal('0.14'))
+        self.assertEqual(conversion.convert(Decimal('0.25')), Decimal('0.22'))
+        self.assertIsNone(conversion.convert(None))
+        # The effective price is converted from the unrounded base amount: 10.05 less 25% is 7.5375, which is
+        # 6.78375 EUR, not 7.54 * 0.9 = 6.786.
+        seasonal = SeasonalProduct(pk=0, price=Decimal('10.05'), seasonal_discount=Decimal('25.00'))
+        self.assertEqual(conversion.convert_product_amount(seasonal, seasonal.get_price()), Decimal('6.78'))
+
+    def test_unknown_and_invalid_currencies_are_rejected(self):
+        for currency, error in (('GBP', UNKNOWN_CURRENCY.replace("{currency}", 'GBP')), ('EURO', INVALID_CURRENCY),
+                                ('E1R', INVALID_CURRENCY)):
+            with self.subTest(currency=currency):
+                response = self.client.get(reverse('product-list-create'), {'currency': currency})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'currency': error})
+
+
+@override_settings(LOAD_SHEDDING={'ENABLED': False})
+class QuoteTests(CurrencyTestCase):
+    """
+    Checks that quotes price orders as they are placed.
+    """
+
+    def setUp(self):
+        super().setUp()
+        ExchangeRate.objects.create(currency='EUR', rate=Decimal('0.90'), effective_from=timezone.now() - timedelta(days=1))
+        self.plain = Product.objects.create(name="Kettle", price=Decimal('7.25'))
+        self.seasonal = SeasonalProduct.objects.create(name="Lantern", price=Decimal('10.00'),
+                                                       seasonal_discount=Decimal('12.50'))
+        self.bulk = BulkProduct.objects.create(name="Candle", price=Decimal('5.00'), bulk_threshold=3,
+                                               bulk_discount=Decimal('20.00'))
+        self.percentage = PercentageDiscount.objects.create(name="Ten", percentage=Decimal('10.00'))
+        self.fixed = FixedAmountDiscount.objects.create(name="Two off", amount=Decimal('2.00'))
+
+    def order(self, discount):
+        return {'discount': discount.pk if discount else None, 'products': [
+            {'product': self.plain.pk, 'quantity': 3},
+            {'product': self.seasonal.pk, 'quantity': 1},
+            {'product': self.bulk.pk, 'quantity': 4},
+        ]}
+
+    def quote(self, body, currency=None):
+        path = reverse('order-quote') + (f'?currency={currency}' if currency else '')
+        response = self.client.post(path, body, content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def place(self, body):
+        response = self.client.post(reverse('order-list-create'), body, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['data']
+
+    def test_quote_totals_match_the_placed_orders(self):
+        for discount in (None, self.percentage, self.fixed):
+            with self.subTest(discount=discount and discount.name):
+                body = self.order(discount)
+                quote = self.quote(body)
+                order = self.place(body)
+                self.assertEqual(quote['currency'], 'USD')
+                self.assertEqual(Decimal(quote['total_price']), Decimal(str(order['total_price'])))
+
+    def test_converted_quote_totals_match_the_placed_orders_in_that_currency(self):
+        body = self.order(self.percentage)
+        quote = self.quote(body, 'EUR')
+        order = self.place(body)
+        response = self.client.get(reverse('order-list-create'), {'currency': 'EUR'})
+        converted = next(item for item in response.json() if item['order_id'] == order['order_id'])
+        self.assertEqual(quote['currency'], 'EUR')
+        self.assertEqual(Decimal(quote['total_price']), Decimal(str(converted['total_price'])))
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import ExchangeRateListCreateView, ProductPriceListCreateView
+
+urlpatterns = [
+    path('currencies/rates/', ExchangeRateListCreateView.as_view(), name='exchange-rate-list-create'),
+    path('currencies/prices/', ProductPriceListCreateView.as_view(), name='product-price-list-create'),
+]
@@ -0,0 +1,74 @@
+"""
+    currencies/views.py
+
+    This module defines API views for managing exchange rates and the per-currency price lists.
+"""
+
+from rest_framework import generics, status
+from rest_framework.response import Response
+
+from constants import CREATED_SUCCESSFULLY, SOMETHING_WENT_WRONG
+from .constants import EXCHANGE_RATE, PRODUCT_PRICE
+from .models import ExchangeRate, ProductPrice
+from .serializers import ExchangeRateSerializer, ProductPriceSerializer
+
+
+class CurrencyListCreateView(generics.ListCreateAPIView):
+    """
+    Base view for listing and creating currency records, optionally filtered with `?currency=`.
+
+    Attributes:
+        module (str): The name of the created record, used in the response message.
+    """
+    module = None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        currency = self.request.query_params.get('currency', '').strip().upper()
+        return queryset.filter(currency=currency) if currency else queryset
+
+    def create(self, request, *args, **kwargs):
+        """
+        Creates a new record using the provided data.
+
+        Args:
+            request (Request): The HTTP request containing the record data.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+
+        Returns:
+            Response: A response containing the created record data or error details.
+        """
+        serializer = self.get_serializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response({'message': CREATED_SUCCESSFULLY.replace("{module}", self.module),
+                             'data': serializer.data}, status=status.HTTP_201_CREATED)
+        return Response({'error': SOMETHING_WENT_WRONG, 'details': serializer.errors},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+
+class ExchangeRateListCreateView(CurrencyListCreateView):
+    """
+    Handles listing and creating exchange rates. A new rate of a currency takes effect at its
+    `effective_from` time and replaces the previous rate from then on.
+    """
+    queryset = ExchangeRate.objects.all()
+    serializer_class = ExchangeRateSerializer
+    module = EXCHANGE_RATE
+    query_budget = {'GET': 1, 'POST': 2}
+
+
+class ProductPriceListCreateView(CurrencyListCreateView):
+    """
+    Handles listing and creating price list entries, optionally filtered with `?product=`.
+    """
+    queryset = ProductPrice.objects.order_by('currency', 'product_id')
+    serializer_class = ProductPriceSerializer
+    module = PRODUCT_PRICE
+    query_budget = {'GET': 1, 'POST': 3}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        product = self.request.query_params.get('product', '')
+        return queryset.filter(product_id=product) if product.isdigit() else queryset
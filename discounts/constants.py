@@ -1,3 +1,13 @@
 DISCOUNT = "Discount"
+DISCOUNTS = "Discounts"
 PERCENTAGE_DISCOUNT = "Percentage Discount"
-FIXED_AMOUNT_DISCOUNT = "Fixed Amount Discount"
\ No newline at end of file
+FIXED_AMOUNT_DISCOUNT = "Fixed Amount Discount"
+COUPON_NOT_FOUND = "Coupon code {code} does not exist"
+COUPON_CODE_REQUIRED = "This discount can only be applied with its coupon code"
+COUPON_DISCOUNT_MISMATCH = "The coupon code does not belong to the given discount"
+COUPON_CUSTOMER_REQUIRED = "A customer is required to redeem this discount"
+COUPON_EXHAUSTED = "Discount {name} has no redemptions left"
+COUPON_CUSTOMER_LIMIT_REACHED = "Discount {name} has been redeemed the maximum number of times by this customer"
+AUTOMATIC_DISCOUNT_RESTRICTED = "Automatic discounts cannot have a coupon code or redemption caps"
+BUNDLE_OFFER = "Bundle Offer"
+BUNDLE_TOO_LARGE = "A bundle can have at most {limit} units"
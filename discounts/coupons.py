@@ -0,0 +1,166 @@
+"""
+    discounts/coupons.py
+
+    This module enforces the redemption caps of discounts when orders are placed.
+
+    The global cap of a discount is split across `redemption_shards` counter rows, each allowing a share of
+    the cap. A redemption increments one counter, picked at random, with a conditional UPDATE that only
+    matches while the counter is below its capacity, so the cap can never be exceeded and no row is read
+    before being written. Concurrent checkouts of a hot coupon increment different rows instead of queueing
+    on one row lock; once a counter is full, redemptions move on to the counters with capacity left.
+
+    Per-customer caps are counted on one row per discount and customer, incremented the same way.
+"""
+
+import random
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .constants import COUPON_EXHAUSTED, COUPON_CUSTOMER_LIMIT_REACHED, COUPON_CUSTOMER_REQUIRED
+from .models import CustomerRedemption, RedemptionCounter
+
+
+class CouponError(Exception):
+    """
+    Raised when a discount cannot be applied to an order because one of its redemption caps is reached.
+    """
+
+
+class CouponExhausted(CouponError):
+    """
+    Raised when the global redemption cap of a discount is reached.
+    """
+
+
+class CustomerLimitReached(CouponError):
+    """
+    Raised when the per-customer redemption cap of a discount is reached for a customer.
+    """
+
+
+def split_capacity(total, shards):
+    """
+    Splits a number of redemptions as evenly as possible across counters.
+
+    Args:
+        total (int): The number of redemptions to split.
+        shards (int): The number of counters.
+
+    Returns:
+        list: The number of redemptions of every counter.
+    """
+    share, remainder = divmod(total, shards)
+    return [share + (1 if shard < remainder else 0) for shard in range(shards)]
+
+
+def sync_redemption_counters(discount):
+    """
+    Creates the redemption counters of a discount, or spreads its remaining redemptions across them again
+    after its cap or number of shards changed. Redemptions already counted are kept.
+
+    Args:
+        discount (ProductDiscount): The discount.
+    """
+    if discount.max_redemptions is None:
+        return
+    with transaction.atomic():
+        counters = {counter.shard: counter
+                    for counter in RedemptionCounter.objects.select_for_update().filter(discount=discount)}
+        redeemed = sum(counter.redeemed for counter in counters.values())
+        shards = max(1, min(discount.redemption_shards, discount.max_redemptions))
+        shares = split_capacity(max(discount.max_redemptions - redeemed, 0), shards)
+        for shard in set(counters) | set(range(shards)):
+            counter = counters.get(shard) or RedemptionCounter(discount=discount, shard=shard)
+            counter.capacity = counter.redeemed + (shares[shard] if shard < shards else 0)
+            counters[shard] = counter
+        RedemptionCounter.objects.bulk_create([counter for counter in counters.values() if counter.pk is None])
+        RedemptionCounter.objects.bulk_update([counter for counter in counters.values() if counter.pk is not None],
+                                              ['capacity'])
+
+
+def take_redemption(discount):
+    """
+    Counts one redemption of a discount against its global cap.
+
+    A random counter is tried first; if it is full, the counters with capacity left are tried in random
+    order.
+
+    Args:
+        discount (ProductDiscount): The discount, with a global cap.
+
+    Raises:
+        CouponExhausted: If every counter is full.
+    """
+    counters = RedemptionCounter.objects.filter(discount=discount, redeemed__lt=F('capacity'))
+    increment = {'redeemed': F('redeemed') + 1}
+    shards = max(1, min(discount.redemption_shards, discount.max_redemptions))
+    if counters.filter(shard=random.randrange(shards)).update(**increment):
+        return
+    open_shards = list(counters.values_list('shard', flat=True))
+    if not open_shards and not RedemptionCounter.objects.filter(discount=discount).exists():
+        # Discounts inserted without their signals, e.g. by bulk_create(), get their counters now.
+        sync_redemption_counters(discount)
+        open_shards = list(counters.values_list('shard', flat=True))
+    random.shuffle(open_shards)
+    for shard in open_shards:
+        if counters.filter(shard=shard).update(**increment):
+            return
+    raise CouponExhausted(COUPON_EXHAUSTED.replace("{name}", discount.name))
+
+
+def take_customer_redemption(discount, customer):
+    """
+    Counts one redemption of a discount by a customer against its per-customer cap.
+
+    Args:
+        discount (ProductDiscount): The discount, with a per-customer cap.
+        customer (str): The reference of the customer.
+
+    Raises:
+        CustomerLimitReached: If the customer has reached the cap.
+    """
+    CustomerRedemption.objects.bulk_create([CustomerRedemption(discount=discount, customer=customer)],
+                                           ignore_conflicts=True)
+    updated = CustomerRedemption.objects.filter(
+        discount=discount, customer=customer, redeemed__lt=discount.max_redemptions_per_customer,
+    ).update(redeemed=F('redeemed') + 1)
+    if not updated:
+        raise CustomerLimitReached(COUPON_CUSTOMER_LIMIT_REACHED.replace("{name}", discount.name))
+
+
+def redeem(discount, customer=''):
+    """
+    Counts one redemption of a discount against its caps, in the transaction placing the order, so that
+    the redemption is rolled back with the order if it fails.
+
+    Args:
+        discount (ProductDiscount): The discount applied to the order, or None.
+        customer (str): The reference of the customer placing the order.
+
+    Raises:
+        CouponError: If a cap of the discount is reached, or if the discount has a per-customer cap and no
+            customer is given; nothing is counted then.
+    """
+    if discount is None or not discount.is_capped():
+        return
+    if discount.max_redemptions_per_customer is not None and not customer:
+        raise CouponError(COUPON_CUSTOMER_REQUIRED)
+    with transaction.atomic():
+        if discount.max_redemptions_per_customer is not None:
+            take_customer_redemption(discount, customer)
+        if discount.max_redemptions is not None:
+            take_redemption(discount)
+
+
+def redemption_count(discount):
+    """
+    Returns the number of redemptions counted against the global cap of a discount.
+
+    Args:
+        discount (ProductDiscount): The discount.
+
+    Returns:
+        int: The number of redemptions.
+    """
+    return RedemptionCounter.objects.filter(discount=discount).aggregate(total=Sum('redeemed'))['total'] or 0
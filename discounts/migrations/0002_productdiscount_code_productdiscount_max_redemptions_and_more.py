@@ -0,0 +1,60 @@
+# Generated by Django 5.1.2 on 2026-10-19 05:10
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productdiscount',
+            name='code',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='productdiscount',
+            name='max_redemptions',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='productdiscount',
+            name='max_redemptions_per_customer',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='productdiscount',
+            name='redemption_shards',
+            field=models.PositiveSmallIntegerField(default=8, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(64)]),
+        ),
+        migrations.CreateModel(
+            name='CustomerRedemption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer', models.CharField(max_length=255)),
+                ('redeemed', models.PositiveIntegerField(default=0)),
+                ('discount', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='customer_redemptions', to='discounts.productdiscount')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('discount', 'customer'), name='unique_customer_redemption')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RedemptionCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('redeemed', models.PositiveIntegerField(default=0)),
+                ('capacity', models.PositiveIntegerField(default=0)),
+                ('discount', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='redemption_counters', to='discounts.productdiscount')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('discount', 'shard'), name='unique_redemption_counter_shard'), models.CheckConstraint(condition=models.Q(('redeemed__lte', models.F('capacity'))), name='redemptions_within_capacity')],
+            },
+        ),
+    ]
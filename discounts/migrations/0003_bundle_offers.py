@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-19 05:27
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discounts', '0002_productdiscount_code_productdiscount_max_redemptions_and_more'),
+        ('products', '0004_product_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productdiscount',
+            name='auto_apply',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.CreateModel(
+            name='BundleOffer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=100)),
+                ('buy_quantity', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('free_quantity', models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+                ('is_active', models.BooleanField(db_index=True, default=True)),
+                ('products', models.ManyToManyField(related_name='bundle_offers', to='products.product')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
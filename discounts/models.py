@@ -2,11 +2,33 @@
     discounts/models.py
 
     This module defines discount models for products. It includes different types of discounts,
-    such as percentage-based and fixed amount discounts
+    such as percentage-based and fixed amount discounts, the counters enforcing the redemption caps of
+    coupon codes, and the bundle offers selected together with discounts by `pricing/optimizer.py`.
 """
 
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from products.models import BaseModel
+from products.models import BaseModel, Product
+
+
+class ProductDiscountQuerySet(models.QuerySet):
+    """
+    QuerySet for the ProductDiscount model with helpers for polymorphic loading.
+
+    Methods:
+        with_subtypes(): Joins the percentage and fixed amount child tables in the same query.
+    """
+
+    def with_subtypes(self):
+        """
+        Left-joins the PercentageDiscount and FixedAmountDiscount child tables so that the concrete
+        subtype of every discount can be resolved without extra queries.
+
+        Returns:
+            QuerySet: The queryset with the child tables selected.
+        """
+        return self.select_related('percentagediscount', 'fixedamountdiscount')
 
 
 class ProductDiscount(BaseModel):
@@ -15,11 +37,59 @@ class ProductDiscount(BaseModel):
 
     Attributes:
         name (CharField): The name of the discount.
+        code (CharField): The coupon code customers apply the discount with, if any.
+        max_redemptions (PositiveIntegerField): The number of orders the discount can be applied to, if capped.
+        max_redemptions_per_customer (PositiveIntegerField): The number of orders of one customer the discount
+            can be applied to, if capped.
+        redemption_shards (PositiveSmallIntegerField): The number of counters the global cap is spread across.
+        auto_apply (BooleanField): Whether the discount is offered on every order without being requested.
+            Automatic discounts have neither a code nor a cap.
 
     Methods:
         apply_discount(price): Applies the discount to the given price.
+        get_concrete(): Returns the concrete subtype instance of the discount.
+        is_capped(): Checks whether redeeming the discount is limited.
     """
+    SUBTYPE_RELATIONS = ('percentagediscount', 'fixedamountdiscount')
+    MAX_REDEMPTION_SHARDS = 64
+
     name = models.CharField(max_length=100)
+    code = models.CharField(max_length=50, unique=True, null=True, blank=True)
+    max_redemptions = models.PositiveIntegerField(null=True, blank=True)
+    max_redemptions_per_customer = models.PositiveIntegerField(null=True, blank=True)
+    redemption_shards = models.PositiveSmallIntegerField(
+        default=8, validators=[MinValueValidator(1), MaxValueValidator(MAX_REDEMPTION_SHARDS)])
+    auto_apply = models.BooleanField(default=False, db_index=True)
+
+    objects = ProductDiscountQuerySet.as_manager()
+
+    def get_concrete(self):
+        """
+        Returns the concrete subtype instance (PercentageDiscount or FixedAmountDiscount) of this discount.
+
+        The child tables should be loaded with `ProductDiscount.objects.with_subtypes()` beforehand,
+        otherwise every lookup costs one query.
+
+        Returns:
+            ProductDiscount: The subtype instance, or the discount itself if it has no subtype.
+        """
+        if type(self) is not ProductDiscount:
+            return self
+        for relation in self.SUBTYPE_RELATIONS:
+            try:
+                return getattr(self, relation)
+            except ObjectDoesNotExist:
+                continue
+        return self
+
+    def is_capped(self):
+        """
+        Checks whether the number of orders the discount can be applied to is limited.
+
+        Returns:
+            bool: True if the discount has a global or a per-customer cap.
+        """
+        return self.max_redemptions is not None or self.max_redemptions_per_customer is not None
 
     def apply_discount(self, price):
         """
@@ -85,3 +155,79 @@ class FixedAmountDiscount(ProductDiscount):
             it does not go below zero.
         """
         return max(0, price - self.amount)
+
+
+class RedemptionCounter(models.Model):
+    """
+    Represents one shard of the global redemption cap of a discount.
+
+    The cap is split across `redemption_shards` counters, each allowed `capacity` redemptions, so that
+    concurrent orders increment different rows instead of queueing on a single row lock.
+
+    Attributes:
+        discount (ForeignKey): The capped discount.
+        shard (PositiveSmallIntegerField): The index of the counter among the counters of the discount.
+        redeemed (PositiveIntegerField): The number of redemptions counted by this counter.
+        capacity (PositiveIntegerField): The number of redemptions this counter allows.
+    """
+    discount = models.ForeignKey(ProductDiscount, on_delete=models.CASCADE, related_name='redemption_counters')
+    shard = models.PositiveSmallIntegerField()
+    redeemed = models.PositiveIntegerField(default=0)
+    capacity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['discount', 'shard'], name='unique_redemption_counter_shard'),
+            models.CheckConstraint(condition=models.Q(redeemed__lte=models.F('capacity')),
+                                   name='redemptions_within_capacity'),
+        ]
+
+
+class CustomerRedemption(models.Model):
+    """
+    Represents the number of orders of one customer a discount was applied to.
+
+    Attributes:
+        discount (ForeignKey): The capped discount.
+        customer (CharField): The reference of the customer.
+        redeemed (PositiveIntegerField): The number of redemptions of the customer.
+    """
+    discount = models.ForeignKey(ProductDiscount, on_delete=models.CASCADE, related_name='customer_redemptions')
+    customer = models.CharField(max_length=255)
+    redeemed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['discount', 'customer'], name='unique_customer_redemption'),
+        ]
+
+
+class BundleOffer(BaseModel):
+    """
+    Represents a "buy X get Y free" offer: of every `buy_quantity + free_quantity` units of its products in an
+    order, in any mix, the `free_quantity` cheapest are free. Active offers are considered for every order.
+
+    Attributes:
+        name (CharField): The name of the offer.
+        products (ManyToManyField): The products the offer applies to.
+        buy_quantity (PositiveSmallIntegerField): The number of paid units of a bundle.
+        free_quantity (PositiveSmallIntegerField): The number of free units of a bundle.
+        is_active (BooleanField): Whether the offer is currently offered.
+    """
+    MAX_BUNDLE_SIZE = 20
+
+    name = models.CharField(max_length=100)
+    products = models.ManyToManyField(Product, related_name='bundle_offers')
+    buy_quantity = models.PositiveSmallIntegerField(validators=[MinValueValidator(1)])
+    free_quantity = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])
+    is_active = models.BooleanField(default=True, db_index=True)
+
+    @property
+    def bundle_size(self):
+        """
+        Returns the number of units of one bundle.
+
+        Returns:
+            int: The number of paid and free units.
+        """
+        return self.buy_quantity + self.free_quantity
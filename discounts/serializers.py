@@ -2,25 +2,99 @@
     discount/serializers.py
 
     This module defines serializers for discount models. It includes serializers for base product discounts,
-    percentage discounts, and fixed amount discounts.
+    percentage discounts, and fixed amount discounts, for the items of bulk discount updates, and for bundle
+    offers. Discount serializers support sparse fieldsets, see `dynamic_pricing_system/sparse_fields.py`.
+
+    Coupon codes are case-insensitive: they are stored and looked up in upper case.
 """
 
+from decimal import Decimal
+
 from rest_framework import serializers
-from .models import ProductDiscount, PercentageDiscount, FixedAmountDiscount
+from rest_framework.validators import UniqueValidator
+
+from dynamic_pricing_system.bulk_updates import BulkUpdateItemSerializer
+from dynamic_pricing_system.related_fields import BulkPrimaryKeyRelatedField
+from dynamic_pricing_system.sparse_fields import SparseFieldsMixin
+from .constants import AUTOMATIC_DISCOUNT_RESTRICTED, BUNDLE_TOO_LARGE
+from .models import ProductDiscount, PercentageDiscount, FixedAmountDiscount, BundleOffer
+
+
+def normalize_coupon_code(value):
+    """
+    Normalizes a coupon code for storage and lookup.
+
+    Args:
+        value (str): The coupon code as entered.
+
+    Returns:
+        str: The upper case code, or None for a blank code.
+    """
+    value = (value or '').strip().upper()
+    return value or None
+
 
+class CouponCodeField(serializers.CharField):
+    """
+    Coupon code field normalizing the code before it is validated, so that codes differing only by case
+    are rejected as duplicates.
+    """
+
+    def run_validation(self, data=serializers.empty):
+        if isinstance(data, str):
+            data = normalize_coupon_code(data)
+        return super().run_validation(data)
 
-class DiscountSerializer(serializers.ModelSerializer):
+
+class DiscountSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializes the ProductDiscount model, providing fields for basic discount information.
 
     Attributes:
         id (IntegerField): The unique identifier for the discount.
         name (CharField): The name of the discount.
+        code (CharField): The coupon code of the discount, if any.
+        max_redemptions (IntegerField): The number of orders the discount can be applied to, if capped.
+        max_redemptions_per_customer (IntegerField): The number of orders of one customer the discount can
+            be applied to, if capped.
+        redemption_shards (IntegerField): The number of counters the global cap is spread across.
+        auto_apply (BooleanField): Whether the discount is offered on every order without being requested.
+        updated_at (DateTimeField): The time of the last change, used to detect concurrent updates.
+        query_budget (int): The largest number of queries rendering its instances may run.
+
+    Methods:
+        validate(attrs): Checks that automatic discounts have neither a code nor a cap.
     """
+    code = CouponCodeField(max_length=50, required=False, allow_null=True,
+                           validators=[UniqueValidator(queryset=ProductDiscount.objects.all())])
+    query_budget = 1
 
     class Meta:
         model = ProductDiscount
-        fields = ['id', 'name']
+        fields = ['id', 'name', 'code', 'max_redemptions', 'max_redemptions_per_customer', 'redemption_shards',
+                  'auto_apply', 'updated_at']
+
+    def validate(self, attrs):
+        """
+        Checks that an automatic discount has neither a coupon code nor a redemption cap, since it is applied
+        to orders that do not request it.
+
+        Args:
+            attrs (dict): The validated discount data.
+
+        Returns:
+            dict: The discount data.
+
+        Raises:
+            ValidationError: If an automatic discount has a code or a cap.
+        """
+        def current(name):
+            return attrs.get(name, getattr(self.instance, name, None))
+
+        if current('auto_apply') and any(current(name) is not None
+                                         for name in ('code', 'max_redemptions', 'max_redemptions_per_customer')):
+            raise serializers.ValidationError({'auto_apply': AUTOMATIC_DISCOUNT_RESTRICTED})
+        return attrs
 
 
 class PercentageDiscountSerializer(DiscountSerializer):
@@ -47,3 +121,63 @@ class FixedAmountDiscountSerializer(DiscountSerializer):
     class Meta(DiscountSerializer.Meta):
         model = FixedAmountDiscount
         fields = DiscountSerializer.Meta.fields + ['amount']
+
+
+class DiscountBulkUpdateSerializer(BulkUpdateItemSerializer):
+    """
+    Validates one item of a bulk discount update. Each field may only be given for discounts of the type
+    declaring it.
+
+    Attributes:
+        percentage (DecimalField): The new percentage of a percentage discount.
+        amount (DecimalField): The new amount of a fixed amount discount.
+    """
+    percentage = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=Decimal('0'),
+                                          max_value=Decimal('100'), required=False)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+
+
+class BundleOfferSerializer(serializers.ModelSerializer):
+    """
+    Serializes the BundleOffer model.
+
+    Attributes:
+        id (IntegerField): The unique identifier for the offer.
+        name (CharField): The name of the offer.
+        products (PrimaryKeyRelatedField): The ids of the products the offer applies to.
+        buy_quantity (IntegerField): The number of paid units of a bundle.
+        free_quantity (IntegerField): The number of free units of a bundle.
+        is_active (BooleanField): Whether the offer is currently offered.
+        updated_at (DateTimeField): The time of the last change.
+        query_budget (int): The largest number of queries rendering its instances may run.
+
+    Methods:
+        validate(attrs): Checks the size of the bundles.
+    """
+    serializer_related_field = BulkPrimaryKeyRelatedField
+    query_budget = 2
+
+    class Meta:
+        model = BundleOffer
+        fields = ['id', 'name', 'products', 'buy_quantity', 'free_quantity', 'is_active', 'updated_at']
+
+    def validate(self, attrs):
+        """
+        Checks that a bundle has at most BundleOffer.MAX_BUNDLE_SIZE units, which bounds the search of the
+        discount optimizer.
+
+        Args:
+            attrs (dict): The validated offer data.
+
+        Returns:
+            dict: The offer data.
+
+        Raises:
+            ValidationError: If the bundle is too large.
+        """
+        buy_quantity = attrs.get('buy_quantity', getattr(self.instance, 'buy_quantity', 0))
+        free_quantity = attrs.get('free_quantity', getattr(self.instance, 'free_quantity', 1))
+        if buy_quantity + free_quantity > BundleOffer.MAX_BUNDLE_SIZE:
+            raise serializers.ValidationError(
+                {'free_quantity': BUNDLE_TOO_LARGE.replace("{limit}", str(BundleOffer.MAX_BUNDLE_SIZE))})
+        return attrs
@@ -0,0 +1,29 @@
+"""
+    discounts/signals.py
+
+    This module defines signal receivers for discount models. They keep the redemption counters of capped
+    discounts in line with their caps.
+"""
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .coupons import sync_redemption_counters
+from .models import ProductDiscount
+
+
+@receiver(post_save)
+def update_redemption_counters(sender, instance, raw=False, **kwargs):
+    """
+    Spreads the redemption cap of a discount across its counters after it has been saved. Receives saves of
+    every ProductDiscount subclass.
+
+    Args:
+        sender (Model): The model class that was saved.
+        instance (Model): The saved instance.
+        raw (bool): True when the instance is loaded from a fixture.
+        **kwargs: Arbitrary keyword arguments.
+    """
+    if raw or not isinstance(instance, ProductDiscount):
+        return
+    sync_redemption_counters(instance)
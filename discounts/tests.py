@@ -1,3 +1,103 @@
-from django.test import TestCase
+import threading
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import connections
+from django.test import TransactionTestCase
+
+from dynamic_pricing_system.group_commit import GroupCommitWriter
+from orders.models import Order
+from orders.services import place_orders
+from products.models import Product
+from .coupons import CouponExhausted, CustomerLimitReached, redemption_count
+from .models import PercentageDiscount
+
+
+class CouponRedemptionStressTests(TransactionTestCase):
+    """
+    Redeems capped discounts from many concurrent clients and checks that no cap is ever exceeded.
+    """
+    clients = 40
+    orders_per_client = 3
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Plain", price=Decimal('7.25'))
+        self.discount = PercentageDiscount.objects.create(
+            name="Flash", percentage=Decimal('10.00'), code="FLASH", max_redemptions=37, redemption_shards=4)
+
+    def run_clients(self, place, customer=lambda number: ''):
+        """
+        Places orders with the discount from concurrent client threads.
+
+        Returns:
+            list: The placed orders or raised errors.
+        """
+        results = [None] * (self.clients * self.orders_per_client)
+        barrier = threading.Barrier(self.clients)
+
+        def client(number):
+            try:
+                barrier.wait()
+                for offset in range(self.orders_per_client):
+                    data = {'discount': self.discount, 'customer': customer(number),
+                            'products': [{'product': self.product, 'quantity': 1}]}
+                    try:
+                        results[number * self.orders_per_client + offset] = place(data)
+                    except Exception as error:
+                        results[number * self.orders_per_client + offset] = error
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=client, args=(number,)) for number in range(self.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def assert_cap_reached(self, results):
+        placed = [result for result in results if isinstance(result, Order)]
+        errors = [result for result in results if not isinstance(result, Order)]
+        self.assertEqual(len(placed), self.discount.max_redemptions)
+        self.assertTrue(all(isinstance(error, CouponExhausted) for error in errors), errors)
+        self.assertEqual(Order.objects.filter(discount=self.discount).count(), self.discount.max_redemptions)
+        self.assertEqual(redemption_count(self.discount), self.discount.max_redemptions)
+
+    def test_global_cap_is_never_exceeded(self):
+        self.assert_cap_reached(self.run_clients(lambda data: place_orders([data])[0]))
+
+    def test_global_cap_is_never_exceeded_with_group_commit(self):
+        writer = GroupCommitWriter(place_orders, window=0.002)
+        try:
+            self.assert_cap_reached(self.run_clients(writer.write))
+        finally:
+            writer.close()
+        self.assertLess(writer.batches, self.clients * self.orders_per_client)
+
+    def test_per_customer_cap_is_never_exceeded(self):
+        self.discount.max_redemptions = None
+        self.discount.max_redemptions_per_customer = 2
+        self.discount.save()
+        results = self.run_clients(lambda data: place_orders([data])[0], customer=lambda number: f"c{number % 8}")
+        errors = [result for result in results if not isinstance(result, Order)]
+        self.assertTrue(all(isinstance(error, CustomerLimitReached) for error in errors), errors)
+        counts = {}
+        for customer in Order.objects.filter(discount=self.discount).values_list('customer', flat=True):
+            counts[customer] = counts.get(customer, 0) + 1
+        self.assertEqual(counts, {f"c{number}": 2 for number in range(8)})
+
+    def test_raising_the_cap_keeps_counted_redemptions(self):
+        self.discount.max_redemptions = 3
+        self.discount.save()
+        for _ in range(3):
+            place_orders([{'discount': self.discount, 'products': [{'product': self.product, 'quantity': 1}]}])
+        with self.assertRaises(CouponExhausted):
+            place_orders([{'discount': self.discount, 'products': [{'product': self.product, 'quantity': 1}]}])
+        self.assertEqual(Order.objects.count(), 3)
+
+        self.discount.max_redemptions = 5
+        self.discount.save()
+        for _ in range(2):
+            place_orders([{'discount': self.discount, 'products': [{'product': self.product, 'quantity': 1}]}])
+        with self.assertRaises(CouponExhausted):
+            place_orders([{'discount': self.discount, 'products': [{'product': self.product, 'quantity': 1}]}])
+        self.assertEqual(redemption_count(self.discount), 5)
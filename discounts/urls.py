@@ -1,8 +1,11 @@
 from django.urls import path
-from .views import DiscountListCreateView, PercentageDiscountListCreateView, FixedAmountDiscountListCreateView
+from .views import (DiscountListCreateView, PercentageDiscountListCreateView, FixedAmountDiscountListCreateView,
+                    DiscountBulkUpdateView, BundleOfferListCreateView)
 
 urlpatterns = [
     path('discounts/', DiscountListCreateView.as_view(), name='discount-list-create'),
     path('discounts/percentage/', PercentageDiscountListCreateView.as_view(), name='percentage-discount-list-create'),
     path('discounts/fixed/', FixedAmountDiscountListCreateView.as_view(), name='fixed-discount-list-create'),
+    path('discounts/bundles/', BundleOfferListCreateView.as_view(), name='bundle-offer-list-create'),
+    path('discounts/bulk-update/', DiscountBulkUpdateView.as_view(), name='discount-bulk-update'),
 ]
@@ -2,19 +2,23 @@
     discount/views.py
 
     This module defines API views for managing product discounts. It includes views for listing and
-    creating generic discounts, percentage-based discounts, and fixed amount discounts.
+    creating generic discounts, percentage-based discounts, fixed amount discounts and bundle offers, and a
+    view updating many discounts at once.
 """
 
 from rest_framework.response import Response
 from rest_framework import status, generics
 
 from constants import CREATED_SUCCESSFULLY, SOMETHING_WENT_WRONG
-from .constants import DISCOUNT, PERCENTAGE_DISCOUNT, FIXED_AMOUNT_DISCOUNT
-from .models import ProductDiscount, PercentageDiscount, FixedAmountDiscount
-from .serializers import DiscountSerializer, PercentageDiscountSerializer, FixedAmountDiscountSerializer
+from dynamic_pricing_system.bulk_updates import BulkUpdateAPIView
+from dynamic_pricing_system.sparse_fields import SparseFieldsetMixin
+from .constants import DISCOUNT, DISCOUNTS, PERCENTAGE_DISCOUNT, FIXED_AMOUNT_DISCOUNT, BUNDLE_OFFER
+from .models import ProductDiscount, PercentageDiscount, FixedAmountDiscount, BundleOffer
+from .serializers import (DiscountSerializer, PercentageDiscountSerializer, FixedAmountDiscountSerializer,
+                          DiscountBulkUpdateSerializer, BundleOfferSerializer)
 
 
-class DiscountListCreateView(generics.ListCreateAPIView):
+class DiscountListCreateView(SparseFieldsetMixin, generics.ListCreateAPIView):
     """
     Handles listing and creating generic discounts.
 
@@ -25,9 +29,11 @@ class DiscountListCreateView(generics.ListCreateAPIView):
         queryset (QuerySet): A queryset of all ProductDiscount instances.
         serializer_class (Serializer): The serializer class used for validating
         and deserializing discount data.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
     """
     queryset = ProductDiscount.objects.all()
     serializer_class = DiscountSerializer
+    query_budget = {'GET': 1, 'POST': 1}
 
     def create(self, request, *args, **kwargs):
         """
@@ -51,7 +57,7 @@ class DiscountListCreateView(generics.ListCreateAPIView):
                             status=status.HTTP_400_BAD_REQUEST)
 
 
-class PercentageDiscountListCreateView(generics.ListCreateAPIView):
+class PercentageDiscountListCreateView(SparseFieldsetMixin, generics.ListCreateAPIView):
     """
     Manages the creation and retrieval of percentage-based discounts.
 
@@ -61,9 +67,11 @@ class PercentageDiscountListCreateView(generics.ListCreateAPIView):
         queryset (QuerySet): A queryset of all PercentageDiscount instances.
         serializer_class (Serializer): The serializer class for validating and
         deserializing percentage discount data.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
     """
     queryset = PercentageDiscount.objects.all()
     serializer_class = PercentageDiscountSerializer
+    query_budget = {'GET': 1, 'POST': 2}
 
     def create(self, request, *args, **kwargs):
         """
@@ -88,7 +96,7 @@ class PercentageDiscountListCreateView(generics.ListCreateAPIView):
                             status=status.HTTP_400_BAD_REQUEST)
 
 
-class FixedAmountDiscountListCreateView(generics.ListCreateAPIView):
+class FixedAmountDiscountListCreateView(SparseFieldsetMixin, generics.ListCreateAPIView):
     """
     Allows listing and creating fixed amount discounts.
 
@@ -99,9 +107,11 @@ class FixedAmountDiscountListCreateView(generics.ListCreateAPIView):
         queryset (QuerySet): A queryset of all FixedAmountDiscount instances.
         serializer_class (Serializer): The serializer class for validating and
         deserializing fixed amount discount data.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
     """
     queryset = FixedAmountDiscount.objects.all()
     serializer_class = FixedAmountDiscountSerializer
+    query_budget = {'GET': 1, 'POST': 2}
 
     def create(self, request, *args, **kwargs):
         """
@@ -124,3 +134,58 @@ class FixedAmountDiscountListCreateView(generics.ListCreateAPIView):
         else:
             return Response({'error': SOMETHING_WENT_WRONG, 'details': serializer.errors},
                             status=status.HTTP_400_BAD_REQUEST)
+
+
+class DiscountBulkUpdateView(BulkUpdateAPIView):
+    """
+    Updates the percentages and amounts of many discounts at once, in one transaction.
+
+    Attributes:
+        base_model (Model): The ProductDiscount model.
+        field_models (dict): Maps every updatable field to the discount model declaring it.
+        serializer_class (Serializer): The serializer validating one item.
+        module (str): The name of the updated rows, used in the response message.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
+    """
+    base_model = ProductDiscount
+    field_models = {
+        'percentage': PercentageDiscount,
+        'amount': FixedAmountDiscount,
+    }
+    serializer_class = DiscountBulkUpdateSerializer
+    module = DISCOUNTS
+    query_budget = {'PATCH': 3}
+
+
+class BundleOfferListCreateView(generics.ListCreateAPIView):
+    """
+    Handles listing and creating bundle offers.
+
+    Attributes:
+        queryset (QuerySet): A queryset of all BundleOffer instances, with their products.
+        serializer_class (Serializer): The serializer class for validating bundle offer data.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
+    """
+    queryset = BundleOffer.objects.prefetch_related('products').order_by('id')
+    serializer_class = BundleOfferSerializer
+    query_budget = {'GET': 2, 'POST': 5}
+
+    def create(self, request, *args, **kwargs):
+        """
+        Creates a new bundle offer using the provided data.
+
+        Args:
+            request (Request): The HTTP request containing bundle offer data.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+
+        Returns:
+            Response: A response containing the created bundle offer data or error details.
+        """
+        serializer = self.get_serializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response({'message': CREATED_SUCCESSFULLY.replace("{module}", BUNDLE_OFFER),
+                             'data': serializer.data}, status=status.HTTP_201_CREATED)
+        return Response({'error': SOMETHING_WENT_WRONG, 'details': serializer.errors},
+                        status=status.HTTP_400_BAD_REQUEST)
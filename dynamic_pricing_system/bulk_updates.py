@@ -0,0 +1,334 @@
+"""
+    dynamic_pricing_system/bulk_updates.py
+
+    This module updates the fields of many rows of a multi-table inheritance hierarchy (products, discounts)
+    at once. Each item names a row and the new values of some of its fields; the items are checked against
+    the concrete type of their row, written table by table, and committed or rolled back together.
+    `BulkUpdateAPIView` exposes this as a PATCH endpoint.
+
+    Rows are written with one parameterized UPDATE per row, sent to the database in batches with
+    `executemany`. Django's `bulk_update` builds a CASE expression over every batch, which costs more to
+    build in Python, and on SQLite to evaluate, than the rows it writes.
+
+    Items may carry the `updated_at` value the client last read. Those rows are updated only if they did not
+    change in the meantime: conditional UPDATEs compare the timestamps while claiming the rows, and any
+    mismatch rolls the whole request back. The claims are the first statements of the transaction, so that
+    it holds the write lock before reading the rows; no other row locks are taken.
+
+    After the commit `rows_bulk_updated` is sent with the updated instances, since no `post_save` is sent,
+    so that caches can invalidate exactly the updated rows.
+"""
+
+from django.db import connections, router, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from rest_framework import generics, serializers, status
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from constants import (UPDATED_SUCCESSFULLY, BULK_UPDATE_ITEMS_REQUIRED, TOO_MANY_BULK_UPDATE_ITEMS,
+                       BULK_UPDATE_NO_FIELDS, BULK_UPDATE_DUPLICATE_IDS, BULK_UPDATE_ROWS_NOT_FOUND,
+                       BULK_UPDATE_FIELDS_NOT_APPLICABLE, BULK_UPDATE_CONFLICT)
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Sent after the commit of a bulk update, with the base model as sender and the updated concrete
+# instances as `instances`.
+rows_bulk_updated = Signal()
+
+
+class BulkUpdateError(Exception):
+    """
+    Raised when a bulk update is rejected. Nothing has been written.
+
+    Attributes:
+        message (str): The error message.
+        status_code (int): The HTTP status code to respond with.
+        details (dict): The rows causing the error.
+    """
+
+    def __init__(self, message, status_code, details):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.details = details
+
+
+class BulkUpdateListSerializer(serializers.ListSerializer):
+    """
+    Validates the items of a bulk update field by field, skipping the per-item serializer machinery that
+    dominates the validation of large requests. Errors are reported per item as with `ListSerializer`.
+    """
+
+    def run_child_validation(self, data):
+        """
+        Validates one item with the fields and the `validate` method of the child serializer.
+
+        Args:
+            data (dict): The item as sent by the client.
+
+        Returns:
+            dict: The validated item.
+        """
+        if not isinstance(data, dict):
+            message = self.child.error_messages['invalid'].format(datatype=type(data).__name__)
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]})
+        fields = self.child.fields
+        attrs, errors = {}, {}
+        for name, field in fields.items():
+            if name in data:
+                try:
+                    attrs[name] = field.run_validation(data[name])
+                except serializers.ValidationError as error:
+                    errors[name] = error.detail
+            elif field.required:
+                errors[name] = [field.error_messages['required']]
+        if errors:
+            raise serializers.ValidationError(errors)
+        try:
+            return self.child.validate(attrs)
+        except serializers.ValidationError as error:
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: error.detail})
+
+
+class BulkUpdateItemSerializer(serializers.Serializer):
+    """
+    Base serializer validating one item of a bulk update. Subclasses declare the updatable fields, all
+    optional.
+
+    Attributes:
+        id (IntegerField): The id of the row to update.
+        updated_at (DateTimeField): The `updated_at` of the row as last read by the client. When given,
+            the row is only updated if it has not changed since.
+    """
+    id = serializers.IntegerField(min_value=1)
+    updated_at = serializers.DateTimeField(required=False)
+
+    class Meta:
+        list_serializer_class = BulkUpdateListSerializer
+
+    def validate(self, attrs):
+        """
+        Checks that the item changes at least one field.
+
+        Args:
+            attrs (dict): The validated item.
+
+        Returns:
+            dict: The validated item.
+        """
+        if not set(attrs) - {'id', 'updated_at'}:
+            raise serializers.ValidationError(BULK_UPDATE_NO_FIELDS)
+        return attrs
+
+
+def batches(items, batch_size):
+    """
+    Splits a list into consecutive slices.
+
+    Args:
+        items (list): The list to split.
+        batch_size (int): The largest length of a slice.
+
+    Yields:
+        list: The slices.
+    """
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def execute_updates(model, sql, params, batch_size):
+    """
+    Runs an UPDATE statement of a model's table for many parameter sets.
+
+    Args:
+        model (Model): The model owning the table.
+        sql (str): The UPDATE statement.
+        params (list): The parameters of every row.
+        batch_size (int): The number of rows sent to the database at once.
+
+    Returns:
+        int: The number of updated rows.
+    """
+    connection = connections[router.db_for_write(model)]
+    updated = 0
+    with connection.cursor() as cursor:
+        for batch in batches(params, batch_size):
+            cursor.executemany(sql, batch)
+            updated += cursor.rowcount
+    return updated
+
+
+def update_table(model, instances, fields, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Writes fields declared by a model to its own table, for many instances.
+
+    Args:
+        model (Model): The model declaring the fields.
+        instances (list): The instances holding the new values.
+        fields (Iterable[str]): The names of the fields to write.
+        batch_size (int): The number of rows sent to the database at once.
+
+    Returns:
+        int: The number of updated rows.
+    """
+    connection = connections[router.db_for_write(model)]
+    quote_name = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in fields]
+    sql = 'UPDATE %s SET %s WHERE %s = %%s' % (
+        quote_name(model._meta.db_table),
+        ', '.join('%s = %%s' % quote_name(field.column) for field in fields),
+        quote_name(model._meta.pk.column),
+    )
+    params = [[field.get_db_prep_save(getattr(instance, field.attname), connection) for field in fields]
+              + [instance.pk] for instance in instances]
+    return execute_updates(model, sql, params, batch_size)
+
+
+def claim_unchanged_rows(base_model, expected, now, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Sets `updated_at` of rows to `now`, provided it still holds the expected value.
+
+    Args:
+        base_model (Model): The base model of the hierarchy, holding `updated_at`.
+        expected (list): The (pk, updated_at) pairs read by the client.
+        now (datetime): The new timestamp.
+        batch_size (int): The number of rows sent to the database at once.
+
+    Returns:
+        list: The ids of the rows that changed since the client read them.
+    """
+    if not expected:
+        return []
+    connection = connections[router.db_for_write(base_model)]
+    quote_name = connection.ops.quote_name
+    field = base_model._meta.get_field('updated_at')
+    sql = 'UPDATE %s SET %s = %%s WHERE %s = %%s AND %s = %%s' % (
+        quote_name(base_model._meta.db_table), quote_name(field.column),
+        quote_name(base_model._meta.pk.column), quote_name(field.column),
+    )
+    now_value = field.get_db_prep_save(now, connection)
+    params = [[now_value, pk, field.get_db_prep_save(timestamp, connection)] for pk, timestamp in expected]
+    if execute_updates(base_model, sql, params, batch_size) == len(expected):
+        return []
+    ids = [pk for pk, _ in expected]
+    claimed = set()
+    for batch in batches(ids, batch_size):
+        claimed.update(base_model.objects.filter(pk__in=batch, updated_at=now).values_list('pk', flat=True))
+    return [pk for pk in ids if pk not in claimed]
+
+
+def bulk_update_rows(base_model, field_models, items, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Updates many rows of a model hierarchy in one transaction.
+
+    Args:
+        base_model (Model): The base model of the hierarchy. Its manager must provide `with_subtypes()`
+            and its instances `get_concrete()`.
+        field_models (dict): Maps every updatable field name to the model declaring it.
+        items (list): The validated items, each with an `id`, an optional `updated_at` and the new values
+            of some fields.
+        batch_size (int): The number of rows sent to the database at once.
+
+    Returns:
+        tuple: The updated concrete instances, in item order, and their new `updated_at`.
+
+    Raises:
+        BulkUpdateError: If ids are repeated or unknown, if a field does not exist on the type of its row,
+            or if rows changed since the client read them.
+    """
+    ids = [item['id'] for item in items]
+    if len(set(ids)) != len(ids):
+        seen = set()
+        duplicates = sorted({pk for pk in ids if pk in seen or seen.add(pk)})
+        raise BulkUpdateError(BULK_UPDATE_DUPLICATE_IDS, 400, {'duplicates': duplicates})
+
+    now = timezone.now()
+    with transaction.atomic(using=router.db_for_write(base_model)):
+        # Write before reading: SQLite cannot upgrade the read lock of a transaction to a write lock while
+        # another transaction writes, and fails at once instead of waiting for its busy timeout. The claims
+        # and the timestamps are rolled back with the rest if the update is rejected.
+        conflicts = claim_unchanged_rows(
+            base_model, [(item['id'], item['updated_at']) for item in items if item.get('updated_at')], now,
+            batch_size)
+        # The timestamp lives on the base table, whichever table holds the changed fields.
+        for batch in batches(ids, batch_size):
+            base_model.objects.filter(pk__in=batch).update(updated_at=now)
+
+        rows = base_model.objects.with_subtypes().in_bulk(ids)
+        missing = [pk for pk in ids if pk not in rows]
+        if missing:
+            raise BulkUpdateError(BULK_UPDATE_ROWS_NOT_FOUND, 404, {'missing': missing})
+
+        instances, invalid = [], []
+        updates = {}
+        for item in items:
+            instance = rows[item['id']].get_concrete()
+            fields = [name for name in item if name in field_models]
+            not_applicable = [name for name in fields if not isinstance(instance, field_models[name])]
+            if not_applicable:
+                invalid.append({'id': item['id'], 'fields': not_applicable})
+                continue
+            for name in fields:
+                setattr(instance, name, item[name])
+            # Only the fields named by an item are written, grouped by table and set of fields.
+            for model in {field_models[name] for name in fields}:
+                model_fields = tuple(sorted(name for name in fields if field_models[name] is model))
+                updates.setdefault((model, model_fields), []).append(instance)
+            instance.updated_at = now
+            instances.append(instance)
+        if invalid:
+            raise BulkUpdateError(BULK_UPDATE_FIELDS_NOT_APPLICABLE, 400, {'invalid': invalid})
+        if conflicts:
+            raise BulkUpdateError(BULK_UPDATE_CONFLICT, 409, {'conflicts': conflicts})
+
+        for (model, fields), updated in updates.items():
+            update_table(model, updated, fields, batch_size)
+        transaction.on_commit(lambda: rows_bulk_updated.send(sender=base_model, instances=instances))
+    return instances, now
+
+
+class BulkUpdateAPIView(generics.GenericAPIView):
+    """
+    Base view updating many rows of a model hierarchy with one PATCH request of the form
+    `{"items": [{"id": 1, "updated_at": "...", "<field>": <value>}, ...]}`.
+
+    Attributes:
+        base_model (Model): The base model of the hierarchy.
+        field_models (dict): Maps every updatable field name to the model declaring it.
+        serializer_class (Serializer): The serializer validating one item.
+        module (str): The name of the updated rows, used in the response message.
+        max_items (int): The largest number of items accepted in one request.
+    """
+    base_model = None
+    field_models = {}
+    module = None
+    max_items = 100000
+
+    def patch(self, request, *args, **kwargs):
+        """
+        Updates the rows listed in the request body, all or nothing.
+
+        Args:
+            request (Request): The HTTP request containing the items to update.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+
+        Returns:
+            Response: A response containing the number of updated rows and their new `updated_at`, or
+            the rows that prevented the update.
+        """
+        items = request.data.get('items') if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not items:
+            return Response({'error': BULK_UPDATE_ITEMS_REQUIRED}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_items:
+            return Response({'error': TOO_MANY_BULK_UPDATE_ITEMS.replace("{limit}", str(self.max_items))},
+                            status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(data=items, many=True)
+        serializer.is_valid(raise_exception=True)
+        try:
+            instances, updated_at = bulk_update_rows(self.base_model, self.field_models, serializer.validated_data)
+        except BulkUpdateError as error:
+            return Response({'error': error.message, 'details': error.details}, status=error.status_code)
+        return Response({'message': UPDATED_SUCCESSFULLY.replace("{module}", self.module),
+                         'data': {'updated': len(instances), 'updated_at': updated_at}})
@@ -0,0 +1,146 @@
+"""
+    dynamic_pricing_system/compression.py
+
+    This module compresses responses with the best encoding accepted by the client. Brotli is preferred
+    when the optional `brotli` package is installed, gzip otherwise. Responses smaller than MIN_SIZE bytes
+    are sent as they are, since compressing them costs more time than it saves on the wire.
+
+    Streaming responses, such as the live price streams, are never compressed: compressing them would
+    buffer their events.
+"""
+
+import gzip
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BROTLI = 'br'
+GZIP = 'gzip'
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 4,
+    'CONTENT_TYPES': ('application/json', 'text/'),
+}
+
+ACCEPT_ENCODING_RE = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def get_setting(name):
+    """
+    Returns a compression setting, falling back to its default value.
+
+    Args:
+        name (str): The name of the setting in the RESPONSE_COMPRESSION dict.
+
+    Returns:
+        object: The setting value.
+    """
+    return getattr(settings, 'RESPONSE_COMPRESSION', {}).get(name, DEFAULTS[name])
+
+
+def available_encodings():
+    """
+    Returns the supported encodings, most preferred first.
+
+    Returns:
+        list: The encoding names.
+    """
+    return [BROTLI, GZIP] if brotli is not None else [GZIP]
+
+
+def negotiate_encoding(accept_encoding, encodings):
+    """
+    Picks the encoding of a response from the Accept-Encoding header of the request.
+
+    Among the encodings the client accepts with the highest quality value, the first of `encodings` wins.
+
+    Args:
+        accept_encoding (str): The Accept-Encoding header.
+        encodings (list): The supported encodings, most preferred first.
+
+    Returns:
+        str: The chosen encoding, or None to send the response uncompressed.
+    """
+    qualities = {}
+    for part in accept_encoding.split(','):
+        match = ACCEPT_ENCODING_RE.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+        qualities[match.group(1).lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(content, encoding):
+    """
+    Compresses a response body.
+
+    Args:
+        content (bytes): The response body.
+        encoding (str): The encoding, BROTLI or GZIP.
+
+    Returns:
+        bytes: The compressed body.
+    """
+    if encoding == BROTLI:
+        return brotli.compress(content, quality=get_setting('BROTLI_QUALITY'))
+    return gzip.compress(content, compresslevel=get_setting('GZIP_LEVEL'), mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of compressible content types larger than MIN_SIZE bytes.
+
+    The Vary header of compressible responses always includes Accept-Encoding, so that caches keep the
+    compressed and uncompressed variants apart. Strong ETags of compressed responses are made weak, as the
+    compressed body is no longer byte-for-byte identical to the one they were computed from.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = get_setting('ENABLED')
+        self.min_size = get_setting('MIN_SIZE')
+        self.content_types = tuple(get_setting('CONTENT_TYPES'))
+        self.encodings = available_encodings()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.enabled or response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith(self.content_types):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < self.min_size:
+            return response
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.encodings)
+        if encoding is None:
+            return response
+
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,102 @@
+"""
+    dynamic_pricing_system/db_router.py
+
+    This module routes reads to the replica databases listed in DATABASE_REPLICAS and writes to the primary
+    (`default`) database, with read-your-writes consistency: once a request writes, it reads from the primary
+    for the rest of the request, and the client keeps reading from the primary for REPLICA_PIN_SECONDS
+    seconds through a cookie set by `ReadYourWritesMiddleware`.
+"""
+
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'db_primary_until'
+
+_pinned = ContextVar('db_pinned_to_primary', default=False)
+_wrote = ContextVar('db_wrote', default=False)
+
+
+def pin_to_primary():
+    """
+    Sends every following read of the current request (or context) to the primary database.
+    """
+    _pinned.set(True)
+
+
+def get_replicas():
+    """
+    Returns the aliases of the replica databases.
+
+    Returns:
+        list: The configured replica aliases.
+    """
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class PrimaryReplicaRouter:
+    """
+    Database router sending reads to a random replica and writes to the primary.
+
+    Reads go to the primary when no replica is configured, when the current request has written or is
+    pinned by the read-your-writes cookie, when a transaction is open on the primary, or when the model
+    sets `read_from_primary = True`.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if (not replicas or _pinned.get() or getattr(model, 'read_from_primary', False)
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _pinned.set(True)
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pins requests to the primary database after a write.
+
+    Unsafe requests and requests carrying an unexpired pin cookie read from the primary. Responses to
+    requests that wrote set the cookie for REPLICA_PIN_SECONDS seconds.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not get_replicas():
+            return self.get_response(request)
+
+        pinned_until = request.COOKIES.get(PIN_COOKIE)
+        try:
+            pinned = pinned_until is not None and float(pinned_until) > time.time()
+        except ValueError:
+            pinned = False
+        pinned_token = _pinned.set(pinned or request.method not in ('GET', 'HEAD', 'OPTIONS'))
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                window = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+                response.set_cookie(PIN_COOKIE, str(time.time() + window), max_age=window, httponly=True,
+                                    samesite='Lax')
+        finally:
+            _pinned.reset(pinned_token)
+            _wrote.reset(wrote_token)
+        return response
@@ -0,0 +1,214 @@
+"""
+    dynamic_pricing_system/group_commit.py
+
+    This module coalesces concurrent writes into shared transactions. Request threads hand their write to a
+    `GroupCommitWriter` and wait for its result; a single writer thread collects the writes arriving within a
+    short window and runs them together in one transaction, so that concurrent requests do not queue on the
+    database write lock (SQLite allows a single writer) and share the cost of one commit.
+
+    Every request still gets its own result or error. The writes of a group are first run together in a
+    savepoint; if that fails, each write is retried in its own savepoint, and if the transaction fails as a
+    whole at commit (for example on deferred foreign key checks), each write is retried in its own
+    transaction. Results are only handed back once their transaction has committed.
+
+    A thread that stops waiting after `timeout` seconds gets `GroupCommitTimeout`: its write is still queued
+    or being written, and may yet commit, so its outcome is unknown rather than failed.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+
+class GroupCommitTimeout(Exception):
+    """
+    Raised when a write was not written within the timeout. It may still be written later.
+    """
+
+
+class GroupCommitWriter:
+    """
+    Runs writes submitted by many threads in shared transactions on a dedicated writer thread.
+
+    Attributes:
+        handler (callable): Writes a list of items and returns one result per item, in order.
+        window (float): The number of seconds the writer waits for more items after the first one.
+        max_batch (int): The largest number of items written in one transaction.
+        timeout (float): The number of seconds a submitting thread waits for its result.
+        using (str): The alias of the database written to.
+        batches (int): The number of transactions committed so far.
+        items (int): The number of items written so far.
+    """
+
+    def __init__(self, handler, window=0.002, max_batch=100, timeout=30.0, using=DEFAULT_DB_ALIAS):
+        self.handler = handler
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.using = using
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+    def submit(self, item):
+        """
+        Queues an item for the next group of writes.
+
+        Args:
+            item: The item passed to the handler.
+
+        Returns:
+            Future: Resolved with the result of the item once its transaction has committed.
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The group commit writer is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='group-commit-writer', daemon=True)
+                self._thread.start()
+            self._queue.put((item, future))
+        return future
+
+    def write(self, item):
+        """
+        Writes an item in the next group and waits for its result.
+
+        Args:
+            item: The item passed to the handler.
+
+        Returns:
+            The result returned by the handler for the item.
+
+        Raises:
+            GroupCommitTimeout: If the item was not written within the timeout; it may still be written.
+            Exception: The error raised while writing the item.
+        """
+        try:
+            return self.submit(item).result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise GroupCommitTimeout(f"The write did not complete within {self.timeout} seconds")
+
+    def close(self):
+        """
+        Writes the items already queued, then stops the writer thread and closes its database connection.
+        """
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _collect(self, first):
+        """
+        Collects the items arriving within the window after the first one.
+
+        Args:
+            first (tuple): The first (item, future) pair of the group.
+
+        Returns:
+            tuple: The (item, future) pairs of the group, and whether the writer was asked to stop.
+        """
+        group = [first]
+        deadline = time.monotonic() + self.window
+        while len(group) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                return group, True
+            group.append(entry)
+        return group, False
+
+    def _run(self):
+        try:
+            stop = False
+            while not stop:
+                entry = self._queue.get()
+                if entry is None:
+                    break
+                group, stop = self._collect(entry)
+                try:
+                    self._commit(group)
+                except Exception as error:
+                    # The writer thread must outlive any error, or every later write would wait for it in vain.
+                    connections[self.using].close()
+                    for _, future in group:
+                        if not future.done():
+                            future.set_exception(error)
+        finally:
+            connections[self.using].close()
+
+    def _commit(self, group):
+        """
+        Writes a group of items and resolves their futures once committed.
+
+        Args:
+            group (list): The (item, future) pairs of the group.
+        """
+        items = [item for item, _ in group]
+        try:
+            with transaction.atomic(using=self.using):
+                outcomes = self._write_group(items)
+            self.batches += 1
+        except DatabaseError:
+            # The transaction failed as a whole: write every item in a transaction of its own.
+            connections[self.using].close_if_unusable_or_obsolete()
+            outcomes = [self._write_alone(item) for item in items]
+            self.batches += len(items)
+        self.items += len(items)
+        for (_, future), (result, error) in zip(group, outcomes):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def _write_group(self, items):
+        """
+        Writes the items of a group in the current transaction, together if possible and one by one
+        otherwise.
+
+        Args:
+            items (list): The items of the group.
+
+        Returns:
+            list: The (result, error) pair of every item.
+        """
+        try:
+            with transaction.atomic(using=self.using):
+                return [(result, None) for result in self.handler(items)]
+        except Exception:
+            outcomes = []
+            for item in items:
+                try:
+                    with transaction.atomic(using=self.using):
+                        outcomes.append((self.handler([item])[0], None))
+                except Exception as error:
+                    outcomes.append((None, error))
+            return outcomes
+
+    def _write_alone(self, item):
+        """
+        Writes one item in a transaction of its own.
+
+        Args:
+            item: The item to write.
+
+        Returns:
+            tuple: The result and the error of the item, one of them None.
+        """
+        try:
+            with transaction.atomic(using=self.using):
+                return self.handler([item])[0], None
+        except Exception as error:
+            connections[self.using].close_if_unusable_or_obsolete()
+            return None, error
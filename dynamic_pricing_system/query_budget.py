@@ -0,0 +1,284 @@
+"""
+    dynamic_pricing_system/query_budget.py
+
+    This module enforces query budgets. Views declare, per HTTP method, the number of queries a request may
+    run in a `query_budget` class attribute, and serializers the number of queries rendering them may run in
+    theirs, loading the querysets they are given included, whatever the number of serialized instances.
+    Budgets are constants: a request whose query count grows with the number of rows it reads or writes, such
+    as an N+1 query, ends up exceeding its budget.
+
+    Transaction control statements (BEGIN, SAVEPOINT, RELEASE and ROLLBACK TO SAVEPOINT) are not counted:
+    whether a request issues them depends on whether it runs inside a transaction already, as it does in a
+    TestCase, and not on the work it does.
+
+    With DEBUG on, `QueryBudgetMiddleware` counts the queries of every request and reports the requests
+    exceeding a budget with the SQL they ran more than once and the call stacks running it. Read-only requests
+    fail with QueryBudgetExceeded; requests which wrote, and may have committed, keep their response and the
+    overrun is logged and flagged in the X-Query-Budget-Exceeded header instead. The tests exercise every
+    endpoint with 1, 10 and 100 rows, see `QueryBudgetTests` in `orders/tests.py`.
+
+    Example:
+        class OrderListCreateView(generics.ListCreateAPIView):
+            query_budget = {'GET': 2, 'POST': 12}
+
+        class OrderSerializer(serializers.ModelSerializer):
+            query_budget = 2
+"""
+
+import logging
+import os
+import re
+import sys
+from collections import Counter, namedtuple
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import URLResolver, get_resolver
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+DEFAULTS = {
+    'ENABLED': None,
+    'STACK_DEPTH': 8,
+    'REPORT_LIMIT': 5,
+}
+
+RecordedQuery = namedtuple('RecordedQuery', ['sql', 'serializer', 'stack'])
+
+TRANSACTION_CONTROL = re.compile(r'\s*(BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE)\b', re.IGNORECASE)
+
+READ = re.compile(r'\s*(SELECT|WITH|EXPLAIN|PRAGMA)\b', re.IGNORECASE)
+
+logger = logging.getLogger(__name__)
+
+
+def get_setting(name):
+    """
+    Returns a query budget setting, falling back to its default value.
+
+    Args:
+        name (str): The name of the setting in the QUERY_BUDGET dict.
+
+    Returns:
+        object: The setting value.
+    """
+    return getattr(settings, 'QUERY_BUDGET', {}).get(name, DEFAULTS[name])
+
+
+def is_enabled():
+    """
+    Checks whether requests are held to their query budgets.
+
+    Returns:
+        bool: QUERY_BUDGET['ENABLED'], or DEBUG when it is not set.
+    """
+    enabled = get_setting('ENABLED')
+    return settings.DEBUG if enabled is None else enabled
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    Raised when a request runs more queries than the budget of its view or of a serializer it renders.
+    """
+
+
+def inspect_caller(frame, root, depth):
+    """
+    Finds the serializer rendering the caller of a query, and the project frames of its call stack.
+
+    Args:
+        frame (frame): The frame running the query.
+        root (str): The project directory; frames of other files, and of installed packages, are skipped.
+        depth (int): The largest number of frames kept.
+
+    Returns:
+        tuple: The class of the outermost serializer rendering the caller, or None, and the
+        "path:line in function" descriptions of the project frames, outermost first.
+    """
+    serializer, stack = None, []
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == 'to_representation' and isinstance(frame.f_locals.get('self'), BaseSerializer):
+            serializer = frame.f_locals['self']
+        filename = code.co_filename
+        if (len(stack) < depth and filename.startswith(root) and 'site-packages' not in filename
+                and filename != __file__):
+            stack.append(f"{os.path.relpath(filename, root)}:{frame.f_lineno} in {code.co_name}")
+        frame = frame.f_back
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+    return type(serializer) if serializer is not None else None, tuple(reversed(stack))
+
+
+class QueryRecorder:
+    """
+    Records the queries run on every database connection of the current thread, with the serializer and
+    the call stack running them. Transaction control statements are run but not recorded.
+
+    Attributes:
+        queries (list): The RecordedQuery of every query, in order. Batches sent with `executemany` count as
+            one query.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.root = str(settings.BASE_DIR) + os.sep
+        self.depth = get_setting('STACK_DEPTH')
+        self.exit_stack = None
+
+    def __enter__(self):
+        self.exit_stack = ExitStack()
+        for alias in connections:
+            self.exit_stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.exit_stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        if not TRANSACTION_CONTROL.match(sql):
+            self.queries.append(RecordedQuery(sql, *inspect_caller(sys._getframe(1), self.root, self.depth)))
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def wrote(self):
+        """
+        Checks whether any recorded query may have written to the database.
+
+        Returns:
+            bool: True if a recorded query is not a read.
+        """
+        return any(not READ.match(query.sql) for query in self.queries)
+
+    def serializer_counts(self):
+        """
+        Counts the queries run while rendering serializers.
+
+        Returns:
+            Counter: The number of queries by outermost serializer class.
+        """
+        return Counter(query.serializer for query in self.queries if query.serializer is not None)
+
+    def duplicates(self):
+        """
+        Groups the queries by SQL, parameters aside, keeping the SQL run more than once.
+
+        Returns:
+            list: The queries of every repeated SQL statement, most repeated first.
+        """
+        groups = {}
+        for query in self.queries:
+            groups.setdefault(query.sql, []).append(query)
+        return sorted((group for group in groups.values() if len(group) > 1), key=len, reverse=True)
+
+    def report(self):
+        """
+        Describes the most repeated SQL statements and the call stacks running them.
+
+        Returns:
+            str: The report, one block per statement, up to QUERY_BUDGET['REPORT_LIMIT'] statements.
+        """
+        lines = [f"{len(self)} queries"]
+        duplicates = self.duplicates()
+        for group in duplicates[:get_setting('REPORT_LIMIT')]:
+            lines.append(f"  {len(group)} x {group[0].sql}")
+            stacks = Counter(query.stack for query in group)
+            for stack, count in stacks.most_common(2):
+                lines.append(f"    from {count} call(s) at:")
+                lines.extend(f"      {frame}" for frame in stack)
+        if not duplicates:
+            lines.append("  No SQL statement was run more than once")
+        return "\n".join(lines)
+
+
+def view_budget(view_class, method):
+    """
+    Returns the query budget of a view for an HTTP method.
+
+    Args:
+        view_class (type): The class-based view, or None.
+        method (str): The HTTP method.
+
+    Returns:
+        int: The largest number of queries of a request, or None if the view declares none.
+    """
+    return getattr(view_class, 'query_budget', {}).get(method)
+
+
+def budget_violations(recorder, view_class, method):
+    """
+    Checks the queries of a request against the budgets of its view and of the serializers it rendered.
+
+    Args:
+        recorder (QueryRecorder): The queries of the request.
+        view_class (type): The class-based view handling the request, or None.
+        method (str): The HTTP method.
+
+    Returns:
+        list: A message for every exceeded budget, empty if the request kept within its budgets.
+    """
+    violations = []
+    budget = view_budget(view_class, method)
+    if budget is not None and len(recorder) > budget:
+        violations.append(f"{view_class.__name__} ran {len(recorder)} queries for {method}, its budget is {budget}")
+    for serializer_class, count in recorder.serializer_counts().items():
+        budget = getattr(serializer_class, 'query_budget', None)
+        if budget is not None and count > budget:
+            violations.append(f"{serializer_class.__name__} ran {count} queries, its budget is {budget}")
+    return violations
+
+
+def api_views(patterns=None, prefix=''):
+    """
+    Lists the class-based views routed by the URL configuration, outside of the admin site.
+
+    Args:
+        patterns (list): The URL patterns to walk, the root URL configuration by default.
+        prefix (str): The route of the walked patterns.
+
+    Returns:
+        list: The (url_name, route, view_class) of every routed view.
+    """
+    views = []
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace != 'admin':
+                views.extend(api_views(pattern.url_patterns, route))
+        else:
+            views.append((pattern.name, route, getattr(pattern.callback, 'view_class', None)))
+    return views
+
+
+class QueryBudgetMiddleware:
+    """
+    Reports the requests running more queries than their budgets allow. Read-only requests fail with
+    QueryBudgetExceeded and its report; the response of a request which wrote is kept, since its transaction
+    may be committed already, and the report is logged and the violations listed in the
+    X-Query-Budget-Exceeded header. The middleware is only loaded when QUERY_BUDGET['ENABLED'] is on, by
+    default when DEBUG is.
+    """
+
+    def __init__(self, get_response):
+        if not is_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        violations = budget_violations(recorder, getattr(request, '_query_budget_view', None), request.method)
+        if violations:
+            message = "\n".join(violations + [recorder.report()])
+            if not recorder.wrote():
+                raise QueryBudgetExceeded(message)
+            logger.error("%s %s exceeded its query budget: %s", request.method, request.path, message)
+            response['X-Query-Budget-Exceeded'] = "; ".join(violations)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget_view = getattr(view_func, 'view_class', None)
+        return None
@@ -0,0 +1,111 @@
+"""
+    dynamic_pricing_system/related_fields.py
+
+    This module resolves the primary keys sent in request bodies to model instances with one query per
+    field, rather than one per key. `PrimaryKeyRelatedField` gets every instance it validates separately,
+    so a list of 100 product ids, or 100 order lines naming a product each, costs 100 queries.
+
+    ModelSerializers opt in with `serializer_related_field = BulkPrimaryKeyRelatedField`. Fields with
+    `many=True` then load all their keys at once; serializers validated with `many=True`, such as the lines
+    of an order, also need `BulkRelatedListSerializer` as their `list_serializer_class`.
+"""
+
+from django.db import connections
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+
+def primary_key(value):
+    """
+    Returns a primary key sent by a client as an integer.
+
+    Args:
+        value (object): The value sent.
+
+    Returns:
+        int: The primary key, or None if the value is not an integer or a string of digits.
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+def primary_key_range(queryset):
+    """
+    Returns the range of the primary key column of the model of a queryset, in the database it reads from.
+    Filtering with keys out of it, such as with an `__in` lookup, raises OverflowError on SQLite.
+
+    Args:
+        queryset (QuerySet): The queryset.
+
+    Returns:
+        tuple: The smallest and largest primary keys, None when unbounded.
+    """
+    pk = queryset.model._meta.pk
+    return connections[queryset.db].ops.integer_field_range(pk.get_internal_type())
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField resolving keys from the instances loaded by `load`. Keys not loaded, including
+    those of missing rows, are resolved and reported one by one as by `PrimaryKeyRelatedField`.
+
+    Attributes:
+        instances (dict): The instances loaded, by primary key.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.instances = {}
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        list_kwargs.update((key, value) for key, value in kwargs.items() if key in MANY_RELATION_KWARGS)
+        return BulkManyRelatedField(**list_kwargs)
+
+    def load(self, values):
+        """
+        Loads the instances of many primary keys with one query. Keys out of the range of the primary key
+        column are left to the per-key path, which reports them as missing, since `in_bulk` would overflow.
+
+        Args:
+            values (Iterable): The primary keys sent, valid or not.
+        """
+        queryset = self.get_queryset()
+        low, high = primary_key_range(queryset)
+        keys = {key for key in map(primary_key, values) if key is not None and (low is None or low <= key)
+                and (high is None or key <= high)} - set(self.instances)
+        if keys and self.pk_field is None:
+            self.instances.update(queryset.in_bulk(keys))
+
+    def to_internal_value(self, data):
+        instance = self.instances.get(primary_key(data)) if self.pk_field is None else None
+        return instance if instance is not None else super().to_internal_value(data)
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """
+    ManyRelatedField loading all the instances of its keys with one query.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.child_relation.load(data)
+        return super().to_internal_value(data)
+
+
+class BulkRelatedListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer loading the instances of every `BulkPrimaryKeyRelatedField` of its items with one query
+    per field.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            for field in self.child.fields.values():
+                if isinstance(field, BulkPrimaryKeyRelatedField) and not field.read_only:
+                    field.load(item.get(field.field_name) for item in data if isinstance(item, dict))
+        return super().to_internal_value(data)
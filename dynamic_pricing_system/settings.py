@@ -41,11 +41,21 @@ INSTALLED_APPS = [
     'products',
     'discounts',
     'orders',
+    'pricing',
+    'currencies',
+    'repricing',
+    'carts',
+    'outbox',
+    'benchmarks',
     'rest_framework'
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'dynamic_pricing_system.query_budget.QueryBudgetMiddleware',
+    'dynamic_pricing_system.compression.CompressionMiddleware',
+    'dynamic_pricing_system.throttling.LoadSheddingMiddleware',
+    'dynamic_pricing_system.db_router.ReadYourWritesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -82,9 +92,29 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'dynami_pricing_system.sqlite3',
+        # A file rather than an in-memory database, so that concurrency tests see SQLite locking as deployed.
+        'TEST': {'NAME': BASE_DIR / 'test_dynami_pricing_system.sqlite3'},
     }
 }
 
+# Read replicas
+# Comma separated replica aliases, e.g. DATABASE_REPLICAS=replica1,replica2. Locally every replica is an
+# SQLite file next to the primary; in tests the replicas mirror the test database of the primary.
+
+DATABASE_REPLICAS = [alias for alias in os.getenv('DATABASE_REPLICAS', '').split(',') if alias]
+
+for replica in DATABASE_REPLICAS:
+    DATABASES[replica] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'dynami_pricing_system_{replica}.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['dynamic_pricing_system.db_router.PrimaryReplicaRouter']
+
+# Number of seconds a client keeps reading from the primary after a write
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -123,3 +153,159 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Idempotency keys for order placement
+# Stored responses are replayed for IDEMPOTENCY_KEY_TTL seconds. A request holds its key for at most
+# IDEMPOTENCY_LOCK_TIMEOUT seconds and duplicates wait up to IDEMPOTENCY_WAIT_TIMEOUT seconds for it.
+
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+IDEMPOTENCY_WAIT_TIMEOUT = 10
+
+# Load shedding
+# Views opt in with a `load_shedding` class attribute, see dynamic_pricing_system/throttling.py.
+# Behind reverse proxies, set CLIENT_ADDRESS_HEADER to the header they append the client address to (for example
+# 'X-Forwarded-For') and TRUSTED_PROXIES to their number; otherwise anonymous clients share the per-client buckets
+# of the proxy address.
+
+LOAD_SHEDDING = {
+    'ENABLED': True,
+    'MIN_CONCURRENCY': 2,
+    'INITIAL_CONCURRENCY': 16,
+    'MAX_CONCURRENCY': 128,
+    'LATENCY_TOLERANCE': 2.0,
+    'MAX_CLIENTS': 10000,
+    'CLIENT_ADDRESS_HEADER': None,
+    'TRUSTED_PROXIES': 1,
+}
+
+# Query budgets
+# Views and serializers declare a `query_budget` class attribute, see dynamic_pricing_system/query_budget.py.
+# When ENABLED, requests exceeding a budget are reported with the SQL they repeated and the STACK_DEPTH innermost
+# project frames running it, for up to REPORT_LIMIT statements: read-only requests fail, requests which wrote are
+# logged and flagged in the X-Query-Budget-Exceeded header. None follows DEBUG, off under the test runner.
+
+QUERY_BUDGET = {
+    'ENABLED': None,
+    'STACK_DEPTH': 8,
+    'REPORT_LIMIT': 5,
+}
+
+# Response compression
+# Responses of at least MIN_SIZE bytes are compressed with brotli (when the brotli package is installed)
+# or gzip, as accepted by the client, see dynamic_pricing_system/compression.py.
+
+RESPONSE_COMPRESSION = {
+    'ENABLED': True,
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 4,
+}
+
+# Currencies
+# Product and discount amounts are stored in the BASE currency. Each process caches the exchange rate table
+# and reloads it after RATE_TABLE_TTL_SECONDS, or as soon as it saves a rate itself.
+
+CURRENCIES = {
+    'BASE': os.getenv('BASE_CURRENCY', 'USD'),
+    'RATE_TABLE_TTL_SECONDS': 60,
+}
+
+# Repricing
+# Sales velocities are counted in buckets of BUCKET_MINUTES over the last WINDOW_HOURS. The reprice_products
+# command runs a pass every INTERVAL_SECONDS, writing BATCH_SIZE prices per database round trip.
+
+REPRICING = {
+    'WINDOW_HOURS': 168,
+    'BUCKET_MINUTES': 60,
+    'INTERVAL_SECONDS': 300,
+    'BATCH_SIZE': 1000,
+}
+
+# Discount optimizer
+# Orders and quotes get the combination of their requested discount, the automatic discounts and the active
+# bundle offers giving them their lowest total. A search running longer than TIME_BUDGET_MS for one order
+# falls back to a greedy selection of bundles.
+
+DISCOUNT_OPTIMIZER = {
+    'TIME_BUDGET_MS': 10,
+}
+
+# Carts
+# Cart lines are priced when they change, and a cart converts to an order at those prices unless a line was
+# priced more than PRICE_TTL_SECONDS ago.
+
+CARTS = {
+    'PRICE_TTL_SECONDS': 900,
+}
+
+# Outbox
+# Placed orders are recorded as `order.placed` events in the transaction placing them, and delivered to SINKS
+# in batches of BATCH_SIZE by the `dispatch_outbox` command, at least once. Rejected batches are retried after
+# RETRY_BASE_SECONDS, doubling up to RETRY_MAX_SECONDS, at most MAX_ATTEMPTS times.
+
+OUTBOX = {
+    'ENABLED': True,
+    'BATCH_SIZE': 1000,
+    'LEASE_SECONDS': 60,
+    'MAX_ATTEMPTS': 10,
+    'RETRY_BASE_SECONDS': 1,
+    'RETRY_MAX_SECONDS': 300,
+    'POLL_SECONDS': 1,
+    'SINKS': [
+        {'BACKEND': 'outbox.sinks.FileSink', 'PATH': BASE_DIR / 'outbox.ndjson'},
+    ],
+}
+
+# Live price streams
+# A stream falling QUEUE_SIZE events behind is evicted; reconnecting streams resume from the last
+# HISTORY_SIZE events. Idle streams receive a keep-alive comment every HEARTBEAT_SECONDS. Saves leaving the
+# prices of one of the TRACKED_PRODUCTS most recently published products unchanged are not published.
+
+LIVE_PRICES = {
+    'QUEUE_SIZE': 256,
+    'HISTORY_SIZE': 1024,
+    'TRACKED_PRODUCTS': 10000,
+    'HEARTBEAT_SECONDS': 15,
+}
+
+# Pricing snapshot
+# Memory-mapped at startup when the file exists, see `python manage.py build_pricing_snapshot`. Rows updated
+# by other processes are priced from the database within PRICING_SNAPSHOT_STALE_CHECK_SECONDS.
+
+PRICING_SNAPSHOT_PATH = os.getenv('PRICING_SNAPSHOT_PATH')
+
+PRICING_SNAPSHOT_STALE_CHECK_SECONDS = 5
+
+# Longest time between a write setting the `updated_at` of a product or discount and its commit. Checks for rows
+# updated by other processes overlap the previous check by this much, so that late commits are not missed.
+
+PRICING_MAX_TRANSACTION_SECONDS = 60
+
+# Shared-memory price table
+# Name of the table built by `python manage.py run_price_table_writer`, shared by all workers on a host.
+
+PRICE_TABLE_NAME = os.getenv('PRICE_TABLE_NAME')
+
+# Order pricing mode
+# 'python' prices order lines in the application, 'database' computes order totals with one SQL aggregate.
+
+ORDER_PRICING_MODE = os.getenv('ORDER_PRICING_MODE', 'python')
+
+# Order placement mode
+# 'sync' places orders in the request, 'async' queues them for `python manage.py process_order_jobs`.
+
+ORDER_PLACEMENT_MODE = os.getenv('ORDER_PLACEMENT_MODE', 'sync')
+
+# Group commit
+# When enabled, orders placed concurrently within WINDOW_MS milliseconds are written in one transaction of
+# at most MAX_BATCH orders by a writer thread; requests wait up to TIMEOUT_SECONDS for their order.
+
+ORDER_GROUP_COMMIT = {
+    'ENABLED': os.getenv('ORDER_GROUP_COMMIT', 'off') == 'on',
+    'WINDOW_MS': 2,
+    'MAX_BATCH': 100,
+    'TIMEOUT_SECONDS': 30,
+}
@@ -0,0 +1,215 @@
+"""
+    dynamic_pricing_system/sparse_fields.py
+
+    This module implements sparse fieldsets. Read requests may pass `?fields=id,price` to receive only the
+    listed fields of every object. Serializers using `SparseFieldsMixin` drop the other fields before
+    serializing, so they are neither computed nor sent, and views using `SparseFieldsetMixin` load only the
+    columns those fields read, with `QuerySet.only()`.
+
+    Fields computed in `to_representation` rather than declared on the serializer are listed in the
+    `computed_fields` attribute of the serializer, with the model fields they read.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.constants import LOOKUP_SEP
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+from constants import FIELDS_REQUIRED, UNKNOWN_FIELDS
+
+FIELDS_PARAM = 'fields'
+
+
+def requested_fields(request):
+    """
+    Returns the fields requested with the `fields` query parameter of a read request.
+
+    Args:
+        request (Request): The HTTP request, or None outside of a request.
+
+    Returns:
+        frozenset: The requested field names, or None when all fields are wanted.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    query_params = getattr(request, 'query_params', request.GET)
+    if FIELDS_PARAM not in query_params:
+        return None
+    return frozenset(name.strip() for name in query_params[FIELDS_PARAM].split(',') if name.strip())
+
+
+def model_field_path(model, source):
+    """
+    Converts the source of a serializer field to a lookup path of model fields.
+
+    Args:
+        model (Model): The model serialized.
+        source (str): The dotted source of the serializer field.
+
+    Returns:
+        str: The lookup path, or None if the source is not a chain of model fields.
+    """
+    if source == '*':
+        return None
+    parts = source.split('.')
+    for index, part in enumerate(parts):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        if index < len(parts) - 1:
+            if not field.is_relation or field.related_model is None:
+                return None
+            model = field.related_model
+    return LOOKUP_SEP.join(parts)
+
+
+def related_pk_paths(model, select_related, prefix=''):
+    """
+    Returns the primary keys of the relations joined with `select_related()`, which `QuerySet.only()` must
+    keep loading.
+
+    Args:
+        model (Model): The model of the queryset, or of the relation being walked.
+        select_related (dict): The joined relations, as stored in `Query.select_related`.
+        prefix (str): The lookup path of the walked relation.
+
+    Returns:
+        list: The lookup paths of the primary keys.
+    """
+    paths = []
+    if not isinstance(select_related, dict):
+        return paths
+    for name, nested in select_related.items():
+        related_model = model._meta.get_field(name).related_model
+        path = prefix + name
+        paths.append(path + LOOKUP_SEP + related_model._meta.pk.name)
+        paths.extend(related_pk_paths(related_model, nested, path + LOOKUP_SEP))
+    return paths
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin keeping only the fields requested with `?fields=`.
+
+    Attributes:
+        computed_fields (dict): Maps the output keys added by `to_representation` to the lookup paths of the
+            model fields they read.
+        requested_fields (frozenset): The requested field names, or None when all fields are wanted.
+    """
+    computed_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requested_fields = requested_fields(self.context.get('request'))
+        if self.requested_fields is not None and isinstance(self, serializers.Serializer):
+            for name in set(self.fields) - self.requested_fields:
+                self.fields.pop(name)
+
+    def wants(self, name):
+        """
+        Checks whether an output key was requested.
+
+        Args:
+            name (str): The output key.
+
+        Returns:
+            bool: True if the key was requested, or if all fields are wanted.
+        """
+        return self.requested_fields is None or name in self.requested_fields
+
+    @classmethod
+    def readable_fields(cls):
+        """
+        Returns the declared readable fields of the serializer.
+
+        Returns:
+            dict: The serializer fields by name.
+        """
+        return {name: field for name, field in cls(context={}).fields.items() if not field.write_only}
+
+    @classmethod
+    def sparse_field_names(cls):
+        """
+        Returns the field names accepted in `?fields=`.
+
+        Returns:
+            set: The readable and computed field names.
+        """
+        return set(cls.readable_fields()) | set(cls.computed_fields)
+
+    @classmethod
+    def sparse_columns(cls, names):
+        """
+        Returns the model fields to load to serialize the given fields.
+
+        Args:
+            names (Iterable[str]): The requested field names.
+
+        Returns:
+            set: The lookup paths of the model fields, or None if some field reads more than model fields
+            and every column must be loaded.
+        """
+        fields = cls.readable_fields()
+        columns = set()
+        for name in names:
+            if name in cls.computed_fields:
+                columns.update(cls.computed_fields[name])
+                continue
+            path = model_field_path(cls.Meta.model, fields[name].source)
+            if path is None:
+                return None
+            columns.add(path)
+        return columns
+
+
+class SparseFieldsetMixin:
+    """
+    View mixin validating `?fields=` and loading only the columns the requested fields read.
+
+    List views get the column selection applied to `get_queryset()`; views building their own querysets
+    call `sparse_queryset()`.
+    """
+
+    def get_sparse_fields(self):
+        """
+        Returns the fields requested with `?fields=`.
+
+        Returns:
+            frozenset: The requested field names, or None when all fields are wanted.
+
+        Raises:
+            ValidationError: If no field or an unknown field is requested.
+        """
+        requested = requested_fields(self.request)
+        if requested is None:
+            return None
+        if not requested:
+            raise serializers.ValidationError({FIELDS_PARAM: FIELDS_REQUIRED})
+        allowed = self.get_serializer_class().sparse_field_names()
+        unknown = requested - allowed
+        if unknown:
+            raise serializers.ValidationError({FIELDS_PARAM: UNKNOWN_FIELDS.replace(
+                "{fields}", ", ".join(sorted(unknown))).replace("{allowed}", ", ".join(sorted(allowed)))})
+        return requested
+
+    def sparse_queryset(self, queryset):
+        """
+        Defers the columns not read by the requested fields.
+
+        Args:
+            queryset (QuerySet): The queryset of the serialized objects.
+
+        Returns:
+            QuerySet: The queryset loading only the needed columns.
+        """
+        requested = self.get_sparse_fields()
+        if requested is None:
+            return queryset
+        columns = self.get_serializer_class().sparse_columns(requested)
+        if columns is None:
+            return queryset
+        return queryset.only(*(columns or {'pk'}), *related_pk_paths(queryset.model, queryset.query.select_related))
+
+    def get_queryset(self):
+        return self.sparse_queryset(super().get_queryset())
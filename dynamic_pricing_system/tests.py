@@ -0,0 +1,400 @@
+import contextvars
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from decimal import Decimal
+from unittest import mock
+
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.views import View
+
+from constants import FIELDS_REQUIRED, SERVICE_OVERLOADED, TOO_MANY_REQUESTS
+from products.models import Product, SeasonalProduct
+from .compression import BROTLI, GZIP, CompressionMiddleware, negotiate_encoding
+from .db_router import PIN_COOKIE
+from .throttling import AdaptiveConcurrencyLimiter, LoadSheddingMiddleware, TokenBucket, client_identifier
+
+REPLICA = 'replica'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], LOAD_SHEDDING={'ENABLED': False})
+class PrimaryReplicaRouterTests(TransactionTestCase):
+    """
+    Checks the routing of reads and writes between a primary and a replica, each an SQLite file.
+
+    The replica is a copy of the primary taken when the test starts and is never written to again, so a
+    read returning a row as it was at that moment was served by the replica.
+    """
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Kettle", price=Decimal('30.00'))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.add_replica(os.path.join(directory.name, 'replica.sqlite3'))
+
+    def add_replica(self, path):
+        """
+        Copies the primary into a new SQLite file and registers it as the replica connection.
+        """
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        replica = sqlite3.connect(path)
+        try:
+            primary.connection.backup(replica)
+        finally:
+            replica.close()
+        connections[REPLICA] = type(primary)({**primary.settings_dict, 'NAME': path}, REPLICA)
+        self.addCleanup(connections.__delitem__, REPLICA)
+        self.addCleanup(connections[REPLICA].close)
+
+    def price(self, client=None):
+        response = (client or self.client).get(reverse('product-batch'), {'ids': self.product.pk})
+        self.assertEqual(response.status_code, 200, response.content)
+        return Decimal(response.json()['results'][0]['price'])
+
+    def update_price(self, price, client=None):
+        response = (client or self.client).patch(reverse('product-bulk-update'),
+                                                 {'items': [{'id': self.product.pk, 'price': str(price)}]},
+                                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_reads_go_to_the_replica(self):
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal('31.00'))
+        self.assertEqual(self.price(), Decimal('30.00'))
+        self.assertEqual(contextvars.Context().run(router.db_for_read, Product), REPLICA)
+
+    def test_writes_go_to_the_primary(self):
+        self.update_price(Decimal('40.00'))
+        self.assertEqual(Product.objects.using(DEFAULT_DB_ALIAS).get(pk=self.product.pk).price, Decimal('40.00'))
+        self.assertEqual(Product.objects.using(REPLICA).get(pk=self.product.pk).price, Decimal('30.00'))
+        self.assertEqual(contextvars.Context().run(router.db_for_write, Product), DEFAULT_DB_ALIAS)
+
+    def test_reads_after_a_write_go_to_the_primary(self):
+        response = self.update_price(Decimal('40.00'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.price(), Decimal('40.00'))
+        # Other clients keep reading from the replica.
+        self.assertEqual(self.price(Client()), Decimal('30.00'))
+
+    def test_reads_go_to_the_replica_once_the_pin_expires(self):
+        self.update_price(Decimal('40.00'))
+        self.client.cookies[PIN_COOKIE] = str(time.time() - 1)
+        self.assertEqual(self.price(), Decimal('30.00'))
+
+
+class TokenBucketTests(SimpleTestCase):
+    """
+    Checks the refill and the waits of the token buckets.
+    """
+
+    def test_allows_a_burst_then_the_refill_rate(self):
+        bucket = TokenBucket(rate=2, capacity=3)
+        now = bucket.updated_at
+        self.assertEqual([bucket.consume(now) for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(bucket.consume(now), 0.5)
+        self.assertAlmostEqual(bucket.consume(now + 0.25), 0.25)
+        self.assertEqual(bucket.consume(now + 0.5), 0.0)
+        self.assertGreater(bucket.consume(now + 0.5), 0.0)
+
+    def test_refill_is_capped_at_the_capacity(self):
+        bucket = TokenBucket(rate=10, capacity=2)
+        now = bucket.updated_at + 60
+        self.assertEqual([bucket.consume(now) for _ in range(2)], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.consume(now), 0.1)
+
+    def test_refunds_are_capped_at_the_capacity(self):
+        bucket = TokenBucket(rate=1, capacity=2)
+        now = bucket.updated_at
+        bucket.consume(now)
+        bucket.refund()
+        bucket.refund()
+        self.assertEqual(bucket.tokens, 2)
+
+
+class AdaptiveConcurrencyLimiterTests(SimpleTestCase):
+    """
+    Checks the admission of requests and how the limit follows their latency.
+    """
+
+    def test_admits_requests_up_to_the_limit(self):
+        limiter = AdaptiveConcurrencyLimiter(initial=2, minimum=1, maximum=4, tolerance=2.0)
+        self.assertEqual([limiter.acquire() for _ in range(3)], [True, True, False])
+        limiter.release(0.01)
+        self.assertTrue(limiter.acquire())
+
+    def test_fast_requests_raise_the_limit_up_to_the_maximum(self):
+        limiter = AdaptiveConcurrencyLimiter(initial=2, minimum=1, maximum=3, tolerance=2.0)
+        for _ in range(2):
+            limiter.acquire()
+            limiter.release(0.01)
+        self.assertAlmostEqual(limiter.limit, 2 + 1 / 2 + 1 / 2.5)
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(0.01)
+        self.assertEqual(limiter.limit, 3)
+
+    def test_slow_requests_cut_the_limit_down_to_the_minimum(self):
+        limiter = AdaptiveConcurrencyLimiter(initial=10, minimum=8, maximum=16, tolerance=2.0)
+        limiter.acquire()
+        limiter.release(0.01)
+        limiter.acquire()
+        limiter.release(0.05)
+        self.assertAlmostEqual(limiter.limit, (10 + 1 / 10) * 0.9)
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(0.05)
+        self.assertEqual(limiter.limit, 8)
+
+
+class SheddingView(View):
+    load_shedding = {
+        'GET': {'client_rate': 0.25, 'client_burst': 2},
+        'POST': {'rate': 0.5, 'burst': 1},
+        'PUT': {'concurrency': True, 'initial_concurrency': 1, 'min_concurrency': 1},
+        'PATCH': {'rate': 0.5, 'burst': 1, 'client_rate': 0.25, 'client_burst': 1},
+    }
+
+
+class LoadSheddingMiddlewareTests(SimpleTestCase):
+    """
+    Checks the responses of the middleware to the requests it sheds.
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = LoadSheddingMiddleware(lambda request: HttpResponse())
+        self.view = SheddingView.as_view()
+
+    def send(self, method, address='10.0.0.1', **headers):
+        request = self.factory.generic(method, '/', REMOTE_ADDR=address, headers=headers)
+        return request, self.middleware.process_view(request, self.view, (), {})
+
+    def assertShed(self, response, status_code, message, retry_after):
+        self.assertEqual(response.status_code, status_code)
+        self.assertEqual(json.loads(response.content), {'error': message})
+        self.assertEqual(response['Retry-After'], retry_after)
+
+    def test_client_buckets_answer_429(self):
+        self.assertEqual([self.send('GET')[1] for _ in range(2)], [None, None])
+        self.assertShed(self.send('GET')[1], 429, TOO_MANY_REQUESTS, '4')
+        self.assertIsNone(self.send('GET', address='10.0.0.2')[1])
+
+    def test_endpoint_bucket_answers_429(self):
+        self.assertIsNone(self.send('POST')[1])
+        self.assertShed(self.send('POST', address='10.0.0.2')[1], 429, TOO_MANY_REQUESTS, '2')
+
+    def test_requests_shed_by_the_endpoint_keep_their_client_token(self):
+        with mock.patch('dynamic_pricing_system.throttling.time.monotonic', return_value=1000.0) as monotonic:
+            self.assertIsNone(self.send('PATCH')[1])
+            self.assertShed(self.send('PATCH', address='10.0.0.2')[1], 429, TOO_MANY_REQUESTS, '2')
+            # The endpoint bucket has refilled a token, the client buckets half a token.
+            monotonic.return_value = 1002.0
+            self.assertShed(self.send('PATCH')[1], 429, TOO_MANY_REQUESTS, '2')
+            self.assertIsNone(self.send('PATCH', address='10.0.0.2')[1])
+
+    @override_settings(LOAD_SHEDDING={'CLIENT_ADDRESS_HEADER': 'X-Forwarded-For'})
+    def test_clients_behind_a_proxy_get_their_own_buckets(self):
+        self.assertEqual([self.send('GET', X_Forwarded_For='203.0.113.1')[1] for _ in range(2)], [None, None])
+        self.assertShed(self.send('GET', X_Forwarded_For='203.0.113.1')[1], 429, TOO_MANY_REQUESTS, '4')
+        self.assertIsNone(self.send('GET', X_Forwarded_For='203.0.113.2')[1])
+
+    def test_concurrency_limit_answers_503(self):
+        admitted, response = self.send('PUT')
+        self.assertIsNone(response)
+        self.assertShed(self.send('PUT', address='10.0.0.2')[1], 503, SERVICE_OVERLOADED, '1')
+        self.middleware(admitted)
+        self.assertIsNone(self.send('PUT', address='10.0.0.2')[1])
+
+    def test_unconfigured_methods_and_views_pass(self):
+        self.assertIsNone(self.send('DELETE')[1])
+        request = self.factory.get('/')
+        self.assertIsNone(self.middleware.process_view(request, lambda request: HttpResponse(), (), {}))
+
+    @override_settings(LOAD_SHEDDING={'ENABLED': False})
+    def test_disabled(self):
+        self.middleware = LoadSheddingMiddleware(lambda request: HttpResponse())
+        self.assertEqual([self.send('GET')[1] for _ in range(3)], [None, None, None])
+
+
+class ClientIdentifierTests(SimpleTestCase):
+    """
+    Checks how the clients of anonymous requests are told apart, directly or behind proxies.
+    """
+
+    def identify(self, **headers):
+        return client_identifier(RequestFactory().get('/', REMOTE_ADDR='10.0.0.1', headers=headers))
+
+    def test_forwarded_addresses_are_ignored_by_default(self):
+        self.assertEqual(self.identify(X_Forwarded_For='203.0.113.1'), 'addr:10.0.0.1')
+
+    @override_settings(LOAD_SHEDDING={'CLIENT_ADDRESS_HEADER': 'X-Forwarded-For'})
+    def test_the_address_added_by_the_proxy_is_used(self):
+        self.assertEqual(self.identify(X_Forwarded_For='203.0.113.1'), 'addr:203.0.113.1')
+        # Entries sent by the client itself come first and cannot pick its bucket.
+        self.assertEqual(self.identify(X_Forwarded_For='198.51.100.9, 203.0.113.1'), 'addr:203.0.113.1')
+        self.assertEqual(self.identify(), 'addr:10.0.0.1')
+        self.assertEqual(self.identify(X_Forwarded_For=' , '), 'addr:10.0.0.1')
+
+    @override_settings(LOAD_SHEDDING={'CLIENT_ADDRESS_HEADER': 'X-Forwarded-For', 'TRUSTED_PROXIES': 2})
+    def test_the_address_added_by_the_outermost_trusted_proxy_is_used(self):
+        self.assertEqual(self.identify(X_Forwarded_For='198.51.100.9, 203.0.113.1, 10.0.0.5'), 'addr:203.0.113.1')
+        self.assertEqual(self.identify(X_Forwarded_For='203.0.113.1'), 'addr:203.0.113.1')
+
+    def test_authenticated_users_are_identified_by_their_id(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        request.user = mock.Mock(is_authenticated=True, pk=7)
+        self.assertEqual(client_identifier(request), 'user:7')
+
+
+class LoadSheddingTests(TestCase):
+    """
+    Sends more orders than a client may place in a burst through the middleware stack.
+    """
+
+    def test_clients_over_their_burst_are_told_when_to_retry(self):
+        product = Product.objects.create(name="Kettle", price=Decimal('30.00'))
+        order = {'products': [{'product': product.pk, 'quantity': 1}]}
+        # Time stands still, so that slow requests do not refill the bucket.
+        with mock.patch('dynamic_pricing_system.throttling.time.monotonic', return_value=1000.0):
+            statuses = [self.client.post(reverse('order-list-create'), order, content_type='application/json')
+                        for _ in range(6)]
+        self.assertEqual([response.status_code for response in statuses], [201] * 5 + [429])
+        self.assertEqual(statuses[-1]['Retry-After'], '1')
+        self.assertEqual(statuses[-1].json(), {'error': TOO_MANY_REQUESTS})
+
+
+@override_settings(LOAD_SHEDDING={'ENABLED': False})
+class SparseFieldsTests(TestCase):
+    """
+    Checks that `?fields=` narrows both the response and the columns read from the database.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="Kettle", price=Decimal('30.00'), stock=4)
+        cls.seasonal = SeasonalProduct.objects.create(name="Lantern", price=Decimal('20.00'),
+                                                      seasonal_discount=Decimal('25.00'))
+
+    def get(self, name, **params):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            response = self.client.get(reverse(name), params)
+        selects = [query['sql'] for query in queries.captured_queries if 'products_product' in query['sql']]
+        return response, selects
+
+    def test_list_reads_only_the_requested_columns(self):
+        response, selects = self.get('product-list-create', fields='id,name')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json(), [{'id': self.product.pk, 'name': "Kettle"},
+                                           {'id': self.seasonal.pk, 'name': "Lantern"}])
+        self.assertEqual(len(selects), 1)
+        self.assertIn('"name"', selects[0])
+        self.assertNotIn('"price"', selects[0])
+        self.assertNotIn('"stock"', selects[0])
+
+    def test_all_fields_are_sent_without_the_parameter(self):
+        response, selects = self.get('product-list-create')
+        self.assertEqual(set(response.json()[0]), {'id', 'name', 'price', 'stock', 'updated_at'})
+        self.assertIn('"price"', selects[0])
+
+    def test_batch_reads_only_the_requested_columns_of_every_subtype(self):
+        response, selects = self.get('product-batch', ids=f'{self.product.pk},{self.seasonal.pk}',
+                                     fields='id,seasonal_discount')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['results'], [{'id': self.product.pk},
+                                                      {'id': self.seasonal.pk, 'seasonal_discount': '25.00'}])
+        self.assertEqual(len(selects), 1)
+        self.assertIn('"seasonal_discount"', selects[0])
+        self.assertNotIn('"name"', selects[0])
+
+    def test_unknown_fields_are_rejected(self):
+        response, selects = self.get('product-list-create', fields='id,cost,margin')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.json()['fields'].startswith("Unknown fields: cost, margin. Available fields: "))
+        self.assertEqual(selects, [])
+
+    def test_empty_field_lists_are_rejected(self):
+        for fields in ('', ' , '):
+            with self.subTest(fields=fields):
+                response, selects = self.get('product-list-create', fields=fields)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'fields': FIELDS_REQUIRED})
+
+
+class CompressionTests(SimpleTestCase):
+    """
+    Checks the encoding negotiated for responses and which responses are compressed.
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def respond(self, response, accept_encoding=GZIP, **settings):
+        with self.settings(RESPONSE_COMPRESSION={'MIN_SIZE': 100, **settings}):
+            middleware = CompressionMiddleware(lambda request: response)
+        middleware.encodings = [GZIP]
+        return middleware(self.factory.get('/', HTTP_ACCEPT_ENCODING=accept_encoding))
+
+    def payload(self, size):
+        return JsonResponse({'items': ['price'] * size})
+
+    def test_quality_values_are_respected(self):
+        encodings = [BROTLI, GZIP]
+        for accept_encoding, expected in (
+                ('gzip, br', BROTLI),
+                ('br;q=0.5, gzip;q=0.8', GZIP),
+                ('br;q=0, gzip', GZIP),
+                ('br;q=0, gzip;q=0', None),
+                ('*;q=0.1', BROTLI),
+                ('br;q=0.2, *;q=0.5', GZIP),
+                ('identity', None),
+                ('', None),
+                ('gzip;q=abc, br;q=1.0', BROTLI)):
+            with self.subTest(accept_encoding=accept_encoding):
+                self.assertEqual(negotiate_encoding(accept_encoding, encodings), expected)
+
+    def test_large_responses_are_compressed(self):
+        response = self.payload(200)
+        content = response.content
+        response['ETag'] = '"v1"'
+        response = self.respond(response, 'br;q=0.9, gzip')
+        self.assertEqual(response['Content-Encoding'], GZIP)
+        self.assertEqual(gzip.decompress(response.content), content)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"v1"')
+
+    def test_refused_encodings_are_not_used(self):
+        response = self.respond(self.payload(200), 'gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_small_responses_are_sent_uncompressed(self):
+        response = self.payload(2)
+        content = response.content
+        response = self.respond(response)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, content)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_streaming_responses_are_sent_uncompressed(self):
+        response = self.respond(StreamingHttpResponse(iter([b'data: {}\n\n'] * 100),
+                                                      content_type='text/event-stream'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertFalse(response.has_header('Vary'))
+        self.assertEqual(b''.join(response.streaming_content), b'data: {}\n\n' * 100)
+
+    def test_other_content_types_are_sent_uncompressed(self):
+        response = self.respond(HttpResponse(b'\x89PNG' * 100, content_type='image/png'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_disabled(self):
+        response = self.respond(self.payload(200), ENABLED=False)
+        self.assertFalse(response.has_header('Content-Encoding'))
@@ -0,0 +1,312 @@
+"""
+    dynamic_pricing_system/throttling.py
+
+    This module implements in-process load shedding. Views opt in through a `load_shedding` class attribute
+    that configures, per HTTP method, token buckets for the whole endpoint and for each client, and an
+    adaptive concurrency limit driven by the observed latency. Shed requests fail fast with 429 or 503 and a
+    `Retry-After` header, so that the latency of admitted requests stays bounded under overload.
+
+    Example:
+        class OrderListCreateView(generics.ListCreateAPIView):
+            load_shedding = {
+                'GET': {'rate': 20, 'burst': 40, 'client_rate': 2, 'client_burst': 5, 'concurrency': True},
+            }
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import JsonResponse
+
+from constants import TOO_MANY_REQUESTS, SERVICE_OVERLOADED
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MIN_CONCURRENCY': 2,
+    'INITIAL_CONCURRENCY': 16,
+    'MAX_CONCURRENCY': 128,
+    'LATENCY_TOLERANCE': 2.0,
+    'MAX_CLIENTS': 10000,
+    'CLIENT_ADDRESS_HEADER': None,
+    'TRUSTED_PROXIES': 1,
+}
+
+
+def get_setting(name):
+    """
+    Returns a load shedding setting, falling back to its default value.
+
+    Args:
+        name (str): The name of the setting in the LOAD_SHEDDING dict.
+
+    Returns:
+        object: The setting value.
+    """
+    return getattr(settings, 'LOAD_SHEDDING', {}).get(name, DEFAULTS[name])
+
+
+class TokenBucket:
+    """
+    A token bucket refilled continuously at a fixed rate.
+
+    Attributes:
+        rate (float): The number of tokens added per second.
+        capacity (float): The maximum number of tokens, i.e. the allowed burst.
+        tokens (float): The number of tokens currently available.
+        updated_at (float): The monotonic time of the last refill.
+    """
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at')
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def consume(self, now):
+        """
+        Takes one token from the bucket. Callers must hold the lock guarding the bucket.
+
+        Args:
+            now (float): The current monotonic time.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the number of seconds until one is available.
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        """
+        Returns a token taken for a request that was shed by another limit. Callers must hold the lock
+        guarding the bucket.
+        """
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits the number of requests in flight with an AIMD limit driven by latency.
+
+    The limit grows by one every time a full window of requests completes within the tolerated latency,
+    and is cut by 10% whenever a request takes longer than `tolerance` times the baseline latency. The
+    baseline is the lowest latency observed recently and slowly drifts up so that it follows real changes.
+
+    Attributes:
+        limit (float): The current concurrency limit.
+        in_flight (int): The number of requests currently admitted.
+        baseline (float): The baseline latency in seconds.
+    """
+
+    def __init__(self, initial, minimum, maximum, tolerance):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.in_flight = 0
+        self.baseline = None
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Admits a request if the limit allows it.
+
+        Returns:
+            bool: True if the request was admitted and must be released.
+        """
+        with self.lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency):
+        """
+        Releases an admitted request and adapts the limit to its latency.
+
+        Args:
+            latency (float): The time the request took, in seconds.
+        """
+        with self.lock:
+            self.in_flight -= 1
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                self.baseline += (latency - self.baseline) * 0.001
+            if latency > self.baseline * self.tolerance:
+                self.limit = max(self.minimum, self.limit * 0.9)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+
+class EndpointLimiter:
+    """
+    Holds the load shedding state of one view class and HTTP method.
+
+    Attributes:
+        bucket (TokenBucket): The endpoint-wide bucket, or None.
+        client_rate (float): The refill rate of the per-client buckets, or None.
+        client_burst (float): The capacity of the per-client buckets.
+        clients (OrderedDict): The per-client buckets, least recently used first.
+        concurrency (AdaptiveConcurrencyLimiter): The concurrency limiter, or None.
+    """
+
+    def __init__(self, config):
+        rate = config.get('rate')
+        self.bucket = TokenBucket(rate, config.get('burst', rate)) if rate else None
+        self.client_rate = config.get('client_rate')
+        self.client_burst = config.get('client_burst', self.client_rate)
+        self.clients = OrderedDict()
+        self.max_clients = get_setting('MAX_CLIENTS')
+        self.concurrency = None
+        if config.get('concurrency'):
+            self.concurrency = AdaptiveConcurrencyLimiter(
+                config.get('initial_concurrency', get_setting('INITIAL_CONCURRENCY')),
+                config.get('min_concurrency', get_setting('MIN_CONCURRENCY')),
+                config.get('max_concurrency', get_setting('MAX_CONCURRENCY')),
+                config.get('latency_tolerance', get_setting('LATENCY_TOLERANCE')),
+            )
+        self.lock = threading.Lock()
+
+    def take_token(self, client):
+        """
+        Takes a token from the client bucket and from the endpoint bucket. A request shed by its client bucket
+        takes nothing from the endpoint bucket, and the client token of a request shed by the endpoint bucket
+        is returned, so that neither limit is charged for requests the other one refuses.
+
+        Args:
+            client (str): The client identifier.
+
+        Returns:
+            float: 0 if the request may proceed, otherwise the number of seconds to wait.
+        """
+        now = time.monotonic()
+        with self.lock:
+            if self.client_rate:
+                bucket = self.clients.get(client)
+                if bucket is None:
+                    bucket = self.clients[client] = TokenBucket(self.client_rate, self.client_burst)
+                    if len(self.clients) > self.max_clients:
+                        self.clients.popitem(last=False)
+                else:
+                    self.clients.move_to_end(client)
+                wait = bucket.consume(now)
+                if wait:
+                    return wait
+            if self.bucket is not None:
+                wait = self.bucket.consume(now)
+                if wait and self.client_rate:
+                    bucket.refund()
+                return wait
+        return 0.0
+
+
+def client_identifier(request):
+    """
+    Identifies the client of a request by its user id, or by its address for anonymous users.
+
+    Behind reverse proxies, REMOTE_ADDR is the address of the nearest proxy and would put every client in the
+    same bucket. The CLIENT_ADDRESS_HEADER setting then names the header the proxies append the client address
+    to, such as X-Forwarded-For; the address appended by the outermost of the TRUSTED_PROXIES proxies is used,
+    since the entries before it are sent by the client and can be forged.
+
+    Args:
+        request (HttpRequest): The HTTP request.
+
+    Returns:
+        str: The client identifier.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return 'user:%s' % user.pk
+    header = get_setting('CLIENT_ADDRESS_HEADER')
+    if header:
+        addresses = [address.strip() for address in request.headers.get(header, '').split(',') if address.strip()]
+        if addresses:
+            return 'addr:%s' % addresses[-min(len(addresses), get_setting('TRUSTED_PROXIES'))]
+    return 'addr:%s' % request.META.get('REMOTE_ADDR', '')
+
+
+def shed_response(message, status_code, retry_after):
+    """
+    Builds the response sent for a shed request.
+
+    Args:
+        message (str): The error message.
+        status_code (int): 429 or 503.
+        retry_after (float): The number of seconds the client should wait before retrying.
+
+    Returns:
+        JsonResponse: The error response with a Retry-After header.
+    """
+    response = JsonResponse({'error': message}, status=status_code)
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class LoadSheddingMiddleware:
+    """
+    Applies the `load_shedding` configuration of class-based views.
+
+    Requests to views without a configuration pass through after a single attribute lookup. The
+    concurrency slot taken for an admitted request is released once its response has been produced.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = get_setting('ENABLED')
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        slot = getattr(request, '_load_shedding_slot', None)
+        if slot is not None:
+            limiter, started_at = slot
+            limiter.release(time.monotonic() - started_at)
+        return response
+
+    def get_limiter(self, view_class, method):
+        """
+        Returns the limiter of a view class and method, creating it on first use.
+
+        Args:
+            view_class (type): The class-based view.
+            method (str): The HTTP method.
+
+        Returns:
+            EndpointLimiter: The limiter, or None if the method is not configured.
+        """
+        key = (view_class, method)
+        limiter = self.limiters.get(key)
+        if limiter is None:
+            config = view_class.load_shedding.get(method)
+            if config is None:
+                return None
+            with self.lock:
+                limiter = self.limiters.setdefault(key, EndpointLimiter(config))
+        return limiter
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        if not self.enabled or getattr(view_class, 'load_shedding', None) is None:
+            return None
+        limiter = self.get_limiter(view_class, request.method)
+        if limiter is None:
+            return None
+
+        wait = limiter.take_token(client_identifier(request))
+        if wait:
+            return shed_response(TOO_MANY_REQUESTS, 429, wait)
+        if limiter.concurrency is not None:
+            if not limiter.concurrency.acquire():
+                return shed_response(SERVICE_OVERLOADED, 503, 1)
+            request._load_shedding_slot = (limiter.concurrency, time.monotonic())
+        return None
@@ -22,4 +22,7 @@ urlpatterns = [
     path('api/', include('products.urls')),
     path('api/', include('discounts.urls')),
     path('api/', include('orders.urls')),
+    path('api/', include('currencies.urls')),
+    path('api/', include('repricing.urls')),
+    path('api/', include('carts.urls')),
 ]
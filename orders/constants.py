@@ -1 +1,11 @@
-ORDER = "Order"
\ No newline at end of file
+ORDER = "Order"
+IDEMPOTENCY_KEY_TOO_LONG = "Idempotency-Key must be at most 255 characters long"
+IDEMPOTENCY_KEY_MISMATCH = "Idempotency-Key has already been used with a different request"
+IDEMPOTENCY_KEY_IN_PROGRESS = "A request with this Idempotency-Key is still being processed"
+ORDER_OUTCOME_UNKNOWN = ("The order was not confirmed in time and may still be placed; retrying with the same "
+                         "Idempotency-Key will not place it twice")
+ORDER_ACCEPTED = "Order accepted for processing"
+JOB_PRODUCT_NOT_FOUND = "Product {id} does not exist"
+JOB_DISCOUNT_NOT_FOUND = "Discount {id} does not exist"
+JOB_ATTEMPTS_EXCEEDED = "The order could not be placed after {attempts} attempts"
+JOB_PROCESSING_ERROR = "The order could not be placed: {error}"
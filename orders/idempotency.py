@@ -0,0 +1,261 @@
+"""
+    orders/idempotency.py
+
+    This module implements idempotency keys for order placement. The first response sent for a key is stored
+    in the IdempotencyKey table and in the cache, and is replayed for every retry until the key expires.
+    Concurrent duplicates wait for the in-flight request instead of placing the order a second time.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .constants import IDEMPOTENCY_KEY_IN_PROGRESS, IDEMPOTENCY_KEY_MISMATCH, IDEMPOTENCY_KEY_TOO_LONG
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# Error responses stored like successful ones: the order may still be placed after them, so a retry must not place
+# it again.
+RECORDED_ERROR_STATUSES = (status.HTTP_503_SERVICE_UNAVAILABLE,)
+
+
+class IdempotencyStore:
+    """
+    Claims idempotency keys and stores the responses sent for them.
+
+    Lookups hit the cache first and the IdempotencyKey table second. Requests waiting for an in-flight
+    duplicate in the same process are woken up as soon as it completes; duplicates in other processes
+    are detected by polling the table.
+
+    Attributes:
+        ttl (int): The number of seconds a stored response is replayed for.
+        lock_timeout (int): The number of seconds an in-flight request may hold its key.
+        wait_timeout (float): The number of seconds a duplicate waits for the in-flight request.
+        poll_interval (float): The number of seconds between two checks while waiting.
+    """
+    cache_prefix = 'idempotency'
+
+    def __init__(self, ttl=None, lock_timeout=None, wait_timeout=None, poll_interval=0.05):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+        self.lock_timeout = (lock_timeout if lock_timeout is not None
+                             else getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+        self.wait_timeout = (wait_timeout if wait_timeout is not None
+                             else getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 10))
+        self.poll_interval = poll_interval
+        self._events = {}
+        self._events_lock = threading.Lock()
+
+    def _cache_key(self, key):
+        return '%s:%s' % (self.cache_prefix, hashlib.sha256(key.encode()).hexdigest())
+
+    def get(self, key):
+        """
+        Returns the stored response of a key.
+
+        Args:
+            key (str): The idempotency key.
+
+        Returns:
+            tuple: The (fingerprint, status_code, body) of the stored response, or None if the key has
+            no completed, unexpired response.
+        """
+        stored = cache.get(self._cache_key(key))
+        if stored is not None:
+            return stored
+        row = (IdempotencyKey.objects.filter(key=key, status_code__isnull=False, expires_at__gt=timezone.now())
+               .values_list('fingerprint', 'status_code', 'response_body', 'expires_at').first())
+        if row is None:
+            return None
+        fingerprint, status_code, body, expires_at = row
+        stored = (fingerprint, status_code, body)
+        cache.set(self._cache_key(key), stored, max(1, int((expires_at - timezone.now()).total_seconds())))
+        return stored
+
+    def claim(self, key, fingerprint):
+        """
+        Tries to claim a key for a new request.
+
+        An expired row, or an in-flight row whose lease is over, is replaced.
+
+        Args:
+            key (str): The idempotency key.
+            fingerprint (str): The fingerprint of the request.
+
+        Returns:
+            bool: True if the caller owns the key and must process the request.
+        """
+        now = timezone.now()
+        IdempotencyKey.objects.filter(key=key, expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(key=key, fingerprint=fingerprint,
+                                              expires_at=now + timedelta(seconds=self.lock_timeout))
+        except IntegrityError:
+            return False
+        with self._events_lock:
+            self._events[key] = threading.Event()
+        return True
+
+    def complete(self, key, fingerprint, status_code, body):
+        """
+        Stores the response of a claimed key and wakes up the waiting duplicates.
+
+        Args:
+            key (str): The idempotency key.
+            fingerprint (str): The fingerprint of the request.
+            status_code (int): The status code of the response.
+            body (object): The JSON compatible body of the response.
+        """
+        IdempotencyKey.objects.filter(key=key).update(
+            status_code=status_code, response_body=body,
+            expires_at=timezone.now() + timedelta(seconds=self.ttl))
+        cache.set(self._cache_key(key), (fingerprint, status_code, body), self.ttl)
+        self._notify(key)
+
+    def release(self, key):
+        """
+        Releases a claimed key without storing a response, so that the request can be retried.
+
+        Args:
+            key (str): The idempotency key.
+        """
+        IdempotencyKey.objects.filter(key=key, status_code__isnull=True).delete()
+        self._notify(key)
+
+    def wait(self, key):
+        """
+        Blocks until the in-flight request holding the key completes or is released.
+
+        Args:
+            key (str): The idempotency key.
+
+        Returns:
+            tuple: The stored (fingerprint, status_code, body), or None if the key was released or the
+            wait timed out.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            with self._events_lock:
+                event = self._events.get(key)
+            if event is not None:
+                event.wait(min(self.poll_interval * 20, max(0.0, deadline - time.monotonic())))
+            else:
+                time.sleep(self.poll_interval)
+            stored = self.get(key)
+            if stored is not None:
+                return stored
+            if not IdempotencyKey.objects.filter(key=key).exists():
+                return None
+        return None
+
+    def purge_expired(self):
+        """
+        Deletes all expired keys.
+
+        Returns:
+            int: The number of deleted keys.
+        """
+        deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+    def _notify(self, key):
+        with self._events_lock:
+            event = self._events.pop(key, None)
+        if event is not None:
+            event.set()
+
+
+store = IdempotencyStore()
+
+
+def request_fingerprint(request):
+    """
+    Computes a fingerprint of the method, path and body of a request.
+
+    Args:
+        request (Request): The HTTP request.
+
+    Returns:
+        str: The hex digest identifying the request.
+    """
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.path.encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def replay(stored):
+    """
+    Builds the response replayed for a stored idempotency key.
+
+    Args:
+        stored (tuple): The stored (fingerprint, status_code, body).
+
+    Returns:
+        Response: The stored response.
+    """
+    _, status_code, body = stored
+    return Response(body, status=status_code, headers={REPLAYED_HEADER: 'true'})
+
+
+def idempotent(request, handler):
+    """
+    Runs a request handler at most once per idempotency key.
+
+    Requests without the header are handled normally. The first request with a key runs the handler and
+    its successful response is stored; retries and concurrent duplicates receive the stored response.
+    Unsuccessful responses are not stored, so the request can be retried with the same key, except for those
+    leaving the outcome unknown (see RECORDED_ERROR_STATUSES), which are replayed like successful ones.
+
+    Args:
+        request (Request): The HTTP request.
+        handler (Callable[[], Response]): Handles the request when the key is new.
+
+    Returns:
+        Response: The handler response or the replayed stored response.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key:
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        return Response({'error': IDEMPOTENCY_KEY_TOO_LONG}, status=status.HTTP_400_BAD_REQUEST)
+
+    fingerprint = request_fingerprint(request)
+    while True:
+        stored = store.get(key)
+        if stored is None:
+            if store.claim(key, fingerprint):
+                break
+            stored = store.wait(key)
+            if stored is None:
+                if IdempotencyKey.objects.filter(key=key).exists():
+                    return Response({'error': IDEMPOTENCY_KEY_IN_PROGRESS}, status=status.HTTP_409_CONFLICT)
+                continue
+        if stored[0] != fingerprint:
+            return Response({'error': IDEMPOTENCY_KEY_MISMATCH}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return replay(stored)
+
+    try:
+        response = handler()
+    except Exception:
+        store.release(key)
+        raise
+    if status.is_success(response.status_code) or response.status_code in RECORDED_ERROR_STATUSES:
+        body = json.loads(JSONRenderer().render(response.data))
+        store.complete(key, fingerprint, response.status_code, body)
+    else:
+        store.release(key)
+    return response
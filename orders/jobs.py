@@ -0,0 +1,234 @@
+"""
+    orders/jobs.py
+
+    This module implements asynchronous order placement. The order API stores accepted orders as OrderJob
+    rows; workers claim pending jobs in batches, check them against the database, and place all valid
+    orders of a batch with one bulk write.
+
+    Jobs are claimed with `SELECT ... FOR UPDATE SKIP LOCKED` where the database supports it, so concurrent
+    workers never wait on each other's rows. On SQLite, which serializes writers, a single conditional
+    UPDATE claims the batch instead.
+"""
+
+import uuid
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from discounts.constants import COUPON_NOT_FOUND, COUPON_CODE_REQUIRED, COUPON_DISCOUNT_MISMATCH
+from discounts.models import ProductDiscount
+from products.models import Product
+from .constants import JOB_PRODUCT_NOT_FOUND, JOB_DISCOUNT_NOT_FOUND, JOB_ATTEMPTS_EXCEEDED, JOB_PROCESSING_ERROR
+from .models import OrderJob
+from .services import REJECTION_ERRORS, place_orders
+
+
+def enqueue_order(payload):
+    """
+    Stores an order for asynchronous placement.
+
+    Args:
+        payload (dict): The order data validated by `OrderJobSerializer`.
+
+    Returns:
+        OrderJob: The pending job.
+    """
+    return OrderJob.objects.create(payload=payload)
+
+
+def release_expired_claims(lease, max_attempts):
+    """
+    Returns jobs claimed by workers that stopped before finishing them to the queue, or fails them once
+    they have been attempted too often.
+
+    Args:
+        lease (float): The number of seconds a worker may hold a job.
+        max_attempts (int): The number of claims after which a job fails.
+
+    Returns:
+        int: The number of released jobs.
+    """
+    expired = OrderJob.objects.filter(status=OrderJob.PROCESSING,
+                                      claimed_at__lt=timezone.now() - timedelta(seconds=lease))
+    expired.filter(attempts__gte=max_attempts).update(
+        status=OrderJob.FAILED, error=JOB_ATTEMPTS_EXCEEDED.replace("{attempts}", str(max_attempts)))
+    return expired.update(status=OrderJob.PENDING, claimed_by='')
+
+
+def release_jobs(jobs, max_attempts):
+    """
+    Returns claimed jobs to the queue at once, rather than when their lease expires, or fails them once
+    they have been attempted too often. Used when a batch could not be processed, such as when the database
+    was busy.
+
+    Args:
+        jobs (list): The claimed jobs.
+        max_attempts (int): The number of claims after which a job fails.
+
+    Returns:
+        int: The number of released jobs.
+    """
+    claimed = OrderJob.objects.filter(pk__in=[job.pk for job in jobs], status=OrderJob.PROCESSING,
+                                      claimed_by__in={job.claimed_by for job in jobs})
+    claimed.filter(attempts__gte=max_attempts).update(
+        status=OrderJob.FAILED, error=JOB_ATTEMPTS_EXCEEDED.replace("{attempts}", str(max_attempts)),
+        updated_at=timezone.now())
+    return claimed.update(status=OrderJob.PENDING, claimed_by='')
+
+
+def fail_jobs(jobs, error):
+    """
+    Fails claimed jobs whose processing raised an unexpected error.
+
+    Args:
+        jobs (list): The claimed jobs.
+        error (Exception): The error.
+
+    Returns:
+        int: The number of failed jobs.
+    """
+    return OrderJob.objects.filter(
+        pk__in=[job.pk for job in jobs], status=OrderJob.PROCESSING,
+        claimed_by__in={job.claimed_by for job in jobs},
+    ).update(status=OrderJob.FAILED, error=JOB_PROCESSING_ERROR.replace("{error}", repr(error)),
+             updated_at=timezone.now())
+
+
+def claim_jobs(batch_size):
+    """
+    Claims a batch of pending jobs, oldest first.
+
+    Args:
+        batch_size (int): The largest number of jobs to claim.
+
+    Returns:
+        list: The claimed jobs.
+    """
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    pending = OrderJob.objects.filter(status=OrderJob.PENDING).order_by('pk')
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            ids = list(pending.select_for_update(skip_locked=True).values_list('pk', flat=True)[:batch_size])
+            claimed = OrderJob.objects.filter(pk__in=ids)
+        else:
+            claimed = OrderJob.objects.filter(pk__in=pending.values('pk')[:batch_size], status=OrderJob.PENDING)
+        claimed.update(status=OrderJob.PROCESSING, claimed_by=token, claimed_at=now, attempts=F('attempts') + 1)
+    return list(OrderJob.objects.filter(claimed_by=token, status=OrderJob.PROCESSING).order_by('pk'))
+
+
+def job_discount(job, discounts, coupons):
+    """
+    Resolves the discount of a job from its discount id or coupon code.
+
+    Args:
+        job (OrderJob): The job.
+        discounts (dict): The discounts of the batch by id.
+        coupons (dict): The discounts of the batch by coupon code.
+
+    Returns:
+        tuple: The discount or None, and the error failing the job or None.
+    """
+    discount_id = job.payload.get('discount')
+    code = job.payload.get('coupon_code')
+    discount = discounts.get(discount_id)
+    if discount_id is not None and discount is None:
+        return None, JOB_DISCOUNT_NOT_FOUND.replace("{id}", str(discount_id))
+    if code:
+        if code not in coupons:
+            return None, COUPON_NOT_FOUND.replace("{code}", code)
+        if discount is not None and discount.pk != coupons[code].pk:
+            return None, COUPON_DISCOUNT_MISMATCH
+        return coupons[code], None
+    if discount is not None and discount.code:
+        return None, COUPON_CODE_REQUIRED
+    return discount, None
+
+
+def place_job_orders(jobs, orders_data):
+    """
+    Places the orders of jobs with one bulk write, or one by one when some order is rejected because its
+    discount has reached a redemption cap or a product is out of stock, so that only the jobs of those
+    orders fail.
+
+    Args:
+        jobs (list): The jobs to place.
+        orders_data (list): The order data of every job.
+
+    Returns:
+        list: The placed order of every job, None for the failed jobs.
+    """
+    try:
+        with transaction.atomic():
+            return place_orders(orders_data)
+    except REJECTION_ERRORS:
+        pass
+    orders = []
+    for job, data in zip(jobs, orders_data):
+        try:
+            with transaction.atomic():
+                orders.append(place_orders([data])[0])
+        except REJECTION_ERRORS as error:
+            job.status = OrderJob.FAILED
+            job.error = str(error)
+            orders.append(None)
+    return orders
+
+
+def process_jobs(jobs):
+    """
+    Places the orders of claimed jobs.
+
+    The products and discounts of all jobs are loaded with one query each, plus one for the discounts
+    given by coupon code. Jobs referring to missing rows fail; the orders of all other jobs are placed with
+    one bulk write, in the same transaction as the job status updates. Jobs whose discount has reached a
+    redemption cap or whose products are out of stock fail as well.
+
+    Args:
+        jobs (list): The claimed jobs.
+
+    Returns:
+        tuple: The number of placed and failed jobs.
+    """
+    product_ids = {line['product'] for job in jobs for line in job.payload['products']}
+    discount_ids = {job.payload.get('discount') for job in jobs} - {None}
+    codes = {job.payload.get('coupon_code') for job in jobs} - {None}
+    products = Product.objects.in_bulk(product_ids)
+    discounts = ProductDiscount.objects.in_bulk(discount_ids)
+    coupons = ProductDiscount.objects.in_bulk(codes, field_name='code') if codes else {}
+
+    placed_jobs, orders_data, failed_jobs = [], [], []
+    for job in jobs:
+        discount, error = job_discount(job, discounts, coupons)
+        missing_product = next((line['product'] for line in job.payload['products']
+                                if line['product'] not in products), None)
+        if missing_product is not None:
+            job.error = JOB_PRODUCT_NOT_FOUND.replace("{id}", str(missing_product))
+        elif error is not None:
+            job.error = error
+        else:
+            placed_jobs.append(job)
+            orders_data.append({
+                'discount': discount,
+                'customer': job.payload.get('customer', ''),
+                'products': [{'product': products[line['product']], 'quantity': line['quantity']}
+                             for line in job.payload['products']],
+            })
+            continue
+        job.status = OrderJob.FAILED
+        failed_jobs.append(job)
+
+    now = timezone.now()
+    with transaction.atomic():
+        for job, order in zip(placed_jobs, place_job_orders(placed_jobs, orders_data)):
+            if order is None:
+                failed_jobs.append(job)
+                continue
+            job.status = OrderJob.DONE
+            job.order = order
+        for job in jobs:
+            job.updated_at = now
+        OrderJob.objects.bulk_update(jobs, ['status', 'order', 'error', 'updated_at'])
+    return len(jobs) - len(failed_jobs), len(failed_jobs)
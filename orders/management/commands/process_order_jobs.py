@@ -0,0 +1,128 @@
+"""
+    orders/management/commands/process_order_jobs.py
+
+    Runs a pool of local workers placing the orders accepted for asynchronous placement.
+"""
+
+import threading
+import time
+import traceback
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from orders.jobs import claim_jobs, fail_jobs, process_jobs, release_expired_claims, release_jobs
+from orders.models import OrderJob
+
+
+class Command(BaseCommand):
+    help = "Places queued asynchronous orders in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Number of worker threads")
+        parser.add_argument('--batch-size', type=int, default=100, help="Number of jobs claimed at once")
+        parser.add_argument('--poll-interval', type=float, default=0.2,
+                            help="Seconds a worker sleeps when the queue is empty")
+        parser.add_argument('--lease', type=float, default=60.0,
+                            help="Seconds after which a job claimed by a stopped worker is queued again")
+        parser.add_argument('--max-attempts', type=int, default=5, help="Number of claims after which a job fails")
+        parser.add_argument('--once', action='store_true', help="Stop once the queue is empty")
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.placed = self.failed = 0
+        release_expired_claims(options['lease'], options['max_attempts'])
+        connection.close()
+
+        workers = [threading.Thread(target=self.work, args=(options,), daemon=True)
+                   for _ in range(options['workers'])]
+        for worker in workers:
+            worker.start()
+        try:
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stop.set()
+            for worker in workers:
+                worker.join()
+        self.stdout.write(self.style.SUCCESS(f"Placed {self.placed} orders, {self.failed} jobs failed"))
+
+    def work(self, options):
+        """
+        Claims and processes batches of jobs until stopped, or until the queue is empty with --once.
+        """
+        try:
+            while not self.stop.is_set():
+                jobs = []
+                try:
+                    jobs = claim_jobs(options['batch_size'])
+                    if not jobs:
+                        if options['once']:
+                            return
+                        time.sleep(options['poll_interval'])
+                        release_expired_claims(options['lease'], options['max_attempts'])
+                        continue
+                    placed, failed = process_jobs(jobs)
+                except OperationalError as error:
+                    # The database is busy (SQLite allows a single writer); claimed jobs are queued again.
+                    self.stderr.write(f"Batch failed: {error}")
+                    self.release(jobs, options)
+                    time.sleep(options['poll_interval'])
+                    continue
+                except Exception:
+                    self.stderr.write(f"Batch failed, processing its jobs one by one:\n{traceback.format_exc()}")
+                    placed, failed = self.process_separately(jobs, options)
+                with self.lock:
+                    self.placed += placed
+                    self.failed += failed
+                self.stdout.write(f"Placed {placed} orders, {failed} jobs failed "
+                                  f"({OrderJob.objects.filter(status=OrderJob.PENDING).count()} pending)")
+        finally:
+            connection.close()
+
+    def release(self, jobs, options):
+        """
+        Queues claimed jobs again. When even that fails, they are queued again once their lease expires.
+        """
+        if not jobs:
+            return
+        try:
+            release_jobs(jobs, options['max_attempts'])
+        except OperationalError as error:
+            self.stderr.write(f"Jobs not released, they will be once their lease expires: {error}")
+
+    def process_separately(self, jobs, options):
+        """
+        Processes the jobs of a batch that raised an unexpected error one by one, failing the jobs raising
+        it again, so that one job cannot fail its whole batch nor stop the worker.
+
+        Returns:
+            tuple: The number of placed and failed jobs.
+        """
+        placed = failed = 0
+        # Reloaded, since processing the batch changed the jobs before it was rolled back.
+        try:
+            jobs = list(OrderJob.objects.filter(pk__in=[job.pk for job in jobs], status=OrderJob.PROCESSING,
+                                                claimed_by__in={job.claimed_by for job in jobs}).order_by('pk'))
+        except OperationalError:
+            self.release(jobs, options)
+            return placed, failed
+        for job in jobs:
+            try:
+                job_placed, job_failed = process_jobs([job])
+            except OperationalError as error:
+                self.stderr.write(f"Job {job.pk} failed: {error}")
+                self.release([job], options)
+                continue
+            except Exception as error:
+                self.stderr.write(f"Job {job.pk} failed:\n{traceback.format_exc()}")
+                try:
+                    job_placed, job_failed = 0, fail_jobs([job], error)
+                except OperationalError:
+                    self.release([job], options)
+                    continue
+            placed += job_placed
+            failed += job_failed
+        return placed, failed
@@ -0,0 +1,17 @@
+"""
+    orders/management/commands/purge_idempotency_keys.py
+
+    Deletes expired idempotency keys.
+"""
+
+from django.core.management.base import BaseCommand
+
+from orders.idempotency import store
+
+
+class Command(BaseCommand):
+    help = "Deletes expired idempotency keys"
+
+    def handle(self, *args, **options):
+        deleted = store.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys"))
@@ -0,0 +1,77 @@
+"""
+    orders/management/commands/verify_order_totals.py
+
+    Re-verifies the stored total of every order against its total computed from the current product and discount
+    data. Orders without offers are verified by the database, without loading order lines into Python. The offers
+    selected for the other orders are not expressed in SQL, so those are priced with their stored offers in Python,
+    in batches.
+"""
+
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from django.db.models.functions import Abs
+
+from orders.models import Order
+from pricing.expressions import round_money
+from pricing.offers import calculate_offers_totals
+
+
+class Command(BaseCommand):
+    help = "Lists orders whose stored total differs from the total computed from the current prices"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tolerance', type=Decimal, default=Decimal('0.005'),
+                            help="Largest difference treated as rounding")
+        parser.add_argument('--show', type=int, default=20, help="Number of mismatching orders to list")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of orders with offers priced together")
+
+    def handle(self, *args, **options):
+        mismatches = (Order.objects.filter(applied_offers=[]).with_db_total()
+                      .annotate(difference=Abs(F('total_price') - F('db_total')))
+                      .filter(difference__gt=options['tolerance'])
+                      .order_by('pk'))
+        count = mismatches.count()
+        rows = list(mismatches.values_list('pk', 'total_price', 'db_total')[:options['show']])
+
+        offer_mismatches = self.verify_offer_totals(options['tolerance'], options['batch_size'])
+        count += len(offer_mismatches)
+        rows.extend(offer_mismatches[:max(0, options['show'] - len(rows))])
+        for order_id, total_price, computed in rows:
+            self.stdout.write(f"Order {order_id}: stored {total_price}, computed {computed}")
+        style = self.style.SUCCESS if count == 0 else self.style.WARNING
+        self.stdout.write(style(f"{count} orders with mismatching totals"))
+
+    def verify_offer_totals(self, tolerance, batch_size):
+        """
+        Prices the orders with offers with their stored offers, a batch at a time.
+
+        Args:
+            tolerance (Decimal): The largest difference treated as rounding.
+            batch_size (int): The number of orders priced together.
+
+        Returns:
+            list: The (order id, stored total, computed total) of every mismatching order, by id.
+        """
+        orders = (Order.objects.exclude(applied_offers=[]).filter(total_price__isnull=False)
+                  .only('pk', 'total_price', 'applied_offers').prefetch_related('orderitem_set').order_by('pk'))
+        mismatches = []
+        batch = []
+        for order in orders.iterator(chunk_size=batch_size):
+            batch.append(order)
+            if len(batch) == batch_size:
+                mismatches.extend(self.compare(batch, tolerance))
+                batch = []
+        if batch:
+            mismatches.extend(self.compare(batch, tolerance))
+        return mismatches
+
+    @staticmethod
+    def compare(orders, tolerance):
+        totals = calculate_offers_totals(
+            ([(item.product_id, item.quantity) for item in order.orderitem_set.all()], order.applied_offers)
+            for order in orders)
+        return [(order.pk, order.total_price, round_money(total)) for order, total in zip(orders, totals)
+                if abs(order.total_price - round_money(total)) > tolerance]
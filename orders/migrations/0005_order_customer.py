@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 05:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_orderjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='customer',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
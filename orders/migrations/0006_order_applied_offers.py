@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 05:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_customer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='applied_offers',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
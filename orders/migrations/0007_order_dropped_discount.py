@@ -0,0 +1,20 @@
+# Generated by Django 5.1.2 on 2026-10-19 06:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discounts', '0003_bundle_offers'),
+        ('orders', '0006_order_applied_offers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='dropped_discount',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='discounts.productdiscount'),
+        ),
+    ]
@@ -5,9 +5,37 @@
     price of an order, including any applicable discounts.
 """
 
+from django.conf import settings
 from django.db import models
+from django.db.models import Sum
 from products.models import Product, BaseModel
 from discounts.models import ProductDiscount
+from pricing.calculator import calculate_lines_total
+from pricing.offers import calculate_offers_totals
+from pricing.expressions import MONEY, line_total_expression, order_total_expression, round_money
+
+PRICING_MODE_PYTHON = 'python'
+PRICING_MODE_DATABASE = 'database'
+
+
+class OrderQuerySet(models.QuerySet):
+    """
+    QuerySet for the Order model.
+
+    Methods:
+        with_db_total(): Annotates every order with its total computed by the database.
+    """
+
+    def with_db_total(self):
+        """
+        Annotates every order with `db_total`, its total computed by the database from the current
+        product and discount data, in the same query. The stored offers are not expressed in SQL, so the
+        annotation only holds for orders without `applied_offers`.
+
+        Returns:
+            QuerySet: The annotated queryset.
+        """
+        return self.annotate(db_total=order_total_expression())
 
 
 class Order(models.Model):
@@ -21,33 +49,67 @@ class Order(models.Model):
             applied to the order. Can be null or blank.
         total_price (DecimalField): The total price of the order, calculated
             based on the products and any applicable discounts.
+        customer (CharField): The reference of the customer placing the order, used to enforce the
+            per-customer redemption caps of discounts.
+        applied_offers (JSONField): The offers selected by the discount optimizer for the units of every
+            product, when automatic discounts or bundle offers applied to the order; empty otherwise.
+        dropped_discount (ForeignKey): The discount the order requested but does not get, because the offers
+            selected for it give a lower total without it; null otherwise.
 
     Methods:
         calculate_total(): Calculates the total price of the order, applying
             any discounts if available.
+        calculate_total_db(): Calculates the total price of the order in the database.
     """
     products = models.ManyToManyField(Product, through='OrderItem')
     discount = models.ForeignKey(ProductDiscount, null=True, blank=True, on_delete=models.SET_NULL)
     total_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    customer = models.CharField(max_length=255, blank=True)
+    applied_offers = models.JSONField(default=list, blank=True)
+    dropped_discount = models.ForeignKey(ProductDiscount, null=True, blank=True, on_delete=models.SET_NULL,
+                                         related_name='+')
+
+    objects = OrderQuerySet.as_manager()
 
     def calculate_total(self):
         """
         Calculates the total price of the order.
 
-        This method iterates through all OrderItems associated with the order,
-        retrieves the price for each product (considering quantity and discounts),
-        and sums the total.
+        This method reads the product and quantity of all OrderItems associated with the order,
+        prices each line with the pricing rules of the concrete product and discount types, and sums
+        the total. Lines are priced from the pricing snapshot when one is loaded, and the items are read
+        without a query when loaded with `prefetch_related('orderitem_set')`.
+
+        Orders priced with offers are priced with their `applied_offers`, see
+        `pricing.offers.calculate_offers_totals`. Otherwise, when the ORDER_PRICING_MODE setting is 'database',
+        the total is computed by the database instead, see `calculate_total_db`.
+
+        Returns:
+            Decimal: The total price of the order, including any applicable discounts and offers.
+        """
+        lines = [(item.product_id, item.quantity) for item in self.orderitem_set.all()]
+        if self.applied_offers:
+            return calculate_offers_totals([(lines, self.applied_offers)])[0]
+        if getattr(settings, 'ORDER_PRICING_MODE', PRICING_MODE_PYTHON) == PRICING_MODE_DATABASE:
+            return self.calculate_total_db()
+        return calculate_lines_total(lines, self.discount_id)
+
+    def calculate_total_db(self):
+        """
+        Calculates the total price of the order with a single aggregate query, applying the pricing rules
+        of the joined product and discount child tables in SQL. The stored offers are not expressed in SQL, so
+        orders priced with offers must use `calculate_total`.
 
         Returns:
-            Decimal: The total price of the order, including any applicable discounts.
+            Decimal: The total price of the order, rounded to cents.
+
+        Raises:
+            ValueError: If the order has `applied_offers`.
         """
-        total = 0
-        for item in self.orderitem_set.all():
-            price = item.product.get_price(quantity=item.quantity)
-            if self.discount:
-                price = self.discount.apply_discount(price)
-            total += price * item.quantity
-        return total
+        if self.applied_offers:
+            raise ValueError(f"Order {self.pk} is priced with offers, which the database cannot apply")
+        total = self.orderitem_set.aggregate(total=Sum(line_total_expression(), output_field=MONEY))['total']
+        return round_money(total or 0)
 
 
 class OrderItem(models.Model):
@@ -62,3 +124,66 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stores the first response of a request sent with an `Idempotency-Key` header.
+
+    A row without a status code marks a request that is still in flight. Its `expires_at` acts as a lease,
+    so a key held by a crashed worker can be claimed again once the lease is over.
+
+    Attributes:
+        key (CharField): The client supplied idempotency key.
+        fingerprint (CharField): A hash of the request the key was first used with.
+        status_code (PositiveSmallIntegerField): The status code of the stored response, null while in flight.
+        response_body (JSONField): The rendered body of the stored response.
+        created_at (DateTimeField): The timestamp of when the key was first used.
+        expires_at (DateTimeField): The timestamp after which the key can be reused.
+        read_from_primary (bool): Keeps reads on the primary database, replicas may lag behind claims.
+    """
+    read_from_primary = True
+
+    key = models.CharField(max_length=255, primary_key=True)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+
+class OrderJob(BaseModel):
+    """
+    Represents an order accepted for asynchronous placement.
+
+    Jobs are created by the order API in asynchronous mode and placed in batches by the workers of the
+    `process_order_jobs` command.
+
+    Attributes:
+        status (CharField): The placement status of the job.
+        payload (JSONField): The order data, with a `discount` id and a list of `products` holding a
+            `product` id and a `quantity` each.
+        order (ForeignKey): The placed order, once the job is done.
+        error (TextField): The reason the job failed.
+        attempts (PositiveSmallIntegerField): The number of times the job was claimed.
+        claimed_by (CharField): The token of the worker batch that claimed the job.
+        claimed_at (DateTimeField): The timestamp of when the job was last claimed.
+    """
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    payload = models.JSONField()
+    order = models.ForeignKey(Order, null=True, blank=True, on_delete=models.SET_NULL)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_by = models.CharField(max_length=32, blank=True, db_index=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
@@ -0,0 +1,82 @@
+"""
+    orders/quotes.py
+
+    This module prices orders without placing them. Quotes apply the same pricing rules as placed orders, in
+    the base currency or in a requested currency: product prices come from the price list of the currency
+    when it has an entry for the product, and are converted at the exchange rate otherwise. Fixed amount
+    discounts are converted at the exchange rate.
+
+    The requested discount, the automatic discounts and the bundle offers are selected as for placed orders,
+    see `pricing/offers.py`, from the base currency equivalent of the quoted prices.
+
+    Amounts are computed unrounded and rounded once, half to even, as the totals of placed orders are.
+"""
+
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from currencies.rates import get_base_currency
+from discounts.models import ProductDiscount
+from pricing.expressions import round_money
+from pricing.offers import get_time_budget, line_offers, load_offers, uses_discount
+from pricing.optimizer import optimize
+from products.models import Product
+
+QuoteLine = namedtuple('QuoteLine', ['product_id', 'quantity', 'unit_price', 'line_total', 'offers'])
+Quote = namedtuple('Quote', ['currency', 'lines', 'total_price', 'dropped_discount'])
+
+
+def quote_order(lines, discount_id=None, conversion=None):
+    """
+    Prices the lines of an order, loading all products with one query.
+
+    Args:
+        lines (list): The (product_id, quantity) pairs of the order.
+        discount_id (int, optional): The id of the requested discount.
+        conversion (CurrencyConversion, optional): The conversion to the quoted currency, if not the base
+            currency.
+
+    Returns:
+        Quote: The average unit price, total and applied offers of every line, and the total price, in the
+        quoted currency, with the requested discount if the selected offers leave it unused, as a placed order
+        would drop it.
+
+    Raises:
+        Product.DoesNotExist: If a product does not exist.
+        ProductDiscount.DoesNotExist: If the discount does not exist.
+    """
+    products = Product.objects.with_subtypes().in_bulk({product_id for product_id, _ in lines})
+    for product_id, _ in lines:
+        if product_id not in products:
+            raise Product.DoesNotExist(f"Product {product_id} does not exist")
+    offers = load_offers(products)
+    discount_ids = set(offers.discount_ids)
+    if discount_id is not None:
+        discount_ids.add(discount_id)
+    discounts = ProductDiscount.objects.with_subtypes().in_bulk(discount_ids)
+    if discount_id is not None and discount_id not in discounts:
+        raise ProductDiscount.DoesNotExist(f"Discount {discount_id} does not exist")
+    if conversion is not None:
+        conversion.load_list_prices(products.values())
+    rate = conversion.rate if conversion is not None else Decimal(1)
+
+    unit_prices = []
+    for product_id, quantity in lines:
+        product = products[product_id].get_concrete()
+        unit_price = product.get_price(quantity=quantity)
+        if conversion is not None:
+            unit_price *= conversion.product_factor(product)
+        # Discounts hold base currency amounts: apply them to the base currency equivalent of the price.
+        unit_prices.append(unit_price / rate)
+    appliers = {pk: discount.get_concrete().apply_discount for pk, discount in discounts.items()}
+    allocation = optimize(lines, unit_prices, appliers, offers.bundles, time.perf_counter() + get_time_budget())
+
+    quoted_lines = []
+    for line in allocation.lines:
+        line_total = line.line_total * rate
+        quoted_lines.append(QuoteLine(line.product_id, line.quantity, round_money(line_total / line.quantity),
+                                      round_money(line_total), line_offers(line)))
+    currency = conversion.currency if conversion is not None else get_base_currency()
+    dropped = discount_id if discount_id is not None and not uses_discount(allocation, discount_id) else None
+    return Quote(currency, quoted_lines, round_money(allocation.total * rate), dropped)
@@ -2,18 +2,56 @@
     order/serializers.py
 
     This module defines serializers for order and order item models. It includes serializers for handling
-    order details and associated items.
+    order details and associated items. Order serializers support sparse fieldsets, see
+    `dynamic_pricing_system/sparse_fields.py`, and render totals in the currency requested with `?currency=`,
+    see `currencies/conversion.py`. Orders are rendered from their prefetched items and joined discount, and
+    their products are resolved with one query per order, see `dynamic_pricing_system/related_fields.py`.
 """
 
 from rest_framework import serializers
 
+from discounts.constants import (COUPON_NOT_FOUND, COUPON_CODE_REQUIRED, COUPON_DISCOUNT_MISMATCH,
+                                 COUPON_CUSTOMER_REQUIRED)
 from discounts.models import ProductDiscount
-from discounts.serializers import DiscountSerializer
+from discounts.serializers import normalize_coupon_code
+from dynamic_pricing_system.related_fields import BulkPrimaryKeyRelatedField, BulkRelatedListSerializer
+from dynamic_pricing_system.sparse_fields import SparseFieldsMixin
 from products.serializers import ProductSerializer
-from .models import Order, OrderItem
+from .models import Order, OrderItem, OrderJob
+from .services import place_order
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+def resolve_discount(attrs):
+    """
+    Resolves the coupon code of an order or cart to its discount, and checks that the discount can be applied.
+
+    Args:
+        attrs (dict): The validated fields of the order or cart.
+
+    Returns:
+        dict: The data, with the discount of the coupon code.
+
+    Raises:
+        ValidationError: If the coupon code does not exist or does not match the discount, if a discount
+        with a code is given without it, or if a discount capped per customer is given without customer.
+    """
+    code = attrs.pop("coupon_code", None)
+    discount = attrs.get("discount")
+    if code:
+        coupon = ProductDiscount.objects.filter(code=code).first()
+        if coupon is None:
+            raise serializers.ValidationError({"coupon_code": COUPON_NOT_FOUND.replace("{code}", code)})
+        if discount is not None and discount.pk != coupon.pk:
+            raise serializers.ValidationError({"coupon_code": COUPON_DISCOUNT_MISMATCH})
+        attrs["discount"] = discount = coupon
+    elif discount is not None and discount.code:
+        raise serializers.ValidationError({"discount": COUPON_CODE_REQUIRED})
+    if discount is not None and discount.max_redemptions_per_customer is not None and not attrs.get("customer"):
+        raise serializers.ValidationError({"customer": COUPON_CUSTOMER_REQUIRED})
+    return attrs
+
+
+class OrderItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializes the OrderItem model, representing individual items within an order.
 
@@ -21,13 +59,15 @@ class OrderItemSerializer(serializers.ModelSerializer):
         product (ForeignKey): The product associated with the order item.
         quantity (PositiveIntegerField): The quantity of the product ordered.
     """
+    serializer_related_field = BulkPrimaryKeyRelatedField
 
     class Meta:
         model = OrderItem
         fields = ["product", "quantity"]
+        list_serializer_class = BulkRelatedListSerializer
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializes the Order model, managing discount information and associated products.
 
@@ -37,17 +77,38 @@ class OrderSerializer(serializers.ModelSerializer):
     Attributes:
         products (OrderItemSerializer): A list of order items containing product
         and quantity information, write-only for creating orders.
+        coupon_code (CharField): The coupon code of the discount to apply, write-only; discounts with a
+        code can only be applied with it.
+        computed_fields (dict): The output keys added by `to_representation`, with the model fields they read.
+        query_budget (int): The largest number of queries rendering its instances may run: the orders and
+        their prefetched items, or the items of an order loaded without them.
 
     Methods:
+        validate(attrs): Resolves the coupon code to its discount.
         create(validated_data): Creates a new order and its associated order items.
         to_representation(instance): Customizes the serialized output to include order ID,
-        total price, order items, and discount details.
+        total price, order items, applied offers, discount details and the id of a requested discount the
+        order does not get.
     """
     products = OrderItemSerializer(many=True, write_only=True)
+    coupon_code = serializers.CharField(max_length=50, write_only=True, required=False)
+    computed_fields = {'order_id': ['id'], 'total_price': ['total_price'], 'order_items': [], 'currency': [],
+                       'offers': ['applied_offers'], 'discount': ['discount__name'],
+                       'dropped_discount': ['dropped_discount']}
+    query_budget = 2
 
     class Meta:
         model = Order
-        fields = ["discount", "products"]
+        fields = ["discount", "customer", "products", "coupon_code"]
+
+    def validate_coupon_code(self, value):
+        return normalize_coupon_code(value)
+
+    def validate(self, attrs):
+        """
+        Resolves the coupon code of the order to its discount, see `resolve_discount`.
+        """
+        return resolve_discount(attrs)
 
     def create(self, validated_data):
         """
@@ -60,32 +121,117 @@ class OrderSerializer(serializers.ModelSerializer):
         Returns:
             Order: The created order instance with its total price calculated.
         """
-        order_items_data = validated_data.pop("products")
-        order = Order.objects.create(**validated_data)
-
-        order_items = [OrderItem(order=order, **item) for item in order_items_data]
-        OrderItem.objects.bulk_create(order_items)
-        order.total_price = order.calculate_total()
-        order.save()
-        return order
+        return place_order(validated_data)
 
     def to_representation(self, instance):
         """
-        Customizes the serialized output of the order instance.
+        Customizes the serialized output of the order instance. The items and discount of orders loaded
+        with `prefetch_related('orderitem_set')` and `select_related('discount')` are read without queries.
 
         Args:
             instance (Order): The order instance to be serialized.
 
         Returns:
             dict: A dictionary representation of the order, including order ID,
-            total price, order items, and discount details.
+            total price, order items, applied offers, discount details and the `dropped_discount`, the id of
+            the requested discount the selected offers left unused, if any. The total price is converted to the
+            requested currency, if any.
         """
         data = super().to_representation(instance)
-        data["order_id"] = instance.id
-        data["total_price"] = instance.total_price
-        order_items_details = OrderItem.objects.filter(order=instance.id)
-        data["order_items"] = OrderItemSerializer(order_items_details, many=True).data
-        order_discount = ProductDiscount.objects.filter(id=instance.discount.id).values("name").first()
-        data["discount"] = DiscountSerializer(order_discount).data
+        if self.wants("order_id"):
+            data["order_id"] = instance.id
+        conversion = self.context.get("currency")
+        if self.wants("total_price"):
+            data["total_price"] = conversion.convert(instance.total_price) if conversion else instance.total_price
+        if self.wants("order_items"):
+            data["order_items"] = OrderItemSerializer(instance.orderitem_set.all(), many=True).data
+        if self.wants("offers"):
+            data["offers"] = instance.applied_offers
+        if self.wants("discount"):
+            data["discount"] = {"name": instance.discount.name} if instance.discount_id is not None else None
+        if self.wants("dropped_discount"):
+            data["dropped_discount"] = instance.dropped_discount_id
+        if conversion is not None and self.wants("currency"):
+            data["currency"] = conversion.currency
         return data
 
+
+class OrderJobLineSerializer(serializers.Serializer):
+    """
+    Validates the shape of one line of an asynchronous order, without touching the database.
+
+    Attributes:
+        product (IntegerField): The id of the product ordered.
+        quantity (IntegerField): The quantity of the product ordered.
+    """
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class OrderJobSerializer(serializers.Serializer):
+    """
+    Validates the shape of an order accepted for asynchronous placement, without touching the database.
+    Whether the products and discount exist is checked by the worker placing the order.
+
+    Attributes:
+        discount (IntegerField): The id of the discount to apply, if any.
+        coupon_code (CharField): The coupon code of the discount to apply, if any.
+        customer (CharField): The reference of the customer placing the order.
+        products (OrderJobLineSerializer): The lines of the order.
+    """
+    discount = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    coupon_code = serializers.CharField(max_length=50, required=False)
+    customer = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    products = OrderJobLineSerializer(many=True, allow_empty=False)
+
+    def validate_coupon_code(self, value):
+        return normalize_coupon_code(value)
+
+
+class OrderQuoteSerializer(OrderJobSerializer):
+    """
+    Validates the order data of a quote. Whether the products and discount exist is checked when pricing;
+    quotes do not count against the redemption caps of discounts.
+    """
+
+
+class OrderJobStatusSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Serializes the status of an asynchronous order, including the placed order once it is done.
+
+    Attributes:
+        job_id (IntegerField): The unique identifier of the job.
+        order_id (IntegerField): The id of the placed order, if any.
+        total_price (DecimalField): The total price of the placed order, if any.
+        computed_fields (dict): The currency key added when converting the total price.
+        query_budget (int): The largest number of queries rendering its instances may run.
+    """
+    job_id = serializers.IntegerField(source='id', read_only=True)
+    order_id = serializers.IntegerField(read_only=True)
+    total_price = serializers.DecimalField(source='order.total_price', max_digits=10, decimal_places=2,
+                                           read_only=True, default=None)
+    computed_fields = {'currency': []}
+    query_budget = 0
+
+    class Meta:
+        model = OrderJob
+        fields = ['job_id', 'status', 'order_id', 'total_price', 'error', 'created_at', 'updated_at']
+
+    def to_representation(self, instance):
+        """
+        Serializes the job status, with the total price in the requested currency if any.
+
+        Args:
+            instance (OrderJob): The job to serialize.
+
+        Returns:
+            dict: The job status, and the currency of the total price when converted.
+        """
+        data = super().to_representation(instance)
+        conversion = self.context.get('currency')
+        if conversion is not None:
+            if data.get('total_price') is not None:
+                data['total_price'] = conversion.represent(conversion.convert(instance.order.total_price))
+            if self.wants('currency'):
+                data['currency'] = conversion.currency
+        return data
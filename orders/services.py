@@ -0,0 +1,147 @@
+"""
+    orders/services.py
+
+    This module places orders. Every placement path (the order API, the asynchronous job workers) goes
+    through these functions, so that orders and their items are always written and priced the same way.
+
+    With ORDER_GROUP_COMMIT enabled, orders placed concurrently by the order API are handed to a writer
+    thread that places all orders arriving within a few milliseconds in one transaction.
+"""
+
+import threading
+
+from django.conf import settings
+from django.db import connections, router, transaction
+
+from discounts.coupons import CouponError, redeem
+from dynamic_pricing_system.group_commit import GroupCommitWriter
+from pricing.calculator import calculate_totals
+from pricing.offers import allocate_offers, applied_offers, has_offers, load_offers, uses_discount
+from outbox.events import record_orders_placed
+from products.inventory import InsufficientStock, reserve_stock
+from pricing.expressions import round_money
+from repricing.velocity import record_sales
+from .models import Order, OrderItem, PRICING_MODE_DATABASE, PRICING_MODE_PYTHON
+
+
+# Errors rejecting an order that is otherwise valid, raised while placing it.
+REJECTION_ERRORS = (CouponError, InsufficientStock)
+
+_group_commit_writer = None
+_group_commit_lock = threading.Lock()
+
+
+def get_group_commit_writer():
+    """
+    Returns the group commit writer of this process, configured from the ORDER_GROUP_COMMIT setting.
+
+    Returns:
+        GroupCommitWriter: The writer, or None when group commit is disabled.
+    """
+    global _group_commit_writer
+    config = getattr(settings, 'ORDER_GROUP_COMMIT', {})
+    if not config.get('ENABLED'):
+        return None
+    if _group_commit_writer is None:
+        with _group_commit_lock:
+            if _group_commit_writer is None:
+                _group_commit_writer = GroupCommitWriter(
+                    place_orders,
+                    window=config.get('WINDOW_MS', 2) / 1000,
+                    max_batch=config.get('MAX_BATCH', 100),
+                    timeout=config.get('TIMEOUT_SECONDS', 30),
+                    using=router.db_for_write(Order),
+                )
+    return _group_commit_writer
+
+
+def place_order(validated_data):
+    """
+    Creates an order and its items and stores its total price, in one transaction.
+
+    With group commit enabled the order is placed by the group commit writer, in a transaction shared
+    with concurrently placed orders, unless the caller has a transaction open.
+
+    Args:
+        validated_data (dict): The validated order data, with a `discount` (ProductDiscount or None), an
+            optional `customer` reference and a list of `products` holding a `product` (Product) and a
+            `quantity` each. Orders converted from carts also carry their `total_price`, and their
+            `applied_offers` if any, and are not priced again.
+
+    Returns:
+        Order: The created order.
+    """
+    writer = get_group_commit_writer()
+    if writer is not None and not connections[router.db_for_write(Order)].in_atomic_block:
+        return writer.write(validated_data)
+    return place_orders([validated_data])[0]
+
+
+def place_orders(orders_data):
+    """
+    Creates many orders and their items and stores their total prices, in one transaction and with a
+    constant number of queries, plus one per order reserving its stock and a few per order applying a capped
+    discount. The sold units are added to the sales velocity of their products, and an `order.placed` event is
+    recorded in the outbox for every order, see `outbox/events.py`. Totals are computed by the database when
+    ORDER_PRICING_MODE is 'database'.
+
+    When automatic discounts or bundle offers apply to the ordered products, every order instead gets the
+    combination of offers giving it its lowest total, see `pricing/offers.py`, and stores it in its
+    `applied_offers`. A requested discount that the selection leaves unused is not redeemed and is moved to
+    the `dropped_discount` of the order, which the API reports. Orders carrying their `total_price`, converted from carts, are not priced again.
+
+    Args:
+        orders_data (list): The validated data of every order, see `place_order`.
+
+    Returns:
+        list: The created orders, in order.
+
+    Raises:
+        CouponError: If the discount of an order has reached one of its redemption caps; no order is placed.
+        InsufficientStock: If a product of an order does not have enough stock left; no order is placed.
+    """
+    orders_data = [dict(data) for data in orders_data]
+    items_data = [data.pop('products') for data in orders_data]
+    unpriced = [index for index, data in enumerate(orders_data) if data.get('total_price') is None]
+    # Offers are selected before the transaction, which then starts with a write and holds no lock while
+    # searching.
+    allocations = {}
+    offers = load_offers(item['product'].pk for index in unpriced for item in items_data[index]) if unpriced else None
+    if offers is not None and has_offers(offers):
+        selected = allocate_offers(
+            (([(item['product'].pk, item['quantity']) for item in items_data[index]],
+              orders_data[index]['discount'].pk if orders_data[index].get('discount') is not None else None)
+             for index in unpriced), offers)
+        for index, allocation in zip(unpriced, selected):
+            data = orders_data[index]
+            if data.get('discount') is not None and not uses_discount(allocation, data['discount'].pk):
+                data['dropped_discount'], data['discount'] = data['discount'], None
+            data['applied_offers'] = applied_offers(allocation)
+            allocations[index] = allocation
+    with transaction.atomic():
+        for data, items in zip(orders_data, items_data):
+            reserve_stock((item['product'].pk, item['quantity']) for item in items)
+            redeem(data.get('discount'), data.get('customer', ''))
+        orders = Order.objects.bulk_create([Order(**data) for data in orders_data])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, **item)
+            for order, items in zip(orders, items_data)
+            for item in items
+        ])
+        record_sales((item['product'].pk, item['quantity']) for items in items_data for item in items)
+        totals = {index: allocation.total for index, allocation in allocations.items()}
+        computed = [index for index in unpriced if index not in allocations]
+        if computed and getattr(settings, 'ORDER_PRICING_MODE', PRICING_MODE_PYTHON) == PRICING_MODE_DATABASE:
+            db_totals = dict(Order.objects.filter(pk__in=[orders[index].pk for index in computed])
+                             .with_db_total().values_list('pk', 'db_total'))
+            totals.update((index, db_totals[orders[index].pk]) for index in computed)
+        elif computed:
+            totals.update(zip(computed, calculate_totals(
+                ([(item['product'].pk, item['quantity']) for item in items_data[index]], orders[index].discount_id)
+                for index in computed)))
+        for index, total in totals.items():
+            orders[index].total_price = round_money(total)
+        if totals:
+            Order.objects.bulk_update([orders[index] for index in totals], ['total_price'])
+        record_orders_placed(orders, items_data)
+    return orders
@@ -1,3 +1,955 @@
-from django.test import TestCase
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connections, transaction
+from django.db.models import F
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from benchmarks.dataset import create_subtyped
+from carts.models import Cart, CartLine
+from carts.pricing import price_lines
+from currencies.models import ExchangeRate, ProductPrice
+
+from discounts.models import ProductDiscount, PercentageDiscount, FixedAmountDiscount, BundleOffer
+from dynamic_pricing_system.group_commit import GroupCommitTimeout, GroupCommitWriter
+from dynamic_pricing_system.query_budget import (QueryBudgetExceeded, QueryRecorder, api_views, budget_violations,
+                                                  view_budget)
+from pricing.expressions import round_money
+from pricing.optimizer import Bundle, optimize
+from products.models import Product, SeasonalProduct, BulkProduct
+from products.search import rebuild_index
+from repricing.models import RepricingPolicy, RepricingRule
+from .constants import IDEMPOTENCY_KEY_MISMATCH, IDEMPOTENCY_KEY_TOO_LONG, JOB_ATTEMPTS_EXCEEDED, ORDER_OUTCOME_UNKNOWN
+from .idempotency import IDEMPOTENCY_HEADER, REPLAYED_HEADER
+from .jobs import claim_jobs, enqueue_order, process_jobs, release_expired_claims, release_jobs
+from .models import Order, OrderItem, OrderJob
+from .quotes import quote_order
+from .views import OrderListCreateView
+from .services import place_orders
+
+
+class DatabaseOrderTotalTests(TestCase):
+    """
+    Cross-checks the order totals computed by the database against the Python pricing path.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(name="Plain", price=Decimal('7.25')),
+            Product.objects.create(name="Whole", price=Decimal('3.00')),
+            SeasonalProduct.objects.create(name="Seasonal", price=Decimal('10.00'), seasonal_discount=Decimal('12.50')),
+            SeasonalProduct.objects.create(name="Off season", price=Decimal('4.99'), seasonal_discount=Decimal('0')),
+            BulkProduct.objects.create(name="Bulk", price=Decimal('5.00'), bulk_threshold=3,
+                                       bulk_discount=Decimal('20.00')),
+            BulkProduct.objects.create(name="Bulk odd", price=Decimal('1.33'), bulk_threshold=10,
+                                       bulk_discount=Decimal('7.50')),
+        ]
+        cls.discounts = [
+            None,
+            PercentageDiscount.objects.create(name="Ten", percentage=Decimal('10.00')),
+            PercentageDiscount.objects.create(name="Odd", percentage=Decimal('33.33')),
+            FixedAmountDiscount.objects.create(name="Two", amount=Decimal('2.00')),
+            FixedAmountDiscount.objects.create(name="Floor", amount=Decimal('6.00')),
+        ]
+        quantities = [1, 2, 3, 9, 10, 25]
+        cls.orders = []
+        for discount in cls.discounts:
+            for shift in range(len(quantities)):
+                order = Order.objects.create(discount=discount)
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, product=product, quantity=quantities[(index + shift) % len(quantities)])
+                    for index, product in enumerate(cls.products)
+                ])
+                cls.orders.append(order)
+        cls.empty_order = Order.objects.create(discount=cls.discounts[1])
+
+    def test_single_order_total_matches_python(self):
+        for order in self.orders:
+            with self.subTest(order=order.pk):
+                self.assertEqual(order.calculate_total_db(), round_money(order.calculate_total()))
+
+    def test_all_order_totals_in_one_query(self):
+        expected = {order.pk: round_money(order.calculate_total()) for order in self.orders}
+        expected[self.empty_order.pk] = Decimal('0.00')
+        with self.assertNumQueries(1):
+            totals = {order.pk: round_money(order.db_total) for order in Order.objects.with_db_total()}
+        self.assertEqual(totals, expected)
+
+    def test_fixed_amount_discount_does_not_go_below_zero(self):
+        order = Order.objects.create(discount=self.discounts[4])
+        OrderItem.objects.create(order=order, product=self.products[1], quantity=4)
+        self.assertEqual(order.calculate_total_db(), Decimal('0.00'))
+        self.assertEqual(order.calculate_total(), 0)
+
+    def test_database_pricing_mode(self):
+        order = self.orders[7]
+        with self.settings(ORDER_PRICING_MODE='database'):
+            self.assertEqual(order.calculate_total(), order.calculate_total_db())
+
+
+class DiscountOptimizerTests(TestCase):
+    """
+    Checks the offers selected for orders against an exhaustive search, and the time taken for large carts.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shirt = Product.objects.create(name="Shirt", price=Decimal('10.00'))
+        cls.tie = Product.objects.create(name="Tie", price=Decimal('6.00'))
+        cls.socks = Product.objects.create(name="Socks", price=Decimal('4.00'))
+        cls.ten = PercentageDiscount.objects.create(name="Ten", percentage=Decimal('10.00'))
+        cls.bundle = BundleOffer.objects.create(name="Three for two", buy_quantity=2, free_quantity=1)
+        cls.bundle.products.set([cls.shirt, cls.tie, cls.socks])
+
+    @staticmethod
+    def exhaustive_total(lines, unit_prices, discounts, bundles):
+        """
+        Prices an order by trying every offer for every unit.
+        """
+        discounted = [min([price] + [apply(price) for apply in discounts.values()]) for price in unit_prices]
+        units = [(index, unit_prices[index]) for index, (_, quantity) in enumerate(lines) for _ in range(quantity)]
+        choices = [[None] + [bundle for bundle in bundles if lines[index][0] in bundle.product_ids]
+                   for index, _ in units]
+        best = None
+        for assignment in itertools.product(*choices):
+            total = Decimal(0)
+            bundled = {}
+            for (index, price), bundle in zip(units, assignment):
+                if bundle is None:
+                    total += discounted[index]
+                else:
+                    bundled.setdefault(bundle, []).append(price)
+            size_mismatch = False
+            for bundle, prices in bundled.items():
+                size = bundle.buy_quantity + bundle.free_quantity
+                size_mismatch = size_mismatch or len(prices) % size
+                prices.sort(reverse=True)
+                total += sum(sum(prices[start:start + bundle.buy_quantity]) for start in range(0, len(prices), size))
+            if not size_mismatch and (best is None or total < best):
+                best = total
+        return best
+
+    def test_matches_exhaustive_search(self):
+        generator = random.Random(7)
+        discounts = {1: lambda price: price * Decimal('0.9'), 2: lambda price: max(price - Decimal(5), 0)}
+        for trial in range(200):
+            lines = [(generator.randint(1, 5), generator.randint(1, 3)) for _ in range(generator.randint(1, 4))]
+            if sum(quantity for _, quantity in lines) > 8:
+                continue
+            unit_prices = [Decimal(generator.randint(1, 50)) for _ in lines]
+            candidates = {pk: apply for pk, apply in discounts.items() if generator.random() < 0.6}
+            bundles = [Bundle(pk, generator.randint(1, 2), generator.randint(1, 2),
+                              frozenset(generator.sample(range(1, 6), generator.randint(1, 4))))
+                       for pk in range(generator.randint(0, 3))]
+            with self.subTest(trial=trial):
+                allocation = optimize(lines, unit_prices, candidates, bundles, time.perf_counter() + 5)
+                self.assertTrue(allocation.exact)
+                self.assertEqual(allocation.total, self.exhaustive_total(lines, unit_prices, candidates, bundles))
+                self.assertEqual(sum(line.line_total for line in allocation.lines), allocation.total)
+
+    def test_large_cart_resolves_within_budget(self):
+        generator = random.Random(11)
+        lines = [(product_id, generator.randint(1, 4)) for product_id in range(1, 151)]
+        unit_prices = [Decimal(generator.randint(100, 10000)) / 100 for _ in lines]
+        discounts = {pk: (lambda rate: lambda price: price * rate)(Decimal(100 - pk) / 100) for pk in range(1, 25)}
+        bundles = [Bundle(pk, generator.randint(1, 4), generator.randint(1, 2),
+                          frozenset(generator.sample(range(1, 151), 15))) for pk in range(1, 25)]
+        started = time.perf_counter()
+        allocation = optimize(lines, unit_prices, discounts, bundles, started + 0.01)
+        elapsed = time.perf_counter() - started
+        self.assertLess(elapsed, 0.1, f"{elapsed * 1000:.1f}ms")
+        discounts_only = optimize(lines, unit_prices, discounts, [], started + 0.01).total
+        self.assertLessEqual(allocation.total, discounts_only)
+
+    def test_requested_discount_is_dropped_for_a_better_bundle(self):
+        order = place_orders([{'discount': self.ten, 'products': [
+            {'product': self.shirt, 'quantity': 1},
+            {'product': self.tie, 'quantity': 1},
+            {'product': self.socks, 'quantity': 1},
+        ]}])[0]
+        self.assertEqual(order.total_price, Decimal('16.00'))
+        self.assertIsNone(order.discount)
+        self.assertEqual(order.dropped_discount, self.ten)
+        self.assertIn({'product': self.socks.pk, 'bundle': self.bundle.pk, 'units': 1, 'free_units': 1},
+                      order.applied_offers)
+        quote = quote_order([(self.shirt.pk, 1), (self.tie.pk, 1), (self.socks.pk, 1)], self.ten.pk)
+        self.assertEqual(quote.dropped_discount, self.ten.pk)
+
+    @override_settings(LOAD_SHEDDING={'ENABLED': False})
+    def test_dropped_discount_is_reported(self):
+        products = [{'product': product.pk, 'quantity': 1} for product in (self.shirt, self.tie, self.socks)]
+        response = self.client.post(reverse('order-list-create'), {'discount': self.ten.pk, 'products': products},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['data']['dropped_discount'], self.ten.pk)
+        self.assertIsNone(response.json()['data']['discount'])
+        response = self.client.post(reverse('order-list-create'), {'discount': self.ten.pk, 'products': products[:1]},
+                                    content_type='application/json')
+        self.assertIsNone(response.json()['data']['dropped_discount'])
+        response = self.client.post(reverse('order-quote'), {'discount': self.ten.pk, 'products': products},
+                                    content_type='application/json')
+        self.assertEqual(response.json()['dropped_discount'], self.ten.pk)
+
+    def test_stored_offers_reprice_to_the_stored_total(self):
+        generator = random.Random(5)
+        PercentageDiscount.objects.create(name="Auto", percentage=Decimal('5.00'), auto_apply=True)
+        products = [self.shirt, self.tie, self.socks]
+        orders = place_orders([
+            {'discount': generator.choice([self.ten, None]), 'products': [
+                {'product': product, 'quantity': generator.randint(1, 4)}
+                for product in generator.sample(products, generator.randint(1, 3))]}
+            for _ in range(20)])
+        self.assertTrue(all(order.applied_offers for order in orders))
+        for order in Order.objects.prefetch_related('orderitem_set'):
+            with self.subTest(order=order.pk):
+                self.assertEqual(round_money(order.calculate_total()), order.total_price)
+                with self.assertRaises(ValueError):
+                    order.calculate_total_db()
+
+        output = StringIO()
+        call_command('verify_order_totals', '--batch-size', '7', stdout=output)
+        self.assertIn("0 orders with mismatching totals", output.getvalue())
+        Order.objects.filter(pk=orders[3].pk).update(total_price=F('total_price') + 1)
+        output = StringIO()
+        call_command('verify_order_totals', '--batch-size', '7', stdout=output)
+        self.assertIn(f"Order {orders[3].pk}: stored {orders[3].total_price + 1}", output.getvalue())
+        self.assertIn("1 orders with mismatching totals", output.getvalue())
+
+    def test_discount_applies_to_units_left_out_of_bundles(self):
+        lines = [{'product': self.shirt, 'quantity': 4}]
+        order = place_orders([{'discount': self.ten, 'products': lines}])[0]
+        # One bundle of three shirts, the fourth one discounted.
+        self.assertEqual(order.total_price, Decimal('29.00'))
+        self.assertEqual(order.discount, self.ten)
+        quote = quote_order([(self.shirt.pk, 4)], self.ten.pk)
+        self.assertEqual(quote.total_price, order.total_price)
+        self.assertEqual(quote.lines[0].offers, [{'discount': self.ten.pk, 'units': 1},
+                                                 {'bundle': self.bundle.pk, 'units': 3, 'free_units': 1}])
+
+    def test_automatic_discount_applies_without_request(self):
+        PercentageDiscount.objects.create(name="Half", percentage=Decimal('50.00'), auto_apply=True)
+        BundleOffer.objects.update(is_active=False)
+        order = place_orders([{'discount': None, 'products': [{'product': self.tie, 'quantity': 2}]}])[0]
+        self.assertEqual(order.total_price, Decimal('6.00'))
+
+
+class OrderJobTests(TestCase):
+    """
+    Checks how workers claim, lease, retry and process the jobs of asynchronous orders.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="Plain", price=Decimal('7.25'))
+
+    def enqueue(self, count, product_id=None):
+        return [enqueue_order({'products': [{'product': product_id or self.product.pk, 'quantity': 2}]})
+                for _ in range(count)]
+
+    def test_jobs_are_claimed_once_oldest_first(self):
+        jobs = self.enqueue(5)
+        first, second = claim_jobs(3), claim_jobs(3)
+        self.assertEqual([job.pk for job in first], [job.pk for job in jobs[:3]])
+        self.assertEqual([job.pk for job in second], [job.pk for job in jobs[3:]])
+        self.assertEqual(claim_jobs(3), [])
+        self.assertNotEqual(first[0].claimed_by, second[0].claimed_by)
+        self.assertTrue(all(job.status == OrderJob.PROCESSING and job.attempts == 1 for job in first + second))
+
+    def test_expired_claims_are_queued_again_until_max_attempts(self):
+        jobs = self.enqueue(2)
+        claim_jobs(2)
+        self.assertEqual(release_expired_claims(lease=60, max_attempts=2), 0)
+        OrderJob.objects.filter(pk=jobs[0].pk).update(attempts=2)
+        with mock.patch('orders.jobs.timezone.now', return_value=timezone.now() + timedelta(seconds=61)):
+            self.assertEqual(release_expired_claims(lease=60, max_attempts=2), 1)
+        jobs = [OrderJob.objects.get(pk=job.pk) for job in jobs]
+        self.assertEqual((jobs[0].status, jobs[0].error),
+                         (OrderJob.FAILED, JOB_ATTEMPTS_EXCEEDED.replace("{attempts}", "2")))
+        self.assertEqual((jobs[1].status, jobs[1].claimed_by), (OrderJob.PENDING, ''))
+        self.assertEqual(claim_jobs(2)[0].attempts, 2)
+
+    def test_released_jobs_are_retried_at_once(self):
+        self.enqueue(2)
+        jobs = claim_jobs(2)
+        OrderJob.objects.filter(pk=jobs[1].pk).update(attempts=3)
+        self.assertEqual(release_jobs(jobs, max_attempts=3), 1)
+        self.assertEqual([job.pk for job in claim_jobs(2)], [jobs[0].pk])
+        self.assertEqual(OrderJob.objects.get(pk=jobs[1].pk).status, OrderJob.FAILED)
+
+    def test_valid_jobs_are_placed_and_others_fail(self):
+        placed = self.enqueue(2)
+        missing = self.enqueue(1, product_id=self.product.pk + 1000)
+        self.assertEqual(process_jobs(claim_jobs(10)), (2, 1))
+        for job in OrderJob.objects.filter(pk__in=[job.pk for job in placed]):
+            self.assertEqual(job.status, OrderJob.DONE)
+            self.assertEqual(job.order.total_price, Decimal('14.50'))
+        self.assertEqual(OrderJob.objects.get(pk=missing[0].pk).status, OrderJob.FAILED)
+
+
+@override_settings(LOAD_SHEDDING={'ENABLED': False})
+class IdempotencyTests(TestCase):
+    """
+    Checks that orders sent with an Idempotency-Key header are placed at most once.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="Plain", price=Decimal('7.25'))
+
+    def setUp(self):
+        # Stored responses outlive the transaction of every test in the cache, so every test uses new keys.
+        self.key = uuid.uuid4().hex
+
+    def place(self, quantity=2, key=None, product_id=None):
+        return self.client.post(reverse('order-list-create'),
+                                {'products': [{'product': product_id or self.product.pk, 'quantity': quantity}]},
+                                content_type='application/json',
+                                headers={IDEMPOTENCY_HEADER: key or self.key})
+
+    def test_completed_keys_replay_the_first_response(self):
+        first = self.place()
+        self.assertEqual(first.status_code, 201, first.content)
+        replayed = self.place()
+        self.assertEqual(replayed.status_code, 201)
+        self.assertEqual(replayed.json(), first.json())
+        self.assertEqual(replayed.headers[REPLAYED_HEADER], 'true')
+        self.assertNotIn(REPLAYED_HEADER, first.headers)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_keys_reused_with_another_body_are_rejected(self):
+        self.assertEqual(self.place().status_code, 201)
+        response = self.place(quantity=3)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json(), {'error': IDEMPOTENCY_KEY_MISMATCH})
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_requests_can_be_retried_with_their_key(self):
+        missing = self.product.pk + 1000
+        self.assertEqual(self.place(product_id=missing).status_code, 400)
+        self.assertEqual(self.place(product_id=missing).status_code, 400)
+        self.assertEqual(self.place().status_code, 201)
+
+    def test_long_keys_are_rejected(self):
+        response = self.place(key='k' * 256)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': IDEMPOTENCY_KEY_TOO_LONG})
+        self.assertFalse(Order.objects.exists())
+
+
+@override_settings(LOAD_SHEDDING={'ENABLED': False})
+class QueryBudgetTests(TransactionTestCase):
+    """
+    Exercises every endpoint with 1, 10 and 100 rows, checking that it keeps within the query budgets of its
+    view and serializers, and that its number of queries does not grow with the number of rows, see
+    `dynamic_pricing_system/query_budget.py`. Requests run in autocommit mode, as they do when served, rather
+    than inside the transaction of a TestCase.
+    """
+    sizes = (1, 10, 100)
+    # The stream runs its queries after the response is returned, for as long as the client listens.
+    unmeasured = {'product-price-stream'}
+
+    def setUp(self):
+        ExchangeRate.objects.create(currency='EUR', rate=Decimal('0.9'), effective_from=timezone.now() - timedelta(days=1))
+        self.discount = PercentageDiscount.objects.create(name="Budget deal", percentage=Decimal('10.00'))
+
+    def products(self, count, model=Product):
+        fields = {
+            SeasonalProduct: {'seasonal_discount': Decimal('10.00')},
+            BulkProduct: {'bulk_threshold': 5, 'bulk_discount': Decimal('10.00')},
+        }.get(model, {})
+        return create_subtyped(Product, [model(name=f"Budget item {number}", price=Decimal('10.00'), **fields)
+                                         for number in range(count)])
+
+    def discounts(self, count):
+        return create_subtyped(ProductDiscount, [
+            FixedAmountDiscount(name=f"Deal {number}", amount=Decimal('1.00')) if number % 2 else
+            PercentageDiscount(name=f"Deal {number}", percentage=Decimal('10.00')) for number in range(count)])
+
+    def cart(self, count):
+        products = self.products(count)
+        cart = Cart.objects.create(discount=self.discount)
+        priced = price_lines([(product.pk, 2) for product in products], cart.discount_id)
+        CartLine.objects.bulk_create([
+            CartLine(cart=cart, product=product, quantity=2, discount_id=discount_id, line_total=line_total,
+                     priced_at=timezone.now()) for product, (discount_id, line_total) in zip(products, priced)])
+        Cart.objects.filter(pk=cart.pk).update(subtotal=sum(line_total for _, line_total in priced))
+        return cart
+
+    def policies(self, count):
+        rule = RepricingRule.objects.create(name="Velocity", target_velocity=Decimal('2.000'))
+        return RepricingPolicy.objects.bulk_create([RepricingPolicy(product=product, rule=rule)
+                                                    for product in self.products(count)])
+
+    def order_lines(self, count):
+        return [{'product': product.pk, 'quantity': 2} for product in self.products(count)]
+
+    def list_products(self, count):
+        self.products(count)
+        return '?currency=EUR', None
+
+    def create_product(self, count):
+        self.products(count)
+        return '', {'name': "New", 'price': '5.00'}
+
+    def list_seasonal_products(self, count):
+        self.products(count, SeasonalProduct)
+        return '?currency=EUR', None
+
+    def create_seasonal_product(self, count):
+        self.products(count, SeasonalProduct)
+        return '', {'name': "New", 'price': '5.00', 'seasonal_discount': '10.00'}
+
+    def list_bulk_products(self, count):
+        self.products(count, BulkProduct)
+        return '?currency=EUR', None
+
+    def create_bulk_product(self, count):
+        self.products(count, BulkProduct)
+        return '', {'name': "New", 'price': '5.00', 'bulk_threshold': 5, 'bulk_discount': '10.00'}
+
+    def search_products(self, count):
+        self.products(count)
+        rebuild_index()
+        return '?q=budget&limit=100&currency=EUR', None
+
+    def get_product_batch(self, count):
+        return '?currency=EUR&ids=' + ','.join(str(product.pk) for product in self.products(count)), None
+
+    def post_product_batch(self, count):
+        return '?currency=EUR', {'ids': [product.pk for product in self.products(count)]}
+
+    def update_products(self, count):
+        return '', {'items': [{'id': product.pk, 'price': '9.00'} for product in self.products(count)]}
+
+    def restock_product(self, count):
+        return {'pk': self.products(count)[0].pk}, {'quantity': 5}
+
+    def list_discounts(self, count):
+        self.discounts(count)
+        return '', None
+
+    def create_discount(self, count):
+        self.discounts(count)
+        return '', {'name': "New"}
+
+    def list_typed_discounts(self, count):
+        self.discounts(count * 2)
+        return '', None
+
+    def create_percentage_discount(self, count):
+        self.discounts(count)
+        return '', {'name': "New", 'percentage': '15.00'}
+
+    def create_fixed_discount(self, count):
+        self.discounts(count)
+        return '', {'name': "New", 'amount': '2.00'}
+
+    def list_bundle_offers(self, count):
+        products = self.products(2)
+        for number in range(count):
+            BundleOffer.objects.create(name=f"Bundle {number}", buy_quantity=2).products.set(products)
+        return '', None
+
+    def create_bundle_offer(self, count):
+        products = self.products(count)
+        return '', {'name': "Bundle", 'buy_quantity': 2, 'products': [product.pk for product in products]}
+
+    def update_discounts(self, count):
+        return '', {'items': [{'id': discount.pk, 'percentage': '20.00'} for discount in self.discounts(count * 2)
+                              if isinstance(discount, PercentageDiscount)]}
+
+    def list_orders(self, count):
+        items = [{'product': product, 'quantity': 1} for product in self.products(2)]
+        place_orders([{'discount': self.discount, 'products': items} for _ in range(count)])
+        return '?currency=EUR', None
+
+    def create_order(self, count):
+        return ('?currency=EUR', {'discount': self.discount.pk, 'products': self.order_lines(count)},
+                {'Idempotency-Key': f"budget-{count}"})
+
+    def quote(self, count):
+        return '?currency=EUR', {'discount': self.discount.pk, 'products': self.order_lines(count)}
+
+    def get_order_job(self, count):
+        jobs = [enqueue_order({'products': self.order_lines(1)}) for _ in range(count)]
+        return {'pk': jobs[-1].pk}, None
+
+    def list_exchange_rates(self, count):
+        ExchangeRate.objects.bulk_create([ExchangeRate(currency='GBP', rate=Decimal('0.8'),
+                                                       effective_from=timezone.now() - timedelta(days=number))
+                                          for number in range(count)])
+        return '', None
+
+    def create_exchange_rate(self, count):
+        return '', {'currency': 'GBP', 'rate': '0.8'}
+
+    def list_product_prices(self, count):
+        ProductPrice.objects.bulk_create([ProductPrice(product=product, currency='EUR', price=Decimal('9.00'))
+                                          for product in self.products(count)])
+        return '', None
+
+    def create_product_price(self, count):
+        return '', {'product': self.products(count)[0].pk, 'currency': 'EUR', 'price': '9.00'}
+
+    def list_repricing_rules(self, count):
+        RepricingRule.objects.bulk_create([RepricingRule(name=f"Rule {number}", target_velocity=Decimal('2.000')) for number in range(count)])
+        return '', None
+
+    def create_repricing_rule(self, count):
+        return '', {'name': "Rule", 'target_velocity': '2.000'}
+
+    def list_repricing_policies(self, count):
+        self.policies(count)
+        return '', None
+
+    def create_repricing_policy(self, count):
+        return '', {'product': self.products(1)[0].pk, 'rule': self.policies(count)[0].rule_id}
+
+    def get_repricing_policy(self, count):
+        return {'pk': self.policies(count)[0].pk}, None
+
+    def replace_repricing_policy(self, count):
+        policy = self.policies(count)[0]
+        return {'pk': policy.pk}, {'product': policy.pk, 'rule': policy.rule_id, 'price_floor': '1.00'}
+
+    def update_repricing_policy(self, count):
+        return {'pk': self.policies(count)[0].pk}, {'price_ceiling': '99.00'}
+
+    def create_cart(self, count):
+        return '', {'customer': "customer", 'discount': self.discount.pk}
+
+    def get_cart(self, count):
+        return {'pk': self.cart(count).pk}, None
+
+    def replace_cart(self, count):
+        return {'pk': self.cart(count).pk}, {'customer': "customer", 'discount': None}
+
+    def change_cart_discount(self, count):
+        return {'pk': self.cart(count).pk}, {'discount': self.discounts(2)[1].pk}
+
+    def set_cart_line(self, count):
+        return {'pk': self.cart(count).pk, 'product_id': self.products(1)[0].pk}, {'quantity': 3}
+
+    def remove_cart_line(self, count):
+        cart = self.cart(count)
+        return {'pk': cart.pk, 'product_id': cart.lines.values_list('product_id', flat=True).first()}, None
+
+    def checkout_cart(self, count):
+        return {'pk': self.cart(count).pk}, None
+
+    def scenarios(self):
+        """
+        Returns the scenario of every measured endpoint and method. A scenario creates `count` rows and
+        returns the URL arguments or query string, the body and optionally the headers of the request.
+        """
+        return {
+            ('product-list-create', 'GET'): self.list_products,
+            ('product-list-create', 'POST'): self.create_product,
+            ('seasonal-product-list-create', 'GET'): self.list_seasonal_products,
+            ('seasonal-product-list-create', 'POST'): self.create_seasonal_product,
+            ('bulk-product-list-create', 'GET'): self.list_bulk_products,
+            ('bulk-product-list-create', 'POST'): self.create_bulk_product,
+            ('product-search', 'GET'): self.search_products,
+            ('product-batch', 'GET'): self.get_product_batch,
+            ('product-batch', 'POST'): self.post_product_batch,
+            ('product-bulk-update', 'PATCH'): self.update_products,
+            ('product-restock', 'POST'): self.restock_product,
+            ('discount-list-create', 'GET'): self.list_discounts,
+            ('discount-list-create', 'POST'): self.create_discount,
+            ('percentage-discount-list-create', 'GET'): self.list_typed_discounts,
+            ('percentage-discount-list-create', 'POST'): self.create_percentage_discount,
+            ('fixed-discount-list-create', 'GET'): self.list_typed_discounts,
+            ('fixed-discount-list-create', 'POST'): self.create_fixed_discount,
+            ('bundle-offer-list-create', 'GET'): self.list_bundle_offers,
+            ('bundle-offer-list-create', 'POST'): self.create_bundle_offer,
+            ('discount-bulk-update', 'PATCH'): self.update_discounts,
+            ('order-list-create', 'GET'): self.list_orders,
+            ('order-list-create', 'POST'): self.create_order,
+            ('order-quote', 'POST'): self.quote,
+            ('order-job-detail', 'GET'): self.get_order_job,
+            ('exchange-rate-list-create', 'GET'): self.list_exchange_rates,
+            ('exchange-rate-list-create', 'POST'): self.create_exchange_rate,
+            ('product-price-list-create', 'GET'): self.list_product_prices,
+            ('product-price-list-create', 'POST'): self.create_product_price,
+            ('repricing-rule-list-create', 'GET'): self.list_repricing_rules,
+            ('repricing-rule-list-create', 'POST'): self.create_repricing_rule,
+            ('repricing-policy-list-create', 'GET'): self.list_repricing_policies,
+            ('repricing-policy-list-create', 'POST'): self.create_repricing_policy,
+            ('repricing-policy-detail', 'GET'): self.get_repricing_policy,
+            ('repricing-policy-detail', 'PUT'): self.replace_repricing_policy,
+            ('repricing-policy-detail', 'PATCH'): self.update_repricing_policy,
+            ('repricing-policy-detail', 'DELETE'): self.get_repricing_policy,
+            ('cart-create', 'POST'): self.create_cart,
+            ('cart-detail', 'GET'): self.get_cart,
+            ('cart-detail', 'PUT'): self.replace_cart,
+            ('cart-detail', 'PATCH'): self.change_cart_discount,
+            ('cart-detail', 'DELETE'): self.get_cart,
+            ('cart-line', 'PUT'): self.set_cart_line,
+            ('cart-line', 'DELETE'): self.remove_cart_line,
+            ('cart-checkout', 'POST'): self.checkout_cart,
+        }
+
+    def measure(self, name, method, view_class, scenario, count):
+        """
+        Runs the request of a scenario against `count` rows.
+
+        Returns:
+            QueryRecorder: The queries of the request.
+        """
+        arguments, body, *headers = scenario(count)
+        if isinstance(arguments, dict):
+            path = reverse(name, kwargs=arguments)
+        else:
+            path = reverse(name) + arguments
+        with QueryRecorder() as recorder:
+            response = self.client.generic(method, path, json.dumps(body) if body is not None else '',
+                                           content_type='application/json', headers=headers[0] if headers else None)
+        self.assertLess(response.status_code, 400, response.content)
+        for serializer_class in recorder.serializer_counts():
+            self.assertIsNotNone(getattr(serializer_class, 'query_budget', None), serializer_class.__name__)
+        self.assertEqual(budget_violations(recorder, view_class, method), [], recorder.report())
+        return recorder
+
+    def test_every_endpoint_declares_its_query_budgets(self):
+        scenarios = self.scenarios()
+        for name, route, view_class in api_views():
+            if name in self.unmeasured:
+                continue
+            for method in view_class.http_method_names:
+                if method in ('head', 'options', 'trace') or not hasattr(view_class, method):
+                    continue
+                with self.subTest(route=route, method=method.upper()):
+                    self.assertIsNotNone(view_budget(view_class, method.upper()))
+                    self.assertIn((name, method.upper()), scenarios)
+
+    @override_settings(QUERY_BUDGET={'ENABLED': True})
+    def test_middleware_rejects_requests_over_budget(self):
+        self.list_orders(3)
+        with mock.patch.object(OrderListCreateView, 'query_budget', {'GET': 1}):
+            with self.assertRaisesMessage(QueryBudgetExceeded, "OrderListCreateView ran 2 queries for GET"):
+                self.client.get(reverse('order-list-create'))
+        self.assertEqual(self.client.get(reverse('order-list-create')).status_code, 200)
+
+    @override_settings(QUERY_BUDGET={'ENABLED': True})
+    def test_middleware_keeps_the_response_of_requests_which_wrote(self):
+        body = {'discount': self.discount.pk, 'products': self.order_lines(2)}
+        with mock.patch.object(OrderListCreateView, 'query_budget', {'POST': 1}):
+            with self.assertLogs('dynamic_pricing_system.query_budget', 'ERROR') as logs:
+                response = self.client.post(reverse('order-list-create'), body, content_type='application/json',
+                                            headers={'Idempotency-Key': "over-budget"})
+            self.assertEqual(response.status_code, 201)
+            self.assertIn("OrderListCreateView ran", response['X-Query-Budget-Exceeded'])
+            self.assertIn("POST /api/orders/ exceeded its query budget", logs.output[0])
+        replay = self.client.post(reverse('order-list-create'), body, content_type='application/json',
+                                  headers={'Idempotency-Key': "over-budget"})
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_out_of_range_keys_are_reported_as_missing(self):
+        products = self.order_lines(1) + [{'product': "99999999999999999999999", 'quantity': 1},
+                                          {'product': 2 ** 63, 'quantity': 1}]
+        response = self.client.post(reverse('order-list-create'), {'products': products},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['products']
+        self.assertEqual(errors[0], {})
+        for error in errors[1:]:
+            self.assertIn("does not exist", error['product'][0])
+
+    def test_transaction_control_is_not_counted(self):
+        with QueryRecorder() as recorder:
+            with transaction.atomic():
+                with transaction.atomic():
+                    Product.objects.count()
+        self.assertEqual([query.sql.split()[0] for query in recorder.queries], ['SELECT'])
+        self.assertFalse(recorder.wrote())
+
+    def test_report_points_at_repeated_queries(self):
+        products = self.products(3)
+        with QueryRecorder() as recorder:
+            for product in products:
+                Product.objects.get(pk=product.pk)
+        report = recorder.report()
+        self.assertIn("3 x SELECT", report)
+        self.assertIn("orders/tests.py", report)
+        self.assertIn("in test_report_points_at_repeated_queries", report)
+
+    def test_queries_do_not_grow_with_rows(self):
+        views = {name: view_class for name, _, view_class in api_views()}
+        for (name, method), scenario in self.scenarios().items():
+            with self.subTest(endpoint=name, method=method):
+                recorders = [self.measure(name, method, views[name], scenario, count) for count in self.sizes]
+                counts = [len(recorder) for recorder in recorders]
+                self.assertLessEqual(max(counts), counts[0], f"{counts} queries for {self.sizes} rows\n"
+                                                             f"{recorders[-1].report()}")
+
+
+class OrderJobWorkerTests(TransactionTestCase):
+    """
+    Runs the `process_order_jobs` workers against batches that fail.
+    """
+
+    def setUp(self):
+        product = Product.objects.create(name="Plain", price=Decimal('7.25'))
+        self.jobs = [enqueue_order({'products': [{'product': product.pk, 'quantity': 1}]}) for _ in range(3)]
+
+    def run_workers(self, side_effect):
+        stdout, stderr = StringIO(), StringIO()
+        with mock.patch('orders.management.commands.process_order_jobs.process_jobs', side_effect=side_effect):
+            call_command('process_order_jobs', workers=1, once=True, poll_interval=0, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def statuses(self):
+        return list(OrderJob.objects.order_by('pk').values_list('status', flat=True))
+
+    def test_unexpected_errors_fail_only_their_job(self):
+        poison = self.jobs[1].pk
+
+        def process(jobs):
+            if any(job.pk == poison for job in jobs):
+                raise RuntimeError("Unexpected")
+            return process_jobs(jobs)
+
+        stdout, stderr = self.run_workers(process)
+        self.assertEqual(self.statuses(), [OrderJob.DONE, OrderJob.FAILED, OrderJob.DONE])
+        self.assertIn("RuntimeError('Unexpected')", OrderJob.objects.get(pk=poison).error)
+        self.assertIn("Traceback", stderr)
+        self.assertIn("Placed 2 orders, 1 jobs failed", stdout)
+
+    def test_busy_database_queues_the_batch_again(self):
+        calls = []
+
+        def process(jobs):
+            calls.append(len(jobs))
+            if len(calls) == 1:
+                raise OperationalError("database is locked")
+            return process_jobs(jobs)
+
+        self.run_workers(process)
+        self.assertEqual(calls, [3, 3])
+        self.assertEqual(self.statuses(), [OrderJob.DONE] * 3)
+        self.assertEqual(set(OrderJob.objects.values_list('attempts', flat=True)), {2})
+
+
+@override_settings(LOAD_SHEDDING={'ENABLED': False})
+class IdempotencyConcurrencyTests(TransactionTestCase):
+    """
+    Sends duplicates of an order while the first request is still being processed.
+    """
+
+    def test_concurrent_duplicates_wait_for_the_first_request(self):
+        product = Product.objects.create(name="Plain", price=Decimal('7.25'))
+        key = uuid.uuid4().hex
+        started, finish = threading.Event(), threading.Event()
+        place_order = OrderListCreateView.place_order
+        responses = {}
+
+        def slow_place_order(view, request):
+            started.set()
+            finish.wait(10)
+            return place_order(view, request)
+
+        def send(name):
+            try:
+                response = Client().post(reverse('order-list-create'),
+                                         {'products': [{'product': product.pk, 'quantity': 2}]},
+                                         content_type='application/json', headers={IDEMPOTENCY_HEADER: key})
+                responses[name] = response
+            finally:
+                connections.close_all()
+
+        with mock.patch.object(OrderListCreateView, 'place_order', slow_place_order):
+            first = threading.Thread(target=send, args=('first',))
+            first.start()
+            self.assertTrue(started.wait(10))
+            duplicate = threading.Thread(target=send, args=('duplicate',))
+            duplicate.start()
+            duplicate.join(0.5)
+            self.assertTrue(duplicate.is_alive())
+            self.assertNotIn('duplicate', responses)
+            finish.set()
+            first.join()
+            duplicate.join()
+
+        self.assertEqual(responses['first'].status_code, 201, responses['first'].content)
+        self.assertEqual(responses['duplicate'].status_code, 201, responses['duplicate'].content)
+        self.assertEqual(responses['duplicate'].json(), responses['first'].json())
+        self.assertEqual(responses['duplicate'].headers[REPLAYED_HEADER], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class GroupCommitStressTests(TransactionTestCase):
+    """
+    Places orders from many concurrent clients through the group commit writer.
+    """
+    clients = 50
+    orders_per_client = 4
+
+    def setUp(self):
+        self.products = [
+            Product.objects.create(name="Plain", price=Decimal('7.25')),
+            SeasonalProduct.objects.create(name="Seasonal", price=Decimal('10.00'), seasonal_discount=Decimal('12.50')),
+            BulkProduct.objects.create(name="Bulk", price=Decimal('5.00'), bulk_threshold=3,
+                                       bulk_discount=Decimal('20.00')),
+        ]
+        self.discount = PercentageDiscount.objects.create(name="Ten", percentage=Decimal('10.00'))
+        self.writer = GroupCommitWriter(place_orders, window=0.002)
+
+    def tearDown(self):
+        self.writer.close()
+
+    def order_data(self, number):
+        return {
+            'discount': self.discount if number % 2 else None,
+            'products': [{'product': product, 'quantity': (number + index) % 5 + 1}
+                         for index, product in enumerate(self.products)],
+        }
+
+    def run_clients(self, place):
+        """
+        Places orders from concurrent client threads.
+
+        Returns:
+            list: The placed orders or raised errors.
+        """
+        results = [None] * (self.clients * self.orders_per_client)
+
+        def client(number):
+            try:
+                for offset in range(self.orders_per_client):
+                    index = number * self.orders_per_client + offset
+                    try:
+                        results[index] = place(self.order_data(index))
+                    except Exception as error:
+                        results[index] = error
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=client, args=(number,)) for number in range(self.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_orders_share_transactions(self):
+        results = self.run_clients(self.writer.write)
+        self.assertTrue(all(isinstance(order, Order) for order in results), results)
+        self.assertEqual(Order.objects.count(), len(results))
+        self.assertLess(self.writer.batches, len(results))
+        for order in Order.objects.all():
+            self.assertEqual(order.total_price, round_money(order.calculate_total()))
+
+    def assert_failing_order_does_not_fail_its_group(self, expected_error):
+        deleted = Product.objects.create(name="Deleted", price=Decimal('1.00'))
+        Product.objects.filter(pk=deleted.pk).delete()
+        orders = [self.order_data(number) for number in range(5)]
+        orders[2]['products'].append({'product': deleted, 'quantity': 1})
+        futures = [self.writer.submit(data) for data in orders]
+
+        with self.assertRaises(expected_error):
+            futures[2].result(timeout=10)
+        placed = [future.result(timeout=10) for index, future in enumerate(futures) if index != 2]
+        self.assertEqual(sorted(Order.objects.values_list('pk', flat=True)), sorted(order.pk for order in placed))
+
+    def test_failing_order_does_not_fail_its_group(self):
+        self.assert_failing_order_does_not_fail_its_group(Product.DoesNotExist)
+
+    def test_order_failing_at_commit_does_not_fail_its_group(self):
+        # Priced in the database, the missing product is only detected by the deferred foreign key check
+        # at commit, which fails the shared transaction as a whole.
+        with self.settings(ORDER_PRICING_MODE='database'):
+            self.assert_failing_order_does_not_fail_its_group(IntegrityError)
+
+    def test_group_commit_batches_concurrent_orders(self):
+        results = self.run_clients(self.writer.write)
+        self.assertTrue(all(isinstance(order, Order) for order in results), results)
+        self.assertLessEqual(self.writer.batches, len(results) // 5, f"{self.writer.batches} transactions")
+
+    def test_group_commit_increases_throughput(self):
+        # Every transaction holds the write lock for a fixed commit cost, as a synced commit would, so that the
+        # gain does not depend on how fast this machine writes: placed one by one, the orders take at least
+        # 200 commits, grouped a few dozen at most. End-to-end rates are measured by `loadtest --group-commit`.
+        commit_seconds = 0.01
+
+        def place_and_commit(orders_data):
+            orders = place_orders(orders_data)
+            time.sleep(commit_seconds)
+            return orders
+
+        def rate(place):
+            started = time.perf_counter()
+            results = self.run_clients(place)
+            elapsed = time.perf_counter() - started
+            self.assertTrue(all(isinstance(order, Order) for order in results), results)
+            return len(results) / elapsed
+
+        direct = rate(lambda data: place_and_commit([data])[0])
+        writer = GroupCommitWriter(place_and_commit, window=0.002)
+        try:
+            grouped = rate(writer.write)
+        finally:
+            writer.close()
+        self.assertGreaterEqual(grouped, 2 * direct, f"{grouped:.0f} vs {direct:.0f} orders/s")
+
+    def test_write_not_committed_in_time_has_an_unknown_outcome(self):
+        release = threading.Event()
+
+        def place_late(orders_data):
+            release.wait(10)
+            return place_orders(orders_data)
+
+        writer = GroupCommitWriter(place_late, timeout=0.05)
+        try:
+            with self.assertRaises(GroupCommitTimeout):
+                writer.write(self.order_data(0))
+            release.set()
+        finally:
+            writer.close()
+        # The write was still queued, and committed after the timeout.
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_writer_survives_unexpected_errors(self):
+        with mock.patch.object(self.writer, '_write_group', side_effect=RuntimeError("Unexpected")):
+            with self.assertRaisesMessage(RuntimeError, "Unexpected"):
+                self.writer.write(self.order_data(0))
+        self.assertIsInstance(self.writer.write(self.order_data(1)), Order)
+
+    @override_settings(LOAD_SHEDDING={'ENABLED': False})
+    def test_api_records_unknown_outcome_for_the_idempotency_key(self):
+        release = threading.Event()
+
+        def place_late(orders_data):
+            release.wait(10)
+            return place_orders(orders_data)
+
+        writer = GroupCommitWriter(place_late, timeout=0.05)
+        body = {'discount': None, 'products': [{'product': self.products[0].pk, 'quantity': 1}]}
+        headers = {'HTTP_IDEMPOTENCY_KEY': str(uuid.uuid4())}
+        try:
+            with mock.patch('orders.services.get_group_commit_writer', return_value=writer):
+                response = self.client.post(reverse('order-list-create'), body, content_type='application/json',
+                                            **headers)
+                release.set()
+                retry = self.client.post(reverse('order-list-create'), body, content_type='application/json',
+                                         **headers)
+        finally:
+            writer.close()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {'error': ORDER_OUTCOME_UNKNOWN})
+        self.assertEqual(retry.status_code, 503)
+        self.assertEqual(retry.headers[REPLAYED_HEADER], 'true')
+        self.assertEqual(Order.objects.count(), 1)
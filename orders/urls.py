@@ -1,6 +1,8 @@
 from django.urls import path
-from .views import OrderListCreateView
+from .views import OrderListCreateView, OrderQuoteView, OrderJobDetailView
 
 urlpatterns = [
     path('orders/', OrderListCreateView.as_view(), name='order-list-create'),
+    path('orders/quote/', OrderQuoteView.as_view(), name='order-quote'),
+    path('orders/jobs/<int:pk>/', OrderJobDetailView.as_view(), name='order-job-detail'),
 ]
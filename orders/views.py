@@ -1,36 +1,65 @@
 """
     order/views.py
 
-    This module defines API views for managing orders.It includes a view for creating new orders.
+    This module defines API views for managing orders.It includes a view for creating new orders, synchronously
+    or asynchronously, a view pricing orders without placing them, and a view reporting the status of
+    asynchronous orders.
 """
 
+from django.conf import settings
+from django.urls import reverse
 from rest_framework import generics, status
 from rest_framework.response import Response
 
 from constants import CREATED_SUCCESSFULLY, SOMETHING_WENT_WRONG
-from .constants import ORDER
-from .models import Order
-from .serializers import OrderSerializer
+from currencies.conversion import MONEY_FIELD, CurrencyConversionMixin
+from discounts.constants import COUPON_NOT_FOUND, COUPON_DISCOUNT_MISMATCH
+from discounts.models import ProductDiscount
+from dynamic_pricing_system.group_commit import GroupCommitTimeout
+from dynamic_pricing_system.sparse_fields import SparseFieldsetMixin
+from products.inventory import InsufficientStock
+from products.models import Product
+from .constants import ORDER, ORDER_ACCEPTED, ORDER_OUTCOME_UNKNOWN
+from .idempotency import idempotent
+from .jobs import enqueue_order
+from .models import Order, OrderJob
+from .quotes import quote_order
+from .serializers import OrderSerializer, OrderJobSerializer, OrderJobStatusSerializer, OrderQuoteSerializer
+from .services import REJECTION_ERRORS
 
+PLACEMENT_MODE_ASYNC = 'async'
 
-class OrderListCreateView(generics.ListCreateAPIView):
+
+class OrderListCreateView(CurrencyConversionMixin, SparseFieldsetMixin, generics.ListCreateAPIView):
     """
     Handles the creation of new orders.
 
     This view supports POST requests to create new orders in the system.
 
     Attributes:
-        queryset (QuerySet): A queryset of all Order instances.
+        queryset (QuerySet): A queryset of all Order instances, with their discount and items.
         serializer_class (Serializer): The serializer class used for validating and
         deserializing order data.
+        load_shedding (dict): Token bucket rates and adaptive concurrency limits per HTTP method.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
     """
-    queryset = Order.objects.all()
+    queryset = Order.objects.select_related('discount').prefetch_related('orderitem_set').order_by('id')
     serializer_class = OrderSerializer
+    load_shedding = {
+        'GET': {'rate': 50, 'burst': 100, 'client_rate': 5, 'client_burst': 10, 'concurrency': True},
+        'POST': {'rate': 100, 'burst': 200, 'client_rate': 2, 'client_burst': 5, 'concurrency': True},
+    }
+    query_budget = {'GET': 3, 'POST': 19}
 
     def create(self, request, *args, **kwargs):
         """
         Creates a new order using the provided data.
 
+        Requests carrying an `Idempotency-Key` header place the order at most once; retries with the
+        same key receive the stored response of the first request. Requests carrying a
+        `Prefer: respond-async` header, or all requests when ORDER_PLACEMENT_MODE is 'async', are
+        accepted with 202 and placed by the `process_order_jobs` workers.
+
         Args:
             request (Request): The HTTP request containing order data.
             *args: Variable length argument list.
@@ -39,9 +68,34 @@ class OrderListCreateView(generics.ListCreateAPIView):
         Returns:
             Response: A response containing the created order data or error details.
         """
+        return idempotent(request, lambda: self.place_order(request))
+
+    def place_order(self, request):
+        """
+        Validates the order data and places the order.
+
+        Args:
+            request (Request): The HTTP request containing order data.
+
+        Returns:
+            Response: A response containing the created order data or error details, with status 409 when
+            the discount has reached one of its redemption caps or when products are out of stock, listing
+            the short lines, and with status 503 when group commit did not confirm the order in time, in which
+            case the order may still be placed.
+        """
+        if self.is_async(request):
+            return self.enqueue_order(request)
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid(raise_exception=True):
-            serializer.save()
+            try:
+                serializer.save()
+            except REJECTION_ERRORS as error:
+                details = {'error': str(error)}
+                if isinstance(error, InsufficientStock):
+                    details['lines'] = error.lines
+                return Response(details, status=status.HTTP_409_CONFLICT)
+            except GroupCommitTimeout:
+                return Response({'error': ORDER_OUTCOME_UNKNOWN}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
             return Response(
                 {'message': CREATED_SUCCESSFULLY.replace("{module}", ORDER), 'data': serializer.data},
                 status=status.HTTP_201_CREATED
@@ -49,3 +103,102 @@ class OrderListCreateView(generics.ListCreateAPIView):
         else:
             return Response({'error': SOMETHING_WENT_WRONG, 'details': serializer.errors},
                             status=status.HTTP_400_BAD_REQUEST)
+
+    def is_async(self, request):
+        """
+        Checks whether the order must be placed asynchronously.
+
+        Args:
+            request (Request): The HTTP request containing order data.
+
+        Returns:
+            bool: True for asynchronous placement.
+        """
+        if getattr(settings, 'ORDER_PLACEMENT_MODE', None) == PLACEMENT_MODE_ASYNC:
+            return True
+        preferences = [preference.strip() for preference in request.headers.get('Prefer', '').split(',')]
+        return 'respond-async' in preferences
+
+    def enqueue_order(self, request):
+        """
+        Validates the shape of the order data and queues the order for placement.
+
+        Args:
+            request (Request): The HTTP request containing order data.
+
+        Returns:
+            Response: A 202 response containing the job id and the URL of its status.
+        """
+        serializer = OrderJobSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = enqueue_order(serializer.validated_data)
+        status_url = request.build_absolute_uri(reverse('order-job-detail', args=[job.pk]))
+        return Response(
+            {'message': ORDER_ACCEPTED, 'data': {'job_id': job.pk, 'status': job.status, 'status_url': status_url}},
+            status=status.HTTP_202_ACCEPTED, headers={'Location': status_url}
+        )
+
+
+class OrderQuoteView(CurrencyConversionMixin, generics.GenericAPIView):
+    """
+    Prices an order without placing it, in the base currency or in the currency requested with `?currency=`.
+
+    Attributes:
+        serializer_class (Serializer): The serializer validating the order data.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
+    """
+    serializer_class = OrderQuoteSerializer
+    query_budget = {'POST': 6}
+
+    def post(self, request, *args, **kwargs):
+        """
+        Returns the unit price, total and applied offers of every line of the order, its total price, and the
+        requested discount if the selected offers leave it unused.
+
+        Args:
+            request (Request): The HTTP request containing order data.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+
+        Returns:
+            Response: A response containing the quote or error details.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        discount_id = serializer.validated_data.get('discount')
+        code = serializer.validated_data.get('coupon_code')
+        if code:
+            coupon_id = ProductDiscount.objects.filter(code=code).values_list('pk', flat=True).first()
+            if coupon_id is None:
+                return Response({'error': COUPON_NOT_FOUND.replace("{code}", code)}, status=status.HTTP_400_BAD_REQUEST)
+            if discount_id is not None and discount_id != coupon_id:
+                return Response({'error': COUPON_DISCOUNT_MISMATCH}, status=status.HTTP_400_BAD_REQUEST)
+            discount_id = coupon_id
+        try:
+            lines = [(line['product'], line['quantity']) for line in serializer.validated_data['products']]
+            quote = quote_order(lines, discount_id, self.get_currency_conversion())
+        except (Product.DoesNotExist, ProductDiscount.DoesNotExist) as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'currency': quote.currency,
+            'lines': [{'product': line.product_id, 'quantity': line.quantity,
+                       'unit_price': MONEY_FIELD.to_representation(line.unit_price),
+                       'line_total': MONEY_FIELD.to_representation(line.line_total),
+                       'offers': line.offers} for line in quote.lines],
+            'total_price': MONEY_FIELD.to_representation(quote.total_price),
+            'dropped_discount': quote.dropped_discount,
+        })
+
+
+class OrderJobDetailView(CurrencyConversionMixin, SparseFieldsetMixin, generics.RetrieveAPIView):
+    """
+    Reports the status of an order accepted for asynchronous placement.
+
+    Attributes:
+        queryset (QuerySet): A queryset of all OrderJob instances with their placed order.
+        serializer_class (Serializer): The serializer class used for the job status.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
+    """
+    queryset = OrderJob.objects.select_related('order')
+    serializer_class = OrderJobStatusSerializer
+    query_budget = {'GET': 2}
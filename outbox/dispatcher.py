@@ -0,0 +1,104 @@
+"""
+    outbox/dispatcher.py
+
+    This module delivers outbox events to the configured sinks, in batches of OUTBOX['BATCH_SIZE'] events.
+    A batch is claimed with one UPDATE leasing its events to the dispatcher, sent to every sink, and deleted
+    with one DELETE once all sinks accepted it. Events are claimed with `SELECT ... FOR UPDATE SKIP LOCKED`
+    where the database supports it, so that several dispatchers can run side by side, as order workers do.
+
+    A batch that a sink rejects is retried after an exponential backoff, from OUTBOX['RETRY_BASE_SECONDS']
+    up to OUTBOX['RETRY_MAX_SECONDS']. Events claimed OUTBOX['MAX_ATTEMPTS'] times are no longer retried and
+    stay in the outbox for inspection. A dispatcher that stops while holding a batch loses it once its lease
+    of OUTBOX['LEASE_SECONDS'] is over.
+"""
+
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .events import get_setting
+from .models import OutboxEvent
+from .sinks import SinkError, load_sinks
+
+DispatchResult = namedtuple('DispatchResult', ['delivered', 'failed', 'error'])
+
+
+def claim_events(batch_size, now):
+    """
+    Claims a batch of events that are due, oldest first.
+
+    Args:
+        batch_size (int): The largest number of events to claim.
+        now (datetime): The current time.
+
+    Returns:
+        tuple: The claim token and the claimed events.
+    """
+    token = uuid.uuid4().hex
+    due = OutboxEvent.objects.filter(available_at__lte=now, attempts__lt=get_setting('MAX_ATTEMPTS')).order_by('pk')
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            ids = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:batch_size])
+            claimed = OutboxEvent.objects.filter(pk__in=ids)
+        else:
+            claimed = OutboxEvent.objects.filter(pk__in=due.values('pk')[:batch_size], available_at__lte=now)
+        claimed.update(claimed_by=token, available_at=now + timedelta(seconds=get_setting('LEASE_SECONDS')),
+                       attempts=F('attempts') + 1)
+    return token, list(OutboxEvent.objects.filter(claimed_by=token).order_by('pk'))
+
+
+def retry_delay(attempts):
+    """
+    Returns the time to wait before retrying events.
+
+    Args:
+        attempts (int): The number of times the events were claimed.
+
+    Returns:
+        timedelta: The exponential backoff for the number of attempts.
+    """
+    seconds = get_setting('RETRY_BASE_SECONDS') * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, get_setting('RETRY_MAX_SECONDS')))
+
+
+def dispatch_batch(sinks=None, batch_size=None, now=None):
+    """
+    Claims a batch of events, delivers it to every sink and deletes it, or schedules its retry.
+
+    Args:
+        sinks (list, optional): The sinks, defaults to the sinks of OUTBOX['SINKS'].
+        batch_size (int, optional): The largest number of events, defaults to OUTBOX['BATCH_SIZE'].
+        now (datetime, optional): The current time.
+
+    Returns:
+        DispatchResult: The numbers of delivered and failed events, and the error failing the batch.
+    """
+    sinks = load_sinks(get_setting('SINKS')) if sinks is None else sinks
+    now = now or timezone.now()
+    token, events = claim_events(batch_size or get_setting('BATCH_SIZE'), now)
+    if not events:
+        return DispatchResult(0, 0, None)
+    try:
+        for sink in sinks:
+            sink.send(events)
+    except SinkError as error:
+        for attempts in {event.attempts for event in events}:
+            OutboxEvent.objects.filter(claimed_by=token, attempts=attempts).update(
+                claimed_by='', available_at=now + retry_delay(attempts), last_error=str(error))
+        return DispatchResult(0, len(events), error)
+    OutboxEvent.objects.filter(claimed_by=token).delete()
+    return DispatchResult(len(events), 0, None)
+
+
+def count_undeliverable():
+    """
+    Counts the events that are no longer retried.
+
+    Returns:
+        int: The number of events claimed OUTBOX['MAX_ATTEMPTS'] times.
+    """
+    return OutboxEvent.objects.filter(attempts__gte=get_setting('MAX_ATTEMPTS')).count()
@@ -0,0 +1,78 @@
+"""
+    outbox/events.py
+
+    This module records events in the outbox. Events are inserted with one query per batch of changes, in the
+    caller's transaction, so that an event exists if and only if its change was committed.
+"""
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+ORDER_PLACED = 'order.placed'
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BATCH_SIZE': 1000,
+    'LEASE_SECONDS': 60,
+    'MAX_ATTEMPTS': 10,
+    'RETRY_BASE_SECONDS': 1,
+    'RETRY_MAX_SECONDS': 300,
+    'POLL_SECONDS': 1,
+    'SINKS': [],
+}
+
+
+def get_setting(name):
+    """
+    Returns an outbox setting, falling back to its default value.
+
+    Args:
+        name (str): The name of the setting in the OUTBOX dict.
+
+    Returns:
+        object: The setting value.
+    """
+    return getattr(settings, 'OUTBOX', {}).get(name, DEFAULTS.get(name))
+
+
+def record_events(topic, payloads):
+    """
+    Adds events to the outbox, with one query.
+
+    Args:
+        topic (str): The kind of the events.
+        payloads (Iterable[dict]): The data of every event.
+
+    Returns:
+        list: The recorded events, none when the outbox is disabled.
+    """
+    if not get_setting('ENABLED'):
+        return []
+    now = timezone.now()
+    return OutboxEvent.objects.bulk_create([OutboxEvent(topic=topic, payload=payload, available_at=now)
+                                            for payload in payloads])
+
+
+def record_orders_placed(orders, items_data):
+    """
+    Records an `order.placed` event for every placed order.
+
+    Args:
+        orders (list): The placed orders, with their total price.
+        items_data (list): The items of every order, each holding a `product` (Product) and a `quantity`.
+
+    Returns:
+        list: The recorded events.
+    """
+    return record_events(ORDER_PLACED, (
+        {
+            'order': order.pk,
+            'customer': order.customer,
+            'discount': order.discount_id,
+            'total_price': str(order.total_price),
+            'items': [{'product': item['product'].pk, 'quantity': item['quantity']} for item in items],
+        }
+        for order, items in zip(orders, items_data)
+    ))
@@ -0,0 +1,55 @@
+"""
+    outbox/management/commands/dispatch_outbox.py
+
+    Delivers the events of the outbox to the configured sinks, in batches, until stopped.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections
+
+from outbox.dispatcher import count_undeliverable, dispatch_batch
+from outbox.events import get_setting
+from outbox.sinks import load_sinks
+
+
+class Command(BaseCommand):
+    help = "Delivers outbox events to the configured sinks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Number of events delivered at once, defaults to OUTBOX['BATCH_SIZE']")
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help="Seconds to wait when no event is due, defaults to OUTBOX['POLL_SECONDS']")
+        parser.add_argument('--once', action='store_true', help="Stop once no event is due")
+
+    def handle(self, *args, **options):
+        sinks = load_sinks(get_setting('SINKS'))
+        poll_interval = options['poll_interval'] or get_setting('POLL_SECONDS')
+        delivered = failed = 0
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    result = dispatch_batch(sinks, options['batch_size'])
+                except OperationalError as error:
+                    # The database is busy (SQLite allows a single writer); claimed events are retried once
+                    # their lease expires.
+                    self.stderr.write(f"Batch failed: {error}")
+                    time.sleep(poll_interval)
+                    continue
+                delivered += result.delivered
+                failed += result.failed
+                if result.error is not None:
+                    self.stderr.write(f"Delivery of {result.failed} events failed: {result.error}")
+                elif result.delivered:
+                    self.stdout.write(f"Delivered {result.delivered} events")
+                if not result.delivered:
+                    if options['once']:
+                        break
+                    time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Delivered {delivered} events, {failed} deliveries failed, "
+                                             f"{count_undeliverable()} events undeliverable"))
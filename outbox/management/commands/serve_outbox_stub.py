@@ -0,0 +1,34 @@
+"""
+    outbox/management/commands/serve_outbox_stub.py
+
+    Serves a local endpoint receiving the batches of an HttpSink, printing the number of received events.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from outbox.stub import StubReceiver
+
+
+class Command(BaseCommand):
+    help = "Serves a local endpoint receiving outbox batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help="Address to listen on")
+        parser.add_argument('--port', type=int, default=8765, help="Port to listen on")
+        parser.add_argument('--delay', type=float, default=0.0, help="Seconds to wait before answering a batch")
+        parser.add_argument('--failures', type=int, default=0, help="Number of first batches to reject")
+
+    def handle(self, *args, **options):
+        receiver = StubReceiver(options['host'], options['port'], options['failures'], options['delay']).start()
+        self.stdout.write(f"Receiving outbox batches at {receiver.url}")
+        received = 0
+        try:
+            while True:
+                time.sleep(1)
+                if len(receiver.messages) != received:
+                    received = len(receiver.messages)
+                    self.stdout.write(f"Received {received} events")
+        except KeyboardInterrupt:
+            receiver.stop()
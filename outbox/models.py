@@ -0,0 +1,31 @@
+"""
+    outbox/models.py
+
+    This module defines the transactional outbox: events written in the transaction of the change they
+    describe, and delivered to downstream systems afterwards by the `dispatch_outbox` command.
+"""
+
+from django.db import models
+
+
+class OutboxEvent(models.Model):
+    """
+    Represents an event waiting for delivery. Delivered events are deleted.
+
+    Attributes:
+        topic (CharField): The kind of event, such as `order.placed`.
+        payload (JSONField): The event data.
+        created_at (DateTimeField): The timestamp of when the event was recorded.
+        available_at (DateTimeField): The timestamp from which the event can be claimed: its next retry, or
+            the end of the lease of the dispatcher holding it.
+        attempts (PositiveSmallIntegerField): The number of times the event was claimed.
+        claimed_by (CharField): The token of the dispatcher batch that claimed the event.
+        last_error (TextField): The reason the last delivery failed.
+    """
+    topic = models.CharField(max_length=100)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_by = models.CharField(max_length=32, blank=True, db_index=True)
+    last_error = models.TextField(blank=True)
@@ -0,0 +1,144 @@
+"""
+    outbox/sinks.py
+
+    This module defines the sinks outbox events are delivered to. A sink receives a whole batch of events at
+    once, and raises SinkError when the batch was not delivered; the dispatcher then retries the batch.
+    Delivery is at least once: a batch may reach a sink again after a failure, and consumers deduplicate
+    events by their `id`.
+
+    Sinks are configured in OUTBOX['SINKS'], each with the dotted path of its class as `BACKEND` and its
+    options:
+
+        {'BACKEND': 'outbox.sinks.FileSink', 'PATH': '/var/log/orders.ndjson'}
+        {'BACKEND': 'outbox.sinks.HttpSink', 'URL': 'http://127.0.0.1:8765/events', 'TIMEOUT': 10}
+"""
+
+import json
+import os
+import urllib.error
+import urllib.request
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+class SinkError(Exception):
+    """
+    Raised when a sink could not deliver a batch of events.
+    """
+
+
+def event_message(event):
+    """
+    Returns the message delivered for an event.
+
+    Args:
+        event (OutboxEvent): The event.
+
+    Returns:
+        dict: The `id`, `topic`, `created_at` and `payload` of the event.
+    """
+    return {'id': event.pk, 'topic': event.topic, 'created_at': event.created_at, 'payload': event.payload}
+
+
+def to_ndjson(events):
+    """
+    Encodes events as newline-delimited JSON, one message per line.
+
+    Args:
+        events (list): The events.
+
+    Returns:
+        bytes: The encoded messages.
+    """
+    return ''.join(json.dumps(event_message(event), cls=DjangoJSONEncoder) + '\n' for event in events).encode()
+
+
+class Sink:
+    """
+    Base class of the sinks.
+
+    Methods:
+        send(events): Delivers a batch of events.
+    """
+
+    def send(self, events):
+        """
+        Delivers a batch of events.
+
+        Args:
+            events (list): The events, oldest first.
+
+        Raises:
+            SinkError: If the batch was not delivered.
+        """
+        raise NotImplementedError
+
+
+class FileSink(Sink):
+    """
+    Appends events to a local newline-delimited JSON file.
+
+    Attributes:
+        path (str): The path of the file.
+        fsync (bool): Whether every batch is flushed to disk before it counts as delivered.
+    """
+
+    def __init__(self, PATH, FSYNC=True):
+        self.path = str(PATH)
+        self.fsync = FSYNC
+
+    def send(self, events):
+        try:
+            with open(self.path, 'ab') as file:
+                file.write(to_ndjson(events))
+                file.flush()
+                if self.fsync:
+                    os.fsync(file.fileno())
+        except OSError as error:
+            raise SinkError(f"Could not write to {self.path}: {error}") from error
+
+
+class HttpSink(Sink):
+    """
+    POSTs every batch of events to an HTTP endpoint as one newline-delimited JSON body. Any response other than
+    2xx fails the batch.
+
+    Attributes:
+        url (str): The URL of the endpoint.
+        timeout (float): The number of seconds to wait for the response.
+        headers (dict): Additional request headers, such as an authorization header.
+    """
+
+    def __init__(self, URL, TIMEOUT=10, HEADERS=None):
+        self.url = URL
+        self.timeout = TIMEOUT
+        self.headers = dict(HEADERS or {})
+
+    def send(self, events):
+        request = urllib.request.Request(self.url, data=to_ndjson(events), method='POST',
+                                         headers={'Content-Type': NDJSON_CONTENT_TYPE, **self.headers})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except (urllib.error.URLError, OSError) as error:
+            raise SinkError(f"Could not deliver to {self.url}: {error}") from error
+
+
+def load_sinks(configs):
+    """
+    Builds the sinks of a configuration.
+
+    Args:
+        configs (list): The sink configurations, see the module docstring.
+
+    Returns:
+        list: The sinks.
+    """
+    sinks = []
+    for config in configs:
+        options = dict(config)
+        sinks.append(import_string(options.pop('BACKEND'))(**options))
+    return sinks
@@ -0,0 +1,95 @@
+"""
+    outbox/stub.py
+
+    This module implements a local HTTP endpoint standing in for the downstream systems of the HttpSink, for
+    development and tests. It accepts newline-delimited JSON batches and keeps the received messages, and can
+    be told to reject batches or to answer slowly.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubReceiver(ThreadingHTTPServer):
+    """
+    HTTP server receiving outbox batches.
+
+    Attributes:
+        messages (list): The received messages, in order of arrival.
+        failures (int): The number of next batches to reject with 503.
+        delay (float): The number of seconds to wait before answering.
+    """
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, failures=0, delay=0.0):
+        super().__init__((host, port), StubHandler)
+        self.messages = []
+        self.failures = failures
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        """
+        Returns the URL batches are posted to.
+
+        Returns:
+            str: The URL of the `/events` endpoint.
+        """
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/events"
+
+    def start(self):
+        """
+        Serves requests from a background thread.
+
+        Returns:
+            StubReceiver: The receiver.
+        """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops serving requests.
+        """
+        self.shutdown()
+        self.server_close()
+
+    def receive(self, body):
+        """
+        Handles the body of a batch.
+
+        Args:
+            body (bytes): The newline-delimited JSON messages.
+
+        Returns:
+            bool: Whether the batch is accepted.
+        """
+        with self.lock:
+            if self.failures:
+                self.failures -= 1
+                return False
+            self.messages.extend(json.loads(line) for line in body.decode().splitlines() if line)
+            return True
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers the batches posted to a StubReceiver.
+    """
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.server.delay:
+            threading.Event().wait(self.server.delay)
+        accepted = self.server.receive(body)
+        self.send_response(202 if accepted else 503)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
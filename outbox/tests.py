@@ -0,0 +1,78 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from orders.services import place_orders
+from products.inventory import InsufficientStock
+from products.models import Product
+from .dispatcher import dispatch_batch
+from .models import OutboxEvent
+from .sinks import FileSink, HttpSink
+from .stub import StubReceiver
+
+
+class OutboxTests(TestCase):
+    """
+    Checks that order events are written with their orders, and delivered in batches with retries.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="Plain", price=Decimal('7.25'), stock=10)
+
+    def place(self, count, quantity=1):
+        return place_orders([{'discount': None, 'customer': f"customer-{number}",
+                              'products': [{'product': self.product, 'quantity': quantity}]}
+                             for number in range(count)])
+
+    def test_events_are_written_in_the_order_transaction(self):
+        orders = self.place(3)
+        payloads = list(OutboxEvent.objects.order_by('pk').values_list('payload', flat=True))
+        self.assertEqual([payload['order'] for payload in payloads], [order.pk for order in orders])
+        self.assertEqual(payloads[0]['total_price'], '7.25')
+        self.assertEqual(payloads[0]['items'], [{'product': self.product.pk, 'quantity': 1}])
+        with self.assertRaises(InsufficientStock):
+            self.place(1, quantity=100)
+        self.assertEqual(OutboxEvent.objects.count(), 3)
+
+    def test_file_sink_receives_batches_and_delivered_events_are_pruned(self):
+        self.place(5)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'events.ndjson')
+            self.assertEqual(dispatch_batch([FileSink(path)], batch_size=3).delivered, 3)
+            self.assertEqual(dispatch_batch([FileSink(path)], batch_size=3).delivered, 2)
+            with open(path) as file:
+                messages = [json.loads(line) for line in file]
+        self.assertEqual(len(messages), 5)
+        self.assertEqual(messages[0]['topic'], 'order.placed')
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    @override_settings(OUTBOX={'RETRY_BASE_SECONDS': 2, 'MAX_ATTEMPTS': 3})
+    def test_http_sink_retries_rejected_batches(self):
+        self.place(4)
+        receiver = StubReceiver(failures=1).start()
+        try:
+            sink = HttpSink(receiver.url, TIMEOUT=5)
+            now = timezone.now()
+            result = dispatch_batch([sink], now=now)
+            self.assertEqual((result.delivered, result.failed), (0, 4))
+            self.assertEqual(dispatch_batch([sink], now=now + timedelta(seconds=1)).failed, 0)
+            self.assertEqual(dispatch_batch([sink], now=now + timedelta(seconds=2)).delivered, 4)
+        finally:
+            receiver.stop()
+        self.assertEqual(len(receiver.messages), 4)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    @override_settings(OUTBOX={'MAX_ATTEMPTS': 2, 'RETRY_BASE_SECONDS': 0})
+    def test_events_are_given_up_after_max_attempts(self):
+        self.place(1)
+        sink = HttpSink('http://127.0.0.1:9/events', TIMEOUT=1)
+        self.assertEqual(dispatch_batch([sink]).failed, 1)
+        self.assertEqual(dispatch_batch([sink]).failed, 1)
+        self.assertEqual(dispatch_batch([sink]).failed, 0)
+        self.assertEqual(OutboxEvent.objects.get().attempts, 2)
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class PricingConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'pricing'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .snapshot import load_configured_snapshot
+        load_configured_snapshot()
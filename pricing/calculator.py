@@ -0,0 +1,137 @@
+"""
+    pricing/calculator.py
+
+    This module prices order lines. It prices from the shared-memory price table when one is available,
+    otherwise from the memory-mapped snapshot when one is loaded, and falls back to the database, in one
+    query per table, for the products and discounts they cannot price.
+"""
+
+from functools import partial
+
+from discounts.models import ProductDiscount
+from products.models import Product
+from .shared_table import get_shared_table
+from .snapshot import get_snapshot
+
+
+def get_price_source():
+    """
+    Returns the in-memory pricing data of this process.
+
+    Returns:
+        SharedPriceTable | PricingSnapshot: The shared price table or the snapshot, or None.
+    """
+    table = get_shared_table()
+    return table if table is not None else get_snapshot()
+
+
+def calculate_lines_total(lines, discount_id=None):
+    """
+    Computes the total of order lines, applying the product pricing rules and the order discount.
+
+    Args:
+        lines (Iterable[tuple]): The (product_id, quantity) pairs of the order.
+        discount_id (int, optional): The id of the discount applied to every line.
+
+    Returns:
+        Decimal: The total price of the lines.
+    """
+    return calculate_totals([(lines, discount_id)])[0]
+
+
+def load_unit_prices(pairs):
+    """
+    Prices products at given quantities, applying the product pricing rules. Products that the in-memory
+    pricing data cannot price are loaded with one query.
+
+    Args:
+        pairs (Iterable[tuple]): The (product_id, quantity) pairs to price.
+
+    Returns:
+        dict: The unit price of every (product_id, quantity) pair.
+
+    Raises:
+        Product.DoesNotExist: If a product does not exist.
+    """
+    source = get_price_source()
+    unit_prices = {}
+    missing = []
+    for product_id, quantity in pairs:
+        if (product_id, quantity) in unit_prices:
+            continue
+        price = source.unit_price(product_id, quantity) if source is not None else None
+        if price is None:
+            missing.append((product_id, quantity))
+        else:
+            unit_prices[product_id, quantity] = price
+
+    if missing:
+        products = Product.objects.with_subtypes().in_bulk({product_id for product_id, _ in missing})
+        for product_id, quantity in missing:
+            if product_id not in products:
+                raise Product.DoesNotExist(f"Product {product_id} does not exist")
+            product = products[product_id].get_concrete()
+            unit_prices[product_id, quantity] = product.get_price(quantity=quantity)
+    return unit_prices
+
+
+def load_discount_appliers(discount_ids):
+    """
+    Returns the functions applying discounts to a unit price. Discounts that the in-memory pricing data
+    cannot apply are loaded with one query.
+
+    Args:
+        discount_ids (Iterable[int]): The ids of the discounts.
+
+    Returns:
+        dict: The function applying every existing discount, by id.
+    """
+    source = get_price_source()
+    appliers = {}
+    missing = set()
+    for discount_id in discount_ids:
+        if discount_id in appliers:
+            continue
+        if source is not None and source.has_discount(discount_id):
+            appliers[discount_id] = partial(source.apply_discount, discount_id)
+        else:
+            missing.add(discount_id)
+    if missing:
+        for discount_id, discount in ProductDiscount.objects.with_subtypes().in_bulk(missing).items():
+            appliers[discount_id] = discount.get_concrete().apply_discount
+    return appliers
+
+
+def calculate_totals(orders):
+    """
+    Computes the totals of many orders at once. Products and discounts that the in-memory pricing data
+    cannot price are loaded with one query per table for all orders together.
+
+    Args:
+        orders (Iterable[tuple]): The (lines, discount_id) pairs of the orders, where lines are
+            (product_id, quantity) pairs and discount_id may be None.
+
+    Returns:
+        list: The total price of every order, in order.
+
+    Raises:
+        Product.DoesNotExist: If a product does not exist.
+        ProductDiscount.DoesNotExist: If a discount does not exist.
+    """
+    orders = [(list(lines), discount_id) for lines, discount_id in orders]
+    unit_prices = load_unit_prices(line for lines, _ in orders for line in lines)
+    discount_appliers = load_discount_appliers({discount_id for _, discount_id in orders} - {None})
+
+    totals = []
+    for lines, discount_id in orders:
+        if discount_id is not None and discount_id not in discount_appliers:
+            raise ProductDiscount.DoesNotExist(f"Discount {discount_id} does not exist")
+        apply_discount = discount_appliers[discount_id] if discount_id is not None else None
+        total = 0
+        for product_id, quantity in lines:
+            price = unit_prices[product_id, quantity]
+            if apply_discount is not None:
+                price = apply_discount(price)
+            total += price * quantity
+        totals.append(total)
+    return totals
@@ -0,0 +1,187 @@
+"""
+    pricing/columns.py
+
+    This module defines the fixed-width columnar representation of the pricing data shared by the pricing
+    snapshot and the shared-memory price table. Money is stored as integer cents and percentages as integer
+    basis points (hundredths of a percent), which matches the two decimal places of the model fields and keeps
+    the conversion back to Decimal exact. The pricing functions reproduce the `get_price` and `apply_discount`
+    methods of the product and discount models.
+"""
+
+from array import array
+from decimal import Decimal
+
+from discounts.models import ProductDiscount
+from products.models import Product
+
+PRODUCT_PLAIN = 0
+PRODUCT_SEASONAL = 1
+PRODUCT_BULK = 2
+
+DISCOUNT_PLAIN = 0
+DISCOUNT_PERCENTAGE = 1
+DISCOUNT_FIXED = 2
+
+# (name, array typecode) of every column, in storage order. 8 byte columns come first so that every
+# column stays aligned to its item size when the columns are laid out back to back.
+PRODUCT_COLUMNS = (
+    ('id', 'q'),
+    ('price', 'q'),
+    ('kind', 'i'),
+    ('seasonal_discount', 'i'),
+    ('bulk_threshold', 'i'),
+    ('bulk_discount', 'i'),
+)
+DISCOUNT_COLUMNS = (
+    ('id', 'q'),
+    ('amount', 'q'),
+    ('kind', 'i'),
+    ('percentage', 'i'),
+)
+
+
+def to_fixed(value):
+    """
+    Converts a decimal with two decimal places into an integer number of hundredths.
+
+    Args:
+        value (Decimal): The value to convert, or None.
+
+    Returns:
+        int: The value in hundredths, 0 for None.
+    """
+    if value is None:
+        return 0
+    return int(Decimal(value).scaleb(2).to_integral_value())
+
+
+def from_fixed(value):
+    """
+    Converts an integer number of hundredths back into a decimal with two decimal places.
+
+    Args:
+        value (int): The value in hundredths.
+
+    Returns:
+        Decimal: The decimal value.
+    """
+    return Decimal(value).scaleb(-2)
+
+
+def empty_columns(columns):
+    """
+    Creates one empty typed array per column.
+
+    Args:
+        columns (tuple): The (name, typecode) column definitions.
+
+    Returns:
+        dict: The arrays by column name.
+    """
+    return {name: array(typecode) for name, typecode in columns}
+
+
+def load_product_columns(queryset=None, chunk_size=5000):
+    """
+    Reads the pricing fields of the products into typed arrays sorted by id, in a single query that
+    left-joins the seasonal and bulk child tables.
+
+    Args:
+        queryset (QuerySet, optional): The products to load, all products by default.
+        chunk_size (int): The number of rows fetched per database round trip.
+
+    Returns:
+        dict: The arrays by column name, see PRODUCT_COLUMNS.
+    """
+    queryset = Product.objects.all() if queryset is None else queryset
+    columns = empty_columns(PRODUCT_COLUMNS)
+    rows = queryset.order_by('pk').values_list(
+        'pk', 'price', 'seasonalproduct__pk', 'seasonalproduct__seasonal_discount',
+        'bulkproduct__pk', 'bulkproduct__bulk_threshold', 'bulkproduct__bulk_discount')
+    for pk, price, seasonal_pk, seasonal_discount, bulk_pk, bulk_threshold, bulk_discount in rows.iterator(
+            chunk_size=chunk_size):
+        columns['id'].append(pk)
+        columns['price'].append(to_fixed(price))
+        if seasonal_pk is not None:
+            columns['kind'].append(PRODUCT_SEASONAL)
+        elif bulk_pk is not None:
+            columns['kind'].append(PRODUCT_BULK)
+        else:
+            columns['kind'].append(PRODUCT_PLAIN)
+        columns['seasonal_discount'].append(to_fixed(seasonal_discount))
+        columns['bulk_threshold'].append(bulk_threshold or 0)
+        columns['bulk_discount'].append(to_fixed(bulk_discount))
+    return columns
+
+
+def load_discount_columns(queryset=None, chunk_size=5000):
+    """
+    Reads the pricing fields of the discounts into typed arrays sorted by id, in a single query that
+    left-joins the percentage and fixed amount child tables.
+
+    Args:
+        queryset (QuerySet, optional): The discounts to load, all discounts by default.
+        chunk_size (int): The number of rows fetched per database round trip.
+
+    Returns:
+        dict: The arrays by column name, see DISCOUNT_COLUMNS.
+    """
+    queryset = ProductDiscount.objects.all() if queryset is None else queryset
+    columns = empty_columns(DISCOUNT_COLUMNS)
+    rows = queryset.order_by('pk').values_list(
+        'pk', 'percentagediscount__pk', 'percentagediscount__percentage',
+        'fixedamountdiscount__pk', 'fixedamountdiscount__amount')
+    for pk, percentage_pk, percentage, fixed_pk, amount in rows.iterator(chunk_size=chunk_size):
+        columns['id'].append(pk)
+        columns['amount'].append(to_fixed(amount))
+        if percentage_pk is not None:
+            columns['kind'].append(DISCOUNT_PERCENTAGE)
+        elif fixed_pk is not None:
+            columns['kind'].append(DISCOUNT_FIXED)
+        else:
+            columns['kind'].append(DISCOUNT_PLAIN)
+        columns['percentage'].append(to_fixed(percentage))
+    return columns
+
+
+def unit_price(kind, price, seasonal_discount, bulk_threshold, bulk_discount, quantity=1):
+    """
+    Computes the unit price of a product from its fixed-width pricing fields.
+
+    Args:
+        kind (int): PRODUCT_PLAIN, PRODUCT_SEASONAL or PRODUCT_BULK.
+        price (int): The price in cents.
+        seasonal_discount (int): The seasonal discount in basis points.
+        bulk_threshold (int): The minimum quantity for the bulk discount.
+        bulk_discount (int): The bulk discount in basis points.
+        quantity (int): The quantity being purchased.
+
+    Returns:
+        Decimal: The unit price, as computed by the `get_price` method of the product model.
+    """
+    price = from_fixed(price)
+    if kind == PRODUCT_SEASONAL:
+        return price * (1 - from_fixed(seasonal_discount) / 100)
+    if kind == PRODUCT_BULK and quantity >= bulk_threshold:
+        return price * (1 - from_fixed(bulk_discount) / 100)
+    return price
+
+
+def discounted_price(kind, amount, percentage, price):
+    """
+    Applies a discount given by its fixed-width pricing fields to a price.
+
+    Args:
+        kind (int): DISCOUNT_PLAIN, DISCOUNT_PERCENTAGE or DISCOUNT_FIXED.
+        amount (int): The fixed amount in cents.
+        percentage (int): The percentage in basis points.
+        price (Decimal): The price to discount.
+
+    Returns:
+        Decimal: The discounted price, as computed by the `apply_discount` method of the discount model.
+    """
+    if kind == DISCOUNT_PERCENTAGE:
+        return price * (1 - from_fixed(percentage) / 100)
+    if kind == DISCOUNT_FIXED:
+        return max(0, price - from_fixed(amount))
+    return price
@@ -0,0 +1,119 @@
+"""
+    pricing/expressions.py
+
+    This module expresses the pricing rules of the product and discount models as ORM expressions, so that
+    line and order totals can be computed by the database in a single aggregate query. The expressions are
+    built relative to a lookup path, which lets the same rules be used from OrderItem and from Order
+    querysets. The cross-check against the Python implementation lives in `orders/tests.py`.
+"""
+
+from decimal import Decimal, ROUND_HALF_EVEN
+
+from django.db.models import Case, DecimalField, F, Func, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+MONEY = DecimalField(max_digits=20, decimal_places=2)
+UNROUNDED = DecimalField(max_digits=30, decimal_places=10)
+CENT = Decimal('0.01')
+
+
+def round_money(value):
+    """
+    Rounds an amount to cents the way DecimalFields with two decimal places store it.
+
+    Computed aggregates are not rounded by the database backends, and SQLite computes them in floating
+    point, so amounts read from expressions are rounded before being compared or stored.
+
+    Args:
+        value (Decimal): The amount to round.
+
+    Returns:
+        Decimal: The amount rounded half to even to two decimal places.
+    """
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_EVEN)
+
+
+class Percent(Func):
+    """
+    Divides a percentage by 100.
+
+    SQLite stores whole decimals as integers, where dividing by 100 would truncate, so the division is
+    done in floating point there. Other databases divide exact decimals.
+    """
+    template = '(%(expressions)s) / 100'
+    output_field = UNROUNDED
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='CAST(%(expressions)s AS REAL) / 100', **extra_context)
+
+
+def unit_price_expression(product='product__', quantity='quantity'):
+    """
+    Builds the unit price of a product, as computed by the `get_price` methods of the product models.
+
+    Args:
+        product (str): The lookup path to the Product, ending with '__'.
+        quantity (str): The lookup path to the purchased quantity.
+
+    Returns:
+        Case: The unit price expression.
+    """
+    price = F(product + 'price')
+    return Case(
+        When(**{product + 'seasonalproduct__isnull': False},
+             then=price * (Value(1) - Percent(F(product + 'seasonalproduct__seasonal_discount')))),
+        When(**{product + 'bulkproduct__isnull': False,
+                quantity + '__gte': F(product + 'bulkproduct__bulk_threshold')},
+             then=price * (Value(1) - Percent(F(product + 'bulkproduct__bulk_discount')))),
+        default=price,
+        output_field=UNROUNDED,
+    )
+
+
+def discounted_price_expression(price, discount='order__discount__'):
+    """
+    Applies a discount to a price expression, as computed by the `apply_discount` methods of the discount
+    models.
+
+    Args:
+        price (Expression): The price to discount.
+        discount (str): The lookup path to the ProductDiscount, ending with '__'.
+
+    Returns:
+        Case: The discounted price expression.
+    """
+    return Case(
+        When(**{discount + 'percentagediscount__isnull': False},
+             then=price * (Value(1) - Percent(F(discount + 'percentagediscount__percentage')))),
+        When(**{discount + 'fixedamountdiscount__isnull': False},
+             then=Greatest(price - F(discount + 'fixedamountdiscount__amount'), Value(Decimal('0')),
+                           output_field=UNROUNDED)),
+        default=price,
+        output_field=UNROUNDED,
+    )
+
+
+def line_total_expression(item='', discount='order__discount__'):
+    """
+    Builds the total of an order line: its discounted unit price times its quantity.
+
+    Args:
+        item (str): The lookup path to the OrderItem, ending with '__', or '' on OrderItem querysets.
+        discount (str): The lookup path to the ProductDiscount of the order, ending with '__'.
+
+    Returns:
+        Expression: The line total expression.
+    """
+    unit_price = unit_price_expression(product=item + 'product__', quantity=item + 'quantity')
+    return discounted_price_expression(unit_price, discount=discount) * F(item + 'quantity')
+
+
+def order_total_expression():
+    """
+    Builds the total of an order, to be used as an annotation on Order querysets.
+
+    Returns:
+        Expression: The order total expression, 0 for orders without items.
+    """
+    return Coalesce(Sum(line_total_expression(item='orderitem__', discount='discount__'), output_field=MONEY),
+                    Value(Decimal('0')), output_field=MONEY)
@@ -0,0 +1,26 @@
+"""
+    pricing/management/commands/build_pricing_snapshot.py
+
+    Writes the memory-mapped pricing snapshot loaded by workers at startup.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pricing.snapshot import write_snapshot
+
+
+class Command(BaseCommand):
+    help = "Writes a pricing snapshot of all products and discounts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None,
+                            help="Snapshot file, defaults to the PRICING_SNAPSHOT_PATH setting")
+
+    def handle(self, *args, **options):
+        path = options['output'] or getattr(settings, 'PRICING_SNAPSHOT_PATH', None)
+        if not path:
+            raise CommandError("Pass --output or set PRICING_SNAPSHOT_PATH")
+        product_count, discount_count = write_snapshot(path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {product_count} products and {discount_count} discounts to {path}"))
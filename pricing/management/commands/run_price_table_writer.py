@@ -0,0 +1,51 @@
+"""
+    pricing/management/commands/run_price_table_writer.py
+
+    Runs the single writer of the shared-memory price table of this host.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from pricing.shared_table import PriceTableWriter
+
+
+class Command(BaseCommand):
+    help = "Builds the shared-memory price table and keeps it up to date"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', default=None,
+                            help="Shared memory name of the table, defaults to the PRICE_TABLE_NAME setting")
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="Seconds between two polls for updated products and discounts")
+        parser.add_argument('--rebuild-every', type=float, default=600.0,
+                            help="Seconds between two full rebuilds, which also drop deleted rows")
+
+    def handle(self, *args, **options):
+        name = options['name'] or getattr(settings, 'PRICE_TABLE_NAME', None)
+        if not name:
+            raise CommandError("Pass --name or set PRICE_TABLE_NAME")
+
+        writer = PriceTableWriter(name)
+        writer.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Price table {name} ready, generation {writer.table.generation}"))
+        rebuilt_at = time.monotonic()
+        try:
+            while True:
+                time.sleep(options['interval'])
+                close_old_connections()
+                if time.monotonic() - rebuilt_at >= options['rebuild_every']:
+                    writer.rebuild()
+                    rebuilt_at = time.monotonic()
+                    self.stdout.write(f"Rebuilt price table, generation {writer.table.generation}")
+                    continue
+                applied = writer.refresh()
+                if applied:
+                    self.stdout.write(f"Applied {applied} updated rows")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            writer.close()
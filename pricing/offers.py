@@ -0,0 +1,192 @@
+"""
+    pricing/offers.py
+
+    This module prices orders with the offers selected by `pricing.optimizer`. The candidate offers of an
+    order are the discount it requests, the automatic discounts and the active bundle offers of its
+    products; they are loaded with two queries for many orders together, and priced from the same sources
+    as `pricing.calculator`.
+"""
+
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from discounts.models import BundleOffer, ProductDiscount
+from .calculator import load_discount_appliers, load_unit_prices
+from .optimizer import Bundle, optimize
+
+DEFAULT_TIME_BUDGET_MS = 10
+
+Offers = namedtuple('Offers', ['discount_ids', 'bundles'])
+
+
+def load_offers(product_ids):
+    """
+    Loads the automatic discounts and the active bundle offers applying to products.
+
+    Args:
+        product_ids (Iterable[int]): The ids of the ordered products.
+
+    Returns:
+        Offers: The ids of the automatic discounts, and the bundle offers with the given products they
+        apply to.
+    """
+    discount_ids = list(ProductDiscount.objects.filter(auto_apply=True).values_list('pk', flat=True))
+    rows = (BundleOffer.products.through.objects
+            .filter(product_id__in=set(product_ids), bundleoffer__is_active=True)
+            .values_list('bundleoffer_id', 'bundleoffer__buy_quantity', 'bundleoffer__free_quantity', 'product_id'))
+    products = {}
+    for bundle_id, buy_quantity, free_quantity, product_id in rows:
+        products.setdefault((bundle_id, buy_quantity, free_quantity), set()).add(product_id)
+    return Offers(discount_ids, [Bundle(bundle_id, buy_quantity, free_quantity, frozenset(product_ids))
+                                 for (bundle_id, buy_quantity, free_quantity), product_ids in products.items()])
+
+
+def has_offers(offers):
+    """
+    Checks whether orders have offers besides the discount they request.
+
+    Args:
+        offers (Offers): The offers of the orders.
+
+    Returns:
+        bool: True if some automatic discount or bundle offer applies.
+    """
+    return bool(offers.discount_ids or offers.bundles)
+
+
+def get_time_budget():
+    """
+    Returns the time the optimizer may search the offers of one order.
+
+    Returns:
+        float: The budget in seconds, from DISCOUNT_OPTIMIZER['TIME_BUDGET_MS'].
+    """
+    return getattr(settings, 'DISCOUNT_OPTIMIZER', {}).get('TIME_BUDGET_MS', DEFAULT_TIME_BUDGET_MS) / 1000
+
+
+def allocate_offers(orders, offers):
+    """
+    Selects the offers giving every order its lowest total.
+
+    Args:
+        orders (Iterable[tuple]): The (lines, discount_id) pairs of the orders, where lines are
+            (product_id, quantity) pairs and discount_id may be None.
+        offers (Offers): The automatic discounts and bundle offers, see `load_offers`.
+
+    Returns:
+        list: The Allocation of every order, in order.
+
+    Raises:
+        Product.DoesNotExist: If a product does not exist.
+        ProductDiscount.DoesNotExist: If a requested discount does not exist.
+    """
+    orders = [(list(lines), discount_id) for lines, discount_id in orders]
+    unit_prices = load_unit_prices(line for lines, _ in orders for line in lines)
+    appliers = load_discount_appliers(set(offers.discount_ids) | {discount_id for _, discount_id in orders} - {None})
+    automatic = {discount_id: appliers[discount_id] for discount_id in offers.discount_ids if discount_id in appliers}
+    budget = get_time_budget()
+
+    allocations = []
+    for lines, discount_id in orders:
+        candidates = dict(automatic)
+        if discount_id is not None:
+            if discount_id not in appliers:
+                raise ProductDiscount.DoesNotExist(f"Discount {discount_id} does not exist")
+            candidates[discount_id] = appliers[discount_id]
+        allocations.append(optimize(lines, [unit_prices[line] for line in lines], candidates, offers.bundles,
+                                    time.perf_counter() + budget))
+    return allocations
+
+
+def uses_discount(allocation, discount_id):
+    """
+    Checks whether a discount is applied to some line of an order.
+
+    Args:
+        allocation (Allocation): The offers of the order.
+        discount_id (int): The id of the discount.
+
+    Returns:
+        bool: True if some units of the order get the discount.
+    """
+    return any(line.discount_id == discount_id for line in allocation.lines)
+
+
+def line_offers(line):
+    """
+    Describes the offers applied to the units of a line.
+
+    Args:
+        line (PricedLine): The priced line.
+
+    Returns:
+        list: A `discount` entry with its number of `units` if the line gets a discount, then a `bundle` entry
+        with its number of `units` and `free_units` for every bundle offer sharing the line.
+    """
+    offers = []
+    bundled = sum(share.units for share in line.bundles)
+    if line.discount_id is not None:
+        offers.append({'discount': line.discount_id, 'units': line.quantity - bundled})
+    offers.extend({'bundle': share.bundle_id, 'units': share.units, 'free_units': share.free_units}
+                  for share in line.bundles)
+    return offers
+
+
+def applied_offers(allocation):
+    """
+    Describes the offers applied to an order, as stored with it.
+
+    Args:
+        allocation (Allocation): The offers of the order.
+
+    Returns:
+        list: The `line_offers` entries of every line, with the `product` of the line.
+    """
+    return [{'product': line.product_id, **offer} for line in allocation.lines for offer in line_offers(line)]
+
+
+def calculate_offers_totals(orders):
+    """
+    Computes the totals of orders with the offers stored for them, see `applied_offers`, from the same sources
+    as `pricing.calculator.calculate_totals`: the units of a `discount` entry get the discount, the paid units of
+    a `bundle` entry their unit price, its free units nothing, and the other units their unit price.
+
+    Args:
+        orders (Iterable[tuple]): The (lines, offers) pairs of the orders, where lines are (product_id, quantity)
+            pairs and offers are the stored `applied_offers` entries.
+
+    Returns:
+        list: The unrounded total price of every order, in order.
+
+    Raises:
+        Product.DoesNotExist: If a product does not exist.
+        ProductDiscount.DoesNotExist: If a discount does not exist.
+    """
+    orders = [(list(lines), offers) for lines, offers in orders]
+    unit_prices = load_unit_prices(line for lines, _ in orders for line in lines)
+    discount_ids = {offer['discount'] for _, offers in orders for offer in offers if 'discount' in offer}
+    appliers = load_discount_appliers(discount_ids)
+    missing = discount_ids - appliers.keys()
+    if missing:
+        raise ProductDiscount.DoesNotExist(f"Discount {min(missing)} does not exist")
+
+    totals = []
+    for lines, offers in orders:
+        product_offers = {}
+        for offer in offers:
+            product_offers.setdefault(offer['product'], []).append(offer)
+        total = 0
+        for product_id, quantity in lines:
+            price = unit_prices[product_id, quantity]
+            full_price_units = quantity
+            for offer in product_offers.get(product_id, ()):
+                if 'discount' in offer:
+                    total += appliers[offer['discount']](price) * offer['units']
+                else:
+                    total += price * (offer['units'] - offer['free_units'])
+                full_price_units -= offer['units']
+            total += price * full_price_units
+        totals.append(total)
+    return totals
@@ -0,0 +1,369 @@
+"""
+    pricing/optimizer.py
+
+    This module selects the combination of offers giving an order its lowest total. Every unit of an order
+    gets at most one offer: either the best of the candidate discounts for its line, or a place in a bundle
+    of a "buy X get Y free" offer, where the Y cheapest units of every X + Y units are free.
+
+    Discounts alone are chosen line by line. Bundles compete for units, so they are searched: the units that
+    some bundle offer applies to are sorted by price, from the most expensive, and a dynamic program walks
+    them one at a time, giving each unit its line discount or the next place in the current bundle of one
+    of its offers. Walking units by decreasing price makes the last places of a bundle its cheapest units,
+    hence its free ones. The states of a step are the positions reached in the current bundle of every
+    offer; states reached twice are memoized with their best savings, and states that cannot complete their
+    bundles or cannot beat the greedy solution even with the most optimistic remaining savings are pruned.
+
+    Offers sharing no unit are searched separately, and an offer sharing units with no other is solved
+    exactly by the same dynamic program with a single position. Groups of offers whose positions can form
+    more than MAX_SEARCH_STATES states, and searches running past their deadline, get the greedy solution
+    instead: each offer in turn, the most generous first, takes its best bundles among the units left.
+"""
+
+import heapq
+import math
+import time
+from collections import namedtuple
+
+Bundle = namedtuple('Bundle', ['id', 'buy_quantity', 'free_quantity', 'product_ids'])
+BundleShare = namedtuple('BundleShare', ['bundle_id', 'units', 'free_units'])
+PricedLine = namedtuple('PricedLine', ['product_id', 'quantity', 'unit_price', 'discount_id', 'discounted_price',
+                                       'bundles', 'line_total'])
+Allocation = namedtuple('Allocation', ['lines', 'total', 'exact'])
+Unit = namedtuple('Unit', ['line', 'price', 'saving', 'bundles'])
+
+# Number of states expanded between two deadline checks.
+DEADLINE_CHECK_INTERVAL = 256
+# Offers sharing units are only searched together when the positions in their current bundles can form at
+# most this many states; larger groups are left to the greedy solution.
+MAX_SEARCH_STATES = 1024
+
+
+class SearchTimeout(Exception):
+    """
+    Raised when a search runs past its deadline.
+    """
+
+
+def best_discounts(unit_prices, discounts):
+    """
+    Selects the discount giving every unit price its lowest value.
+
+    Args:
+        unit_prices (list): The unit price of every line.
+        discounts (dict): The functions applying the candidate discounts to a unit price, by id.
+
+    Returns:
+        list: The (discount_id, discounted_price) pair of every line; the discount id is None when no
+        discount lowers the price.
+    """
+    candidates = sorted(discounts.items())
+    chosen = []
+    for price in unit_prices:
+        discount_id, discounted = None, price
+        for candidate_id, apply_discount in candidates:
+            candidate = apply_discount(price)
+            if candidate < discounted:
+                discount_id, discounted = candidate_id, candidate
+        chosen.append((discount_id, discounted))
+    return chosen
+
+
+def bundle_size(bundle):
+    """
+    Returns the number of units of one bundle of an offer.
+
+    Args:
+        bundle (Bundle): The bundle offer.
+
+    Returns:
+        int: The number of paid and free units.
+    """
+    return bundle.buy_quantity + bundle.free_quantity
+
+
+def split_components(units, bundle_count):
+    """
+    Groups bundle offers sharing units, so that each group can be searched separately.
+
+    Args:
+        units (list): The units, each with the indexes of the bundle offers applying to it.
+        bundle_count (int): The number of bundle offers.
+
+    Returns:
+        list: The sorted bundle indexes of every group.
+    """
+    parents = list(range(bundle_count))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    for unit in units:
+        for other in unit.bundles[1:]:
+            parents[find(other)] = find(unit.bundles[0])
+    groups = {}
+    for index in range(bundle_count):
+        groups.setdefault(find(index), []).append(index)
+    return list(groups.values())
+
+
+def fill_bundles(units, bundle):
+    """
+    Finds the bundles of one offer giving units their largest savings, by dynamic programming over the
+    position reached in its current bundle.
+
+    Args:
+        units (list): The units the offer applies to, sorted by decreasing price.
+        bundle (Bundle): The bundle offer.
+
+    Returns:
+        tuple: The savings, and whether every unit is free in a bundle, True, paid in a bundle, False, or
+        given its line discount, None.
+    """
+    size = bundle_size(bundle)
+    values = [0.0] + [-math.inf] * (size - 1)
+    trail = []
+    for unit in units:
+        reached = [-math.inf] * size
+        links = [None] * size
+        for place, value in enumerate(values):
+            if value == -math.inf:
+                continue
+            if value + unit.saving > reached[place]:
+                reached[place] = value + unit.saving
+                links[place] = (place, None)
+            is_free = place >= bundle.buy_quantity
+            next_place = (place + 1) % size
+            joined = value + unit.price if is_free else value
+            if joined > reached[next_place]:
+                reached[next_place] = joined
+                links[next_place] = (place, is_free)
+        values = reached
+        trail.append(links)
+    choices = [None] * len(units)
+    place = 0
+    for position in range(len(units) - 1, -1, -1):
+        place, choices[position] = trail[position][place]
+    return values[0], choices
+
+
+def greedy_bundles(units, bundles):
+    """
+    Fills the bundles of one offer at a time, each with its best bundles among the units left, starting with
+    the offers giving the largest share of their units for free.
+
+    Args:
+        units (list): The units, sorted by decreasing price.
+        bundles (list): The bundle offers, indexed by the `bundles` of the units.
+
+    Returns:
+        tuple: The savings, and the (bundle index, free) choice of every unit, None for a line discount.
+    """
+    eligible = [[] for _ in bundles]
+    for position, unit in enumerate(units):
+        for index in unit.bundles:
+            eligible[index].append(position)
+    choices = [None] * len(units)
+    order = sorted(range(len(bundles)),
+                   key=lambda index: (-bundles[index].free_quantity / bundle_size(bundles[index]), bundles[index].id))
+    for index in order:
+        positions = [position for position in eligible[index] if choices[position] is None]
+        _, filled = fill_bundles([units[position] for position in positions], bundles[index])
+        for position, is_free in zip(positions, filled):
+            if is_free is not None:
+                choices[position] = (index, is_free)
+    savings = sum(unit.price if choice is not None and choice[1] else (unit.saving if choice is None else 0.0)
+                  for unit, choice in zip(units, choices))
+    return savings, choices
+
+
+def max_free_units(bundle, remaining):
+    """
+    Bounds the number of free units of an offer among the next units of the search, whatever the position
+    reached in its current bundle: free places repeat every bundle, in runs of `free_quantity`.
+
+    Args:
+        bundle (Bundle): The bundle offer.
+        remaining (int): The number of units left that the offer applies to.
+
+    Returns:
+        int: The largest number of them that can be free.
+    """
+    size = bundle_size(bundle)
+    return bundle.free_quantity * (remaining // size) + min(bundle.free_quantity, remaining % size)
+
+
+def search_bundles(units, bundles, incumbent, deadline):
+    """
+    Finds the bundles giving units their largest savings, by dynamic programming over the positions reached
+    in the current bundle of every offer, with branch-and-bound pruning.
+
+    Args:
+        units (list): The units, sorted by decreasing price.
+        bundles (list): The bundle offers, indexed by the `bundles` of the units.
+        incumbent (float): The savings of a known solution; states that cannot reach them are pruned.
+        deadline (float): The `time.perf_counter()` value at which the search is abandoned.
+
+    Returns:
+        tuple: The savings and the (bundle index, free) choice of every unit, None for a line discount; or
+        None if no solution beats the incumbent.
+
+    Raises:
+        SearchTimeout: If the deadline passes.
+    """
+    count = len(units)
+    sizes = [bundle_size(bundle) for bundle in bundles]
+    # remaining[position][index]: units from `position` on that bundle offer `index` applies to.
+    remaining = [[0] * len(bundles) for _ in range(count + 1)]
+    # bounds[position]: the largest savings the units from `position` on could bring, if the free units were
+    # those gaining the most over their line discount. The largest gains are kept in `top`, the others in
+    # `rest` (negated).
+    bounds = [0.0] * (count + 1)
+    top, rest = [], []
+    top_sum = saving_sum = 0.0
+    for position in range(count - 1, -1, -1):
+        unit = units[position]
+        remaining[position] = list(remaining[position + 1])
+        for index in unit.bundles:
+            remaining[position][index] += 1
+        saving_sum += unit.saving
+        gain = unit.price - unit.saving
+        if top and gain > top[0]:
+            evicted = heapq.heappushpop(top, gain)
+            top_sum += gain - evicted
+            gain = evicted
+        heapq.heappush(rest, -gain)
+        free = sum(max_free_units(bundle, remaining[position][index]) for index, bundle in enumerate(bundles))
+        while len(top) < free and rest:
+            moved = -heapq.heappop(rest)
+            heapq.heappush(top, moved)
+            top_sum += moved
+        bounds[position] = saving_sum + top_sum
+
+    start = (0,) * len(bundles)
+    buys = [bundle.buy_quantity for bundle in bundles]
+    states = {start: 0.0}
+    trail = []
+    expanded = 0
+    for position, unit in enumerate(units):
+        left = remaining[position + 1]
+        bound = bounds[position + 1]
+        reached, links = {}, {}
+        for state, savings in states.items():
+            expanded += 1
+            if expanded % DEADLINE_CHECK_INTERVAL == 0 and time.perf_counter() > deadline:
+                raise SearchTimeout()
+            # Only the offers of this unit have one unit less left to complete their current bundle.
+            if all(not state[index] or left[index] >= sizes[index] - state[index] for index in unit.bundles):
+                value = savings + unit.saving
+                if value + bound >= incumbent and value > reached.get(state, -1.0):
+                    reached[state] = value
+                    links[state] = (state, None)
+            for index in unit.bundles:
+                place = state[index]
+                next_place = place + 1
+                if next_place == sizes[index]:
+                    next_place = 0
+                elif left[index] < sizes[index] - next_place:
+                    continue
+                is_free = place >= buys[index]
+                value = savings + unit.price if is_free else savings
+                next_state = state[:index] + (next_place,) + state[index + 1:]
+                if value + bound >= incumbent and value > reached.get(next_state, -1.0):
+                    reached[next_state] = value
+                    links[next_state] = (state, (index, is_free))
+        states = reached
+        trail.append(links)
+
+    if start not in states:
+        return None
+    choices = [None] * count
+    state = start
+    for position in range(count - 1, -1, -1):
+        state, choices[position] = trail[position][state]
+    return states[start], choices
+
+
+def optimize(lines, unit_prices, discounts, bundles, deadline):
+    """
+    Selects the offers giving an order its lowest total.
+
+    Args:
+        lines (list): The (product_id, quantity) pairs of the order.
+        unit_prices (list): The unit price of every line, after the product pricing rules.
+        discounts (dict): The functions applying the candidate discounts to a unit price, by id.
+        bundles (Iterable[Bundle]): The candidate bundle offers.
+        deadline (float): The `time.perf_counter()` value at which searches fall back to greedy solutions.
+
+    Returns:
+        Allocation: The priced lines with the offers of their units, the unrounded total, and whether every
+        search completed.
+    """
+    chosen = best_discounts(unit_prices, discounts)
+    offers, line_bundles = [], {}
+    for bundle in sorted(bundles, key=lambda bundle: bundle.id):
+        bundle_lines = [line for line, (product_id, _) in enumerate(lines) if product_id in bundle.product_ids]
+        if sum(lines[line][1] for line in bundle_lines) < bundle_size(bundle):
+            continue
+        for line in bundle_lines:
+            line_bundles.setdefault(line, []).append(len(offers))
+        offers.append(bundle)
+    units = sorted(
+        (Unit(line, float(unit_prices[line]), float(unit_prices[line] - chosen[line][1]), tuple(line_bundles[line]))
+         for line in line_bundles for _ in range(lines[line][1])),
+        key=lambda unit: (-unit.price, unit.line),
+    )
+
+    groups = sorted(split_components(units, len(offers)), key=len)
+    group_of, local = {}, {}
+    for number, group in enumerate(groups):
+        for place, index in enumerate(group):
+            group_of[index], local[index] = number, place
+    group_units = [[] for _ in groups]
+    for unit in units:
+        group_units[group_of[unit.bundles[0]]].append(
+            unit._replace(bundles=tuple(local[index] for index in unit.bundles)))
+
+    exact = True
+    shares = {}
+    # Small groups first, so that a group too large to search within the deadline cannot starve them.
+    for group, members in zip(groups, group_units):
+        group_offers = [offers[index] for index in group]
+        if len(group_offers) == 1:
+            _, filled = fill_bundles(members, group_offers[0])
+            choices = [None if is_free is None else (0, is_free) for is_free in filled]
+        else:
+            savings, choices = greedy_bundles(members, group_offers)
+            found = None
+            if math.prod(bundle_size(bundle) for bundle in group_offers) > MAX_SEARCH_STATES:
+                exact = False
+            else:
+                try:
+                    found = search_bundles(members, group_offers, savings, deadline)
+                except SearchTimeout:
+                    exact = False
+            if found is not None and found[0] >= savings:
+                choices = found[1]
+        for unit, choice in zip(members, choices):
+            if choice is not None:
+                key = (unit.line, group_offers[choice[0]].id)
+                units_count, free_count = shares.get(key, (0, 0))
+                shares[key] = (units_count + 1, free_count + int(choice[1]))
+
+    line_shares = {}
+    for (line, bundle_id), (units_count, free_count) in sorted(shares.items()):
+        line_shares.setdefault(line, []).append(BundleShare(bundle_id, units_count, free_count))
+    priced = []
+    total = 0
+    for line, ((product_id, quantity), price, (discount_id, discounted)) in enumerate(zip(lines, unit_prices, chosen)):
+        bundled = sum(share.units for share in line_shares.get(line, []))
+        paid = sum(share.units - share.free_units for share in line_shares.get(line, []))
+        line_total = price * paid + discounted * (quantity - bundled)
+        if bundled == quantity:
+            discount_id = None
+        priced.append(PricedLine(product_id, quantity, price, discount_id, discounted, line_shares.get(line, []),
+                                 line_total))
+        total += line_total
+    return Allocation(priced, total, exact)
@@ -0,0 +1,515 @@
+"""
+    pricing/shared_table.py
+
+    This module implements a price table in shared memory, so that all workers on a host price from a single
+    copy of the pricing data. The table uses the columnar layout of `pricing.columns`: one fixed-width array per
+    column, with rows sorted by id so that the id column doubles as the id-to-slot index.
+
+    A single writer process (`manage.py run_price_table_writer`) builds the table and applies updates. Every
+    write is wrapped in a seqlock: the writer makes the sequence counter odd before touching rows and even
+    again afterwards, and readers retry when the counter was odd or changed while they read, so they never
+    see torn rows. A reader giving up on a write that never ends (the writer died in the middle of it) treats the
+    table as unavailable for a while, and prices from the snapshot or the database instead. When a table runs
+    out of room, the writer builds a larger one under the next generation
+    and publishes the generation in a small control segment; readers notice it and re-attach.
+
+    The writer polls for rows by their `updated_at`, so it applies a change up to a poll interval after its
+    commit. Rows saved by a worker are priced from the database by that worker until then.
+"""
+
+import atexit
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from multiprocessing import resource_tracker, shared_memory
+
+from django.conf import settings
+
+from .snapshot import check_window_start
+from .columns import (PRODUCT_COLUMNS, DISCOUNT_COLUMNS, load_product_columns, load_discount_columns,
+                      unit_price, discounted_price)
+
+# seq, generation, product capacity, product count, discount capacity, discount count, built at and refreshed at
+# (epoch microseconds)
+HEADER = struct.Struct('=8q')
+(SEQ, GENERATION, PRODUCT_CAPACITY, PRODUCT_COUNT, DISCOUNT_CAPACITY, DISCOUNT_COUNT, BUILT_AT,
+ REFRESHED_AT) = range(8)
+
+CONTROL = struct.Struct('=q')
+MIN_CAPACITY = 1024
+# How long a reader waits for a write to end, and how long it then leaves the table alone.
+READ_TIMEOUT_SECONDS = 0.1
+UNAVAILABLE_SECONDS = 1.0
+
+# The ids saved by this process, with the time their save committed (epoch microseconds), priced from the
+# database until the writer has applied them. At most one entry per row.
+_saved_product_ids = {}
+_saved_discount_ids = {}
+
+
+class TableFull(Exception):
+    """
+    Raised by the writer when an update does not fit in the current table.
+    """
+
+
+class TableUnavailable(Exception):
+    """
+    Raised by readers when a write has not ended within READ_TIMEOUT_SECONDS.
+    """
+
+
+def _epoch_micros(moment=None):
+    return int((moment.timestamp() if moment is not None else time.time()) * 1_000_000)
+
+
+def mark_saved(product_ids=(), discount_ids=()):
+    """
+    Prices products and discounts saved by this process from the database until the writer has applied them.
+    Called once their save has committed.
+
+    Args:
+        product_ids (Iterable[int]): The saved products.
+        discount_ids (Iterable[int]): The saved discounts.
+    """
+    saved_at = _epoch_micros()
+    for saved, ids in ((_saved_product_ids, product_ids), (_saved_discount_ids, discount_ids)):
+        for pk in ids:
+            saved[pk] = saved_at
+
+
+def _attach(name):
+    """
+    Attaches to an existing segment without letting this process' resource tracker unlink it on exit.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        segment = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+
+def _segment_size(product_capacity, discount_capacity):
+    size = HEADER.size
+    for capacity, definitions in ((product_capacity, PRODUCT_COLUMNS), (discount_capacity, DISCOUNT_COLUMNS)):
+        for _, typecode in definitions:
+            size += array(typecode).itemsize * capacity
+        size += -size % 8
+    return size
+
+
+def _map_columns(buffer, product_capacity, discount_capacity):
+    offset = HEADER.size
+    sections = []
+    for capacity, definitions in ((product_capacity, PRODUCT_COLUMNS), (discount_capacity, DISCOUNT_COLUMNS)):
+        columns = {}
+        for name, typecode in definitions:
+            size = array(typecode).itemsize * capacity
+            columns[name] = buffer[offset:offset + size].cast(typecode)
+            offset += size
+        offset += -offset % 8
+        sections.append(columns)
+    return sections
+
+
+class SharedPriceTable:
+    """
+    A view of one generation of the shared price table.
+
+    Readers use `unit_price`, `has_discount` and `apply_discount`, which have the same contract as the
+    methods of `pricing.snapshot.PricingSnapshot`: None means the row is unknown, was saved by this process
+    after the writer's last refresh, or could not be read, and must be priced from the database. The writer
+    uses `create`, `apply` and `mark_refreshed`.
+
+    Attributes:
+        name (str): The base name of the table.
+        generation (int): The generation this view is attached to.
+        header (memoryview): The header fields, see HEADER.
+        products (dict): The product columns by name.
+        discounts (dict): The discount columns by name.
+        unavailable_until (float): The monotonic time before which readers skip the table.
+    """
+
+    def __init__(self, name, segment, owner=False, control=None):
+        self.name = name
+        self.segment = segment
+        self.owner = owner
+        self.control = control
+        self.header = segment.buf[:HEADER.size].cast('q')
+        self.generation = self.header[GENERATION]
+        self.products, self.discounts = _map_columns(
+            segment.buf, self.header[PRODUCT_CAPACITY], self.header[DISCOUNT_CAPACITY])
+        self.unavailable_until = 0.0
+
+    @staticmethod
+    def segment_name(name, generation):
+        return '%s-%d' % (name, generation)
+
+    @classmethod
+    def create(cls, name, generation, products, discounts, built_at):
+        """
+        Creates a new generation of the table holding the given rows. Used by the writer only.
+
+        Args:
+            name (str): The base name of the table.
+            generation (int): The generation number.
+            products (dict): The product columns, see `pricing.columns.load_product_columns`.
+            discounts (dict): The discount columns, see `pricing.columns.load_discount_columns`.
+            built_at (datetime): The time the rows were read.
+
+        Returns:
+            SharedPriceTable: The writer's view of the new table.
+        """
+        product_count = len(products['id'])
+        discount_count = len(discounts['id'])
+        product_capacity = max(MIN_CAPACITY, product_count * 2)
+        discount_capacity = max(MIN_CAPACITY, discount_count * 2)
+        segment = shared_memory.SharedMemory(
+            name=cls.segment_name(name, generation), create=True,
+            size=_segment_size(product_capacity, discount_capacity))
+        HEADER.pack_into(segment.buf, 0, 0, generation, product_capacity, product_count, discount_capacity,
+                         discount_count, _epoch_micros(built_at), _epoch_micros(built_at))
+        table = cls(name, segment, owner=True)
+        for target, source, count in ((table.products, products, product_count),
+                                      (table.discounts, discounts, discount_count)):
+            for column, values in source.items():
+                target[column][:count] = values
+        return table
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Attaches to the current generation of a table created by the writer.
+
+        Args:
+            name (str): The base name of the table.
+
+        Returns:
+            SharedPriceTable: The reader's view of the table.
+
+        Raises:
+            FileNotFoundError: If the writer has not created the table.
+        """
+        control = _attach(name)
+        generation = CONTROL.unpack_from(control.buf)[0]
+        try:
+            segment = _attach(cls.segment_name(name, generation))
+        except FileNotFoundError:
+            control.close()
+            raise
+        return cls(name, segment, control=control)
+
+    def is_current(self):
+        """
+        Checks whether the writer still publishes the generation this view is attached to.
+
+        Returns:
+            bool: False once the writer has switched to a new generation or has stopped.
+        """
+        return CONTROL.unpack_from(self.control.buf)[0] == self.generation
+
+    def is_available(self):
+        """
+        Checks whether readers may use the table, see `_read`.
+
+        Returns:
+            bool: False for UNAVAILABLE_SECONDS after a read gave up on a write.
+        """
+        return time.monotonic() >= self.unavailable_until
+
+    def mark_refreshed(self, refreshed_at):
+        """
+        Records that every row committed before a time has been applied. Used by the writer only.
+
+        Args:
+            refreshed_at (datetime): The time the applied rows were read.
+        """
+        self.header[REFRESHED_AT] = _epoch_micros(refreshed_at)
+
+    def _is_saved_locally(self, saved, pk):
+        saved_at = saved.get(pk)
+        return saved_at is not None and saved_at >= self.header[REFRESHED_AT]
+
+    def _read(self, read):
+        """
+        Runs a read under the seqlock, retrying until it did not overlap a write.
+
+        Raises:
+            TableUnavailable: If the reads kept overlapping writes for READ_TIMEOUT_SECONDS, which happens when
+                the writer died in the middle of a write. The table is then skipped for UNAVAILABLE_SECONDS.
+        """
+        header = self.header
+        deadline = None
+        while True:
+            seq = header[SEQ]
+            if not seq & 1:
+                result = read()
+                if header[SEQ] == seq:
+                    return result
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + READ_TIMEOUT_SECONDS
+            elif now >= deadline:
+                self.unavailable_until = now + UNAVAILABLE_SECONDS
+                raise TableUnavailable(self.name)
+            time.sleep(0)
+
+    @staticmethod
+    def _find(ids, count, pk):
+        index = bisect_left(ids, pk, 0, count)
+        if index < count and ids[index] == pk:
+            return index
+        return None
+
+    def unit_price(self, product_id, quantity=1):
+        """
+        Returns the unit price of a product.
+
+        Args:
+            product_id (int): The product id.
+            quantity (int): The quantity being purchased.
+
+        Returns:
+            Decimal: The unit price, or None if the product must be priced from the database.
+        """
+        if self._is_saved_locally(_saved_product_ids, product_id):
+            return None
+        columns = self.products
+
+        def read():
+            index = self._find(columns['id'], self.header[PRODUCT_COUNT], product_id)
+            if index is None:
+                return None
+            return (columns['kind'][index], columns['price'][index], columns['seasonal_discount'][index],
+                    columns['bulk_threshold'][index], columns['bulk_discount'][index])
+
+        try:
+            row = self._read(read)
+        except TableUnavailable:
+            return None
+        return None if row is None else unit_price(*row, quantity)
+
+    def _discount_row(self, discount_id):
+        if self._is_saved_locally(_saved_discount_ids, discount_id):
+            return None
+        columns = self.discounts
+
+        def read():
+            index = self._find(columns['id'], self.header[DISCOUNT_COUNT], discount_id)
+            if index is None:
+                return None
+            return columns['kind'][index], columns['amount'][index], columns['percentage'][index]
+
+        try:
+            return self._read(read)
+        except TableUnavailable:
+            return None
+
+    def has_discount(self, discount_id):
+        """
+        Checks whether a discount is in the table.
+
+        Args:
+            discount_id (int): The discount id.
+
+        Returns:
+            bool: False if the discount must be loaded from the database.
+        """
+        return self._discount_row(discount_id) is not None
+
+    def apply_discount(self, discount_id, price):
+        """
+        Applies a discount to a price.
+
+        Args:
+            discount_id (int): The discount id.
+            price (Decimal): The price to discount.
+
+        Returns:
+            Decimal: The discounted price, or None if the discount is not in the table.
+        """
+        row = self._discount_row(discount_id)
+        return None if row is None else discounted_price(*row, price)
+
+    def apply(self, products, discounts):
+        """
+        Writes changed rows into the table under the seqlock. Used by the writer only.
+
+        Rows of known ids are overwritten in place; ids larger than every id in the table are appended,
+        which keeps the id column sorted.
+
+        Args:
+            products (dict): The changed product columns, sorted by id.
+            discounts (dict): The changed discount columns, sorted by id.
+
+        Raises:
+            TableFull: If a row can neither be overwritten nor appended. Nothing is written in that case.
+        """
+        plans = []
+        for columns, changes, count_field, capacity_field in (
+                (self.products, products, PRODUCT_COUNT, PRODUCT_CAPACITY),
+                (self.discounts, discounts, DISCOUNT_COUNT, DISCOUNT_CAPACITY)):
+            count = self.header[count_field]
+            slots = []
+            for pk in changes['id']:
+                slot = self._find(columns['id'], count, pk)
+                if slot is None:
+                    if (count and pk < columns['id'][count - 1]) or count >= self.header[capacity_field]:
+                        raise TableFull(pk)
+                    slot = count
+                    count += 1
+                slots.append(slot)
+            plans.append((columns, changes, count_field, count, slots))
+
+        self.header[SEQ] += 1
+        try:
+            for columns, changes, count_field, count, slots in plans:
+                for row, slot in enumerate(slots):
+                    for column, values in changes.items():
+                        columns[column][slot] = values[row]
+                self.header[count_field] = count
+        finally:
+            self.header[SEQ] += 1
+
+    def close(self):
+        """
+        Detaches from the table, and removes it if this view created it.
+        """
+        for columns in (self.products, self.discounts):
+            for view in columns.values():
+                view.release()
+        self.header.release()
+        self.segment.close()
+        if self.control is not None:
+            self.control.close()
+        if self.owner:
+            self.segment.unlink()
+
+
+class PriceTableWriter:
+    """
+    Builds the shared price table and keeps it up to date. Exactly one writer may run per table name.
+
+    Attributes:
+        name (str): The base name of the table.
+        table (SharedPriceTable): The current generation.
+        watermark (datetime): The time the last refresh started. Rows updated after it have not been applied yet;
+            the next refresh reads again those updated shortly before it, see `check_window_start`.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.table = None
+        self.watermark = None
+        self.control = None
+
+    def rebuild(self):
+        """
+        Reads all products and discounts into a new generation and publishes it.
+        """
+        from django.utils import timezone
+
+        started_at = timezone.now()
+        if self.control is None:
+            try:
+                self.control = shared_memory.SharedMemory(name=self.name, create=True, size=CONTROL.size)
+            except FileExistsError:
+                # Left behind by a writer that did not stop cleanly; continue after its last generation.
+                self.control = _attach(self.name)
+        generation = CONTROL.unpack_from(self.control.buf)[0] + 1
+        table = SharedPriceTable.create(self.name, generation, load_product_columns(), load_discount_columns(),
+                                        started_at)
+        CONTROL.pack_into(self.control.buf, 0, generation)
+        previous, self.table, self.watermark = self.table, table, started_at
+        if previous is not None:
+            previous.close()
+
+    def refresh(self):
+        """
+        Applies the products and discounts updated since the last refresh, rebuilding the table when
+        they do not fit.
+
+        Returns:
+            int: The number of applied rows.
+        """
+        from django.utils import timezone
+        from discounts.models import ProductDiscount
+        from products.models import Product
+
+        started_at = timezone.now()
+        since = check_window_start(self.watermark)
+        products = load_product_columns(Product.objects.filter(updated_at__gte=since))
+        discounts = load_discount_columns(ProductDiscount.objects.filter(updated_at__gte=since))
+        try:
+            self.table.apply(products, discounts)
+        except TableFull:
+            self.rebuild()
+            return len(products['id']) + len(discounts['id'])
+        self.table.mark_refreshed(started_at)
+        self.watermark = started_at
+        return len(products['id']) + len(discounts['id'])
+
+    def close(self):
+        """
+        Removes the table and its control segment. Readers still attached see generation 0 and detach.
+        """
+        if self.table is not None:
+            self.table.close()
+        if self.control is not None:
+            CONTROL.pack_into(self.control.buf, 0, 0)
+            self.control.close()
+            self.control.unlink()
+
+
+_table = None
+_retired_tables = []
+_table_lock = threading.Lock()
+_next_attach_at = 0.0
+
+
+def get_shared_table():
+    """
+    Returns the shared price table of this host, attaching to it on first use.
+
+    The table is only used when the PRICE_TABLE_NAME setting is set. If the writer is not running, attaching
+    is retried at most once per second. When the writer has published a new generation, the reader switches
+    to it. A table left in the middle of a write is not returned until it is readable again.
+
+    Returns:
+        SharedPriceTable: The table, or None if it is not available.
+    """
+    global _table, _next_attach_at
+    name = getattr(settings, 'PRICE_TABLE_NAME', None)
+    if not name:
+        return None
+    table = _table
+    if table is not None and table.is_current():
+        return table if table.is_available() else None
+    with _table_lock:
+        if _table is not None:
+            if _table.is_current():
+                return _table if _table.is_available() else None
+            # Other threads may still be reading the previous generation, so it stays mapped.
+            _retired_tables.append(_table)
+            _table = None
+        if time.monotonic() < _next_attach_at:
+            return None
+        try:
+            _table = SharedPriceTable.attach(name)
+        except FileNotFoundError:
+            _next_attach_at = time.monotonic() + 1.0
+        return _table
+
+
+@atexit.register
+def _detach_tables():
+    """
+    Detaches from the shared tables when the process exits. The column views must be released before the
+    segments can be closed, which garbage collection at shutdown does not guarantee.
+    """
+    for table in _retired_tables + [_table]:
+        if table is not None:
+            table.close()
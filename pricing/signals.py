@@ -0,0 +1,70 @@
+"""
+    pricing/signals.py
+
+    This module defines signal receivers keeping the pricing caches of this process consistent with product
+    and discount changes.
+"""
+
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from discounts.models import ProductDiscount
+from dynamic_pricing_system.bulk_updates import rows_bulk_updated
+from products.models import Product
+from .shared_table import mark_saved
+from .snapshot import get_snapshot
+
+
+def invalidate_rows(product_ids=(), discount_ids=()):
+    """
+    Stops pricing changed products and discounts from the in-memory pricing data of this process: from the
+    snapshot at once, and from the shared price table once the change has committed and until the writer has
+    applied it.
+
+    Args:
+        product_ids (list): The changed products.
+        discount_ids (list): The changed discounts.
+    """
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        snapshot.invalidate(product_ids=product_ids, discount_ids=discount_ids)
+    if getattr(settings, 'PRICE_TABLE_NAME', None):
+        transaction.on_commit(partial(mark_saved, product_ids=product_ids, discount_ids=discount_ids))
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_pricing_snapshot(sender, instance, **kwargs):
+    """
+    Stops pricing a saved or deleted product or discount from the in-memory pricing data of this process.
+
+    Args:
+        sender (Model): The model class of the instance.
+        instance (Model): The saved or deleted instance.
+        **kwargs: Arbitrary keyword arguments.
+    """
+    if isinstance(instance, Product):
+        invalidate_rows(product_ids=[instance.pk])
+    elif isinstance(instance, ProductDiscount):
+        invalidate_rows(discount_ids=[instance.pk])
+
+
+@receiver(rows_bulk_updated)
+def invalidate_bulk_updated_rows(sender, instances, **kwargs):
+    """
+    Stops pricing the products or discounts changed by a bulk update from the in-memory pricing data of this
+    process. Only the updated rows are invalidated.
+
+    Args:
+        sender (Model): The base model of the updated rows.
+        instances (list): The updated instances.
+        **kwargs: Arbitrary keyword arguments.
+    """
+    if issubclass(sender, Product):
+        invalidate_rows(product_ids=[instance.pk for instance in instances])
+    elif issubclass(sender, ProductDiscount):
+        invalidate_rows(discount_ids=[instance.pk for instance in instances])
@@ -0,0 +1,324 @@
+"""
+    pricing/snapshot.py
+
+    This module writes and reads the pricing snapshot: a binary file holding the pricing fields of every
+    product and discount in the fixed-width columnar layout of `pricing.columns`. Workers memory-map the file
+    at startup and price directly from the mapped columns without copying them, so a new worker is warm
+    without reading the product and discount tables.
+
+    File layout (native byte order, recorded in the header):
+        header    HEADER struct, see below
+        products  one array per PRODUCT_COLUMNS entry, `product_count` items each, sorted by id
+        discounts one array per DISCOUNT_COLUMNS entry, `discount_count` items each, sorted by id
+"""
+
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from discounts.models import ProductDiscount
+from products.models import Product
+from .columns import (PRODUCT_COLUMNS, DISCOUNT_COLUMNS, load_product_columns, load_discount_columns,
+                      unit_price, discounted_price)
+
+MAGIC = b'DPSNAP01'
+FORMAT_VERSION = 1
+BYTE_ORDERS = {'little': 1, 'big': 2}
+
+# magic, byte order, format version, built at (epoch microseconds), max product id, product count,
+# discount count
+HEADER = struct.Struct('=8sII4q')
+
+DEFAULT_STALE_CHECK_SECONDS = 5
+DEFAULT_MAX_TRANSACTION_SECONDS = 60
+
+
+class SnapshotError(Exception):
+    """
+    Raised when a snapshot file cannot be used.
+    """
+
+
+def write_snapshot(path, built_at=None):
+    """
+    Writes a pricing snapshot of all products and discounts.
+
+    The file is written next to its destination and moved into place, so workers opening the path never
+    see a partially written snapshot.
+
+    Args:
+        path (str): The destination file.
+        built_at (datetime, optional): The snapshot version. Defaults to the time the data is read; rows
+            updated after it are priced from the database.
+
+    Returns:
+        tuple: The number of products and discounts written.
+    """
+    built_at = built_at or timezone.now()
+    products = load_product_columns()
+    discounts = load_discount_columns()
+    product_count = len(products['id'])
+    discount_count = len(discounts['id'])
+    max_product_id = products['id'][-1] if product_count else 0
+    header = HEADER.pack(MAGIC, BYTE_ORDERS[sys.byteorder], FORMAT_VERSION,
+                         int(built_at.timestamp() * 1_000_000), max_product_id, product_count, discount_count)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.pricing-snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            output.write(header)
+            for columns, definitions in ((products, PRODUCT_COLUMNS), (discounts, DISCOUNT_COLUMNS)):
+                for name, _ in definitions:
+                    columns[name].tofile(output)
+                # Keep the next section aligned to 8 bytes.
+                output.write(b'\0' * (-output.tell() % 8))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return product_count, discount_count
+
+
+def check_window_start(watermark):
+    """
+    Returns the time from which to look for updated rows, given the start of the previous check.
+
+    `updated_at` is set when a row is written, not when its transaction commits, so a row may become visible
+    after a check that started later than its `updated_at`. Every check therefore reads again the rows updated
+    within PRICING_MAX_TRANSACTION_SECONDS, the longest time a transaction may take to commit, before the
+    previous one.
+
+    Args:
+        watermark (datetime): The time the previous check started.
+
+    Returns:
+        datetime: The earliest `updated_at` to read.
+    """
+    return watermark - timedelta(seconds=getattr(settings, 'PRICING_MAX_TRANSACTION_SECONDS',
+                                                 DEFAULT_MAX_TRANSACTION_SECONDS))
+
+
+class PricingSnapshot:
+    """
+    A memory-mapped pricing snapshot.
+
+    The columns are typed memoryviews over the mapping, and ids are located by binary search, so pricing
+    from the snapshot neither copies the columns nor touches the database. Rows the snapshot does not
+    know about (newer ids) or that changed after it was built (stale ids) are reported as missing, and
+    the caller prices them from the database.
+
+    Saves in this process invalidate their rows at once. Rows changed by other processes, or by writes that
+    send no signal such as the repricing passes, are found from their `updated_at`, at most every
+    `stale_check_seconds` seconds. Checks overlap, see `check_window_start`, so that rows committed after the
+    check that should have seen them are still found.
+
+    Attributes:
+        built_at (datetime): The snapshot version.
+        max_product_id (int): The largest product id in the snapshot.
+        products (dict): The product columns by name.
+        discounts (dict): The discount columns by name.
+        stale_product_ids (set): Products updated after the snapshot was built.
+        stale_discount_ids (set): Discounts updated after the snapshot was built.
+        watermark (datetime): Rows updated after this time have not been checked for yet.
+        stale_check_seconds (float): The number of seconds between two checks for updated rows.
+    """
+
+    def __init__(self, path, stale_check_seconds=None):
+        with open(path, 'rb') as snapshot_file:
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if len(buffer) < HEADER.size:
+            raise SnapshotError("%s is not a pricing snapshot" % path)
+        magic, byte_order, version, built_at, max_product_id, product_count, discount_count = HEADER.unpack_from(
+            buffer)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise SnapshotError("%s is not a pricing snapshot of format version %d" % (path, FORMAT_VERSION))
+        if byte_order != BYTE_ORDERS[sys.byteorder]:
+            raise SnapshotError("%s was written on a machine with a different byte order" % path)
+
+        self.built_at = datetime.fromtimestamp(built_at / 1_000_000, tz=dt_timezone.utc)
+        self.max_product_id = max_product_id
+        offset = HEADER.size
+        self.products, offset = self._map_columns(buffer, offset, PRODUCT_COLUMNS, product_count)
+        self.discounts, offset = self._map_columns(buffer, offset, DISCOUNT_COLUMNS, discount_count)
+        self.stale_product_ids = set()
+        self.stale_discount_ids = set()
+        self.watermark = self.built_at
+        self.stale_check_seconds = (stale_check_seconds if stale_check_seconds is not None
+                                    else getattr(settings, 'PRICING_SNAPSHOT_STALE_CHECK_SECONDS',
+                                                 DEFAULT_STALE_CHECK_SECONDS))
+        self._next_check = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _map_columns(buffer, offset, definitions, count):
+        columns = {}
+        for name, typecode in definitions:
+            size = array(typecode).itemsize * count
+            if offset + size > len(buffer):
+                raise SnapshotError("The pricing snapshot is truncated")
+            columns[name] = buffer[offset:offset + size].cast(typecode)
+            offset += size
+        return columns, offset + (-offset % 8)
+
+    def load_stale_ids(self):
+        """
+        Collects the products and discounts updated since the last check, on first use and then at most every
+        `stale_check_seconds` seconds, so that opening the snapshot at startup does not hit the database.
+        """
+        if self._next_check is not None and time.monotonic() < self._next_check:
+            return
+        with self._lock:
+            if self._next_check is not None and time.monotonic() < self._next_check:
+                return
+            started_at = timezone.now()
+            since = check_window_start(self.watermark)
+            self.stale_product_ids.update(
+                Product.objects.filter(updated_at__gte=since).values_list('pk', flat=True))
+            self.stale_discount_ids.update(
+                ProductDiscount.objects.filter(updated_at__gte=since).values_list('pk', flat=True))
+            self.watermark = started_at
+            self._next_check = time.monotonic() + self.stale_check_seconds
+
+    def invalidate(self, product_ids=(), discount_ids=()):
+        """
+        Marks rows as changed, so that they are priced from the database from now on.
+
+        Args:
+            product_ids (Iterable[int]): The changed products.
+            discount_ids (Iterable[int]): The changed discounts.
+        """
+        self.stale_product_ids.update(product_ids)
+        self.stale_discount_ids.update(discount_ids)
+
+    @staticmethod
+    def _find(ids, pk):
+        index = bisect_left(ids, pk)
+        if index < len(ids) and ids[index] == pk:
+            return index
+        return None
+
+    def unit_price(self, product_id, quantity=1):
+        """
+        Returns the unit price of a product.
+
+        Args:
+            product_id (int): The product id.
+            quantity (int): The quantity being purchased.
+
+        Returns:
+            Decimal: The unit price, or None if the product must be priced from the database.
+        """
+        self.load_stale_ids()
+        if product_id > self.max_product_id or product_id in self.stale_product_ids:
+            return None
+        index = self._find(self.products['id'], product_id)
+        if index is None:
+            return None
+        columns = self.products
+        return unit_price(columns['kind'][index], columns['price'][index], columns['seasonal_discount'][index],
+                          columns['bulk_threshold'][index], columns['bulk_discount'][index], quantity)
+
+    def has_discount(self, discount_id):
+        """
+        Checks whether a discount can be applied from the snapshot.
+
+        Args:
+            discount_id (int): The discount id.
+
+        Returns:
+            bool: False if the discount must be loaded from the database.
+        """
+        self.load_stale_ids()
+        return (discount_id not in self.stale_discount_ids
+                and self._find(self.discounts['id'], discount_id) is not None)
+
+    def apply_discount(self, discount_id, price):
+        """
+        Applies a discount to a price.
+
+        Args:
+            discount_id (int): The discount id.
+            price (Decimal): The price to discount.
+
+        Returns:
+            Decimal: The discounted price, or None if the discount must be loaded from the database.
+        """
+        self.load_stale_ids()
+        if discount_id in self.stale_discount_ids:
+            return None
+        index = self._find(self.discounts['id'], discount_id)
+        if index is None:
+            return None
+        columns = self.discounts
+        return discounted_price(columns['kind'][index], columns['amount'][index], columns['percentage'][index],
+                                price)
+
+    def close(self):
+        """
+        Releases the column views and unmaps the file.
+        """
+        for columns in (self.products, self.discounts):
+            for view in columns.values():
+                view.release()
+        self._mmap.close()
+
+
+_snapshot = None
+
+
+def get_snapshot():
+    """
+    Returns the snapshot loaded by this process.
+
+    Returns:
+        PricingSnapshot: The snapshot, or None if no snapshot is loaded.
+    """
+    return _snapshot
+
+
+def load_snapshot(path):
+    """
+    Memory-maps a snapshot file and makes it the snapshot of this process.
+
+    Args:
+        path (str): The snapshot file.
+
+    Returns:
+        PricingSnapshot: The loaded snapshot.
+    """
+    global _snapshot
+    _snapshot = PricingSnapshot(path)
+    return _snapshot
+
+
+def unload_snapshot():
+    """
+    Stops pricing from the snapshot of this process.
+    """
+    global _snapshot
+    _snapshot = None
+
+
+def load_configured_snapshot():
+    """
+    Loads the snapshot configured by the PRICING_SNAPSHOT_PATH setting, if the file exists.
+
+    Returns:
+        PricingSnapshot: The loaded snapshot, or None.
+    """
+    path = getattr(settings, 'PRICING_SNAPSHOT_PATH', None)
+    if not path or not os.path.exists(path):
+        return None
+    return load_snapshot(path)
@@ -0,0 +1,240 @@
+import os
+import random
+import sys
+import tempfile
+import threading
+import uuid
+from multiprocessing import shared_memory
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from discounts.models import PercentageDiscount
+from products.models import Product, SeasonalProduct
+from .calculator import calculate_lines_total
+from .columns import DISCOUNT_COLUMNS, PRODUCT_COLUMNS, PRODUCT_SEASONAL, empty_columns
+from .shared_table import SEQ, PriceTableWriter, SharedPriceTable, get_shared_table
+from .snapshot import check_window_start, load_snapshot, unload_snapshot, write_snapshot
+
+
+class PricingSnapshotTests(TestCase):
+    """
+    Checks that the pricing snapshot stops pricing rows once they change, whichever process changes them.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="Kettle", price=Decimal('30.00'))
+        cls.seasonal = SeasonalProduct.objects.create(name="Lantern", price=Decimal('20.00'),
+                                                      seasonal_discount=Decimal('25.00'))
+        cls.discount = PercentageDiscount.objects.create(name="Ten", percentage=Decimal('10.00'))
+        # Rows updated shortly before the snapshot was built are checked again, see `check_window_start`.
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Product.objects.update(updated_at=an_hour_ago)
+        PercentageDiscount.objects.update(updated_at=an_hour_ago)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'snapshot.bin')
+        write_snapshot(self.path)
+        with self.settings(PRICING_SNAPSHOT_STALE_CHECK_SECONDS=60):
+            self.snapshot = load_snapshot(self.path)
+        self.addCleanup(self.snapshot.close)
+        self.addCleanup(unload_snapshot)
+
+    def test_prices_from_the_snapshot(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.snapshot.unit_price(self.seasonal.pk), Decimal('15.00'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.snapshot.unit_price(self.product.pk), Decimal('30.00'))
+            self.assertEqual(self.snapshot.apply_discount(self.discount.pk, Decimal('30.00')), Decimal('27.00'))
+            self.assertIsNone(self.snapshot.unit_price(self.seasonal.pk + 1000))
+
+    def test_saves_of_this_process_invalidate_their_rows(self):
+        self.snapshot.load_stale_ids()
+        self.product.price = Decimal('31.00')
+        self.product.save()
+        self.discount.percentage = Decimal('20.00')
+        self.discount.save()
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.snapshot.unit_price(self.product.pk))
+            self.assertFalse(self.snapshot.has_discount(self.discount.pk))
+            self.assertEqual(self.snapshot.unit_price(self.seasonal.pk), Decimal('15.00'))
+
+    def test_updates_without_signals_are_found_at_the_next_check(self):
+        self.snapshot.load_stale_ids()
+        # Queryset updates send no signal, as other processes and the repricing passes do not.
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal('31.00'), updated_at=timezone.now())
+        self.assertEqual(self.snapshot.unit_price(self.product.pk), Decimal('30.00'))
+        with mock.patch('pricing.snapshot.time.monotonic', return_value=self.snapshot._next_check):
+            self.assertIsNone(self.snapshot.unit_price(self.product.pk))
+        self.assertEqual(self.snapshot.unit_price(self.seasonal.pk), Decimal('15.00'))
+
+    def test_rows_committed_after_a_check_are_found_by_the_next(self):
+        self.snapshot.load_stale_ids()
+        # A transaction that set `updated_at` before the check started, but committed after it.
+        Product.objects.filter(pk=self.product.pk).update(
+            price=Decimal('31.00'), updated_at=self.snapshot.watermark - timedelta(seconds=5))
+        with mock.patch('pricing.snapshot.time.monotonic', return_value=self.snapshot._next_check):
+            self.assertIsNone(self.snapshot.unit_price(self.product.pk))
+        self.assertEqual(self.snapshot.unit_price(self.seasonal.pk), Decimal('15.00'))
+
+    def test_checks_only_read_rows_updated_since_the_last_one(self):
+        self.snapshot.load_stale_ids()
+        watermark = self.snapshot.watermark
+        self.assertGreater(watermark, self.snapshot.built_at)
+        self.snapshot.stale_product_ids.clear()
+        with mock.patch('pricing.snapshot.time.monotonic', return_value=self.snapshot._next_check):
+            self.snapshot.load_stale_ids()
+        self.assertEqual(self.snapshot.stale_product_ids, set())
+        self.assertGreater(self.snapshot.watermark, watermark)
+
+
+def attach(name, generation=None):
+    """
+    Attaches a reader to a table created by this process. Readers stop their resource tracker from unlinking
+    the table, which in the writer's own process would drop the writer's registration as well.
+    """
+    with mock.patch('pricing.shared_table.resource_tracker.unregister'):
+        if generation is None:
+            return SharedPriceTable.attach(name)
+        segment = shared_memory.SharedMemory(name=SharedPriceTable.segment_name(name, generation))
+        return SharedPriceTable(name, segment)
+
+
+class SharedPriceTableStressTests(SimpleTestCase):
+    """
+    Checks that readers of the shared price table never see a row half written by the writer.
+    """
+
+    def seasonal_rows(self, ids, price, seasonal_discount):
+        columns = empty_columns(PRODUCT_COLUMNS)
+        for pk in ids:
+            for column, value in (('id', pk), ('price', price), ('kind', PRODUCT_SEASONAL),
+                                  ('seasonal_discount', seasonal_discount), ('bulk_threshold', 0),
+                                  ('bulk_discount', 0)):
+                columns[column].append(value)
+        return columns
+
+    def test_readers_never_see_torn_rows(self):
+        # Both versions of every row price at 100.00; a row mixing the price of one version with the
+        # discount of the other prices at 50.00 or 200.00.
+        ids = range(1, 501)
+        versions = [self.seasonal_rows(ids, 10000, 0), self.seasonal_rows(ids, 20000, 5000)]
+        name = 'test-prices-%s' % uuid.uuid4().hex[:12]
+        writer = SharedPriceTable.create(name, 1, versions[0], empty_columns(DISCOUNT_COLUMNS), timezone.now())
+        self.addCleanup(writer.close)
+        stop = threading.Event()
+        torn = []
+
+        def read(reader):
+            while not stop.is_set():
+                product_id = random.choice(ids)
+                price = reader.unit_price(product_id)
+                if price != Decimal('100.00'):
+                    torn.append((product_id, price))
+                    return
+
+        # Switching threads as often as possible makes readers run in the middle of writes.
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+        tables = [attach(name, generation=1) for _ in range(4)]
+        for table in tables:
+            self.addCleanup(table.close)
+        readers = [threading.Thread(target=read, args=(table,)) for table in tables]
+        for reader in readers:
+            reader.start()
+        try:
+            for write in range(200):
+                writer.apply(versions[write % 2], empty_columns(DISCOUNT_COLUMNS))
+        finally:
+            stop.set()
+            for reader in readers:
+                reader.join()
+        self.assertEqual(torn, [])
+        self.assertEqual(writer.header[0] % 2, 0)
+
+
+class PriceTableWriterTests(TestCase):
+    """
+    Checks that the writer applies the rows updated since its watermark, and when readers price from the database
+    instead.
+    """
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Kettle", price=Decimal('30.00'))
+        # Rows updated shortly before the table was built are applied again, see `check_window_start`.
+        Product.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        self.writer = PriceTableWriter('test-prices-%s' % uuid.uuid4().hex[:12])
+        self.addCleanup(self.writer.close)
+        self.writer.rebuild()
+        self.table = attach(self.writer.name)
+        self.addCleanup(self.table.close)
+
+    def test_applies_rows_updated_after_the_watermark(self):
+        watermark = self.writer.watermark
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal('35.00'), updated_at=timezone.now())
+        added = SeasonalProduct.objects.create(name="Lantern", price=Decimal('20.00'),
+                                               seasonal_discount=Decimal('25.00'))
+        self.assertEqual(self.writer.refresh(), 2)
+        self.assertGreater(self.writer.watermark, watermark)
+        self.assertEqual(self.table.unit_price(self.product.pk), Decimal('35.00'))
+        self.assertEqual(self.table.unit_price(added.pk), Decimal('15.00'))
+        with self.settings(PRICING_MAX_TRANSACTION_SECONDS=0):
+            self.assertEqual(self.writer.refresh(), 0)
+
+    def test_rows_committed_after_a_refresh_are_applied_by_the_next(self):
+        self.writer.refresh()
+        # A transaction that set `updated_at` before the refresh started, but committed after it.
+        Product.objects.filter(pk=self.product.pk).update(
+            price=Decimal('35.00'), updated_at=self.writer.watermark - timedelta(seconds=5))
+        self.assertEqual(self.writer.refresh(), 1)
+        self.assertEqual(self.table.unit_price(self.product.pk), Decimal('35.00'))
+
+    def test_skips_rows_updated_before_the_window(self):
+        Product.objects.filter(pk=self.product.pk).update(
+            price=Decimal('35.00'), updated_at=check_window_start(self.writer.watermark) - timedelta(seconds=1))
+        self.assertEqual(self.writer.refresh(), 0)
+        self.assertEqual(self.table.unit_price(self.product.pk), Decimal('30.00'))
+
+    @mock.patch.dict('pricing.shared_table._saved_product_ids', clear=True)
+    def test_rows_saved_by_this_process_are_priced_from_the_database_until_applied(self):
+        with self.settings(PRICE_TABLE_NAME=self.writer.name), self.captureOnCommitCallbacks(execute=True):
+            self.product.price = Decimal('35.00')
+            self.product.save()
+            # Not committed yet: other transactions still see the price of the table.
+            self.assertEqual(self.table.unit_price(self.product.pk), Decimal('30.00'))
+        self.assertIsNone(self.table.unit_price(self.product.pk))
+        self.writer.refresh()
+        self.assertEqual(self.table.unit_price(self.product.pk), Decimal('35.00'))
+
+    def test_readers_give_up_on_writes_that_never_end(self):
+        # A writer dying in the middle of a write leaves the sequence counter odd.
+        self.writer.table.header[SEQ] += 1
+        self.addCleanup(self.writer.table.header.__setitem__, SEQ, self.writer.table.header[SEQ] + 1)
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal('35.00'))
+        with mock.patch('pricing.shared_table.READ_TIMEOUT_SECONDS', 0.01):
+            self.assertIsNone(self.table.unit_price(self.product.pk))
+        self.assertFalse(self.table.is_available())
+        with mock.patch('pricing.shared_table._table', self.table), self.settings(PRICE_TABLE_NAME=self.writer.name):
+            self.assertIsNone(get_shared_table())
+            self.assertEqual(calculate_lines_total([(self.product.pk, 2)]), Decimal('70.00'))
+        with mock.patch('pricing.shared_table.time.monotonic', return_value=self.table.unavailable_until):
+            self.assertTrue(self.table.is_available())
+
+    def test_rebuilds_when_rows_do_not_fit(self):
+        with mock.patch('pricing.shared_table.MIN_CAPACITY', 1):
+            self.writer.rebuild()
+            generation = self.writer.table.generation
+            added = [Product.objects.create(name=f"Mug {number}", price=Decimal('5.00')) for number in range(2)]
+            self.assertEqual(self.writer.refresh(), 2)
+        self.assertEqual(self.writer.table.generation, generation + 1)
+        self.assertFalse(self.table.is_current())
+        table = attach(self.writer.name)
+        self.addCleanup(table.close)
+        self.assertEqual(table.unit_price(added[1].pk), Decimal('5.00'))
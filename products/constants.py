@@ -1,3 +1,13 @@
 PRODUCT = "Product"
+PRODUCTS = "Products"
 BULK_PRODUCT = "Bulk Product"
-SEASONAL_PRODUCT = "Seasonal Product"
\ No newline at end of file
+SEASONAL_PRODUCT = "Seasonal Product"
+SEARCH_QUERY_REQUIRED = "Query parameter 'q' is required"
+INVALID_CURSOR = "Invalid cursor"
+INVALID_LIMIT = "Query parameter 'limit' must be a positive integer"
+PRODUCT_IDS_REQUIRED = "A list of product ids is required"
+PRODUCT_IDS_INVALID = "Product ids must be positive integers"
+PRODUCT_IDS_OUT_OF_RANGE = "Product ids must be at most {max}"
+TOO_MANY_PRODUCT_IDS = "At most {limit} product ids can be requested at once"
+OUT_OF_STOCK = "Not enough stock left of products {ids}"
+STOCK = "Stock"
@@ -0,0 +1,119 @@
+"""
+    products/inventory.py
+
+    This module reserves the stock of ordered products. Products with a null `stock` are not tracked and can
+    always be ordered.
+
+    All lines of an order are reserved with one conditional UPDATE, which decrements the stock of every
+    ordered product only if each of them has enough left (`stock >= quantity`). No row is read or locked
+    beforehand, so concurrent orders of a best-seller never oversell it and never queue on row locks held
+    while they are priced; at worst an order finds the stock gone and is rejected, listing every short line.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Coalesce
+
+from .constants import OUT_OF_STOCK
+from .models import Product
+
+RESERVE_ATTEMPTS = 3
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when some products of an order do not have enough stock left.
+
+    Attributes:
+        lines (list): The short lines, each with the `product` id, the `requested` quantity and the
+            `available` stock.
+    """
+
+    def __init__(self, message, lines):
+        super().__init__(message)
+        self.lines = lines
+
+
+def order_quantities(lines):
+    """
+    Sums the ordered quantities of every product.
+
+    Args:
+        lines (Iterable[tuple]): The (product_id, quantity) pairs of the order.
+
+    Returns:
+        Counter: The quantity of every product id.
+    """
+    quantities = Counter()
+    for product_id, quantity in lines:
+        quantities[product_id] += quantity
+    return quantities
+
+
+def quantity_case(quantities):
+    """
+    Builds an expression mapping every product to its ordered quantity, to reserve all lines with one UPDATE.
+
+    Args:
+        quantities (dict): The quantity of every product id.
+
+    Returns:
+        Case: The quantity expression.
+    """
+    return Case(*[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+                output_field=IntegerField())
+
+
+def reserve_stock(lines):
+    """
+    Decrements the stock of the products of an order, all lines at once or none.
+
+    When the UPDATE leaves some product out, the current stock of the products is read to report the short
+    lines. If none is short any more, because stock was added meanwhile or because the product does not
+    exist, the UPDATE is tried again. Missing products are left to the pricing of the order to report.
+
+    Args:
+        lines (Iterable[tuple]): The (product_id, quantity) pairs of the order.
+
+    Raises:
+        InsufficientStock: If some product does not have enough stock left; no stock is decremented then.
+    """
+    quantities = order_quantities(lines)
+    short = []
+    for _ in range(RESERVE_ATTEMPTS):
+        if not quantities:
+            return
+        with transaction.atomic():
+            reserved = Product.objects.filter(Q(stock__isnull=True) | Q(stock__gte=quantity_case(quantities)),
+                                              pk__in=quantities).update(stock=F('stock') - quantity_case(quantities))
+            if reserved == len(quantities):
+                return
+            transaction.set_rollback(True)
+        stock = dict(Product.objects.filter(pk__in=quantities).values_list('pk', 'stock'))
+        quantities = {product_id: quantity for product_id, quantity in quantities.items() if product_id in stock}
+        short = [{'product': product_id, 'requested': quantity, 'available': stock[product_id]}
+                 for product_id, quantity in quantities.items()
+                 if stock[product_id] is not None and stock[product_id] < quantity]
+        if short:
+            break
+    ids = [line['product'] for line in short] or list(quantities)
+    raise InsufficientStock(OUT_OF_STOCK.replace("{ids}", ", ".join(map(str, ids))), short)
+
+
+def add_stock(product_id, quantity):
+    """
+    Adds stock to a product, starting to track its stock if it was not.
+
+    Args:
+        product_id (int): The id of the product.
+        quantity (int): The number of units to add.
+
+    Returns:
+        int: The new stock of the product, or None if the product does not exist.
+    """
+    with transaction.atomic():
+        if not Product.objects.filter(pk=product_id).update(stock=Coalesce(F('stock'), 0) + quantity):
+            return None
+        return Product.objects.filter(pk=product_id).values_list('stock', flat=True).first()
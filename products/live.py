@@ -0,0 +1,348 @@
+"""
+    products/live.py
+
+    This module broadcasts effective price changes of products to Server-Sent Events streams. Saved and
+    deleted products are published to an in-process hub after their transaction commits; the hub numbers
+    the events, keeps the most recent ones for resuming streams, and fans them out to the subscribed streams.
+
+    Every subscriber has a bounded queue. A subscriber that falls behind by a full queue is evicted instead
+    of slowing down publishers or buffering without limit; it can reconnect with the id of the last event it
+    received and resume from the history.
+
+    The hub lives in the process that saves the products, so a stream only sees the changes made by the
+    server process it is connected to.
+"""
+
+import asyncio
+import copy
+import json
+import threading
+import uuid
+from collections import OrderedDict, deque, namedtuple
+
+from django.conf import settings
+from django.db import models
+
+from pricing.expressions import round_money
+from .models import Product, SeasonalProduct, BulkProduct
+
+PRICE_EVENT = 'price'
+DELETE_EVENT = 'delete'
+
+DEFAULT_HISTORY_SIZE = 1024
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_TRACKED_PRODUCTS = 10000
+
+PRODUCT_TYPES = {
+    Product: 'product',
+    SeasonalProduct: 'seasonal',
+    BulkProduct: 'bulk',
+}
+
+PriceEvent = namedtuple('PriceEvent', ['sequence', 'event', 'product_id', 'data'])
+
+
+def with_decimal_values(product):
+    """
+    Returns a copy of a product whose decimal fields hold Decimal values. A saved instance keeps the values
+    it was given until it is reloaded, such as the float 0.0 defaults of the discount fields.
+
+    Args:
+        product (Product): The product.
+
+    Returns:
+        Product: The copy.
+    """
+    product = copy.copy(product)
+    for field in product._meta.concrete_fields:
+        if isinstance(field, models.DecimalField):
+            setattr(product, field.attname, field.to_python(getattr(product, field.attname)))
+    return product
+
+
+def price_payload(product, concrete=False):
+    """
+    Builds the published state of a product: its prices after the seasonal or bulk pricing rules.
+
+    Args:
+        product (Product): The saved product.
+        concrete (bool): True when `product` is known to be of its concrete type, such as a product
+            created as a plain Product, skipping the lookups of its subtype rows.
+
+    Returns:
+        dict: The id, type, price and effective price of the product, and the bulk price and threshold
+        of bulk products.
+    """
+    concrete = with_decimal_values(product if concrete else product.get_concrete())
+    payload = {
+        'id': concrete.pk,
+        'type': PRODUCT_TYPES[type(concrete)],
+        'price': str(round_money(concrete.price)),
+        'effective_price': str(round_money(concrete.get_price(quantity=1))),
+    }
+    if isinstance(concrete, BulkProduct):
+        payload['bulk_threshold'] = concrete.bulk_threshold
+        payload['bulk_price'] = str(round_money(concrete.get_price(quantity=concrete.bulk_threshold)))
+    return payload
+
+
+class Subscriber:
+    """
+    A stream subscribed to the hub, receiving events on the event loop it subscribed from.
+
+    Attributes:
+        loop (AbstractEventLoop): The event loop of the stream.
+        queue (Queue): The events not yet sent to the client. None marks the eviction of the subscriber.
+        product_ids (frozenset): The ids of the products the stream is interested in, or None for all.
+        evicted (bool): True once the subscriber has been evicted for falling behind.
+    """
+
+    def __init__(self, loop, product_ids, queue_size):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.product_ids = product_ids
+        self.evicted = False
+
+    def wants(self, event):
+        """
+        Checks whether the stream is interested in an event.
+
+        Args:
+            event (PriceEvent): The published event.
+
+        Returns:
+            bool: True if the event concerns one of the subscribed products.
+        """
+        return self.product_ids is None or event.product_id in self.product_ids
+
+    def deliver(self, event):
+        """
+        Queues an event for the stream, or evicts the subscriber when its queue is full. Runs on the event
+        loop of the stream.
+
+        Args:
+            event (PriceEvent): The published event.
+        """
+        if self.evicted:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.evicted = True
+            # Drop the backlog so that the stream learns of its eviction at once.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class PriceChangeHub:
+    """
+    Fans out price change events to the subscribed streams of this process.
+
+    Events are published from any thread and delivered to each subscriber on its own event loop. Event
+    ids combine the epoch of the hub with a sequence number, so that ids issued by a previous process
+    are recognized and not resumed from.
+
+    The last published state of the `tracked_products` most recently published products is kept to skip
+    unchanged ones; a product published again after falling out of them is published even if unchanged.
+
+    Attributes:
+        epoch (str): A random identifier of this hub.
+        queue_size (int): The number of events a subscriber may fall behind before it is evicted.
+        tracked_products (int): The number of products whose last published state is kept.
+    """
+
+    def __init__(self, history_size=DEFAULT_HISTORY_SIZE, queue_size=DEFAULT_QUEUE_SIZE,
+                 tracked_products=DEFAULT_TRACKED_PRODUCTS):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.queue_size = queue_size
+        self.tracked_products = tracked_products
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._last_payloads = OrderedDict()
+
+    def event_id(self, event):
+        """
+        Returns the id sent to clients for an event, to be used as resume token.
+
+        Args:
+            event (PriceEvent): The event.
+
+        Returns:
+            str: The event id.
+        """
+        return f"{self.epoch}-{event.sequence}"
+
+    def parse_event_id(self, event_id):
+        """
+        Extracts the sequence number of an event id issued by this hub.
+
+        Args:
+            event_id (str): The event id sent back by a client.
+
+        Returns:
+            int: The sequence number, or None if the id was not issued by this hub.
+        """
+        epoch, _, sequence = (event_id or '').partition('-')
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        return sequence if sequence <= self._sequence else None
+
+    def publish(self, product_id, event, payload):
+        """
+        Publishes a change of a product, unless its published state is unchanged.
+
+        Args:
+            product_id (int): The id of the product.
+            event (str): The event type, PRICE_EVENT or DELETE_EVENT.
+            payload (dict): The published state of the product.
+
+        Returns:
+            PriceEvent: The published event, or None if nothing changed.
+        """
+        with self._lock:
+            # Deleting a seasonal or bulk product also deletes its parent row, which is published once.
+            if self._last_payloads.get(product_id, ()) == payload:
+                self._last_payloads.move_to_end(product_id)
+                return None
+            self._last_payloads[product_id] = payload
+            self._last_payloads.move_to_end(product_id)
+            if len(self._last_payloads) > self.tracked_products:
+                self._last_payloads.popitem(last=False)
+            self._sequence += 1
+            published = PriceEvent(self._sequence, event, product_id, json.dumps(payload))
+            self._history.append(published)
+            subscribers = [subscriber for subscriber in self._subscribers if subscriber.wants(published)]
+
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.deliver, published)
+            except RuntimeError:
+                # The event loop of the stream has been closed.
+                self.unsubscribe(subscriber)
+        return published
+
+    def subscribe(self, product_ids=None, last_event_id=None):
+        """
+        Subscribes a stream running on the current event loop.
+
+        Args:
+            product_ids (Iterable[int]): The ids of the products to receive changes of, or None for all.
+            last_event_id (str): The id of the last event received by the client, when reconnecting.
+
+        Returns:
+            tuple: The subscriber, the events missed since `last_event_id`, and whether the missed events
+            are complete. They are not when the id is unknown or older than the kept history.
+        """
+        product_ids = frozenset(product_ids) if product_ids is not None else None
+        subscriber = Subscriber(asyncio.get_running_loop(), product_ids, self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if last_event_id is None:
+                return subscriber, [], True
+            after = self.parse_event_id(last_event_id)
+            if after is None:
+                return subscriber, [], False
+            complete = not self._history or self._history[0].sequence <= after + 1
+            missed = [event for event in self._history if event.sequence > after and subscriber.wants(event)]
+        return subscriber, missed, complete
+
+    def unsubscribe(self, subscriber):
+        """
+        Stops delivering events to a subscriber.
+
+        Args:
+            subscriber (Subscriber): The subscriber to remove.
+        """
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def subscriber_count(self):
+        """
+        Returns the number of subscribed streams.
+
+        Returns:
+            int: The number of subscribers.
+        """
+        return len(self._subscribers)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    """
+    Returns the price change hub of this process, configured from the LIVE_PRICES setting.
+
+    Returns:
+        PriceChangeHub: The hub.
+    """
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                config = getattr(settings, 'LIVE_PRICES', {})
+                _hub = PriceChangeHub(history_size=config.get('HISTORY_SIZE', DEFAULT_HISTORY_SIZE),
+                                      queue_size=config.get('QUEUE_SIZE', DEFAULT_QUEUE_SIZE),
+                                      tracked_products=config.get('TRACKED_PRODUCTS', DEFAULT_TRACKED_PRODUCTS))
+    return _hub
+
+
+def format_event(hub, event):
+    """
+    Formats an event in the Server-Sent Events wire format.
+
+    Args:
+        hub (PriceChangeHub): The hub that published the event.
+        event (PriceEvent): The event.
+
+    Returns:
+        str: The formatted event.
+    """
+    return f"id: {hub.event_id(event)}\nevent: {event.event}\ndata: {event.data}\n\n"
+
+
+async def price_event_stream(hub, product_ids=None, last_event_id=None, heartbeat=15.0):
+    """
+    Streams the price changes published to a hub in the Server-Sent Events wire format.
+
+    A `reset` event is sent first when `last_event_id` cannot be resumed from, telling the client to reload
+    the current prices. A comment is sent every `heartbeat` seconds without events to keep the connection
+    open. An evicted stream ends with an `evicted` event carrying the id to resume from.
+
+    Args:
+        hub (PriceChangeHub): The hub to subscribe to.
+        product_ids (Iterable[int]): The ids of the products to stream changes of, or None for all.
+        last_event_id (str): The id of the last event received by the client, when reconnecting.
+        heartbeat (float): The number of seconds between keep-alive comments.
+
+    Yields:
+        str: The events.
+    """
+    subscriber, missed, complete = hub.subscribe(product_ids, last_event_id)
+    try:
+        resume_id = last_event_id if complete else None
+        yield "retry: 3000\n\n"
+        if not complete:
+            yield "event: reset\ndata: {}\n\n"
+        for event in missed:
+            resume_id = hub.event_id(event)
+            yield format_event(hub, event)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                yield f"event: evicted\ndata: {json.dumps({'resume_id': resume_id})}\n\n"
+                return
+            resume_id = hub.event_id(event)
+            yield format_event(hub, event)
+    finally:
+        hub.unsubscribe(subscriber)
@@ -0,0 +1,24 @@
+"""
+    products/management/commands/rebuild_search_index.py
+
+    Rebuilds the full-text product search index from the Product table.
+"""
+
+from django.core.management.base import BaseCommand
+
+from products.search import is_fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text product search index"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of products indexed per batch")
+
+    def handle(self, *args, **options):
+        if not is_fts_available():
+            self.stdout.write("The database backend has no FTS5 support, nothing to rebuild.")
+            return
+        count = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products"))
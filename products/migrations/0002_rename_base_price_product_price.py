@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2024-10-22 12:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='product',
+            old_name='base_price',
+            new_name='price',
+        ),
+    ]
@@ -5,6 +5,7 @@
     as well as specific models for regular, seasonal, and bulk products.
 """
 
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 
 
@@ -23,6 +24,25 @@ class BaseModel(models.Model):
         abstract = True
 
 
+class ProductQuerySet(models.QuerySet):
+    """
+    QuerySet for the Product model with helpers for polymorphic loading.
+
+    Methods:
+        with_subtypes(): Joins the seasonal and bulk child tables in the same query.
+    """
+
+    def with_subtypes(self):
+        """
+        Left-joins the SeasonalProduct and BulkProduct child tables so that the concrete
+        subtype of every product can be resolved without extra queries.
+
+        Returns:
+            QuerySet: The queryset with the child tables selected.
+        """
+        return self.select_related('seasonalproduct', 'bulkproduct')
+
+
 class Product(BaseModel):
     """
     Represents a standard product with a name and price.
@@ -30,12 +50,39 @@ class Product(BaseModel):
     Attributes:
         name (CharField): The name of the product.
         price (DecimalField): The price of the product.
+        stock (PositiveIntegerField): The number of units left to order, or null if the stock of the product
+            is not tracked. Reserved by `products.inventory.reserve_stock` when orders are placed.
 
     Methods:
         get_price(*args, **kwargs): Returns the price of the product.
+        get_concrete(): Returns the concrete subtype instance of the product.
     """
+    SUBTYPE_RELATIONS = ('seasonalproduct', 'bulkproduct')
+
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    stock = models.PositiveIntegerField(null=True, blank=True)
+
+    objects = ProductQuerySet.as_manager()
+
+    def get_concrete(self):
+        """
+        Returns the concrete subtype instance (SeasonalProduct or BulkProduct) of this product.
+
+        The child tables should be loaded with `Product.objects.with_subtypes()` beforehand,
+        otherwise every lookup costs one query.
+
+        Returns:
+            Product: The subtype instance, or the product itself if it has no subtype.
+        """
+        if type(self) is not Product:
+            return self
+        for relation in self.SUBTYPE_RELATIONS:
+            try:
+                return getattr(self, relation)
+            except ObjectDoesNotExist:
+                continue
+        return self
 
     def get_price(self, *args, **kwargs):
         """
@@ -59,14 +106,18 @@ class SeasonalProduct(Product):
         seasonal_discount (DecimalField): The discount percentage applied to the product.
 
     Methods:
-        get_price(): Returns the price after applying the seasonal discount.
+        get_price(*args, **kwargs): Returns the price after applying the seasonal discount.
     """
     seasonal_discount = models.DecimalField(max_digits=5, decimal_places=2, default=0.0)
 
-    def get_price(self):
+    def get_price(self, *args, **kwargs):
         """
         Returns the price of the product after applying the seasonal discount.
 
+        Args:
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+
         Returns:
             Decimal: The price of the product with seasonal discount applied.
         """
@@ -87,12 +138,14 @@ class BulkProduct(Product):
     bulk_threshold = models.IntegerField(default=10)
     bulk_discount = models.DecimalField(max_digits=5, decimal_places=2, default=0.0)
 
-    def get_price(self, quantity):
+    def get_price(self, quantity=1, *args, **kwargs):
         """
         Returns the price of the product after applying the bulk discount based on quantity.
 
         Args:
             quantity (int): The quantity of the product being purchased.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
 
         Returns:
             Decimal: The price of the product with the bulk discount applied, if applicable.
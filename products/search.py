@@ -0,0 +1,210 @@
+"""
+    products/search.py
+
+    This module implements full-text product search. On SQLite the product names are indexed in an FTS5
+    virtual table that is kept in sync by signals and can be rebuilt in batches. Other database backends
+    fall back to a case-insensitive substring match.
+"""
+
+import base64
+import binascii
+import json
+import math
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, router
+
+from .models import Product
+
+FTS_TABLE = 'products_product_fts'
+
+# Product fields copied into the FTS table. Adding a field here requires a migration adding the
+# matching column to the virtual table, followed by `manage.py rebuild_search_index`.
+SEARCH_FIELDS = ('name',)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Row ids of SQLite tables, FTS5 tables included, are signed 64-bit integers.
+MAX_ROWID = 2 ** 63 - 1
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a pagination cursor cannot be decoded.
+    """
+
+
+def is_fts_available(using=DEFAULT_DB_ALIAS):
+    """
+    Checks whether a database connection supports the FTS5 index.
+
+    Args:
+        using (str): The database alias.
+
+    Returns:
+        bool: True if the FTS5 virtual table can be used.
+    """
+    return connections[using].vendor == 'sqlite'
+
+
+def encode_cursor(rank, product_id):
+    """
+    Encodes the position of the last returned result into an opaque cursor.
+
+    Args:
+        rank (float): The rank of the last returned result.
+        product_id (int): The id of the last returned result.
+
+    Returns:
+        str: A URL-safe cursor string.
+    """
+    raw = json.dumps([rank, product_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor created by `encode_cursor`.
+
+    Args:
+        cursor (str): The cursor string.
+
+    Returns:
+        tuple: The (rank, product_id) position the cursor points after.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed, or holds a rank or an id `encode_cursor` cannot have
+            written, such as an id out of the range of row ids.
+    """
+    try:
+        rank, product_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    valid_rank = isinstance(rank, (int, float)) and not isinstance(rank, bool) and math.isfinite(rank)
+    valid_id = isinstance(product_id, int) and not isinstance(product_id, bool) and 0 <= product_id <= MAX_ROWID
+    if not (valid_rank and valid_id):
+        raise InvalidCursor(cursor)
+    return float(rank), product_id
+
+
+def build_match_expression(query):
+    """
+    Converts free text into an FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term, so "win jack" matches "Winter Jacket". Quoting the terms
+    keeps FTS5 operators typed by users from being interpreted.
+
+    Args:
+        query (str): The raw search text.
+
+    Returns:
+        str: The MATCH expression, or an empty string if the query contains no words.
+    """
+    return ' '.join('"%s"*' % token for token in TOKEN_RE.findall(query))
+
+
+def index_products(products, using=DEFAULT_DB_ALIAS):
+    """
+    Inserts or replaces the index rows of the given products.
+
+    Args:
+        products (Iterable[Product]): The products to index.
+        using (str): The alias of the database the products were written to.
+    """
+    if not is_fts_available(using):
+        return
+    rows = [[product.pk] + [getattr(product, field) for field in SEARCH_FIELDS] for product in products]
+    if not rows:
+        return
+    columns = ', '.join(('rowid',) + SEARCH_FIELDS)
+    placeholders = ', '.join(['%s'] * (len(SEARCH_FIELDS) + 1))
+    with connections[using].cursor() as cursor:
+        cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % FTS_TABLE, [[row[0]] for row in rows])
+        cursor.executemany('INSERT INTO %s (%s) VALUES (%s)' % (FTS_TABLE, columns, placeholders), rows)
+
+
+def remove_products(product_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Removes the index rows of the given products.
+
+    Args:
+        product_ids (Iterable[int]): The ids of the products to remove.
+        using (str): The alias of the database the products were deleted from.
+    """
+    if not is_fts_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % FTS_TABLE, [[pk] for pk in product_ids])
+
+
+def rebuild_index(batch_size=1000):
+    """
+    Rebuilds the whole search index from the Product table.
+
+    Args:
+        batch_size (int): The number of products read and indexed per batch.
+
+    Returns:
+        int: The number of indexed products.
+    """
+    if not is_fts_available():
+        return 0
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute('DELETE FROM %s' % FTS_TABLE)
+    count = 0
+    last_id = 0
+    while True:
+        batch = list(Product.objects.filter(pk__gt=last_id).order_by('pk').only(*SEARCH_FIELDS)[:batch_size])
+        if not batch:
+            break
+        index_products(batch)
+        count += len(batch)
+        last_id = batch[-1].pk
+    return count
+
+
+def search_product_ids(query, after=None, limit=20):
+    """
+    Returns the ids of the products matching the query, best match first.
+
+    Results are ordered by BM25 rank and then by id, and are paginated by keyset: `after` is the
+    (rank, id) position of the last result of the previous page. The query is sent to the database
+    the router picks for product reads.
+
+    Args:
+        query (str): The raw search text.
+        after (tuple, optional): The (rank, product_id) position to continue after.
+        limit (int): The maximum number of results.
+
+    Returns:
+        list: A list of (rank, product_id) tuples.
+    """
+    using = router.db_for_read(Product)
+    if not is_fts_available(using):
+        return _search_product_ids_fallback(query, after, limit)
+
+    expression = build_match_expression(query)
+    if not expression:
+        return []
+    sql = 'SELECT bm25(%s) AS score, rowid FROM %s WHERE %s MATCH %%s' % (FTS_TABLE, FTS_TABLE, FTS_TABLE)
+    params = [expression]
+    if after is not None:
+        sql = 'SELECT score, rowid FROM (%s) WHERE score > %%s OR (score = %%s AND rowid > %%s)' % sql
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY score, rowid LIMIT %s'
+    params.append(limit)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(score, product_id) for score, product_id in cursor.fetchall()]
+
+
+def _search_product_ids_fallback(query, after, limit):
+    """
+    Substring search used on database backends without FTS5. All matches share the same rank.
+    """
+    queryset = Product.objects.all()
+    for token in TOKEN_RE.findall(query):
+        queryset = queryset.filter(name__icontains=token)
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after[1])
+    return [(0.0, pk) for pk in queryset.order_by('pk').values_list('pk', flat=True)[:limit]]
@@ -2,14 +2,23 @@
     products/serializers.py
 
     This module defines serializers for product models. It includes serializers for basic products,
-    seasonal products, and bulk products.
+    seasonal products, and bulk products, and for the items of bulk price updates. Product serializers
+    support sparse fieldsets, see `dynamic_pricing_system/sparse_fields.py`, and render prices in the currency
+    requested with `?currency=`, see `currencies/conversion.py`.
 """
 
+from decimal import Decimal
+
+from django.db.models.constants import LOOKUP_SEP
 from rest_framework import serializers
+
+from currencies.conversion import ConvertedListSerializer
+from dynamic_pricing_system.bulk_updates import BulkUpdateItemSerializer
+from dynamic_pricing_system.sparse_fields import SparseFieldsMixin
 from .models import Product, SeasonalProduct, BulkProduct
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializes the basic Product model, handling name and base price.
 
@@ -17,11 +26,37 @@ class ProductSerializer(serializers.ModelSerializer):
         id (IntegerField): The unique identifier for the product.
         name (CharField): The name of the product.
         base_price (DecimalField): The base price of the product.
+        stock (IntegerField): The number of units left to order, null when the stock is not tracked.
+        updated_at (DateTimeField): The time of the last change, used to detect concurrent updates.
+        computed_fields (dict): The currency key added when converting prices.
+        query_budget (int): The largest number of queries rendering its instances may run.
     """
+    computed_fields = {'currency': []}
+    query_budget = 2
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'price']  # Adjusted to match the model field name
+        fields = ['id', 'name', 'price', 'stock', 'updated_at']  # Adjusted to match the model field name
+        list_serializer_class = ConvertedListSerializer
+
+    def to_representation(self, instance):
+        """
+        Serializes the product, with its price in the requested currency if any.
+
+        Args:
+            instance (Product): The product to serialize.
+
+        Returns:
+            dict: The fields of the product, and the currency of its price when converted.
+        """
+        data = super().to_representation(instance)
+        conversion = self.context.get('currency')
+        if conversion is not None:
+            if 'price' in data:
+                data['price'] = conversion.represent(conversion.convert_product_amount(instance, instance.price))
+            if self.wants('currency'):
+                data['currency'] = conversion.currency
+        return data
 
 
 class SeasonalProductSerializer(ProductSerializer):
@@ -52,3 +87,153 @@ class BulkProductSerializer(ProductSerializer):
     class Meta(ProductSerializer.Meta):
         model = BulkProduct
         fields = ProductSerializer.Meta.fields + ['bulk_threshold', 'bulk_discount']
+
+
+class PolymorphicProductSerializer(SparseFieldsMixin, serializers.BaseSerializer):
+    """
+    Serializes any product with the serializer of its concrete subtype.
+
+    Products should be loaded with `Product.objects.with_subtypes()` so that resolving the subtype
+    does not cost extra queries.
+
+    Attributes:
+        serializer_classes (dict): Maps each product model to its serializer.
+        product_types (dict): Maps each product model to the type name included in the output.
+        computed_fields (dict): The output keys added to the subtype fields, with the model fields they read.
+        query_budget (int): The largest number of queries rendering its instances may run.
+    """
+    serializer_classes = {
+        Product: ProductSerializer,
+        SeasonalProduct: SeasonalProductSerializer,
+        BulkProduct: BulkProductSerializer,
+    }
+    product_types = {
+        Product: 'product',
+        SeasonalProduct: 'seasonal',
+        BulkProduct: 'bulk',
+    }
+    computed_fields = {'type': []}
+    query_budget = 1
+
+    class Meta:
+        list_serializer_class = ConvertedListSerializer
+
+    @classmethod
+    def sparse_field_names(cls):
+        """
+        Returns the field names accepted in `?fields=`: the fields of every subtype and the computed fields.
+
+        Returns:
+            set: The accepted field names.
+        """
+        names = set(cls.computed_fields)
+        for serializer_class in cls.serializer_classes.values():
+            names |= serializer_class.sparse_field_names()
+        return names
+
+    @classmethod
+    def sparse_columns(cls, names):
+        """
+        Returns the fields of the products and of their subtype tables to load to serialize the given fields.
+        Subtype fields are reached through the child relations joined by `with_subtypes()`.
+
+        Args:
+            names (Iterable[str]): The requested field names.
+
+        Returns:
+            set: The lookup paths of the model fields, or None if every column must be loaded.
+        """
+        columns = set()
+        for name in set(names) & set(cls.computed_fields):
+            columns.update(cls.computed_fields[name])
+        for model, serializer_class in cls.serializer_classes.items():
+            subtype_columns = serializer_class.sparse_columns(set(names) & serializer_class.sparse_field_names())
+            if subtype_columns is None:
+                return None
+            for column in subtype_columns:
+                field = model._meta.get_field(column.split(LOOKUP_SEP)[0])
+                columns.add(column if field.model is Product else f"{model._meta.model_name}{LOOKUP_SEP}{column}")
+        return columns
+
+    def to_representation(self, instance):
+        """
+        Serializes the concrete subtype of the product.
+
+        Args:
+            instance (Product): The product to serialize.
+
+        Returns:
+            dict: The subtype fields of the product along with its type name.
+        """
+        concrete = instance.get_concrete()
+        data = self.serializer_classes[type(concrete)](concrete, context=self.context).data
+        if self.wants('type'):
+            data['type'] = self.product_types[type(concrete)]
+        return data
+
+
+class ProductBatchSerializer(PolymorphicProductSerializer):
+    """
+    Serializes a product with its concrete subtype fields and its effective unit price.
+
+    Attributes:
+        effective_price (DecimalField): The unit price after the seasonal or bulk pricing rules,
+        for a quantity of one, converted to the requested currency if any.
+    """
+    effective_price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    computed_fields = {
+        'type': [],
+        'effective_price': ['price', 'seasonalproduct__seasonal_discount', 'bulkproduct__bulk_threshold',
+                            'bulkproduct__bulk_discount'],
+    }
+
+    def to_representation(self, instance):
+        """
+        Serializes the concrete subtype of the product along with its effective price.
+
+        Args:
+            instance (Product): The product to serialize.
+
+        Returns:
+            dict: The subtype fields, type name and effective price of the product.
+        """
+        data = super().to_representation(instance)
+        if self.wants('effective_price'):
+            concrete = instance.get_concrete()
+            effective_price = concrete.get_price(quantity=1)
+            conversion = self.context.get('currency')
+            if conversion is None:
+                data['effective_price'] = self.effective_price.to_representation(effective_price)
+            else:
+                data['effective_price'] = conversion.represent(
+                    conversion.convert_product_amount(concrete, effective_price))
+        return data
+
+
+class ProductBulkUpdateSerializer(BulkUpdateItemSerializer):
+    """
+    Validates one item of a bulk product price update. Each field may only be given for products of the
+    type declaring it.
+
+    Attributes:
+        price (DecimalField): The new price of the product.
+        seasonal_discount (DecimalField): The new seasonal discount percentage of a seasonal product.
+        bulk_threshold (IntegerField): The new bulk threshold of a bulk product.
+        bulk_discount (DecimalField): The new bulk discount percentage of a bulk product.
+    """
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+    seasonal_discount = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=Decimal('0'),
+                                                 max_value=Decimal('100'), required=False)
+    bulk_threshold = serializers.IntegerField(min_value=1, required=False)
+    bulk_discount = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=Decimal('0'),
+                                             max_value=Decimal('100'), required=False)
+
+
+class ProductRestockSerializer(serializers.Serializer):
+    """
+    Validates the number of units added to the stock of a product.
+
+    Attributes:
+        quantity (IntegerField): The number of units to add.
+    """
+    quantity = serializers.IntegerField(min_value=1)
@@ -0,0 +1,114 @@
+"""
+    products/signals.py
+
+    This module defines signal receivers for product models. They keep the full-text search index in sync
+    with product inserts, updates and deletes, and publish price changes, including those of bulk updates, to
+    the live price streams once the saving transaction commits.
+"""
+
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from dynamic_pricing_system.bulk_updates import rows_bulk_updated
+from .live import DELETE_EVENT, PRICE_EVENT, get_hub, price_payload
+from .models import Product
+from .search import index_products, remove_products
+
+
+@receiver(post_save)
+def update_search_index(sender, instance, raw=False, using=None, **kwargs):
+    """
+    Indexes a product after it has been saved. Receives saves of every Product subclass.
+
+    Args:
+        sender (Model): The model class that was saved.
+        instance (Model): The saved instance.
+        raw (bool): True when the instance is loaded from a fixture.
+        using (str): The alias of the database the instance was saved to.
+        **kwargs: Arbitrary keyword arguments.
+    """
+    if raw or not isinstance(instance, Product):
+        return
+    index_products([instance], using=using)
+
+
+@receiver(post_delete)
+def remove_from_search_index(sender, instance, using=None, **kwargs):
+    """
+    Removes a product from the search index after it has been deleted.
+
+    Args:
+        sender (Model): The model class that was deleted.
+        instance (Model): The deleted instance.
+        using (str): The alias of the database the instance was deleted from.
+        **kwargs: Arbitrary keyword arguments.
+    """
+    if not isinstance(instance, Product):
+        return
+    remove_products([instance.pk], using=using)
+
+
+def publish_price(product, concrete=False):
+    """
+    Publishes the prices of a product to the live price streams.
+
+    Args:
+        product (Product): The product.
+        concrete (bool): True when `product` is known to be of its concrete type.
+    """
+    get_hub().publish(product.pk, PRICE_EVENT, price_payload(product, concrete=concrete))
+
+
+@receiver(post_save)
+def publish_price_change(sender, instance, created=False, raw=False, using=None, **kwargs):
+    """
+    Publishes the prices of a saved product to the live price streams after the transaction commits.
+    Products whose prices did not change are not published.
+
+    Args:
+        sender (Model): The model class that was saved.
+        instance (Model): The saved instance.
+        created (bool): True when the instance was inserted.
+        raw (bool): True when the instance is loaded from a fixture.
+        using (str): The alias of the database the instance was saved to.
+        **kwargs: Arbitrary keyword arguments.
+    """
+    if raw or not isinstance(instance, Product):
+        return
+    # Subtype instances are concrete, and so are plain products just inserted: no subtype row names them yet.
+    concrete = created or type(instance) is not Product
+    transaction.on_commit(partial(publish_price, instance, concrete=concrete), using=using)
+
+
+@receiver(post_delete)
+def publish_product_removal(sender, instance, using=None, **kwargs):
+    """
+    Publishes the removal of a deleted product to the live price streams after the transaction commits.
+
+    Args:
+        sender (Model): The model class that was deleted.
+        instance (Model): The deleted instance.
+        using (str): The alias of the database the instance was deleted from.
+        **kwargs: Arbitrary keyword arguments.
+    """
+    if not isinstance(instance, Product):
+        return
+    transaction.on_commit(partial(get_hub().publish, instance.pk, DELETE_EVENT, {'id': instance.pk}), using=using)
+
+
+@receiver(rows_bulk_updated, sender=Product)
+def publish_bulk_price_changes(sender, instances, **kwargs):
+    """
+    Publishes the prices of products changed by a bulk update to the live price streams. The signal is
+    sent after the transaction commits.
+
+    Args:
+        sender (Model): The Product model.
+        instances (list): The updated products.
+        **kwargs: Arbitrary keyword arguments.
+    """
+    for instance in instances:
+        publish_price(instance)
@@ -1,3 +1,525 @@
-from django.test import TestCase
+import base64
+import json
+import threading
+from contextlib import aclosing
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import connections
+from django.test import AsyncClient, Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from constants import BULK_UPDATE_CONFLICT, BULK_UPDATE_FIELDS_NOT_APPLICABLE, BULK_UPDATE_ROWS_NOT_FOUND
+from dynamic_pricing_system.bulk_updates import bulk_update_rows
+from orders.models import Order, OrderItem
+from orders.services import place_orders
+from .constants import (INVALID_CURSOR, PRODUCT_IDS_INVALID, PRODUCT_IDS_OUT_OF_RANGE, PRODUCT_IDS_REQUIRED,
+                        TOO_MANY_PRODUCT_IDS)
+from .inventory import InsufficientStock
+from .live import PriceChangeHub, price_event_stream
+from .models import Product, SeasonalProduct, BulkProduct
+from .search import rebuild_index, search_product_ids
+
+
+@override_settings(LOAD_SHEDDING={'ENABLED': False})
+class ProductSearchTests(TestCase):
+    """
+    Checks full-text search ranking, cursor pagination and the maintenance of the index by signals.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.long = Product.objects.create(name="Long Red Wool Jacket", price=Decimal('90.00'))
+        cls.jacket = Product.objects.create(name="Jacket", price=Decimal('50.00'))
+        cls.red = SeasonalProduct.objects.create(name="Red Jacket", price=Decimal('60.00'),
+                                                 seasonal_discount=Decimal('10.00'))
+        cls.winter = Product.objects.create(name="Winter Jacket", price=Decimal('70.00'))
+        cls.scarf = Product.objects.create(name="Wool Scarf", price=Decimal('20.00'))
+
+    def search(self, query, **params):
+        return self.client.get(reverse('product-search'), {'q': query, **params})
+
+    def ids(self, query):
+        return [product_id for _, product_id in search_product_ids(query, limit=100)]
+
+    def test_best_matches_come_first(self):
+        response = self.search("jacket")
+        self.assertEqual(response.status_code, 200, response.content)
+        results = response.json()['results']
+        self.assertEqual(results[0]['id'], self.jacket.pk)
+        self.assertEqual(results[-1]['id'], self.long.pk)
+        self.assertEqual({product['id'] for product in results}, {self.jacket.pk, self.red.pk, self.winter.pk,
+                                                                  self.long.pk})
+        self.assertEqual(self.ids("red wool"), [self.long.pk])
+
+    def test_words_match_as_prefixes(self):
+        self.assertEqual(self.ids("win jack"), [self.winter.pk])
+        self.assertEqual(self.ids('wool "scarf'), [self.scarf.pk])
+
+    def test_cursor_walks_every_result_once(self):
+        expected = self.ids("jacket")
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 1, **({'cursor': cursor} if cursor else {})}
+            page = self.search("jacket", **params).json()
+            seen += [product['id'] for product in page['results']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursors_are_rejected(self):
+        def cursor(value):
+            return base64.urlsafe_b64encode(value.encode()).decode()
+
+        for value in ("not a cursor", cursor("[1.5]"), cursor("[-1.5, 99999999999999999999999]"),
+                      cursor("[-1.5, -1]"), cursor("[-1.5, 1.9]"), cursor("[-1.5, true]"), cursor("[NaN, 1]"),
+                      cursor('["-1.5", 1]')):
+            with self.subTest(cursor=value):
+                response = self.search("jacket", cursor=value)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': INVALID_CURSOR})
+
+    def test_signals_keep_the_index_in_sync(self):
+        product = BulkProduct.objects.create(name="Thermal Socks", price=Decimal('5.00'))
+        self.assertEqual(self.ids("thermal"), [product.pk])
+        product.name = "Wool Socks"
+        product.save()
+        self.assertEqual(self.ids("thermal"), [])
+        self.assertIn(product.pk, self.ids("wool socks"))
+        product.delete()
+        self.assertEqual(self.ids("socks"), [])
+
+    def test_rebuild_indexes_rows_written_without_signals(self):
+        Product.objects.bulk_create([Product(name=f"Bulk Loaded {number}", price=Decimal('1.00'))
+                                     for number in range(3)])
+        self.assertEqual(self.ids("loaded"), [])
+        self.assertEqual(rebuild_index(batch_size=2), Product.objects.count())
+        self.assertEqual(len(self.ids("loaded")), 3)
+        self.assertEqual(self.ids("win jack"), [self.winter.pk])
+
+
+@override_settings(LOAD_SHEDDING={'ENABLED': False})
+class LivePriceTests(TestCase):
+    """
+    Checks the price changes published to the live price streams when products are saved.
+    """
+
+    def setUp(self):
+        self.hub = PriceChangeHub(tracked_products=3)
+        patcher = mock.patch('products.signals.get_hub', return_value=self.hub)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def published(self):
+        return [json.loads(event.data) for event in self.hub._history]
+
+    def test_products_are_published_once_committed(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            product = SeasonalProduct.objects.create(name="Scarf", price=Decimal('50'))
+        self.assertEqual(self.published(), [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.published(), [{'id': product.pk, 'type': 'seasonal', 'price': '50.00',
+                                             'effective_price': '50.00'}])
+
+    def test_default_discounts_are_published_as_decimals(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('seasonal-product-list-create'), {'name': "Hat", 'price': '20.00'},
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 201, response.content)
+            BulkProduct.objects.create(name="Socks", price=Decimal('3.00'), bulk_threshold=4)
+        self.assertEqual([payload.get('effective_price') for payload in self.published()], ['20.00', '3.00'])
+        self.assertEqual(self.published()[1]['bulk_price'], '3.00')
+
+    def test_created_products_are_published_without_subtype_lookups(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Product.objects.create(name="Pen", price=Decimal('1.50'))
+        with self.assertNumQueries(0):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(self.published()[0]['type'], 'product')
+
+    def test_updates_of_parent_rows_publish_the_subtype(self):
+        product = SeasonalProduct.objects.create(name="Gloves", price=Decimal('10.00'),
+                                                 seasonal_discount=Decimal('10.00'))
+        parent = Product.objects.get(pk=product.pk)
+        parent.price = Decimal('20.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            parent.save()
+        self.assertEqual(self.published()[-1], {'id': product.pk, 'type': 'seasonal', 'price': '20.00',
+                                                'effective_price': '18.00'})
+
+    def test_unchanged_prices_are_not_published_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(name="Cup", price=Decimal('4.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = "Mug"
+            product.save()
+        self.assertEqual(len(self.published()), 1)
+
+    def test_bulk_updates_are_published(self):
+        products = Product.objects.bulk_create([Product(name=f"Item {number}", price=Decimal('5.00'))
+                                                for number in range(2)])
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_update_rows(Product, {'price': Product}, [{'id': product.pk, 'price': Decimal('6.00')}
+                                                           for product in products])
+        self.assertEqual([payload['price'] for payload in self.published()], ['6.00', '6.00'])
+
+    def test_tracked_products_are_bounded(self):
+        for product_id in range(1, 6):
+            self.hub.publish(product_id, 'price', {'id': product_id})
+        self.assertEqual(list(self.hub._last_payloads), [3, 4, 5])
+        self.assertIsNone(self.hub.publish(5, 'price', {'id': 5}))
+        self.assertIsNotNone(self.hub.publish(1, 'price', {'id': 1}))
+        self.assertEqual(list(self.hub._last_payloads), [4, 5, 1])
+
+
+class LivePriceStreamTests(SimpleTestCase):
+    """
+    Checks the Server-Sent Events streamed from the price change hub.
+    """
+
+    def setUp(self):
+        self.hub = PriceChangeHub(history_size=3, queue_size=2)
+
+    def publish(self, *product_ids):
+        return [self.hub.publish(product_id, 'price', {'id': product_id, 'price': str(len(self.hub._history))})
+                for product_id in product_ids]
+
+    def formatted(self, event):
+        return f"id: {self.hub.event_id(event)}\nevent: price\ndata: {event.data}\n\n"
+
+    async def read(self, stream, count):
+        return [await anext(stream) for _ in range(count)]
+
+    async def test_streams_published_events_of_the_subscribed_products(self):
+        stream = price_event_stream(self.hub, product_ids=[2, 3], heartbeat=60)
+        self.assertEqual(await anext(stream), "retry: 3000\n\n")
+        events = self.publish(1, 2, 3)
+        self.assertEqual(await self.read(stream, 2), [self.formatted(events[1]), self.formatted(events[2])])
+        self.assertEqual(self.hub.subscriber_count, 1)
+        await stream.aclose()
+        self.assertEqual(self.hub.subscriber_count, 0)
+
+    async def test_idle_streams_are_kept_alive(self):
+        stream = price_event_stream(self.hub, heartbeat=0.01)
+        self.assertEqual(await self.read(stream, 2), ["retry: 3000\n\n", ": keep-alive\n\n"])
+        await stream.aclose()
+
+    async def test_resumes_after_the_last_event_id(self):
+        events = self.publish(1, 2, 1)
+        stream = price_event_stream(self.hub, product_ids=[1], last_event_id=self.hub.event_id(events[0]))
+        self.assertEqual(await self.read(stream, 2), ["retry: 3000\n\n", self.formatted(events[2])])
+        later = self.publish(2, 1)
+        self.assertEqual(await anext(stream), self.formatted(later[1]))
+        await stream.aclose()
+
+    async def test_evicted_or_unknown_ids_reset_the_client(self):
+        events = self.publish(1, 2, 3, 4, 5)
+        stream = price_event_stream(self.hub, last_event_id=self.hub.event_id(events[0]))
+        # The events after the first one have partly been evicted from the history of three events.
+        self.assertEqual(await self.read(stream, 5), ["retry: 3000\n\n", "event: reset\ndata: {}\n\n",
+                                                      *[self.formatted(event) for event in events[2:]]])
+        await stream.aclose()
+
+        for last_event_id in ("unknown-1", f"{self.hub.epoch}-99", "garbage"):
+            with self.subTest(last_event_id=last_event_id):
+                stream = price_event_stream(self.hub, last_event_id=last_event_id, heartbeat=0.01)
+                self.assertEqual(await self.read(stream, 3), ["retry: 3000\n\n", "event: reset\ndata: {}\n\n",
+                                                              ": keep-alive\n\n"])
+                await stream.aclose()
+
+    async def test_slow_consumers_are_evicted_with_their_resume_id(self):
+        stream = price_event_stream(self.hub, heartbeat=60)
+        await anext(stream)
+        first = self.publish(1)[0]
+        self.assertEqual(await anext(stream), self.formatted(first))
+        # A third event overflows the queue of two events before the stream reads any of them.
+        self.publish(2, 3, 4)
+        self.assertEqual(await anext(stream),
+                         f"event: evicted\ndata: {json.dumps({'resume_id': self.hub.event_id(first)})}\n\n")
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
+        self.assertEqual(self.hub.subscriber_count, 0)
+
+    @override_settings(LOAD_SHEDDING={'ENABLED': False}, LIVE_PRICES={'HEARTBEAT_SECONDS': 60})
+    async def test_view_streams_the_requested_products(self):
+        events = self.publish(1, 2, 1)
+        with mock.patch('products.views.get_hub', return_value=self.hub):
+            response = await AsyncClient().get(reverse('product-price-stream'), {'ids': '1, 3'},
+                                               headers={'Last-Event-ID': self.hub.event_id(events[0])})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            self.assertEqual(response['Cache-Control'], 'no-cache')
+            # Consumed as the ASGI handler does.
+            async with aclosing(aiter(response)) as content:
+                self.assertEqual([chunk.decode() for chunk in await self.read(content, 2)],
+                                 ["retry: 3000\n\n", self.formatted(events[2])])
+                self.assertEqual(self.hub.subscriber_count, 1)
+
+    @override_settings(LOAD_SHEDDING={'ENABLED': False})
+    def test_view_rejects_invalid_ids(self):
+        url = reverse('product-price-stream')
+        for ids in ('1,abc', '0', '2,-1', '1.5'):
+            with self.subTest(ids=ids):
+                response = Client().get(url, {'ids': ids})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': PRODUCT_IDS_INVALID})
+        response = Client().get(url, {'ids': ','.join(str(number) for number in range(1, 1002))})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': TOO_MANY_PRODUCT_IDS.replace("{limit}", "1000")})
+        self.assertEqual(self.hub.subscriber_count, 0)
+
+
+@override_settings(LOAD_SHEDDING={'ENABLED': False})
+class ProductBatchTests(TestCase):
+    """
+    Checks the batch lookup of products by id.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.plain = Product.objects.create(name="Plain", price=Decimal('7.25'))
+        cls.seasonal = SeasonalProduct.objects.create(name="Seasonal", price=Decimal('10.00'),
+                                                      seasonal_discount=Decimal('10.00'))
+        cls.bulk = BulkProduct.objects.create(name="Bulk", price=Decimal('5.00'), bulk_threshold=3,
+                                              bulk_discount=Decimal('20.00'))
+
+    def get(self, ids):
+        return self.client.get(reverse('product-batch'), {'ids': ids})
+
+    def post(self, ids):
+        return self.client.post(reverse('product-batch'), {'ids': ids}, content_type='application/json')
+
+    def test_products_are_returned_in_request_order_with_their_subtype(self):
+        missing = self.bulk.pk + 1000
+        with self.assertNumQueries(1):
+            response = self.get(f"{self.bulk.pk},{missing},{self.plain.pk},{self.seasonal.pk},{self.bulk.pk}")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([product['id'] for product in response.json()['results']],
+                         [self.bulk.pk, self.plain.pk, self.seasonal.pk])
+        self.assertEqual(response.json()['missing'], [missing])
+        self.assertEqual(self.post([self.seasonal.pk, str(self.plain.pk)]).json()['missing'], [])
+
+    def test_invalid_ids_are_rejected(self):
+        cases = [
+            (self.get(''), PRODUCT_IDS_REQUIRED),
+            (self.get('1,x'), PRODUCT_IDS_INVALID),
+            (self.get('0'), PRODUCT_IDS_INVALID),
+            (self.get('1.9'), PRODUCT_IDS_INVALID),
+            (self.post([1.9]), PRODUCT_IDS_INVALID),
+            (self.post([True]), PRODUCT_IDS_INVALID),
+            (self.post([None]), PRODUCT_IDS_INVALID),
+            (self.get('99999999999999999999999'), PRODUCT_IDS_OUT_OF_RANGE.replace("{max}", str(2 ** 63 - 1))),
+            (self.post([self.plain.pk, 2 ** 63]), PRODUCT_IDS_OUT_OF_RANGE.replace("{max}", str(2 ** 63 - 1))),
+            (self.get(','.join(['1'] * 201)), TOO_MANY_PRODUCT_IDS.replace("{limit}", "200")),
+        ]
+        for response, error in cases:
+            with self.subTest(error=error):
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': error})
+
+
+@override_settings(LOAD_SHEDDING={'ENABLED': False})
+class ProductBulkUpdateTests(TestCase):
+    """
+    Checks that bulk price updates are written all or nothing.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.plain = Product.objects.create(name="Plain", price=Decimal('7.25'))
+        cls.seasonal = SeasonalProduct.objects.create(name="Seasonal", price=Decimal('10.00'),
+                                                      seasonal_discount=Decimal('12.50'))
+
+    def patch(self, items):
+        return self.client.patch(reverse('product-bulk-update'), {'items': items}, content_type='application/json')
+
+    def prices(self):
+        return dict(Product.objects.values_list('pk', 'price'))
+
+    def test_rows_are_updated_table_by_table(self):
+        response = self.patch([{'id': self.plain.pk, 'price': '8.00'},
+                               {'id': self.seasonal.pk, 'price': '11.00', 'seasonal_discount': '20.00'}])
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['data']['updated'], 2)
+        self.assertEqual(self.prices(), {self.plain.pk: Decimal('8.00'), self.seasonal.pk: Decimal('11.00')})
+        self.assertEqual(SeasonalProduct.objects.get().seasonal_discount, Decimal('20.00'))
+
+    def test_rows_changed_since_read_are_rejected(self):
+        read_at = self.plain.updated_at
+        Product.objects.filter(pk=self.plain.pk).update(name="Renamed")
+        self.plain.save()
+        response = self.patch([{'id': self.plain.pk, 'updated_at': read_at.isoformat(), 'price': '8.00'},
+                               {'id': self.seasonal.pk, 'updated_at': self.seasonal.updated_at.isoformat(),
+                                'price': '11.00'}])
+        self.assertEqual(response.status_code, 409, response.content)
+        self.assertEqual(response.json(), {'error': BULK_UPDATE_CONFLICT, 'details': {'conflicts': [self.plain.pk]}})
+        self.assertEqual(self.prices(), {self.plain.pk: Decimal('7.25'), self.seasonal.pk: Decimal('10.00')})
+        self.assertEqual(Product.objects.get(pk=self.seasonal.pk).updated_at, self.seasonal.updated_at)
+
+    def test_rejected_updates_are_rolled_back(self):
+        for items, status_code, error in (
+                ([{'id': self.seasonal.pk, 'price': '11.00'}, {'id': self.plain.pk, 'seasonal_discount': '5.00'}],
+                 400, BULK_UPDATE_FIELDS_NOT_APPLICABLE),
+                ([{'id': self.plain.pk, 'price': '8.00'}, {'id': self.seasonal.pk + 1000, 'price': '1.00'}],
+                 404, BULK_UPDATE_ROWS_NOT_FOUND)):
+            with self.subTest(error=error):
+                response = self.patch(items)
+                self.assertEqual(response.status_code, status_code, response.content)
+                self.assertEqual(response.json()['error'], error)
+                self.assertEqual(self.prices(), {self.plain.pk: Decimal('7.25'), self.seasonal.pk: Decimal('10.00')})
+                self.assertEqual(set(Product.objects.values_list('updated_at', flat=True)),
+                                 {self.plain.updated_at, self.seasonal.updated_at})
+
+
+@override_settings(LOAD_SHEDDING={'ENABLED': False})
+class BulkUpdateStressTests(TransactionTestCase):
+    """
+    Sends bulk updates of the same rows from many concurrent clients.
+    """
+    clients = 30
+
+    def setUp(self):
+        self.products = [Product.objects.create(name=f"Item {number}", price=Decimal('5.00')) for number in range(4)]
+
+    def run_clients(self, items):
+        """
+        Sends the items returned by `items(number)` from concurrent client threads.
+
+        Returns:
+            list: The status code of every response.
+        """
+        statuses = [None] * self.clients
+
+        def client(number):
+            try:
+                response = Client().patch(reverse('product-bulk-update'), {'items': items(number)},
+                                          content_type='application/json')
+                statuses[number] = response.status_code
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=client, args=(number,)) for number in range(self.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def test_concurrent_updates_wait_for_each_other(self):
+        statuses = self.run_clients(lambda number: [{'id': product.pk, 'price': f"{number + 100}.00"}
+                                                    for product in self.products[number % 2:number % 2 + 3]])
+        self.assertEqual(statuses, [200] * self.clients)
+        for product in Product.objects.all():
+            self.assertGreaterEqual(product.price, Decimal('100.00'))
+
+    def test_concurrent_updates_of_the_same_read_keep_one(self):
+        read_at = self.products[0].updated_at.isoformat()
+        statuses = self.run_clients(lambda number: [{'id': self.products[0].pk, 'updated_at': read_at,
+                                                     'price': f"{number + 1}.00"}])
+        self.assertEqual(sorted(statuses), [200] + [409] * (self.clients - 1))
+        self.assertEqual(Product.objects.filter(price=Decimal('5.00')).count(), len(self.products) - 1)
+
+
+class InventoryReservationStressTests(TransactionTestCase):
+    """
+    Orders a best-selling product from many concurrent clients and checks that it is never oversold.
+    """
+    clients = 40
+    orders_per_client = 5
+    stock = 60
+
+    def setUp(self):
+        self.hot = Product.objects.create(name="Best-seller", price=Decimal('7.25'), stock=self.stock)
+        self.untracked = Product.objects.create(name="Untracked", price=Decimal('3.00'))
+        self.others = [Product.objects.create(name=f"Other {number}", price=Decimal('1.00'), stock=1000)
+                       for number in range(self.clients)]
+
+    def run_clients(self, lines):
+        """
+        Places orders from concurrent client threads.
+
+        Args:
+            lines (Callable): Returns the lines of an order from the number of the client.
+
+        Returns:
+            list: The placed orders or raised errors.
+        """
+        results = [None] * (self.clients * self.orders_per_client)
+        barrier = threading.Barrier(self.clients)
+
+        def client(number):
+            try:
+                barrier.wait()
+                for offset in range(self.orders_per_client):
+                    data = {'discount': None, 'products': lines(number)}
+                    try:
+                        results[number * self.orders_per_client + offset] = place_orders([data])[0]
+                    except Exception as error:
+                        results[number * self.orders_per_client + offset] = error
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=client, args=(number,)) for number in range(self.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_hot_product_is_never_oversold(self):
+        results = self.run_clients(lambda number: [
+            {'product': self.hot, 'quantity': 1 + number % 2},
+            {'product': self.untracked, 'quantity': 3},
+            {'product': self.others[number], 'quantity': 1},
+        ])
+        placed = [result for result in results if isinstance(result, Order)]
+        errors = [result for result in results if not isinstance(result, Order)]
+        self.assertTrue(all(isinstance(error, InsufficientStock) for error in errors), errors)
+        self.assertTrue(errors)
+
+        self.hot.refresh_from_db()
+        sold = sum(OrderItem.objects.filter(product=self.hot).values_list('quantity', flat=True))
+        self.assertGreaterEqual(self.hot.stock, 0)
+        self.assertEqual(sold + self.hot.stock, self.stock)
+        # One unit may be left when only orders of two units remain.
+        self.assertLessEqual(self.hot.stock, 1)
+        for order in placed:
+            self.assertEqual(order.orderitem_set.count(), 3)
+        for number, product in enumerate(self.others):
+            product.refresh_from_db()
+            ordered = OrderItem.objects.filter(product=product).count()
+            self.assertEqual(product.stock, 1000 - ordered)
+        self.untracked.refresh_from_db()
+        self.assertIsNone(self.untracked.stock)
+
+    def test_rejected_order_reports_short_lines(self):
+        Product.objects.filter(pk=self.hot.pk).update(stock=2)
+        with self.assertRaises(InsufficientStock) as context:
+            place_orders([{'discount': None, 'products': [
+                {'product': self.others[0], 'quantity': 5},
+                {'product': self.hot, 'quantity': 2},
+                {'product': self.hot, 'quantity': 1},
+                {'product': self.untracked, 'quantity': 1},
+            ]}])
+        self.assertEqual(context.exception.lines, [{'product': self.hot.pk, 'requested': 3, 'available': 2}])
+        self.others[0].refresh_from_db()
+        self.assertEqual(self.others[0].stock, 1000)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_hot_product_contention(self):
+        # Every order decrements the same row. The throughput of such orders is reported by
+        # `manage.py loadtest --mix contention`, rather than asserted here.
+        orders = self.clients * self.orders_per_client
+        Product.objects.filter(pk=self.hot.pk).update(stock=orders)
+        results = self.run_clients(lambda number: [{'product': self.hot, 'quantity': 1}])
+        self.assertTrue(all(isinstance(order, Order) for order in results), results)
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.stock, 0)
+        results = self.run_clients(lambda number: [{'product': self.others[number], 'quantity': 1}])
+        self.assertTrue(all(isinstance(order, Order) for order in results), results)
+        for product in self.others:
+            product.refresh_from_db()
+            self.assertEqual(product.stock, 1000 - self.orders_per_client)
@@ -1,8 +1,15 @@
 from django.urls import path
-from .views import ProductListCreateView, SeasonalProductListCreateView, BulkProductListCreateView
+from .views import (ProductListCreateView, SeasonalProductListCreateView, BulkProductListCreateView,
+                    ProductSearchView, ProductBatchView, ProductBulkUpdateView, ProductRestockView,
+                    ProductPriceStreamView)
 
 urlpatterns = [
     path('products/', ProductListCreateView.as_view(), name='product-list-create'),
     path('products/seasonal/', SeasonalProductListCreateView.as_view(), name='seasonal-product-list-create'),
     path('products/bulk/', BulkProductListCreateView.as_view(), name='bulk-product-list-create'),
+    path('products/search/', ProductSearchView.as_view(), name='product-search'),
+    path('products/batch/', ProductBatchView.as_view(), name='product-batch'),
+    path('products/bulk-update/', ProductBulkUpdateView.as_view(), name='product-bulk-update'),
+    path('products/<int:pk>/restock/', ProductRestockView.as_view(), name='product-restock'),
+    path('products/stream/', ProductPriceStreamView.as_view(), name='product-price-stream'),
 ]
@@ -2,19 +2,34 @@
     products/views.py
 
     This module defines API views for managing product models. It includes views for listing and creating general products,
-    seasonal products, and bulk products.
+    seasonal products, and bulk products, a full-text search view, a batch lookup view, a bulk price update view,
+    a restock view and a stream of live price changes.
 """
 
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
 from rest_framework import generics, status
 from rest_framework.response import Response
 
-from constants import CREATED_SUCCESSFULLY, SOMETHING_WENT_WRONG
-from .constants import PRODUCT, BULK_PRODUCT, SEASONAL_PRODUCT
+from constants import CREATED_SUCCESSFULLY, UPDATED_SUCCESSFULLY, SOMETHING_WENT_WRONG
+from currencies.conversion import CurrencyConversionMixin
+from dynamic_pricing_system.bulk_updates import BulkUpdateAPIView
+from dynamic_pricing_system.related_fields import primary_key, primary_key_range
+from dynamic_pricing_system.sparse_fields import SparseFieldsetMixin
+from .constants import (PRODUCT, PRODUCTS, BULK_PRODUCT, SEASONAL_PRODUCT, SEARCH_QUERY_REQUIRED, INVALID_CURSOR,
+                        INVALID_LIMIT, PRODUCT_IDS_REQUIRED, PRODUCT_IDS_INVALID, PRODUCT_IDS_OUT_OF_RANGE,
+                        TOO_MANY_PRODUCT_IDS, STOCK)
+from .inventory import add_stock
+from .live import get_hub, price_event_stream
 from .models import Product, SeasonalProduct, BulkProduct
-from .serializers import ProductSerializer, SeasonalProductSerializer, BulkProductSerializer
+from .search import InvalidCursor, decode_cursor, encode_cursor, search_product_ids
+from .serializers import (ProductSerializer, SeasonalProductSerializer, BulkProductSerializer,
+                          PolymorphicProductSerializer, ProductBatchSerializer, ProductBulkUpdateSerializer,
+                          ProductRestockSerializer)
 
 
-class ProductListCreateView(generics.ListCreateAPIView):
+class ProductListCreateView(CurrencyConversionMixin, SparseFieldsetMixin, generics.ListCreateAPIView):
     """
     Handles listing of all products and creating new products.
 
@@ -24,9 +39,11 @@ class ProductListCreateView(generics.ListCreateAPIView):
         queryset (QuerySet): A queryset of all Product instances.
         serializer_class (Serializer): The serializer class for validating and
         deserializing product data.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
     """
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    query_budget = {'GET': 3, 'POST': 5}
 
     def create(self, request, *args, **kwargs):
         """
@@ -50,7 +67,7 @@ class ProductListCreateView(generics.ListCreateAPIView):
                             status=status.HTTP_400_BAD_REQUEST)
 
 
-class SeasonalProductListCreateView(generics.ListCreateAPIView):
+class SeasonalProductListCreateView(CurrencyConversionMixin, SparseFieldsetMixin, generics.ListCreateAPIView):
     """
     Handles listing of all seasonal products and creating new products.
 
@@ -61,9 +78,11 @@ class SeasonalProductListCreateView(generics.ListCreateAPIView):
         queryset (QuerySet): A queryset of all SeasonalProduct instances.
         serializer_class (Serializer): The serializer class for validating and
         deserializing seasonal product data.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
     """
     queryset = SeasonalProduct.objects.all()
     serializer_class = SeasonalProductSerializer
+    query_budget = {'GET': 3, 'POST': 4}
 
     def create(self, request, *args, **kwargs):
         """
@@ -89,7 +108,7 @@ class SeasonalProductListCreateView(generics.ListCreateAPIView):
                             status=status.HTTP_400_BAD_REQUEST)
 
 
-class BulkProductListCreateView(generics.ListCreateAPIView):
+class BulkProductListCreateView(CurrencyConversionMixin, SparseFieldsetMixin, generics.ListCreateAPIView):
     """
     Manages the creation and retrieval of bulk products.
 
@@ -99,9 +118,11 @@ class BulkProductListCreateView(generics.ListCreateAPIView):
         queryset (QuerySet): A queryset of all BulkProduct instances.
         serializer_class (Serializer): The serializer class for validating and
         deserializing bulk product data.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
     """
     queryset = BulkProduct.objects.all()
     serializer_class = BulkProductSerializer
+    query_budget = {'GET': 3, 'POST': 4}
 
     def create(self, request, *args, **kwargs):
         """
@@ -124,3 +145,250 @@ class BulkProductListCreateView(generics.ListCreateAPIView):
         else:
             return Response({'error': SOMETHING_WENT_WRONG, 'details': serializer.errors},
                             status=status.HTTP_400_BAD_REQUEST)
+
+
+class ProductSearchView(CurrencyConversionMixin, SparseFieldsetMixin, generics.GenericAPIView):
+    """
+    Searches products by name using the full-text search index.
+
+    Query parameters:
+        q (str): The search text. Every word is matched as a prefix.
+        cursor (str, optional): The `next_cursor` value returned with the previous page.
+        limit (int, optional): The page size, capped at `max_limit`.
+
+    Attributes:
+        serializer_class (Serializer): The serializer used to render the concrete product subtypes.
+        default_limit (int): The page size used when no limit is given.
+        max_limit (int): The largest accepted page size.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
+    """
+    serializer_class = PolymorphicProductSerializer
+    default_limit = 20
+    max_limit = 100
+    query_budget = {'GET': 4}
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns one page of products matching the query, best match first.
+
+        Args:
+            request (Request): The HTTP request containing the search parameters.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+
+        Returns:
+            Response: A response containing the matching products and the cursor of the next page.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': SEARCH_QUERY_REQUIRED}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response({'error': INVALID_LIMIT}, status=status.HTTP_400_BAD_REQUEST)
+        after = None
+        if request.query_params.get('cursor'):
+            try:
+                after = decode_cursor(request.query_params['cursor'])
+            except InvalidCursor:
+                return Response({'error': INVALID_CURSOR}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.sparse_queryset(Product.objects.with_subtypes())
+        matches = search_product_ids(query, after=after, limit=limit)
+        products = queryset.in_bulk([product_id for _, product_id in matches])
+        results = [products[product_id] for _, product_id in matches if product_id in products]
+        next_cursor = encode_cursor(*matches[-1]) if len(matches) == limit else None
+        return Response({'results': self.get_serializer(results, many=True).data, 'next_cursor': next_cursor})
+
+
+class ProductBatchView(CurrencyConversionMixin, SparseFieldsetMixin, generics.GenericAPIView):
+    """
+    Returns many products by id in a single round trip.
+
+    Ids are passed as `?ids=1,2,3` with GET, or as `{"ids": [1, 2, 3]}` with POST for large id sets. All
+    products are loaded in one query that left-joins the seasonal and bulk child tables.
+
+    Attributes:
+        serializer_class (Serializer): The serializer rendering the concrete subtype and effective price.
+        max_get_ids (int): The largest number of ids accepted in the query string.
+        max_post_ids (int): The largest number of ids accepted in a POST body.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
+    """
+    serializer_class = ProductBatchSerializer
+    max_get_ids = 200
+    max_post_ids = 1000
+    query_budget = {'GET': 3, 'POST': 3}
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns the products whose ids are listed in the `ids` query parameter.
+
+        Args:
+            request (Request): The HTTP request containing the product ids.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+
+        Returns:
+            Response: A response containing the products in request order and the ids not found.
+        """
+        raw_ids = request.query_params.get('ids', '')
+        return self.batch_response([raw_id for raw_id in raw_ids.split(',') if raw_id.strip()], self.max_get_ids)
+
+    def post(self, request, *args, **kwargs):
+        """
+        Returns the products whose ids are listed in the `ids` field of the request body.
+
+        Args:
+            request (Request): The HTTP request containing the product ids.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+
+        Returns:
+            Response: A response containing the products in request order and the ids not found.
+        """
+        raw_ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(raw_ids, list):
+            raw_ids = []
+        return self.batch_response(raw_ids, self.max_post_ids)
+
+    def batch_response(self, raw_ids, limit):
+        """
+        Validates the requested ids and loads the products.
+
+        Args:
+            raw_ids (list): The requested ids, as strings or integers.
+            limit (int): The largest number of ids accepted.
+
+        Returns:
+            Response: A response containing the products in request order and the ids not found.
+        """
+        if not raw_ids:
+            return Response({'error': PRODUCT_IDS_REQUIRED}, status=status.HTTP_400_BAD_REQUEST)
+        if len(raw_ids) > limit:
+            return Response({'error': TOO_MANY_PRODUCT_IDS.replace("{limit}", str(limit))},
+                            status=status.HTTP_400_BAD_REQUEST)
+        # Floats such as 1.9 are rejected rather than truncated.
+        ids = list(dict.fromkeys(primary_key(raw_id.strip() if isinstance(raw_id, str) else raw_id)
+                                 for raw_id in raw_ids))
+        if None in ids or min(ids) < 1:
+            return Response({'error': PRODUCT_IDS_INVALID}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.sparse_queryset(Product.objects.with_subtypes())
+        _, max_id = primary_key_range(queryset)
+        if max_id is not None and max(ids) > max_id:
+            return Response({'error': PRODUCT_IDS_OUT_OF_RANGE.replace("{max}", str(max_id))},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        products = queryset.in_bulk(ids)
+        found = [products[product_id] for product_id in ids if product_id in products]
+        return Response({
+            'results': self.get_serializer(found, many=True).data,
+            'missing': [product_id for product_id in ids if product_id not in products],
+        })
+
+
+class ProductBulkUpdateView(BulkUpdateAPIView):
+    """
+    Updates the prices and pricing rules of many products at once, in one transaction.
+
+    Attributes:
+        base_model (Model): The Product model.
+        field_models (dict): Maps every updatable field to the product model declaring it.
+        serializer_class (Serializer): The serializer validating one item.
+        module (str): The name of the updated rows, used in the response message.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
+    """
+    base_model = Product
+    field_models = {
+        'price': Product,
+        'seasonal_discount': SeasonalProduct,
+        'bulk_threshold': BulkProduct,
+        'bulk_discount': BulkProduct,
+    }
+    serializer_class = ProductBulkUpdateSerializer
+    module = PRODUCTS
+    query_budget = {'PATCH': 3}
+
+
+class ProductRestockView(generics.GenericAPIView):
+    """
+    Adds stock to a product. The stock is incremented in the database rather than overwritten, so that
+    reservations of orders placed meanwhile are never lost.
+
+    Attributes:
+        serializer_class (Serializer): The serializer validating the added quantity.
+        query_budget (dict): The largest number of queries of a request, per HTTP method.
+    """
+    serializer_class = ProductRestockSerializer
+    query_budget = {'POST': 2}
+
+    def post(self, request, pk, *args, **kwargs):
+        """
+        Adds the given quantity to the stock of the product.
+
+        Args:
+            request (Request): The HTTP request containing the quantity.
+            pk (int): The id of the product.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+
+        Returns:
+            Response: A response containing the new stock of the product, or 404 if it does not exist.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        stock = add_stock(pk, serializer.validated_data['quantity'])
+        if stock is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response({'message': UPDATED_SUCCESSFULLY.replace("{module}", STOCK),
+                         'data': {'id': pk, 'stock': stock}})
+
+
+class ProductPriceStreamView(View):
+    """
+    Streams effective price changes of products as Server-Sent Events.
+
+    Clients subscribe to all products, or to the products listed in `?ids=1,2,3`. Reconnecting clients
+    resume after the event named by the `Last-Event-ID` header, which browsers send automatically, or by
+    the `last_event_id` query parameter. The stream needs an ASGI server; see the README.
+
+    Attributes:
+        max_ids (int): The largest number of product ids a stream can subscribe to.
+    """
+    max_ids = 1000
+
+    async def get(self, request, *args, **kwargs):
+        """
+        Opens a stream of price changes.
+
+        Args:
+            request (HttpRequest): The HTTP request containing the subscribed product ids, if any.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+
+        Returns:
+            StreamingHttpResponse: The event stream, or a JSON error response for invalid ids.
+        """
+        product_ids = None
+        raw_ids = [raw_id for raw_id in request.GET.get('ids', '').split(',') if raw_id.strip()]
+        if raw_ids:
+            if len(raw_ids) > self.max_ids:
+                return JsonResponse({'error': TOO_MANY_PRODUCT_IDS.replace("{limit}", str(self.max_ids))},
+                                    status=status.HTTP_400_BAD_REQUEST)
+            try:
+                product_ids = {int(raw_id) for raw_id in raw_ids}
+            except ValueError:
+                product_ids = {0}
+            if min(product_ids) < 1:
+                return JsonResponse({'error': PRODUCT_IDS_INVALID}, status=status.HTTP_400_BAD_REQUEST)
+
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        heartbeat = getattr(settings, 'LIVE_PRICES', {}).get('HEARTBEAT_SECONDS', 15)
+        response = StreamingHttpResponse(
+            price_event_stream(get_hub(), product_ids, last_event_id, heartbeat=heartbeat),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
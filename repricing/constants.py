@@ -0,0 +1,3 @@
+REPRICING_RULE = "Repricing Rule"
+REPRICING_POLICY = "Repricing Policy"
+INVALID_PRICE_BOUNDS = "The price floor must not be higher than the price ceiling"
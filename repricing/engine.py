@@ -0,0 +1,200 @@
+"""
+    repricing/engine.py
+
+    This module reprices the products opted in to repricing. A pass loads the price, bounds and rule of
+    every repriced product and the sales velocities of the window into NumPy arrays, computes all new prices
+    at once, and writes the changed prices in bulk in one transaction.
+
+    Prices are computed in cents and rounded half to even, like `round_money`. Each rule follows a
+    constant-elasticity demand curve: with sales q = k * p ** elasticity, the price bringing a product
+    selling `velocity` units per day back to `target_velocity` is p * (target / velocity) ** (1 / elasticity).
+    The change is capped to `max_step` percent per pass, then the price is clipped to the floor and ceiling
+    of the product, which win over the step cap.
+
+    Prices are written with one parameterized UPDATE per product sent in batches, like bulk updates, and only
+    where the price is still the one read at the start of the pass, so that edits made meanwhile are kept.
+    The shared price table picks the new prices up from their `updated_at`. Passes run within a server
+    process can also announce the updated products with `rows_bulk_updated` after the commit, which keeps the
+    pricing snapshot and the live price streams of that process in sync; both live in the process, so the
+    `reprice_products` command, serving neither, skips loading the updated products for them.
+"""
+
+import time
+from collections import namedtuple
+from functools import lru_cache, partial
+
+import numpy as np
+from django.db import connections, router, transaction
+from django.db.models import FloatField, Value
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from dynamic_pricing_system.bulk_updates import batches, execute_updates, rows_bulk_updated
+from pricing.columns import from_fixed
+from products.models import Product
+from .models import RepricingPolicy, RepricingRule
+from .velocity import get_setting, prune_sales, velocities_of
+
+# Velocity of products not sold within the window, keeping the demand ratio finite.
+MIN_VELOCITY = 1e-6
+MIN_PRICE = 1
+NO_CEILING = -1.0
+
+RepricingResult = namedtuple('RepricingResult', ['products', 'changed', 'applied', 'seconds'])
+
+
+def load_policies():
+    """
+    Reads the price, bounds and rule of every repriced product with one query.
+
+    Returns:
+        dict: The `product_id` and `rule_id` int64 arrays and the `price`, `floor` and `ceiling` float64 arrays
+        in cents, sorted by product id. Products without ceiling have an infinite one.
+    """
+    rows = RepricingPolicy.objects.order_by('pk').annotate(
+        current_price=Cast('product__price', FloatField()),
+        floor=Coalesce(Cast('price_floor', FloatField()), Value(MIN_PRICE / 100)),
+        ceiling=Coalesce(Cast('price_ceiling', FloatField()), Value(NO_CEILING)),
+    ).values_list('product_id', 'rule_id', 'current_price', 'floor', 'ceiling')
+    data = np.array(list(rows), dtype=np.float64).reshape(-1, 5)
+    ceilings = np.rint(data[:, 4] * 100)
+    return {
+        'product_id': data[:, 0].astype(np.int64),
+        'rule_id': data[:, 1].astype(np.int64),
+        'price': np.rint(data[:, 2] * 100),
+        'floor': np.maximum(np.rint(data[:, 3] * 100), MIN_PRICE),
+        'ceiling': np.where(ceilings < 0, np.inf, ceilings),
+    }
+
+
+def load_rules(rule_ids):
+    """
+    Reads the parameters of the rules of the repriced products, spread to one value per product.
+
+    Args:
+        rule_ids (ndarray): The rule id of every repriced product.
+
+    Returns:
+        dict: The `elasticity`, `target_velocity` and `max_step` float64 arrays, one value per product;
+        `max_step` as a fraction.
+    """
+    ids = np.unique(rule_ids)
+    rows = RepricingRule.objects.filter(pk__in=ids.tolist()).order_by('pk').values_list(
+        'pk', 'elasticity', 'target_velocity', 'max_step')
+    data = np.array([[float(value) for value in row] for row in rows], dtype=np.float64).reshape(-1, 4)
+    index = np.searchsorted(data[:, 0], rule_ids)
+    return {
+        'elasticity': data[index, 1],
+        'target_velocity': data[index, 2],
+        'max_step': data[index, 3] / 100,
+    }
+
+
+def compute_prices(prices, floors, ceilings, velocities, elasticities, target_velocities, max_steps):
+    """
+    Computes the new prices of products from their sales velocities.
+
+    Args:
+        prices (ndarray): The current prices, in cents.
+        floors (ndarray): The lowest allowed prices, in cents.
+        ceilings (ndarray): The highest allowed prices, in cents, infinite when unbounded.
+        velocities (ndarray): The sales velocities, in units per day.
+        elasticities (ndarray): The price elasticities of demand, negative.
+        target_velocities (ndarray): The target sales velocities, in units per day.
+        max_steps (ndarray): The largest relative price changes.
+
+    Returns:
+        ndarray: The new prices, in cents (float64 holding whole numbers).
+    """
+    with np.errstate(over='ignore', under='ignore', divide='ignore'):
+        demand_ratio = target_velocities / np.maximum(velocities, MIN_VELOCITY)
+        factors = np.power(demand_ratio, 1 / elasticities)
+    factors = np.clip(factors, 1 - max_steps, 1 + max_steps)
+    return np.clip(np.rint(prices * factors), floors, ceilings)
+
+
+def apply_prices(product_ids, old_prices, new_prices, now, batch_size):
+    """
+    Writes new prices, keeping products whose price changed since it was read.
+
+    Args:
+        product_ids (ndarray): The ids of the products.
+        old_prices (ndarray): The prices read, in cents.
+        new_prices (ndarray): The new prices, in cents.
+        now (datetime): The new `updated_at` of the products.
+        batch_size (int): The number of rows sent to the database at once.
+
+    Returns:
+        int: The number of updated products.
+    """
+    connection = connections[router.db_for_write(Product)]
+    quote_name = connection.ops.quote_name
+    price = Product._meta.get_field('price')
+    updated_at = Product._meta.get_field('updated_at')
+    sql = 'UPDATE %s SET %s = %%s, %s = %%s WHERE %s = %%s AND %s = %%s' % (
+        quote_name(Product._meta.db_table), quote_name(price.column), quote_name(updated_at.column),
+        quote_name(Product._meta.pk.column), quote_name(price.column),
+    )
+    now_value = updated_at.get_db_prep_save(now, connection)
+    # Many products share prices, so each price is adapted for the database once.
+    prepare = lru_cache(maxsize=None)(lambda cents: price.get_db_prep_save(from_fixed(cents), connection))
+    params = [
+        [prepare(new), now_value, pk, prepare(old)]
+        for pk, old, new in zip(product_ids.tolist(), old_prices.astype(np.int64).tolist(),
+                                new_prices.astype(np.int64).tolist())
+    ]
+    return execute_updates(Product, sql, params, batch_size)
+
+
+def announce_repriced(product_ids, batch_size):
+    """
+    Sends `rows_bulk_updated` for repriced products, loading their concrete instances in batches.
+
+    Args:
+        product_ids (list): The ids of the repriced products.
+        batch_size (int): The number of products loaded per query.
+    """
+    for batch in batches(product_ids, batch_size):
+        instances = [product.get_concrete() for product in Product.objects.with_subtypes().filter(pk__in=batch)]
+        rows_bulk_updated.send(sender=Product, instances=instances)
+
+
+def reprice(now=None, dry_run=False, batch_size=None, announce=True):
+    """
+    Runs one repricing pass over all products opted in to repricing, and deletes the sales buckets that
+    fell out of the velocity window.
+
+    Args:
+        now (datetime): The time of the pass, now when omitted.
+        dry_run (bool): Computes the new prices without writing them.
+        batch_size (int): The number of rows sent to the database at once, REPRICING['BATCH_SIZE'] when
+            omitted.
+        announce (bool): Sends `rows_bulk_updated` for the updated products after the commit.
+
+    Returns:
+        RepricingResult: The number of repriced products, of computed price changes, of written price
+        changes, and the duration of the pass in seconds.
+    """
+    started = time.perf_counter()
+    now = now or timezone.now()
+    batch_size = batch_size or get_setting('BATCH_SIZE')
+    policies = load_policies()
+    product_ids = policies['product_id']
+    if not len(product_ids):
+        return RepricingResult(0, 0, 0, time.perf_counter() - started)
+
+    rules = load_rules(policies['rule_id'])
+    new_prices = compute_prices(policies['price'], policies['floor'], policies['ceiling'],
+                                velocities_of(product_ids, now), rules['elasticity'], rules['target_velocity'],
+                                rules['max_step'])
+    changed = np.flatnonzero(new_prices != policies['price'])
+    applied = 0
+    if not dry_run:
+        if len(changed):
+            with transaction.atomic(using=router.db_for_write(Product)):
+                applied = apply_prices(product_ids[changed], policies['price'][changed], new_prices[changed], now,
+                                       batch_size)
+                if announce:
+                    transaction.on_commit(partial(announce_repriced, product_ids[changed].tolist(), batch_size))
+        prune_sales(now)
+    return RepricingResult(len(product_ids), len(changed), applied, time.perf_counter() - started)
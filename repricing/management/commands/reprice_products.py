@@ -0,0 +1,41 @@
+"""
+    repricing/management/commands/reprice_products.py
+
+    Reprices the products opted in to repricing from their sales velocity, once or periodically.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from repricing.engine import reprice
+from repricing.velocity import get_setting
+
+
+class Command(BaseCommand):
+    help = "Reprices the products opted in to repricing from their sales velocity"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help="Seconds between two passes, defaults to REPRICING['INTERVAL_SECONDS']")
+        parser.add_argument('--once', action='store_true', help="Runs a single pass and exits")
+        parser.add_argument('--dry-run', action='store_true', help="Computes the new prices without writing them")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Rows sent to the database at once, defaults to REPRICING['BATCH_SIZE']")
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or get_setting('INTERVAL_SECONDS')
+        try:
+            while True:
+                started = time.monotonic()
+                close_old_connections()
+                # The pricing snapshot and the live price streams to keep in sync live in the server processes.
+                result = reprice(dry_run=options['dry_run'], batch_size=options['batch_size'], announce=False)
+                self.stdout.write(f"Repriced {result.products} products: {result.changed} price changes, "
+                                  f"{result.applied} written in {result.seconds:.2f}s")
+                if options['once']:
+                    break
+                time.sleep(max(interval - (time.monotonic() - started), 0))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.2 on 2026-10-19 05:19
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0004_product_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepricingRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=100)),
+                ('elasticity', models.DecimalField(decimal_places=3, default=Decimal('-1.500'), max_digits=6, validators=[django.core.validators.MaxValueValidator(Decimal('-0.100'))])),
+                ('target_velocity', models.DecimalField(decimal_places=3, max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.001'))])),
+                ('max_step', models.DecimalField(decimal_places=2, default=Decimal('5.00'), max_digits=5, validators=[django.core.validators.MinValueValidator(Decimal('0')), django.core.validators.MaxValueValidator(Decimal('100'))])),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RepricingPolicy',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='repricing_policy', serialize=False, to='products.product')),
+                ('price_floor', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('price_ceiling', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('rule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='policies', to='repricing.repricingrule')),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(('price_floor__isnull', True), ('price_ceiling__isnull', True), ('price_floor__lte', models.F('price_ceiling')), _connector='OR'), name='repricing_floor_below_ceiling')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField(db_index=True)),
+                ('units', models.PositiveBigIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_buckets', to='products.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'bucket_start'), name='unique_sales_bucket')],
+            },
+        ),
+    ]
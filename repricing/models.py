@@ -0,0 +1,85 @@
+"""
+    repricing/models.py
+
+    This module defines the models of demand-driven repricing. Products opt in with a repricing policy
+    linking them to a rule; the rule describes how their price reacts to their sales velocity, which is
+    counted in time buckets as orders are placed.
+"""
+
+from decimal import Decimal
+
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models
+
+from products.models import BaseModel, Product
+
+
+class RepricingRule(BaseModel):
+    """
+    Represents how the prices of the products following it react to demand.
+
+    Prices follow a constant-elasticity demand curve: a product selling `velocity` units per day instead of
+    the `target_velocity` gets the price that would bring its sales back to the target, moved by at most
+    `max_step` percent per repricing pass.
+
+    Attributes:
+        name (CharField): The name of the rule.
+        elasticity (DecimalField): The price elasticity of demand, the relative change of the sales for a
+            relative change of the price. Negative: sales drop when prices rise.
+        target_velocity (DecimalField): The number of units per day the products should sell.
+        max_step (DecimalField): The largest change of a price in one repricing pass, in percent.
+    """
+    name = models.CharField(max_length=100)
+    elasticity = models.DecimalField(max_digits=6, decimal_places=3, default=Decimal('-1.500'),
+                                     validators=[MaxValueValidator(Decimal('-0.100'))])
+    target_velocity = models.DecimalField(max_digits=12, decimal_places=3,
+                                          validators=[MinValueValidator(Decimal('0.001'))])
+    max_step = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('5.00'),
+                                   validators=[MinValueValidator(Decimal('0')), MaxValueValidator(Decimal('100'))])
+
+
+class RepricingPolicy(models.Model):
+    """
+    Opts a product in to repricing.
+
+    Attributes:
+        product (OneToOneField): The repriced product.
+        rule (ForeignKey): The rule repricing the product.
+        price_floor (DecimalField): The lowest price repricing may set, one cent when null.
+        price_ceiling (DecimalField): The highest price repricing may set, unbounded when null.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='repricing_policy')
+    rule = models.ForeignKey(RepricingRule, on_delete=models.CASCADE, related_name='policies')
+    price_floor = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
+                                      validators=[MinValueValidator(Decimal('0.01'))])
+    price_ceiling = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
+                                        validators=[MinValueValidator(Decimal('0.01'))])
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(price_floor__isnull=True) | models.Q(price_ceiling__isnull=True)
+                | models.Q(price_floor__lte=models.F('price_ceiling')),
+                name='repricing_floor_below_ceiling'),
+        ]
+
+
+class SalesBucket(models.Model):
+    """
+    Represents the number of units of a product sold during one time bucket. Buckets older than the sales
+    velocity window are deleted by the repricing passes.
+
+    Attributes:
+        product (ForeignKey): The sold product.
+        bucket_start (DateTimeField): The start of the bucket.
+        units (PositiveBigIntegerField): The number of units sold.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_buckets')
+    bucket_start = models.DateTimeField(db_index=True)
+    units = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'bucket_start'], name='unique_sales_bucket'),
+        ]
@@ -0,0 +1,54 @@
+"""
+    repricing/serializers.py
+
+    This module defines serializers for repricing rules and the repricing policies opting products in.
+"""
+
+from rest_framework import serializers
+
+from .constants import INVALID_PRICE_BOUNDS
+from .models import RepricingPolicy, RepricingRule
+
+
+class RepricingRuleSerializer(serializers.ModelSerializer):
+    """
+    Serializes the RepricingRule model.
+
+    Attributes:
+        id (IntegerField): The unique identifier for the rule.
+        name (CharField): The name of the rule.
+        elasticity (DecimalField): The price elasticity of demand, negative.
+        target_velocity (DecimalField): The number of units per day the products should sell.
+        max_step (DecimalField): The largest change of a price in one repricing pass, in percent.
+        query_budget (int): The largest number of queries rendering its instances may run.
+    """
+    query_budget = 1
+
+    class Meta:
+        model = RepricingRule
+        fields = ['id', 'name', 'elasticity', 'target_velocity', 'max_step']
+
+
+class RepricingPolicySerializer(serializers.ModelSerializer):
+    """
+    Serializes the RepricingPolicy model.
+
+    Attributes:
+        product (PrimaryKeyRelatedField): The repriced product.
+        rule (PrimaryKeyRelatedField): The rule repricing the product.
+        price_floor (DecimalField): The lowest price repricing may set, optional.
+        price_ceiling (DecimalField): The highest price repricing may set, optional.
+        query_budget (int): The largest number of queries rendering its instances may run.
+    """
+    query_budget = 1
+
+    class Meta:
+        model = RepricingPolicy
+        fields = ['product', 'rule', 'price_floor', 'price_ceiling']
+
+    def validate(self, attrs):
+        floor = attrs.get('price_floor', getattr(self.instance, 'price_floor', None))
+        ceiling = attrs.get('price_ceiling', getattr(self.instance, 'price_ceiling', None))
+        if floor is not None and ceiling is not None and floor > ceiling:
+            raise serializers.ValidationError({'price_floor': INVALID_PRICE_BOUNDS})
+        return attrs
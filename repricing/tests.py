@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from products.models import Product
+from .engine import apply_prices, compute_prices, reprice
+from .models import RepricingPolicy, RepricingRule, SalesBucket
+from .velocity import prune_sales, record_sales, velocities_of
+
+NOW = datetime(2026, 3, 10, 12, 30, tzinfo=dt_timezone.utc)
+
+
+class ComputePricesTests(SimpleTestCase):
+    """
+    Checks the prices computed from sales velocities, in cents.
+    """
+
+    def compute(self, velocity, price=1000, floor=1, ceiling=np.inf, elasticity=-1.5, target=10.0, max_step=1.0):
+        prices = compute_prices(np.array([price], dtype=np.float64), np.array([floor], dtype=np.float64),
+                                np.array([ceiling], dtype=np.float64), np.array([velocity], dtype=np.float64),
+                                np.array([elasticity]), np.array([target]), np.array([max_step]))
+        return prices[0]
+
+    def test_prices_follow_demand(self):
+        # Selling twice the target raises the price by 2 ** (1 / 1.5), selling half of it lowers it as much.
+        self.assertEqual(self.compute(velocity=20.0), 1587)
+        self.assertEqual(self.compute(velocity=5.0), 630)
+        self.assertEqual(self.compute(velocity=10.0), 1000)
+
+    def test_more_elastic_demand_moves_prices_less(self):
+        self.assertEqual(self.compute(velocity=20.0, elasticity=-4.0), 1189)
+        self.assertLess(self.compute(velocity=20.0, elasticity=-4.0), self.compute(velocity=20.0))
+
+    def test_changes_are_capped_to_the_max_step(self):
+        self.assertEqual(self.compute(velocity=20.0, max_step=0.05), 1050)
+        self.assertEqual(self.compute(velocity=5.0, max_step=0.05), 950)
+        # Products not sold within the window drop by the step, not to the floor.
+        self.assertEqual(self.compute(velocity=0.0, max_step=0.05), 950)
+
+    def test_floor_and_ceiling_win_over_the_step(self):
+        self.assertEqual(self.compute(velocity=5.0, floor=990, max_step=0.05), 990)
+        self.assertEqual(self.compute(velocity=20.0, ceiling=1020, max_step=0.05), 1020)
+        self.assertEqual(self.compute(velocity=10.0, floor=1200, max_step=0.05), 1200)
+        self.assertEqual(self.compute(velocity=10.0, ceiling=800, max_step=0.05), 800)
+
+    def test_prices_are_computed_for_all_products_at_once(self):
+        prices = compute_prices(np.array([1000.0, 1000.0, 2001.0]), np.ones(3), np.full(3, np.inf),
+                                np.array([20.0, 5.0, 20.0]), np.full(3, -1.5), np.full(3, 10.0), np.full(3, 0.05))
+        self.assertEqual(prices.tolist(), [1050.0, 950.0, 2101.0])
+
+
+class ApplyPricesTests(TestCase):
+    """
+    Checks that repricing writes new prices only over the prices it read.
+    """
+
+    def setUp(self):
+        self.products = [Product.objects.create(name=f"Lamp {number}", price=Decimal('10.00')) for number in range(3)]
+
+    def test_rows_edited_since_they_were_read_are_kept(self):
+        edited = self.products[1]
+        Product.objects.filter(pk=edited.pk).update(price=Decimal('12.00'))
+        applied = apply_prices(np.array([product.pk for product in self.products]), np.full(3, 1000.0),
+                               np.array([1050.0, 1050.0, 950.0]), NOW, batch_size=2)
+        self.assertEqual(applied, 2)
+        prices = dict(Product.objects.values_list('pk', 'price'))
+        self.assertEqual([prices[product.pk] for product in self.products],
+                         [Decimal('10.50'), Decimal('12.00'), Decimal('9.50')])
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).updated_at, NOW)
+        self.assertNotEqual(Product.objects.get(pk=edited.pk).updated_at, NOW)
+
+
+@override_settings(REPRICING={'WINDOW_HOURS': 24, 'BUCKET_MINUTES': 60, 'BATCH_SIZE': 100})
+class SalesVelocityTests(TestCase):
+    """
+    Checks the sales buckets recorded for placed orders and the velocities read from them.
+    """
+
+    def setUp(self):
+        self.lamp = Product.objects.create(name="Lamp", price=Decimal('10.00'))
+        self.shade = Product.objects.create(name="Shade", price=Decimal('4.00'))
+
+    def buckets(self):
+        return list(SalesBucket.objects.order_by('product_id', 'bucket_start')
+                    .values_list('product_id', 'bucket_start', 'units'))
+
+    def test_sales_are_added_to_the_bucket_of_their_hour(self):
+        record_sales([(self.lamp.pk, 2), (self.shade.pk, 1), (self.lamp.pk, 3)], at=NOW.replace(minute=5))
+        record_sales([(self.lamp.pk, 4)], at=NOW.replace(minute=59))
+        record_sales([(self.lamp.pk, 1)], at=NOW.replace(hour=13, minute=0))
+        hour = NOW.replace(minute=0)
+        self.assertEqual(self.buckets(), [
+            (self.lamp.pk, hour, 9),
+            (self.lamp.pk, hour + timedelta(hours=1), 1),
+            (self.shade.pk, hour, 1),
+        ])
+
+    def test_velocities_count_the_units_of_the_window_per_day(self):
+        record_sales([(self.lamp.pk, 12)], at=NOW - timedelta(hours=2))
+        record_sales([(self.lamp.pk, 6)], at=NOW)
+        record_sales([(self.shade.pk, 100)], at=NOW - timedelta(hours=30))
+        missing = self.shade.pk + 1000
+        self.assertEqual(velocities_of(np.array([self.lamp.pk, self.shade.pk, missing]), NOW).tolist(),
+                         [18.0, 0.0, 0.0])
+
+    def test_buckets_out_of_the_window_are_pruned(self):
+        record_sales([(self.lamp.pk, 5)], at=NOW - timedelta(hours=30))
+        record_sales([(self.lamp.pk, 3)], at=NOW - timedelta(hours=23))
+        self.assertEqual(prune_sales(NOW), 1)
+        self.assertEqual([units for _, _, units in self.buckets()], [3])
+        self.assertEqual(prune_sales(NOW), 0)
+
+
+@override_settings(REPRICING={'WINDOW_HOURS': 24, 'BUCKET_MINUTES': 60, 'BATCH_SIZE': 100})
+class RepricingPassTests(TestCase):
+    """
+    Runs repricing passes over products selling above, below and at their target.
+    """
+
+    def setUp(self):
+        rule = RepricingRule.objects.create(name="Velocity", target_velocity=Decimal('10.000'))
+        self.hot, self.cold, self.steady = [Product.objects.create(name=name, price=Decimal('10.00'))
+                                            for name in ("Hot", "Cold", "Steady")]
+        for product in (self.hot, self.cold, self.steady):
+            RepricingPolicy.objects.create(product=product, rule=rule, price_floor=Decimal('9.80'))
+        record_sales([(self.hot.pk, 20), (self.cold.pk, 5), (self.steady.pk, 10)], at=NOW - timedelta(hours=1))
+
+    def prices(self):
+        return [Product.objects.get(pk=product.pk).price for product in (self.hot, self.cold, self.steady)]
+
+    def test_pass_writes_changed_prices(self):
+        result = reprice(now=NOW, announce=False)
+        self.assertEqual((result.products, result.changed, result.applied), (3, 2, 2))
+        self.assertEqual(self.prices(), [Decimal('10.50'), Decimal('9.80'), Decimal('10.00')])
+
+    def test_dry_run_writes_nothing(self):
+        result = reprice(now=NOW, dry_run=True)
+        self.assertEqual((result.products, result.changed, result.applied), (3, 2, 0))
+        self.assertEqual(self.prices(), [Decimal('10.00')] * 3)
+        self.assertEqual(SalesBucket.objects.count(), 3)
@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import RepricingPolicyDetailView, RepricingPolicyListCreateView, RepricingRuleListCreateView
+
+urlpatterns = [
+    path('repricing/rules/', RepricingRuleListCreateView.as_view(), name='repricing-rule-list-create'),
+    path('repricing/policies/', RepricingPolicyListCreateView.as_view(), name='repricing-policy-list-create'),
+    path('repricing/policies/<int:pk>/', RepricingPolicyDetailView.as_view(), name='repricing-policy-detail'),
+]
@@ -0,0 +1,138 @@
+"""
+    repricing/velocity.py
+
+    This module keeps the sliding-window sales velocity of every product. Orders placed through
+    `orders.services.place_orders` add their units to the current time bucket of each product, with one
+    INSERT of the missing buckets and one UPDATE incrementing all of them; the velocity of a product is the
+    number of units sold over the buckets of the last REPRICING['WINDOW_HOURS'], per day.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Case, F, PositiveBigIntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .models import SalesBucket
+
+DEFAULTS = {
+    'WINDOW_HOURS': 168,
+    'BUCKET_MINUTES': 60,
+    'INTERVAL_SECONDS': 300,
+    'BATCH_SIZE': 1000,
+}
+
+
+def get_setting(name):
+    """
+    Returns a repricing setting, falling back to its default value.
+
+    Args:
+        name (str): The name of the setting in the REPRICING dict.
+
+    Returns:
+        object: The setting value.
+    """
+    return getattr(settings, 'REPRICING', {}).get(name, DEFAULTS.get(name))
+
+
+def bucket_start(at):
+    """
+    Returns the start of the time bucket containing a time.
+
+    Args:
+        at (datetime): The time.
+
+    Returns:
+        datetime: The start of its bucket.
+    """
+    minutes = get_setting('BUCKET_MINUTES')
+    start = at.replace(second=0, microsecond=0)
+    return start - timedelta(minutes=(start.hour * 60 + start.minute) % minutes)
+
+
+def record_sales(lines, at=None):
+    """
+    Adds sold units to the current bucket of their products.
+
+    Args:
+        lines (Iterable[tuple]): The (product_id, quantity) pairs of the placed order lines.
+        at (datetime): The time of the sale, now when omitted.
+    """
+    units = Counter()
+    for product_id, quantity in lines:
+        units[product_id] += quantity
+    if not units:
+        return
+    start = bucket_start(at or timezone.now())
+    SalesBucket.objects.bulk_create([SalesBucket(product_id=product_id, bucket_start=start) for product_id in units],
+                                    ignore_conflicts=True)
+    sold = Case(*[When(product_id=product_id, then=Value(quantity)) for product_id, quantity in units.items()],
+                output_field=PositiveBigIntegerField())
+    SalesBucket.objects.filter(bucket_start=start, product_id__in=units).update(units=F('units') + sold)
+
+
+def window_start(now=None):
+    """
+    Returns the start of the sales velocity window.
+
+    Args:
+        now (datetime): The end of the window, now when omitted.
+
+    Returns:
+        datetime: The start of the oldest bucket of the window.
+    """
+    return bucket_start((now or timezone.now()) - timedelta(hours=get_setting('WINDOW_HOURS')))
+
+
+def load_velocities(now=None):
+    """
+    Computes the sales velocity of every product sold within the window, with one aggregate query.
+
+    Args:
+        now (datetime): The end of the window, now when omitted.
+
+    Returns:
+        tuple: The sorted product ids (int64 array) and their velocities in units per day (float64 array).
+    """
+    rows = (SalesBucket.objects.filter(bucket_start__gte=window_start(now)).order_by('product_id')
+            .values('product_id').annotate(units=Sum('units')).values_list('product_id', 'units'))
+    data = np.array(list(rows), dtype=np.int64).reshape(-1, 2)
+    days = get_setting('WINDOW_HOURS') / 24
+    return data[:, 0], data[:, 1] / days
+
+
+def velocities_of(product_ids, now=None):
+    """
+    Returns the sales velocity of the given products.
+
+    Args:
+        product_ids (ndarray): The product ids.
+        now (datetime): The end of the window, now when omitted.
+
+    Returns:
+        ndarray: The velocity of every product in units per day, 0 for products not sold within the window.
+    """
+    sold_ids, velocities = load_velocities(now)
+    result = np.zeros(len(product_ids))
+    if len(sold_ids):
+        index = np.minimum(np.searchsorted(sold_ids, product_ids), len(sold_ids) - 1)
+        found = sold_ids[index] == product_ids
+        result[found] = velocities[index[found]]
+    return result
+
+
+def prune_sales(now=None):
+    """
+    Deletes the buckets that fell out of the window.
+
+    Args:
+        now (datetime): The end of the window, now when omitted.
+
+    Returns:
+        int: The number of deleted buckets.
+    """
+    deleted, _ = SalesBucket.objects.filter(bucket_start__lt=window_start(now)).delete()
+    return deleted
@@ -0,0 +1,78 @@
+"""
+    repricing/views.py
+
+    This module defines API views for managing repricing rules and opting products in to repricing.
+"""
+
+from rest_framework import generics, status
+from rest_framework.response import Response
+
+from constants import CREATED_SUCCESSFULLY, SOMETHING_WENT_WRONG
+from .constants import REPRICING_POLICY, REPRICING_RULE
+from .models import RepricingPolicy, RepricingRule
+from .serializers import RepricingPolicySerializer, RepricingRuleSerializer
+
+
+class RepricingListCreateView(generics.ListCreateAPIView):
+    """
+    Base view for listing and creating repricing records.
+
+    Attributes:
+        module (str): The name of the created record, used in the response message.
+    """
+    module = None
+
+    def create(self, request, *args, **kwargs):
+        """
+        Creates a new record using the provided data.
+
+        Args:
+            request (Request): The HTTP request containing the record data.
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+
+        Returns:
+            Response: A response containing the created record data or error details.
+        """
+        serializer = self.get_serializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response({'message': CREATED_SUCCESSFULLY.replace("{module}", self.module),
+                             'data': serializer.data}, status=status.HTTP_201_CREATED)
+        return Response({'error': SOMETHING_WENT_WRONG, 'details': serializer.errors},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+
+class RepricingRuleListCreateView(RepricingListCreateView):
+    """
+    Handles listing and creating repricing rules.
+    """
+    queryset = RepricingRule.objects.order_by('id')
+    serializer_class = RepricingRuleSerializer
+    module = REPRICING_RULE
+    query_budget = {'GET': 1, 'POST': 1}
+
+
+class RepricingPolicyListCreateView(RepricingListCreateView):
+    """
+    Handles listing and creating repricing policies, optionally filtered with `?rule=`.
+    """
+    queryset = RepricingPolicy.objects.order_by('product_id')
+    serializer_class = RepricingPolicySerializer
+    module = REPRICING_POLICY
+    query_budget = {'GET': 1, 'POST': 4}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        rule = self.request.query_params.get('rule', '')
+        return queryset.filter(rule_id=rule) if rule.isdigit() else queryset
+
+
+class RepricingPolicyDetailView(generics.RetrieveUpdateDestroyAPIView):
+    """
+    Handles reading, changing and deleting the repricing policy of a product. Deleting it opts the product
+    out of repricing.
+    """
+    queryset = RepricingPolicy.objects.all()
+    serializer_class = RepricingPolicySerializer
+    query_budget = {'GET': 1, 'PUT': 5, 'PATCH': 2, 'DELETE': 2}